@@ -0,0 +1,44 @@
+"""add llm_calls table
+
+Revision ID: add_llm_calls
+Revises: 441b2d4b00c3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_llm_calls'
+down_revision: Union[str, None] = '441b2d4b00c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'llm_calls',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('provider', sa.String(length=32), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=True),
+        sa.Column('operation', sa.String(length=32), nullable=False),
+        sa.Column('success', sa.Boolean(), nullable=False),
+        sa.Column('http_status', sa.SmallInteger(), nullable=True),
+        sa.Column('latency_ms', sa.Integer(), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+        sa.Column('completion_tokens', sa.Integer(), nullable=False),
+        sa.Column('cached_tokens', sa.Integer(), nullable=False),
+        sa.Column('retries', sa.SmallInteger(), nullable=False),
+        sa.Column('fallback', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_llm_calls_created_at'), 'llm_calls', ['created_at'], unique=False)
+    op.create_index('ix_llm_calls_provider_created_at', 'llm_calls', ['provider', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_llm_calls_provider_created_at', table_name='llm_calls')
+    op.drop_index(op.f('ix_llm_calls_created_at'), table_name='llm_calls')
+    op.drop_table('llm_calls')
@@ -0,0 +1,91 @@
+"""add submission_events table
+
+Revision ID: add_submission_events
+Revises: add_llm_calls
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_submission_events'
+down_revision: Union[str, None] = 'add_llm_calls'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Действия submission.* в audit_logs, не являющиеся событиями прохождения
+NON_EVENT_ACTIONS = ('submission.grant_retake', 'submission.bulk_delete')
+UUID_PATTERN = '^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+
+
+def upgrade() -> None:
+    op.create_table(
+        'submission_events',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.Column('submission_id', sa.UUID(), nullable=False),
+        sa.Column('question_id', sa.UUID(), nullable=True),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('details', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.ForeignKeyConstraint(['submission_id'], ['submissions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', 'ts'),
+        postgresql_partition_by='RANGE (ts)',
+    )
+    op.create_index(
+        'ix_submission_events_submission_question_ts',
+        'submission_events',
+        ['submission_id', 'question_id', 'ts'],
+        unique=False,
+    )
+
+    # Месячные секции: от самого раннего события в audit_logs до двух месяцев вперёд
+    op.execute("""
+        DO $$
+        DECLARE
+            month_start date;
+            last_month date := (date_trunc('month', now()) + interval '2 months')::date;
+        BEGIN
+            SELECT COALESCE(date_trunc('month', min("timestamp")), date_trunc('month', now()))::date
+              INTO month_start
+              FROM audit_logs
+             WHERE action LIKE 'submission.%' AND resource_type = 'submission';
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF submission_events FOR VALUES FROM (%L) TO (%L)',
+                    'submission_events_' || to_char(month_start, 'YYYY_MM'),
+                    month_start,
+                    (month_start + interval '1 month')::date
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END $$;
+    """)
+    op.execute("CREATE TABLE IF NOT EXISTS submission_events_default PARTITION OF submission_events DEFAULT")
+
+    op.execute(sa.text("""
+        INSERT INTO submission_events (id, ts, submission_id, question_id, event_type, details)
+        SELECT a.id,
+               a."timestamp",
+               a.resource_id,
+               CASE WHEN a.details->>'question_id' ~ :uuid_pattern
+                    THEN (a.details->>'question_id')::uuid END,
+               left(substr(a.action, length('submission.') + 1), 50),
+               NULLIF(a.details - 'question_id', '{}'::jsonb)
+          FROM audit_logs a
+          JOIN submissions s ON s.id = a.resource_id
+         WHERE a.action LIKE 'submission.%'
+           AND a.resource_type = 'submission'
+           AND a.action NOT IN :non_event_actions
+    """).bindparams(
+        sa.bindparam('uuid_pattern', UUID_PATTERN),
+        sa.bindparam('non_event_actions', NON_EVENT_ACTIONS, expanding=True),
+    ))
+
+
+def downgrade() -> None:
+    # Секции удаляются вместе с родительской таблицей
+    op.drop_index('ix_submission_events_submission_question_ts', table_name='submission_events')
+    op.drop_table('submission_events')
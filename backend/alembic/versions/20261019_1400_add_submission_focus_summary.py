@@ -0,0 +1,25 @@
+"""add submissions.focus_summary
+
+Revision ID: add_submission_focus_summary
+Revises: add_submission_events
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_submission_focus_summary'
+down_revision: Union[str, None] = 'add_submission_events'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('submissions', sa.Column('focus_summary', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('submissions', 'focus_summary')
@@ -0,0 +1,36 @@
+"""unique (submission_id, question_id) on answers
+
+Revision ID: add_answers_unique_question
+Revises: add_submission_focus_summary
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_answers_unique_question'
+down_revision: Union[str, None] = 'add_submission_focus_summary'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Дубли от гонки автосохранений: оставляем последнюю версию ответа
+    op.execute(
+        """
+        DELETE FROM answers a
+        USING answers b
+        WHERE a.submission_id = b.submission_id
+          AND a.question_id = b.question_id
+          AND (COALESCE(a.updated_at, a.created_at), a.id) < (COALESCE(b.updated_at, b.created_at), b.id)
+        """
+    )
+    op.create_unique_constraint(
+        'uq_answers_submission_question', 'answers', ['submission_id', 'question_id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_answers_submission_question', 'answers', type_='unique')
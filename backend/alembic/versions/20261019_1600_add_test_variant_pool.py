@@ -0,0 +1,31 @@
+"""test_variants pool columns
+
+Revision ID: add_test_variant_pool
+Revises: add_answers_unique_question
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_test_variant_pool'
+down_revision: Union[str, None] = 'add_answers_unique_question'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('test_variants', sa.Column('pooled', sa.Boolean(), server_default='false', nullable=False))
+    op.add_column('test_variants', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_test_variants_pool', 'test_variants', ['test_id', 'claimed_at'],
+        postgresql_where=sa.text('pooled'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_test_variants_pool', table_name='test_variants')
+    op.drop_column('test_variants', 'claimed_at')
+    op.drop_column('test_variants', 'pooled')
@@ -0,0 +1,27 @@
+"""image_assets content hash
+
+Revision ID: add_image_content_hash
+Revises: add_test_variant_pool
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_image_content_hash'
+down_revision: Union[str, None] = 'add_test_variant_pool'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Существующие объекты переносятся задачей maintenance.rekey_image_objects
+    op.add_column('image_assets', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_image_assets_content_hash', 'image_assets', ['content_hash'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_image_assets_content_hash', table_name='image_assets')
+    op.drop_column('image_assets', 'content_hash')
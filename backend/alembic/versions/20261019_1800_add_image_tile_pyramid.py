@@ -0,0 +1,25 @@
+"""image_assets tile pyramid manifest
+
+Revision ID: add_image_tile_pyramid
+Revises: add_image_content_hash
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_image_tile_pyramid'
+down_revision: Union[str, None] = 'add_image_content_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('image_assets', sa.Column('tile_pyramid', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('image_assets', 'tile_pyramid')
@@ -0,0 +1,26 @@
+"""image_assets renditions
+
+Revision ID: add_image_renditions
+Revises: add_image_tile_pyramid
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_image_renditions'
+down_revision: Union[str, None] = 'add_image_tile_pyramid'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Копии существующих изображений строит maintenance.backfill_image_renditions
+    op.add_column('image_assets', sa.Column('renditions', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('image_assets', 'renditions')
@@ -0,0 +1,27 @@
+"""llm_calls stream_id
+
+Revision ID: add_llm_calls_stream_id
+Revises: add_image_renditions
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_llm_calls_stream_id'
+down_revision: Union[str, None] = 'add_image_renditions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Уже перенесённые записи остаются без stream_id (NULL в уникальном индексе допустим)
+    op.add_column('llm_calls', sa.Column('stream_id', sa.String(length=32), nullable=True))
+    op.create_unique_constraint('uq_llm_calls_stream_id', 'llm_calls', ['stream_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_llm_calls_stream_id', 'llm_calls', type_='unique')
+    op.drop_column('llm_calls', 'stream_id')
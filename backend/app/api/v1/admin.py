@@ -3,7 +3,7 @@ Admin API - CRUD операции для всех сущностей
 Только для роли admin
 """
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import csv
 import io
 import logging
@@ -19,15 +19,20 @@ from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.database import get_db
-from app.core.security import get_current_user, get_password_hash
-from app.core.storage import storage_service
+from app.core.security import get_current_user, get_password_hash_async
+from app.core.storage import async_storage
+from app.core.user_cache import invalidate_user
 from app.services.audit_service import audit_service
+from app.services.question_pool import bump_question_bank_version
+from app.services.renditions import ImageSize, attach_image_urls
+from app.services.submission_state import invalidate_submission_state
 from app.models.user import User, Role
 from app.models.question import Question, ImageAsset
 from app.models.system_config import SystemConfig
 from app.models.test import Test, TestQuestion, TestVariant, TestStatus
 from app.models.submission import Submission, Answer, SubmissionStatus
 from app.models.audit import AuditLog
+from app.models.llm_call import LLMCall
 from app.schemas.admin import (
     AdminUserCreate, AdminUserUpdate, AdminUserResponse,
     AdminQuestionUpdate, AdminQuestionResponse,
@@ -37,6 +42,7 @@ from app.schemas.admin import (
     PaginatedResponse, AdminStatsResponse, EntityCounts,
     AdminSystemConfigResponse, AdminSystemConfigUpdate, AdminCVConfig,
     AdminLLMConfig, AdminLLMTestResponse,
+    AdminLLMUsageGroup, AdminLLMUsageResponse,
 )
 from app.schemas.submission import BulkDeleteRequest
 
@@ -237,7 +243,7 @@ async def create_user(
     
     user = User(
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await get_password_hash_async(user_in.password),
         last_name=user_in.last_name,
         first_name=user_in.first_name,
         middle_name=user_in.middle_name,
@@ -278,13 +284,14 @@ async def update_user(
     
     # Хеширование пароля
     if "password" in update_data:
-        update_data["password_hash"] = get_password_hash(update_data.pop("password"))
+        update_data["password_hash"] = await get_password_hash_async(update_data.pop("password"))
     
     for field, value in update_data.items():
         setattr(user, field, value)
     
     await log_admin_action(db, admin, "update", "user", user_id, update_data)
     await db.commit()
+    await invalidate_user(user_id)
     await db.refresh(user)
     
     return user
@@ -361,6 +368,7 @@ async def delete_user(
             status_code=400,
             detail="Ошибка при удалении: возможны зависимости в БД"
         )
+    await invalidate_user(user_id)
 
 
 @router.post("/users/bulk-delete", status_code=204)
@@ -420,6 +428,7 @@ async def bulk_delete_users(
             status_code=400,
             detail="Ошибка при массовом удалении: возможны зависимости в БД"
         )
+    await invalidate_user(*[user.id for user in users])
 
 
 # ==================== QUESTIONS ====================
@@ -430,6 +439,9 @@ async def list_questions(
     limit: int = Query(50, ge=1, le=100),
     search: Optional[str] = None,
     author_id: Optional[UUID] = None,
+    size: ImageSize = Query(
+        ImageSize.ORIGINAL, description="Размер изображений: thumb, preview или original"
+    ),
     admin: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
@@ -459,13 +471,12 @@ async def list_questions(
     questions = result.scalars().all()
     
     # Генерация presigned URLs
-    for question in questions:
-        if question.image:
-            question.image.presigned_url = storage_service.get_presigned_url(
-                question.image.storage_path.split("/", 1)[1],
-                expires_seconds=3600
-            )
-            
+    await attach_image_urls(
+        (question.image for question in questions),
+        size,
+        expires_seconds=3600
+    )
+
     return PaginatedResponse(items=questions, total=total or 0, skip=skip, limit=limit)
 
 
@@ -492,7 +503,7 @@ async def get_question(
     
     # Генерация presigned URL
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -528,6 +539,7 @@ async def update_question(
     
     await log_admin_action(db, admin, "update", "question", question_id, update_data)
     await db.commit()
+    await bump_question_bank_version()
     
     # Получаем обновленный вопрос
     result = await db.execute(
@@ -542,7 +554,7 @@ async def update_question(
     question = result.scalar_one()
     
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -585,6 +597,62 @@ async def delete_question(
     await log_admin_action(db, admin, "delete", "question", question_id)
     await db.delete(question)
     await db.commit()
+    await bump_question_bank_version()
+
+
+@router.post("/questions/{question_id}/revaluate")
+async def revaluate_question_answers(
+    question_id: UUID,
+    admin: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Массовая переоценка ответов на текстовый вопрос в завершённых работах.
+
+    Ответы уходят в Celery группами; внутри группы LLM оценивает по batch_size
+    ответов за один запрос, итоги работ пересчитываются.
+    """
+    from app.models.question import QuestionType
+    from app.services.llm_service import DEFAULT_BATCH_SIZE
+    from app.tasks.evaluation_tasks import evaluate_question_batch
+
+    question = await db.get(Question, question_id)
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if question.type != QuestionType.TEXT:
+        raise HTTPException(
+            status_code=400, detail="Пакетная переоценка доступна только для текстовых вопросов"
+        )
+
+    result = await db.execute(
+        select(Answer.id)
+        .join(Submission, Submission.id == Answer.submission_id)
+        .where(
+            Answer.question_id == question_id,
+            Submission.status == SubmissionStatus.COMPLETED
+        )
+    )
+    answer_ids = [str(answer_id) for answer_id in result.scalars().all()]
+
+    result = await db.execute(select(SystemConfig).where(SystemConfig.key == "llm_evaluation_params"))
+    config = result.scalar_one_or_none()
+    batch_size = int(
+        ((config.value if config else {}) or {}).get("batch_size") or DEFAULT_BATCH_SIZE
+    )
+    # Несколько пакетов на задачу: меньше накладных расходов Celery, но задачи остаются короткими
+    task_size = max(1, batch_size) * 5
+
+    tasks = 0
+    for start in range(0, len(answer_ids), task_size):
+        evaluate_question_batch.delay(str(question_id), answer_ids[start:start + task_size])
+        tasks += 1
+
+    await log_admin_action(
+        db, admin, "revaluate", "question", question_id,
+        details={"answers": len(answer_ids), "tasks": tasks}
+    )
+    await db.commit()
+    return {"status": "queued", "answers": len(answer_ids), "tasks": tasks}
 
 
 # ==================== TESTS ====================
@@ -810,6 +878,7 @@ async def delete_submission(
     await log_admin_action(db, admin, "delete", "submission", submission_id)
     await db.delete(submission)
     await db.commit()
+    await invalidate_submission_state(submission_id)
 
 
 @router.post("/submissions/{submission_id}/revaluate")
@@ -831,7 +900,9 @@ async def revaluate_submission(
         if not submission:
             raise HTTPException(status_code=404, detail="Submission not found")
         
-        from app.tasks.evaluation_tasks import run_evaluate_annotation_answer, run_evaluate_text_answer
+        from app.tasks.evaluation_tasks import (
+            dispatch_peer_rescoring, run_evaluate_annotation_answer, run_evaluate_text_answer
+        )
         from app.models.question import Question, QuestionType
         from app.models.submission import Answer, SubmissionStatus
         
@@ -908,6 +979,8 @@ async def revaluate_submission(
         
         await log_admin_action(db, admin, "revaluate", "submission", submission_id)
         await db.commit()
+        dispatch_peer_rescoring(db)
+        await invalidate_submission_state(submission_id)
         return {"status": "success", "message": "Evaluation recalculated"}
     except Exception as e:
         import traceback
@@ -922,6 +995,9 @@ async def revaluate_submission(
 async def list_images(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    size: ImageSize = Query(
+        ImageSize.ORIGINAL, description="Размер изображений: thumb, preview или original"
+    ),
     admin: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db)
 ):
@@ -933,11 +1009,7 @@ async def list_images(
     images = result.scalars().all()
     
     # Генерация presigned URLs
-    for image in images:
-        image.presigned_url = storage_service.get_presigned_url(
-            image.storage_path.split("/", 1)[1],
-            expires_seconds=3600
-        )
+    await attach_image_urls(images, size, expires_seconds=3600)
     
     return PaginatedResponse(items=images, total=total or 0, skip=skip, limit=limit)
 
@@ -1222,8 +1294,10 @@ async def test_llm_config(
         
         # Нам нужно знать, были ли результаты. Но check_plagiarism возвращает float.
         # В идеале нужно проверить, не было ли ошибок авторизации.
-        plagiarism_score = await search_service.check_plagiarism(test_text, config=search_config)
-        
+        plagiarism_score = await search_service.check_plagiarism(
+            test_text, config=search_config, use_cache=False
+        )
+
         if config_in.yandex_search_api_key and config_in.yandex_search_folder_id:
             search_test_result = {
                 "status": "success" if plagiarism_score > 0 else "no_results",
@@ -1262,3 +1336,91 @@ async def test_llm_config(
             result=llm_test_result,
             search_result=search_test_result
         )
+
+
+@router.get("/llm/usage", response_model=AdminLLMUsageResponse)
+async def get_llm_usage(
+    days: int = Query(7, ge=1, le=90),
+    provider: Optional[str] = None,
+    admin: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Расход токенов, ошибки и задержки вызовов LLM по провайдерам, моделям и дням.
+    Стоимость считается по token_prices из настроек LLM.
+    """
+    from app.core.redis import get_redis_client
+    from app.services.llm_usage import LLM_CALLS_STREAM, estimate_cost
+
+    since = datetime.utcnow() - timedelta(days=days)
+    day_col = func.date(LLMCall.created_at).label("day")
+
+    def _filtered(stmt):
+        stmt = stmt.where(LLMCall.created_at >= since)
+        if provider:
+            stmt = stmt.where(LLMCall.provider == provider)
+        return stmt
+
+    async def _aggregate(*group_cols):
+        stmt = _filtered(select(
+            *group_cols,
+            func.count(LLMCall.id).label("calls"),
+            func.count(LLMCall.id).filter(LLMCall.success.is_(False)).label("errors"),
+            func.count(LLMCall.id).filter(LLMCall.fallback.is_(True)).label("fallbacks"),
+            func.coalesce(func.sum(LLMCall.retries), 0).label("retries"),
+            func.coalesce(func.sum(LLMCall.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(LLMCall.completion_tokens), 0).label("completion_tokens"),
+            func.coalesce(func.sum(LLMCall.cached_tokens), 0).label("cached_tokens"),
+            func.percentile_cont(0.5).within_group(LLMCall.latency_ms).label("latency_p50_ms"),
+            func.percentile_cont(0.95).within_group(LLMCall.latency_ms).label("latency_p95_ms"),
+        )).group_by(*group_cols).order_by(*group_cols)
+        return (await db.execute(stmt)).mappings().all()
+
+    # Стоимость зависит от модели: считаем по (день, провайдер, модель) и суммируем в группы
+    config = await db.scalar(
+        select(SystemConfig).where(SystemConfig.key == "llm_evaluation_params")
+    )
+    token_prices = (config.value if config else {}).get("token_prices") or {}
+    costs: Dict[tuple, float] = {}
+    if token_prices:
+        cost_rows = await db.execute(
+            _filtered(
+                select(
+                    day_col,
+                    LLMCall.provider,
+                    LLMCall.model,
+                    func.sum(LLMCall.prompt_tokens),
+                    func.sum(LLMCall.completion_tokens),
+                    func.sum(LLMCall.cached_tokens),
+                )
+            ).group_by(day_col, LLMCall.provider, LLMCall.model)
+        )
+        for day, row_provider, model, prompt_tokens, completion_tokens, cached in cost_rows.all():
+            cost = estimate_cost(
+                token_prices.get(model), prompt_tokens or 0, completion_tokens or 0, cached or 0
+            )
+            if cost is None:
+                continue
+            for key in ((row_provider,), (row_provider, model), (day, row_provider)):
+                costs[key] = costs.get(key, 0.0) + cost
+
+    def _groups(rows, key_fields):
+        return [
+            AdminLLMUsageGroup(**row, cost=costs.get(tuple(row[f] for f in key_fields)))
+            for row in rows
+        ]
+
+    pending_calls = 0
+    try:
+        client = await get_redis_client()
+        pending_calls = await client.xlen(LLM_CALLS_STREAM)
+    except Exception as e:
+        logger.warning(f"Failed to read LLM calls stream length: {e}")
+
+    return AdminLLMUsageResponse(
+        since=since,
+        pending_calls=pending_calls,
+        by_provider=_groups(await _aggregate(LLMCall.provider), ("provider",)),
+        by_model=_groups(await _aggregate(LLMCall.provider, LLMCall.model), ("provider", "model")),
+        by_day=_groups(await _aggregate(day_col, LLMCall.provider), ("day", "provider")),
+    )
@@ -38,9 +38,10 @@ from app.core.redis import delete_key, get_redis_client
 from app.core.security import (
     create_access_token,
     create_refresh_token,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
 )
+from app.core.user_cache import invalidate_user
 from app.models.user import Role, User
 from app.schemas.user import (
     EmailVerificationRequest,
@@ -71,7 +72,7 @@ async def _save_draft(email: str, password: str, last_name: str, first_name: str
     client = await get_redis_client()
     payload = json.dumps({
         "email": email,
-        "password_hash": get_password_hash(password),
+        "password_hash": await get_password_hash_async(password),
         "last_name": last_name,
         "first_name": first_name,
         "middle_name": middle_name,
@@ -125,7 +126,9 @@ async def register(
     # send a new code but DO NOT overwrite the victim's draft. The legitimate
     # user still has their original code valid.
     existing_draft = await _load_draft(email)
-    if existing_draft and not verify_password(user_in.password, existing_draft["password_hash"]):
+    if existing_draft and not await verify_password_async(
+        user_in.password, existing_draft["password_hash"]
+    ):
         logger.warning("register.draft_conflict email=%s", email)
         return RegistrationAccepted(
             message="Если email корректен, код подтверждения отправлен.",
@@ -385,7 +388,7 @@ async def login(
     result = await db.execute(select(User).where(User.email == form_data.username.lower()))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль.",
@@ -406,6 +409,7 @@ async def login(
 
     user.last_login = datetime.utcnow()
     await db.commit()
+    await invalidate_user(user.id)
 
     return {
         "access_token": access_token,
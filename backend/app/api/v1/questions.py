@@ -1,30 +1,42 @@
 import hashlib
 import json
-import io
-import uuid
-import os
 import colorsys
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from PIL import Image
 
 from app.core.database import get_db
 from app.core.security import get_current_user
-from app.core.storage import storage_service
+from app.core.storage import async_storage, storage_service
 from app.models.user import User, Role
 from app.models.question import Question, ImageAsset, QuestionType
 from app.models.test import TestQuestion
 from app.models.submission import Answer
-from app.schemas.question import QuestionCreate, QuestionUpdate, QuestionResponse, ImageAssetResponse, PaginatedQuestionsResponse
+from app.schemas.question import (
+    QuestionCreate,
+    QuestionUpdate,
+    QuestionResponse,
+    ImageAssetResponse,
+    PaginatedQuestionsResponse,
+    TilePyramidResponse,
+    BulkAnnotationsResponse,
+)
 from app.schemas.annotation import AnnotationData
+from app.services.coco_import import CocoParseError, extract_coco_annotations
+from app.services.image_store import inspect_image_stream, store_image_stream
+from app.services.question_pool import bump_question_bank_version
+from app.services.renditions import ImageSize, attach_image_urls, schedule_renditions
+from app.services.tile_pyramid import needs_tile_pyramid, schedule_tile_pyramid, tile_url_template
 
 router = APIRouter()
 
+# Изображений в одном массовом импорте аннотаций
+MAX_BULK_ANNOTATION_IMAGES = 500
+
 
 @router.get("", response_model=PaginatedQuestionsResponse)
 async def list_questions(
@@ -33,6 +45,9 @@ async def list_questions(
     type: Optional[QuestionType] = None,
     topic_id: Optional[UUID] = None,
     search: Optional[str] = None,
+    size: ImageSize = Query(
+        ImageSize.ORIGINAL, description="Размер изображений: thumb, preview или original"
+    ),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -83,12 +98,11 @@ async def list_questions(
     questions = result.scalars().all()
     
     # Генерация presigned URLs для всех вопросов с изображениями
-    for question in questions:
-        if question.image:
-            question.image.presigned_url = storage_service.get_presigned_url(
-                question.image.storage_path.split("/", 1)[1],
-                expires_seconds=3600
-            )
+    await attach_image_urls(
+        (question.image for question in questions),
+        size,
+        expires_seconds=3600
+    )
         
     # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Скрываем только контуры от студентов, оставляя метки
     if current_user.role == Role.STUDENT:
@@ -157,6 +171,7 @@ async def create_question(
     
     db.add(question)
     await db.commit()
+    await bump_question_bank_version()
     
     # Получаем созданный вопрос со всеми связями для ответа
     result = await db.execute(
@@ -167,7 +182,7 @@ async def create_question(
     question = result.scalar_one()
     
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -210,7 +225,7 @@ async def get_question(
             )
     
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -286,6 +301,7 @@ async def update_question(
         setattr(question, field, value)
     
     await db.commit()
+    await bump_question_bank_version()
     
     # Получаем обновленный вопрос со всеми связями
     result = await db.execute(
@@ -296,7 +312,7 @@ async def update_question(
     question = result.scalar_one()
     
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -351,6 +367,7 @@ async def delete_question(
     
     await db.delete(question)
     await db.commit()
+    await bump_question_bank_version()
     
     return None
 
@@ -409,6 +426,7 @@ async def duplicate_question(
     
     db.add(new_question)
     await db.commit()
+    await bump_question_bank_version()
 
     # 4. Возвращаем новый вопрос со всеми связями
     result = await db.execute(
@@ -419,7 +437,7 @@ async def duplicate_question(
     new_question = result.scalar_one()
     
     if new_question.image:
-        new_question.image.presigned_url = storage_service.get_presigned_url(
+        new_question.image.presigned_url = await async_storage.get_presigned_url(
             new_question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -466,7 +484,7 @@ async def update_question_annotations(
     )
     question = result.scalar_one()
     if question.image:
-        question.image.presigned_url = storage_service.get_presigned_url(
+        question.image.presigned_url = await async_storage.get_presigned_url(
             question.image.storage_path.split("/", 1)[1],
             expires_seconds=3600
         )
@@ -575,50 +593,57 @@ async def upload_image(
             detail="File must be an image"
         )
     
-    # Чтение и валидация изображения
-    content = await file.read()
+    # Проверка изображения: файл уже сохранён во временный (UploadFile), читается частями,
+    # PIL разбирает только заголовок — всё в пуле потоков хранилища
+    from app.core.config import settings
     try:
-        img = Image.open(io.BytesIO(content))
-        width, height = img.size
-        
-        # Проверка размеров
-        from app.core.config import settings
-        if width > settings.MAX_IMAGE_DIMENSION or height > settings.MAX_IMAGE_DIMENSION:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Image dimensions exceed maximum of {settings.MAX_IMAGE_DIMENSION}px"
-            )
+        info = await async_storage.run(inspect_image_stream, file.file, settings.MAX_UPLOAD_SIZE)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid image file: {str(e)}"
         )
     
-    # Загрузка в MinIO
-    object_name = f"images/{uuid.uuid4()}.{file.filename.split('.')[-1]}"
+    # Проверка размеров
+    if info.width > settings.MAX_IMAGE_DIMENSION or info.height > settings.MAX_IMAGE_DIMENSION:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Image dimensions exceed maximum of {settings.MAX_IMAGE_DIMENSION}px"
+        )
     
-    file_data = io.BytesIO(content)
-    storage_path = storage_service.upload_file(
-        file_data,
-        object_name,
-        content_type=file.content_type
+    # Загрузка в MinIO под ключом sha256 (одинаковое содержимое хранится один раз)
+    storage_path = await store_image_stream(
+        db,
+        file.file,
+        info.digest,
+        info.image_format,
+        content_type=file.content_type,
+        filename=file.filename
     )
     
     # Создание записи в БД
     image_asset = ImageAsset(
         filename=file.filename,
         storage_path=storage_path,
-        width=width,
-        height=height,
-        file_size=len(content),
+        content_hash=info.digest,
+        width=info.width,
+        height=info.height,
+        file_size=info.size,
     )
     
     db.add(image_asset)
     await db.commit()
     await db.refresh(image_asset)
     
+    # Уменьшенные копии для списков и тайлы больших изображений строятся в фоне
+    schedule_renditions(image_asset.id)
+    if needs_tile_pyramid(image_asset.width, image_asset.height):
+        schedule_tile_pyramid(image_asset.id)
+    
     # Генерация presigned URL для ответа
-    presigned_url = storage_service.get_presigned_url(
+    presigned_url = await async_storage.get_presigned_url(
         image_asset.storage_path.split("/", 1)[1],
         expires_seconds=3600
     )
@@ -648,7 +673,7 @@ async def get_image(
         )
     
     # Генерация presigned URL
-    presigned_url = storage_service.get_presigned_url(
+    presigned_url = await async_storage.get_presigned_url(
         image.storage_path.split("/", 1)[1],  # Убираем bucket из пути
         expires_seconds=3600
     )
@@ -659,46 +684,54 @@ async def get_image(
     return response
 
 
-def parse_coco_for_image(coco_data: dict, filename: str) -> dict:
+@router.get("/images/{image_id}/tiles", response_model=TilePyramidResponse)
+async def get_image_tiles(
+    image_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Парсит COCO данные и оставляет только те, что относятся к конкретному изображению.
+    Манифест пирамиды тайлов и шаблон URL тайла.
+    404 — пирамида не построена (изображение небольшое или ещё обрабатывается):
+    клиент показывает изображение целиком по presigned_url.
     """
-    # 1. Находим изображение в 'images'
-    target_image = None
-    
-    # Сначала ищем по точному совпадению file_name
-    for img in coco_data.get('images', []):
-        if img.get('file_name') == filename:
-            target_image = img
-            break
-    
-    # Если не нашли, ищем по базовому имени файла (без пути)
-    if not target_image:
-        base_filename = os.path.basename(filename)
-        for img in coco_data.get('images', []):
-            if os.path.basename(img.get('file_name', '')) == base_filename:
-                target_image = img
-                break
-                
-    if not target_image:
-        return None
-        
-    image_id = target_image.get('id')
-    
-    # 2. Фильтруем аннотации
-    relevant_annotations = [
-        ann for ann in coco_data.get('annotations', [])
-        if ann.get('image_id') == image_id
-    ]
+    result = await db.execute(select(ImageAsset.tile_pyramid).where(ImageAsset.id == image_id))
+    manifest = result.scalar_one_or_none()
     
-    # 3. Сохраняем все категории (согласно требованию)
-    all_categories = coco_data.get('categories', [])
+    if not manifest:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tile pyramid not available"
+        )
     
-    return {
-        "images": [target_image],
-        "annotations": relevant_annotations,
-        "categories": all_categories
-    }
+    return TilePyramidResponse(
+        image_id=image_id,
+        url_template=tile_url_template(manifest),
+        manifest_url=storage_service.public_url(f"{manifest['prefix']}manifest.json"),
+        **{
+            key: manifest[key]
+            for key in ("width", "height", "tile_size", "overlap", "format", "max_level", "levels")
+        },
+    )
+
+
+def _check_annotations_file(file: UploadFile) -> None:
+    if not file.filename.endswith(".json"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Annotations file must be a JSON file"
+        )
+
+
+async def _extract_annotations(file: UploadFile, filenames: List[str]) -> Dict[str, dict]:
+    """Потоковый разбор COCO (временный файл загрузки, пул потоков хранилища)"""
+    try:
+        return await async_storage.run(extract_coco_annotations, file.file, filenames)
+    except CocoParseError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON in annotations file"
+        )
 
 
 @router.post("/images/{image_id}/annotations", response_model=ImageAssetResponse)
@@ -728,53 +761,83 @@ async def upload_annotations(
         )
     
     # 2. Валидация JSON
-    if not file.filename.endswith(".json"):
+    _check_annotations_file(file)
+    
+    # 3. Потоковый парсинг и проверка соответствия
+    parsed_annotations = (await _extract_annotations(file, [image_asset.filename])).get(
+        image_asset.filename
+    )
+
+    if not parsed_annotations:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Annotations file must be a JSON file"
-        )
-    
-    try:
-        content = await file.read()
-        coco_data = json.loads(content)
-        
-        # 3. Парсинг и проверка соответствия
-        parsed_annotations = parse_coco_for_image(coco_data, image_asset.filename)
-        
-        if not parsed_annotations:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"No annotations found for image '{image_asset.filename}' in the provided file. "
-                       f"Make sure 'file_name' in JSON matches the uploaded image name."
-            )
-            
-        # 4. Обновление в БД
-        image_asset.coco_annotations = parsed_annotations
-        await db.commit()
-        await db.refresh(image_asset)
-        
-        # Генерация presigned URL для ответа
-        presigned_url = storage_service.get_presigned_url(
-            image_asset.storage_path.split("/", 1)[1],
-            expires_seconds=3600
+            detail=f"No annotations found for image '{image_asset.filename}' in the provided file. "
+                   f"Make sure 'file_name' in JSON matches the uploaded image name."
         )
         
-        response = ImageAssetResponse.model_validate(image_asset)
-        response.presigned_url = presigned_url
-        
-        return response
-        
-    except json.JSONDecodeError:
+    # 4. Обновление в БД
+    image_asset.coco_annotations = parsed_annotations
+    await db.commit()
+    await db.refresh(image_asset)
+    
+    # Генерация presigned URL для ответа
+    presigned_url = await async_storage.get_presigned_url(
+        image_asset.storage_path.split("/", 1)[1],
+        expires_seconds=3600
+    )
+    
+    response = ImageAssetResponse.model_validate(image_asset)
+    response.presigned_url = presigned_url
+    
+    return response
+
+
+@router.post("/images/annotations/bulk", response_model=BulkAnnotationsResponse)
+async def upload_annotations_bulk(
+    file: UploadFile = File(...),
+    image_ids: List[UUID] = Form(...),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Загрузка выгрузки датасета COCO для нескольких изображений за один проход:
+    каждому изображению из image_ids сохраняются аннотации его file_name.
+    """
+    if current_user.role not in [Role.TEACHER, Role.ADMIN]:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid JSON in annotations file"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        print(f"Error processing annotations: {traceback.format_exc()}")
+    
+    if len(image_ids) > MAX_BULK_ANNOTATION_IMAGES:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing annotations: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_ANNOTATION_IMAGES} images per request"
         )
+    
+    _check_annotations_file(file)
+    
+    result = await db.execute(select(ImageAsset).where(ImageAsset.id.in_(image_ids)))
+    images = result.scalars().all()
+    found_ids = {image.id for image in images}
+    
+    parsed = await _extract_annotations(file, [image.filename for image in images])
+    
+    updated = []
+    unmatched = []
+    for image in images:
+        annotations = parsed.get(image.filename)
+        if annotations:
+            image.coco_annotations = annotations
+            updated.append(image.id)
+        else:
+            unmatched.append(image.id)
+    
+    if updated:
+        await db.commit()
+    
+    return BulkAnnotationsResponse(
+        updated=updated,
+        unmatched=unmatched,
+        not_found=[image_id for image_id in dict.fromkeys(image_ids) if image_id not in found_ids]
+    )
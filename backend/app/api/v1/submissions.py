@@ -2,21 +2,33 @@
 Submissions endpoints
 """
 
+import uuid
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from sqlalchemy import DateTime, Text, func, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, joinedload
 
+from app.core.admission import ADMISSION_TICKET_HEADER, admission_slot
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User, Role
 from app.models.submission import Submission, SubmissionStatus, Answer, RetakePermission
 from app.models.test import TestVariant, Test
 from app.models.question import Question
+from app.services.event_ingest import get_submission_owner, ingest_events
+from app.services.submission_state import (
+    SubmissionState,
+    cache_submission_state,
+    get_submission_state,
+    invalidate_submission_state,
+    parse_time_limit,
+)
 from app.schemas.submission import (
     SubmissionCreate,
     SubmissionResponse,
@@ -26,6 +38,7 @@ from app.schemas.submission import (
     AnswerResponse,
     BulkDeleteRequest,
     SubmissionEventCreate,
+    SubmissionEventBatch,
     RetakePermissionCreate,
     RetakePermissionResponse,
 )
@@ -144,6 +157,7 @@ async def start_submission(
         .where(Submission.id == submission.id)
     )
     submission = result.scalar_one()
+    await cache_submission_state(submission)
     
     # Добавляем time_limit в объект для схемы
     submission.time_limit = submission.variant.test.settings.get("time_limit")
@@ -209,6 +223,7 @@ async def get_submission(
     if submission.status == SubmissionStatus.IN_PROGRESS and not submission.answers:
         submission.started_at = datetime.utcnow()
         await db.commit()
+        await cache_submission_state(submission)
     
     # Добавляем time_limit в объект для схемы
     submission.time_limit = submission.variant.test.settings.get("time_limit")
@@ -237,109 +252,144 @@ async def create_or_update_answer(
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Создание или обновление ответа на вопрос
+    Создание или обновление ответа на вопрос (автосохранение).
+
+    Владелец, статус и срок сдачи берутся из кэша состояния попытки, ответ
+    сохраняется одним INSERT ... ON CONFLICT (submission_id, question_id) DO UPDATE.
+    INSERT выбирает строку попытки с условием на владельца и статус, поэтому
+    устаревший кэш не позволит изменить ответ отправленного теста.
     """
-    # Проверка submission
-    result = await db.execute(
-        select(Submission)
-        .options(selectinload(Submission.variant).selectinload(TestVariant.test))
-        .where(Submission.id == submission_id)
+    state = await get_submission_state(db, submission_id)
+    _check_answer_state(state, current_user)
+
+    # Проверка времени
+    deadline = state.deadline
+    is_late = deadline is not None and datetime.utcnow() > deadline
+
+    # Сохранение ответа (даже если время вышло, мы фиксируем последнее состояние)
+    now = datetime.utcnow()
+    source = select(
+        literal(uuid.uuid4(), PG_UUID(as_uuid=True)),
+        Submission.id,
+        literal(answer_in.question_id, PG_UUID(as_uuid=True)),
+        literal(answer_in.student_answer, Text()),
+        literal(answer_in.annotation_data, JSONB()),
+        literal(now, DateTime()),
+        literal(now, DateTime()),
+    ).where(
+        Submission.id == submission_id,
+        Submission.student_id == current_user.id,
+        Submission.status == SubmissionStatus.IN_PROGRESS,
     )
-    submission = result.scalar_one_or_none()
-    
-    if not submission:
+    stmt = pg_insert(Answer).from_select(
+        [
+            "id",
+            "submission_id",
+            "question_id",
+            "student_answer",
+            "annotation_data",
+            "created_at",
+            "updated_at",
+        ],
+        source,
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_answers_submission_question",
+        set_={
+            "student_answer": stmt.excluded.student_answer,
+            "annotation_data": stmt.excluded.annotation_data,
+            "updated_at": now,
+        },
+    ).returning(*Answer.__table__.c)
+
+    try:
+        saved_answer = (await db.execute(stmt)).mappings().one_or_none()
+        await db.commit()
+    except IntegrityError:
+        # Вопрос не существует
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Question not found"
+        ) from None
+
+    if saved_answer is None:
+        # Кэш устарел (тест отправлен или удалён): перечитываем состояние из БД
+        await invalidate_submission_state(submission_id)
+        _check_answer_state(await get_submission_state(db, submission_id), current_user)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Submission is not in progress"
+        )
+
+    # Если время вышло, завершаем тест после сохранения последнего ответа
+    if is_late:
+        result = await db.execute(
+            update(Submission)
+            .where(
+                Submission.id == submission_id, Submission.status == SubmissionStatus.IN_PROGRESS
+            )
+            .values(status=SubmissionStatus.EVALUATING, submitted_at=deadline)
+        )
+        await db.commit()
+        await invalidate_submission_state(submission_id)
+
+        # Запуск асинхронной оценки через Celery (один раз, если сохранений было несколько)
+        if result.rowcount:
+            try:
+                from app.tasks.evaluation_tasks import evaluate_submission
+                evaluate_submission.delay(str(submission_id))
+            except Exception as e:
+                logger.error(f"Failed to start evaluation task: {e}")
+        
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Time limit exceeded. Test submitted automatically."
+        )
+
+    return dict(saved_answer)
+
+
+def _check_answer_state(state: Optional[SubmissionState], current_user: User) -> None:
+    """Проверки автосохранения: попытка есть, принадлежит студенту и не отправлена"""
+    if state is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Submission not found"
         )
     
     # Проверка прав доступа
-    if submission.student_id != current_user.id:
+    if state.student_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
     # Проверка статуса
-    if submission.status != SubmissionStatus.IN_PROGRESS:
+    if state.status != SubmissionStatus.IN_PROGRESS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Submission is not in progress"
         )
 
-    # Проверка времени
-    time_limit_raw = submission.variant.test.settings.get("time_limit")
-    try:
-        time_limit = float(time_limit_raw) if time_limit_raw is not None else None
-    except (ValueError, TypeError):
-        time_limit = None
-
-    is_late = False
-    if time_limit is not None:
-        if datetime.utcnow() > submission.started_at + timedelta(minutes=time_limit):
-            is_late = True
-    
-    # Сохранение ответа (даже если время вышло, мы фиксируем последнее состояние)
-    result = await db.execute(
-        select(Answer).where(
-            Answer.submission_id == submission_id,
-            Answer.question_id == answer_in.question_id
-        )
-    )
-    existing_answer = result.scalar_one_or_none()
-    
-    if existing_answer:
-        existing_answer.student_answer = answer_in.student_answer
-        existing_answer.annotation_data = answer_in.annotation_data
-    else:
-        answer = Answer(
-            submission_id=submission_id,
-            question_id=answer_in.question_id,
-            student_answer=answer_in.student_answer,
-            annotation_data=answer_in.annotation_data,
-        )
-        db.add(answer)
-    
-    await db.commit()
-
-    # Если время вышло, завершаем тест после сохранения последнего ответа
-    if is_late:
-        submission.status = SubmissionStatus.EVALUATING
-        submission.submitted_at = submission.started_at + timedelta(minutes=time_limit)
-        await db.commit()
-        
-        # Запуск асинхронной оценки через Celery
-        try:
-            from app.tasks.evaluation_tasks import evaluate_submission
-            evaluate_submission.delay(str(submission.id))
-        except Exception as e:
-            logger.error(f"Failed to start evaluation task: {e}")
-        
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Time limit exceeded. Test submitted automatically."
-        )
 
-    # Рефреш для возврата
-    if existing_answer:
-        await db.refresh(existing_answer)
-        return existing_answer
-    else:
-        # Нам нужно получить созданный объект, если мы его только что добавили
-        result = await db.execute(
-            select(Answer).where(
-                Answer.submission_id == submission_id,
-                Answer.question_id == answer_in.question_id
-            )
-        )
-        new_answer = result.scalar_one()
-        return new_answer
+async def admit_test_submit(
+    submission_id: UUID,
+    ticket: Optional[str] = Header(None, alias=ADMISSION_TICKET_HEADER),
+    db: AsyncSession = Depends(get_db),
+):
+    """Слот очереди допуска на время отправки (бюджет теста берётся из кэша состояния попытки)"""
+    state = await get_submission_state(db, submission_id)
+    scope = f"test:{state.test_id}" if state and state.test_id else "submit"
+    async with admission_slot(scope, ticket):
+        yield
 
 
 @router.post("/{submission_id}/submit", response_model=SubmissionResponse)
 async def submit_test(
     submission_id: UUID,
     current_user: User = Depends(get_current_user),
+    _admission: None = Depends(admit_test_submit),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -384,11 +434,7 @@ async def submit_test(
         submission.submitted_at = datetime.utcnow()
         
         # Дополнительная проверка времени при сабмите
-        time_limit_raw = submission.variant.test.settings.get("time_limit")
-        try:
-            time_limit = float(time_limit_raw) if time_limit_raw is not None else None
-        except (ValueError, TypeError):
-            time_limit = None
+        time_limit = parse_time_limit(submission.variant.test.settings.get("time_limit"))
 
         if time_limit is not None and submission.submitted_at > submission.started_at + timedelta(minutes=time_limit):
             submission.submitted_at = submission.started_at + timedelta(minutes=time_limit)
@@ -396,6 +442,7 @@ async def submit_test(
         submission.status = SubmissionStatus.EVALUATING
         
         await db.commit()
+        await invalidate_submission_state(submission.id)
         
         # Запуск асинхронной оценки через Celery
         try:
@@ -459,18 +506,40 @@ async def log_submission_event(
             detail="Not enough permissions"
         )
     
-    await log_audit_action(
-        db,
-        current_user.id,
-        f"submission.{event_in.event_type}",
-        "submission",
-        resource_id=submission_id,
-        details=event_in.details
-    )
-    await db.commit()
+    # Через общую очередь: событие попадает в сводку поведения по вопросу
+    await ingest_events(db, submission_id, [event_in])
     return None
 
 
+@router.post("/{submission_id}/events/batch", status_code=status.HTTP_202_ACCEPTED)
+async def log_submission_events_batch(
+    submission_id: UUID,
+    batch_in: SubmissionEventBatch,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Пакетное логирование событий прохождения теста.
+    События попадают в Redis stream (submission:events) и переносятся в таблицу
+    submission_events в фоне; без Redis записываются в неё сразу.
+    """
+    student_id = await get_submission_owner(db, submission_id)
+    if student_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Submission not found"
+        )
+
+    if student_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+
+    await ingest_events(db, submission_id, batch_in.events, sent_at=batch_in.sent_at)
+    return {"accepted": len(batch_in.events)}
+
+
 @router.get("", response_model=PaginatedSubmissionsResponse)
 async def list_submissions(
     skip: int = Query(0, ge=0),
@@ -626,6 +695,7 @@ async def hide_submission(
     
     submission.is_hidden = True
     await db.commit()
+    await invalidate_submission_state(submission.id)
     await db.refresh(submission)
     
     # Reload with relations for the response
@@ -730,6 +800,7 @@ async def delete_submission(
     
     await db.delete(submission)
     await db.commit()
+    await invalidate_submission_state(submission_id)
     return None
 
 
@@ -870,6 +941,7 @@ async def bulk_delete_submissions(
     deleted_count = len(submissions)
     
     await db.commit()
+    await invalidate_submission_state(*[sub.id for sub in submissions])
 
     # 3. Аудит лог (аналогично одиночному удалению)
     await log_audit_action(
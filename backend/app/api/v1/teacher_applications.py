@@ -13,7 +13,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_password_hash, get_current_user, require_role
+from app.core.security import get_password_hash_async, get_current_user, require_role
 from app.models.user import User, Role
 from app.models.teacher_application import TeacherApplication, ApplicationStatus
 from app.schemas.teacher_application import (
@@ -184,7 +184,7 @@ async def approve_teacher_application(
     # Создание пользователя-преподавателя
     teacher = User(
         email=application.email,
-        password_hash=get_password_hash(temp_password),
+        password_hash=await get_password_hash_async(temp_password),
         last_name=application.last_name,
         first_name=application.first_name,
         middle_name=application.middle_name,
@@ -2,44 +2,65 @@
 Tests endpoints
 """
 
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 import secrets
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, joinedload
 
+from app.core.admission import ADMISSION_TICKET_HEADER, admission_slot
 from app.core.database import get_db
 from app.core.security import get_current_user
-from app.core.storage import storage_service
+from app.core.storage import async_storage
 from app.models.user import User, Role
 from app.models.test import Test, TestStatus, TestQuestion, TestVariant
 from app.models.question import Question
 from app.models.submission import Submission, SubmissionStatus
 from app.schemas.test import TestCreate, TestUpdate, TestResponse, TestListResponse, TestVariantResponse
 from app.schemas.submission import SubmissionResponse
+from app.services.question_pool import get_question_pool
+from app.services.submission_state import cache_submission_state
+from app.services.variant_pool import (
+    MAX_VARIANT_POOL_SIZE,
+    claim_pooled_variant,
+    request_pool_refill,
+    retire_variant_pool,
+    schedule_variant_pool_fill,
+    variant_pool_reuse,
+    variant_pool_size,
+    variant_question_ids,
+)
 
 router = APIRouter()
 
 
-def populate_test_question_urls(test: Test):
+async def populate_test_question_urls(test: Test):
     """Генерация presigned URLs для всех вопросов в тесте"""
     if not test.test_questions:
         return
-    for tq in test.test_questions:
-        if tq.question and tq.question.image:
-            tq.question.image.presigned_url = storage_service.get_presigned_url(
-                tq.question.image.storage_path.split("/", 1)[1],
-                expires_seconds=3600
-            )
+    await async_storage.attach_presigned_urls(
+        (tq.question.image for tq in test.test_questions if tq.question),
+        expires_seconds=3600
+    )
+
+
+async def admit_test_start(
+    test_id: UUID,
+    ticket: Optional[str] = Header(None, alias=ADMISSION_TICKET_HEADER),
+):
+    """Слот очереди допуска на время начала теста"""
+    async with admission_slot(f"test:{test_id}", ticket):
+        yield
 
 
 @router.post("/{test_id}/start", response_model=SubmissionResponse)
 async def start_test(
     test_id: UUID,
     current_user: User = Depends(get_current_user),
+    _admission: None = Depends(admit_test_start),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -89,6 +110,7 @@ async def start_test(
                 .where(Submission.id == in_progress.id)
             )
             sub = result.unique().scalar_one()
+            await cache_submission_state(sub)
             sub.time_limit = sub.variant.test.settings.get("time_limit")
             return sub
 
@@ -116,43 +138,40 @@ async def start_test(
         # Первая попытка
         attempt_number = 1
 
-    # 3. Получение фиксированных вопросов и генерация варианта
-    result = await db.execute(
-        select(TestQuestion.question_id)
-        .where(TestQuestion.test_id == test_id)
-        .order_by(TestQuestion.order)
-    )
-    fixed_question_ids = [r[0] for r in result.all()]
-    
-    if test.structure:
-        generated_ids = await generate_test_variant_questions(
-            db, test.structure, exclude_ids=fixed_question_ids
-        )
-        question_ids = fixed_question_ids + generated_ids
-    else:
-        question_ids = fixed_question_ids
-    
-    if not question_ids:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No questions available for this test"
+    # 3. Вариант из заранее сгенерированного пула или генерация в запросе
+    variant_id = None
+    if variant_pool_size(test.settings):
+        variant_id = await claim_pooled_variant(
+            db, test.id, reuse=variant_pool_reuse(test.settings)
         )
+        if variant_id is None:
+            await request_pool_refill(test.id)
+
+    if variant_id is None:
+        question_ids = await variant_question_ids(db, test)
         
-    # Convert UUIDs to strings for JSONB serialization
-    question_ids_str = [str(qid) for qid in question_ids]
-    
-    variant = TestVariant(
-        test_id=test.id,
-        variant_code=secrets.token_urlsafe(8),
-        question_order=question_ids_str,
-    )
-    db.add(variant)
-    await db.flush() # Получаем ID варианта
+        if not question_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No questions available for this test"
+            )
+            
+        # Convert UUIDs to strings for JSONB serialization
+        question_ids_str = [str(qid) for qid in question_ids]
+        
+        variant = TestVariant(
+            test_id=test.id,
+            variant_code=secrets.token_urlsafe(8),
+            question_order=question_ids_str,
+        )
+        db.add(variant)
+        await db.flush() # Получаем ID варианта
+        variant_id = variant.id
     
     # 4. Создание submission
     submission = Submission(
         student_id=current_user.id,
-        variant_id=variant.id,
+        variant_id=variant_id,
         status=SubmissionStatus.IN_PROGRESS,
         attempt_number=attempt_number
     )
@@ -188,6 +207,8 @@ async def start_test(
         .where(Submission.id == submission.id)
     )
     submission = result.unique().scalar_one()
+    # Первое автосохранение после начала не идёт в БД за состоянием попытки
+    await cache_submission_state(submission)
     
     # Добавляем time_limit в объект для схемы
     submission.time_limit = submission.variant.test.settings.get("time_limit")
@@ -340,7 +361,7 @@ async def create_test(
         .where(Test.id == test.id)
     )
     test = result.scalar_one()
-    populate_test_question_urls(test)
+    await populate_test_question_urls(test)
     
     return test
 
@@ -391,7 +412,7 @@ async def get_test(
                 detail="Not enough permissions"
             )
     
-    populate_test_question_urls(test)
+    await populate_test_question_urls(test)
     
     return test
 
@@ -445,7 +466,8 @@ async def update_test(
         await check_test_structure_availability(db, update_data["structure"], exclude_ids=fixed_ids)
         
     # Обработка обновления вопросов
-    if "questions" in update_data:
+    questions_changed = "questions" in update_data
+    if questions_changed:
         new_questions_data = update_data.pop("questions")
         
         # Очищаем старые вопросы (cascade="all, delete-orphan" удалит их из базы)
@@ -473,8 +495,20 @@ async def update_test(
     for field, value in update_data.items():
         setattr(test, field, value)
     
+    # Заранее сгенерированные варианты собраны по старым вопросам
+    pool_outdated = questions_changed or "structure" in update_data
+    if pool_outdated:
+        await retire_variant_pool(db, test.id)
+    
     await db.commit()
     
+    if (
+        test.status == TestStatus.PUBLISHED
+        and variant_pool_size(test.settings)
+        and (pool_outdated or "settings" in update_data)
+    ):
+        schedule_variant_pool_fill(test.id)
+    
     # Возвращаем тест со всеми загруженными связями для TestResponse
     result = await db.execute(
         select(Test)
@@ -487,7 +521,7 @@ async def update_test(
         .where(Test.id == test.id)
     )
     test = result.scalar_one()
-    populate_test_question_urls(test)
+    await populate_test_question_urls(test)
     
     return test
 
@@ -569,6 +603,10 @@ async def publish_test(
     db.add(variant)
     await db.commit()
     
+    # Пул вариантов для массового старта генерируется в фоне
+    if variant_pool_size(test.settings):
+        schedule_variant_pool_fill(test.id)
+    
     # Возвращаем тест со всеми загруженными связями для TestResponse
     result = await db.execute(
         select(Test)
@@ -581,7 +619,7 @@ async def publish_test(
         .where(Test.id == test.id)
     )
     test = result.scalar_one()
-    populate_test_question_urls(test)
+    await populate_test_question_urls(test)
     
     return test
 
@@ -628,6 +666,7 @@ async def unpublish_test(
     
     test.status = TestStatus.DRAFT
     test.published_at = None
+    await retire_variant_pool(db, test.id)
     await db.commit()
     
     # Релоад для ответа
@@ -642,11 +681,54 @@ async def unpublish_test(
         .where(Test.id == test.id)
     )
     test = result.scalar_one()
-    populate_test_question_urls(test)
+    await populate_test_question_urls(test)
     
     return test
 
 
+@router.post("/{test_id}/variant-pool", status_code=status.HTTP_202_ACCEPTED)
+async def fill_test_variant_pool(
+    test_id: UUID,
+    size: Optional[int] = Query(None, ge=1, le=MAX_VARIANT_POOL_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Генерация пула вариантов перед экзаменом (в фоне).
+    size — сколько невыданных вариантов должно быть в пуле (по умолчанию settings.variant_pool_size)
+    """
+    if current_user.role not in [Role.TEACHER, Role.ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    result = await db.execute(select(Test).where(Test.id == test_id))
+    test = result.scalar_one_or_none()
+    
+    if not test:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test not found"
+        )
+    
+    if current_user.role == Role.TEACHER and test.author_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    target = size or variant_pool_size(test.settings)
+    if not target:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Variant pool size is not set"
+        )
+    
+    schedule_variant_pool_fill(test.id, target)
+    return {"test_id": str(test.id), "pool_size": target}
+
+
 @router.post("/{test_id}/duplicate", response_model=TestResponse)
 async def duplicate_test(
     test_id: UUID,
@@ -725,7 +807,7 @@ async def duplicate_test(
         .where(Test.id == new_test.id)
     )
     new_test = result.scalar_one()
-    populate_test_question_urls(new_test)
+    await populate_test_question_urls(new_test)
 
     return new_test
 
@@ -738,43 +820,11 @@ async def generate_test_variant_questions(
     """
     Генерация списка ID вопросов на основе структуры теста.
     Используется только точное совпадение по теме и типу.
+    Выборка идёт по индексу банка вопросов (app/services/question_pool.py)
+    без запросов на каждое правило.
     """
-    import random
-    from app.models.question import Question
-    
-    selected_ids = []
-    base_exclude = list(exclude_ids) if exclude_ids else []
-    
-    for rule in structure:
-        topic_id = rule.get("topic_id")
-        q_type = rule.get("question_type")
-        difficulty = rule.get("difficulty", 1)
-        count_needed = rule.get("count", 0)
-        
-        # Только точное совпадение (Тема + Тип + Сложность)
-        # Исключаем уже выбранные в этом проходе и переданные извне (фиксированные)
-        current_exclude = base_exclude + selected_ids
-        
-        query = select(Question.id).where(
-            Question.topic_id == topic_id,
-            Question.type == q_type,
-            Question.difficulty == difficulty
-        )
-        if current_exclude:
-            query = query.where(~Question.id.in_(current_exclude))
-            
-        result = await db.execute(query)
-        available_ids = [r[0] for r in result.all()]
-        
-        if len(available_ids) < count_needed:
-            # Если после валидации при сохранении вопросы были удалены,
-            # берем максимум возможного из того что осталось
-            selected_ids.extend(available_ids)
-        else:
-            picked = random.sample(available_ids, count_needed)  # nosec B311
-            selected_ids.extend(picked)
-                
-    return selected_ids
+    pool = await get_question_pool(db)
+    return pool.sample(structure, exclude_ids)
 
 
 @router.get("/{test_id}/variants", response_model=List[TestVariantResponse])
@@ -12,8 +12,9 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
-from app.core.security import get_current_user, get_password_hash
+from app.core.security import get_current_user, get_password_hash_async
 from app.core.redis import set_json, get_json, delete_key
+from app.core.user_cache import invalidate_user
 from app.models.user import User, Role
 from app.schemas.user import UserCreate, UserResponse, UserUpdate, EmailChangeRequest, EmailChangeConfirm
 from app.services.email import get_email_sender
@@ -44,12 +45,13 @@ async def update_current_user(
     
     # Хеширование пароля если он изменяется
     if "password" in update_data:
-        update_data["password_hash"] = get_password_hash(update_data.pop("password"))
+        update_data["password_hash"] = await get_password_hash_async(update_data.pop("password"))
     
     for field, value in update_data.items():
         setattr(current_user, field, value)
     
     await db.commit()
+    await invalidate_user(current_user.id)
     await db.refresh(current_user)
     
     return current_user
@@ -143,6 +145,7 @@ async def confirm_email_change(
     current_user.email_change_expires = None
     
     await db.commit()
+    await invalidate_user(current_user.id)
     
     # Удаляем данные из Redis
     await delete_key(f"email_change:{current_user.id}")
@@ -221,7 +224,7 @@ async def create_user(
     
     user = User(
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await get_password_hash_async(user_in.password),
         last_name=user_in.last_name,
         first_name=user_in.first_name,
         middle_name=user_in.middle_name,
@@ -290,6 +293,7 @@ async def delete_user(
     
     await db.delete(user)
     await db.commit()
+    await invalidate_user(user_id)
     
     return None
 
@@ -0,0 +1,168 @@
+"""
+Очередь допуска ("зал ожидания") для начала и отправки теста
+
+Одновременный старт экзамена целым потоком исчерпывал пул соединений БД
+(pool_size=10, max_overflow=20), и запросы начинали падать с 500. Перед
+обработкой start/submit запрос получает слот в двух бюджетах одновременно:
+    admission:inflight:{scope}   — запросы одного теста (ADMISSION_TEST_CONCURRENCY);
+    admission:inflight:global    — все тесты (ADMISSION_GLOBAL_CONCURRENCY).
+Слот — аренда на ADMISSION_LEASE_SECONDS (упавший воркер не держит его вечно).
+
+Если свободных слотов нет, запрос встаёт в FIFO-очередь теста под билетом и
+получает 429 с Retry-After, номером в очереди и билетом (X-Admission-Ticket).
+Клиент повторяет тот же запрос с билетом; проверка билета — один вызов Lua
+в Redis без обращения к БД. Билет, не опрашиваемый ADMISSION_TICKET_TTL секунд,
+выбывает из очереди. Без Redis запросы допускаются без очереди.
+"""
+
+import logging
+import math
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_PREFIX = "admission:"
+ADMISSION_TICKET_HEADER = "X-Admission-Ticket"
+GLOBAL_SCOPE = "global"
+# Ключи брошенной очереди удаляются сами
+ADMISSION_KEY_TTL = 3600
+
+_TICKET_RE = re.compile(r"^[A-Za-z0-9-]{8,64}$")
+
+# KEYS: очередь (билет -> номер), время опроса билетов, слоты scope, глобальные слоты,
+#       счётчик номеров
+# ARGV: билет, now, бюджет scope, глобальный бюджет, аренда, TTL билета, TTL ключей
+# Возвращает {1, 0} — допущен, {0, позиция} — в очереди
+_ADMIT_SCRIPT = """
+local now = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', now)
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[6]))
+for _, ticket in ipairs(stale) do
+    redis.call('ZREM', KEYS[1], ticket)
+    redis.call('ZREM', KEYS[2], ticket)
+end
+
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[5]), ARGV[1])
+end
+redis.call('ZADD', KEYS[2], now, ARGV[1])
+
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+local free = math.min(
+    tonumber(ARGV[3]) - redis.call('ZCARD', KEYS[3]),
+    tonumber(ARGV[4]) - redis.call('ZCARD', KEYS[4])
+)
+local key_ttl = tonumber(ARGV[7])
+for i = 1, 5 do
+    redis.call('EXPIRE', KEYS[i], key_ttl)
+end
+
+if rank < free then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    local lease = now + tonumber(ARGV[5])
+    redis.call('ZADD', KEYS[3], lease, ARGV[1])
+    redis.call('ZADD', KEYS[4], lease, ARGV[1])
+    return {1, 0}
+end
+return {0, rank - math.max(free, 0) + 1}
+"""
+
+
+def _keys(scope: str) -> list:
+    return [
+        f"{ADMISSION_PREFIX}queue:{scope}",
+        f"{ADMISSION_PREFIX}seen:{scope}",
+        f"{ADMISSION_PREFIX}inflight:{scope}",
+        f"{ADMISSION_PREFIX}inflight:{GLOBAL_SCOPE}",
+        f"{ADMISSION_PREFIX}seq:{scope}",
+    ]
+
+
+def normalize_ticket(ticket: Optional[str]) -> str:
+    """Билет клиента или новый, если его нет или он некорректен"""
+    if ticket and _TICKET_RE.match(ticket):
+        return ticket
+    return uuid.uuid4().hex
+
+
+def retry_after_seconds(position: int) -> int:
+    """Пауза до следующего опроса: дальше в очереди — реже"""
+    budget = max(1, settings.ADMISSION_TEST_CONCURRENCY)
+    return max(1, min(settings.ADMISSION_MAX_RETRY_AFTER, math.ceil(position / budget)))
+
+
+async def try_admit(scope: str, ticket: str) -> Tuple[bool, int]:
+    """(допущен, позиция в очереди)"""
+    client = await get_redis_client()
+    admitted, position = await client.eval(
+        _ADMIT_SCRIPT,
+        5,
+        *_keys(scope),
+        ticket,
+        time.time(),
+        settings.ADMISSION_TEST_CONCURRENCY,
+        settings.ADMISSION_GLOBAL_CONCURRENCY,
+        settings.ADMISSION_LEASE_SECONDS,
+        settings.ADMISSION_TICKET_TTL,
+        ADMISSION_KEY_TTL,
+    )
+    return bool(int(admitted)), int(position)
+
+
+async def release(scope: str, ticket: str) -> None:
+    try:
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.zrem(f"{ADMISSION_PREFIX}inflight:{scope}", ticket)
+        pipe.zrem(f"{ADMISSION_PREFIX}inflight:{GLOBAL_SCOPE}", ticket)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to release admission slot {scope}/{ticket}: {e}")
+
+
+@asynccontextmanager
+async def admission_slot(scope: str, ticket: Optional[str]) -> AsyncIterator[None]:
+    """
+    Слот на время обработки запроса; если слота нет — HTTPException 429
+    с позицией в очереди (detail.position) и билетом для повторного запроса.
+    """
+    if not settings.ADMISSION_ENABLED:
+        yield
+        return
+
+    ticket = normalize_ticket(ticket)
+    try:
+        admitted, position = await try_admit(scope, ticket)
+    except Exception as e:
+        logger.warning(f"Admission control unavailable, admitting request: {e}")
+        yield
+        return
+
+    if not admitted:
+        retry_after = retry_after_seconds(position)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "queued": True,
+                "ticket": ticket,
+                "position": position,
+                "retry_after": retry_after,
+            },
+            headers={"Retry-After": str(retry_after), ADMISSION_TICKET_HEADER: ticket},
+        )
+
+    try:
+        yield
+    finally:
+        await release(scope, ticket)
@@ -66,6 +66,12 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
     
+    # Кэш снимков пользователей для get_current_user (app/core/user_cache.py)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_LOCAL_TTL: float = 5.0  # Секунд жизни копии в процессе без сообщения об изменении
+    USER_CACHE_REDIS_TTL: int = 60  # Секунд жизни снимка в Redis
+    USER_CACHE_MAX_ENTRIES: int = 10000  # Снимков в LRU процесса
+    
     # Celery
     CELERY_BROKER_URL: str = "redis://redis:6379/1"
     CELERY_RESULT_BACKEND: str = "redis://redis:6379/2"
@@ -79,6 +85,15 @@ class Settings(BaseSettings):
     MINIO_BUCKET: str = "medtest-storage"
     MINIO_SECURE: bool = False
     MINIO_PUBLIC_URL: Optional[str] = "/storage"  # Доступ через прокси Vite
+    # Регион bucket; если не задан, клиент один раз запрашивает его у сервера
+    MINIO_REGION: Optional[str] = None
+    # Пул HTTP-соединений клиента MinIO и таймауты (секунды)
+    STORAGE_HTTP_POOL_SIZE: int = 16
+    STORAGE_CONNECT_TIMEOUT: float = 5.0
+    STORAGE_READ_TIMEOUT: float = 120.0
+    # Кэш presigned URL: выданная ссылка действует ещё не меньше MIN_VALIDITY секунд
+    PRESIGNED_URL_MIN_VALIDITY: int = 1800
+    PRESIGNED_URL_CACHE_SIZE: int = 50000
     
     # LLM Configuration
     YANDEX_API_KEY: Optional[str] = None
@@ -91,6 +106,10 @@ class Settings(BaseSettings):
     # Yandex Search API (for plagiarism check)
     YANDEX_SEARCH_API_KEY: Optional[str] = None
     YANDEX_SEARCH_FOLDER_ID: Optional[str] = None
+    YANDEX_SEARCH_URL: str = "https://searchapi.cloud.yandex.net/v1/search"
+    PLAGIARISM_FRAGMENTS: int = 3  # Фрагментов ответа, проверяемых параллельно
+    PLAGIARISM_SEARCH_CONCURRENCY: int = 4  # Одновременных запросов к Search API на процесс
+    PLAGIARISM_CACHE_TTL: int = 7 * 24 * 3600  # Секунд хранения результата поиска фрагмента
     
     DEEPSEEK_API_KEY: Optional[str] = None
     QWEN_API_KEY: Optional[str] = None
@@ -98,6 +117,13 @@ class Settings(BaseSettings):
     GIGACHAT_CREDENTIALS: Optional[str] = None  # Base64 encoded ClientID:ClientSecret
     GIGACHAT_SCOPE: str = "GIGACHAT_API_PERS"  # GIGACHAT_API_PERS or GIGACHAT_API_CORP
     
+    # Адреса API провайдеров (переопределяются для offline-заглушки tests/load/llm_stub_server.py)
+    YANDEX_LLM_URL: str = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+    DEEPSEEK_BASE_URL: str = "https://api.deepseek.com"
+    QWEN_BASE_URL: str = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
+    GIGACHAT_AUTH_URL: str = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+    GIGACHAT_API_URL: str = "https://gigachat.devices.sberbank.ru/api/v1"
+    
     LOCAL_LLM_ENABLED: bool = True
     LOCAL_LLM_URL: str = "http://localhost:8001/v1"
     LOCAL_LLM_MODEL: str = "mistral-7b-instruct"
@@ -121,6 +147,18 @@ class Settings(BaseSettings):
     # Redis DB for slowapi storage (separate from main cache/broker)
     RATE_LIMIT_STORAGE_URL: Optional[str] = None
 
+    # Очередь допуска к началу и отправке теста (app/core/admission.py)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_GLOBAL_CONCURRENCY: int = 24  # Одновременных start/submit на все API-процессы
+    ADMISSION_TEST_CONCURRENCY: int = 12  # Одновременных start/submit одного теста
+    ADMISSION_LEASE_SECONDS: int = 30  # Слот освобождается сам, если процесс упал
+    ADMISSION_TICKET_TTL: int = 20  # Билет без опроса дольше этого выбывает из очереди
+    ADMISSION_MAX_RETRY_AFTER: int = 5
+
+    # Хеширование паролей (bcrypt) вне event loop: потоков на процесс и очередь сверх них
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Сверх этого запросы отклоняются с 503
+
     # Registration / OTP policy (OWASP ASVS §6.2, NIST SP 800-63B)
     OTP_LENGTH: int = 6
     OTP_TTL_SECONDS: int = 600                    # 10 min
@@ -140,6 +178,22 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 100 * 1024 * 1024  # 100 MB
     ALLOWED_IMAGE_EXTENSIONS: List[str] = [".jpg", ".jpeg", ".png", ".webp"]
     MAX_IMAGE_DIMENSION: int = 8192  # 8K max
+    # Пул потоков для блокирующих вызовов MinIO (одновременные загрузки)
+    STORAGE_IO_WORKERS: int = 8
+    # Отдельный пул для подписи URL, которых нет в кэше: не ждёт загрузок и разбора файлов
+    STORAGE_SIGN_WORKERS: int = 2
+    # Размер части multipart-загрузки: столько байт загрузки держится в памяти
+    STORAGE_UPLOAD_PART_SIZE: int = 16 * 1024 * 1024
+    # Пирамида тайлов для изображений больше TILE_PYRAMID_MIN_DIMENSION px по стороне
+    TILE_PYRAMID_ENABLED: bool = True
+    TILE_PYRAMID_MIN_DIMENSION: int = 2048
+    TILE_SIZE: int = 256
+    TILE_FORMAT: Literal["jpeg", "webp"] = "jpeg"
+    TILE_QUALITY: int = 85
+    # Уменьшенные WebP-копии для списков (по большей стороне, px)
+    IMAGE_THUMB_SIZE: int = 256
+    IMAGE_PREVIEW_SIZE: int = 1024
+    IMAGE_RENDITION_QUALITY: int = 80
     
     # Admin User (для инициализации)
     FIRST_ADMIN_EMAIL: EmailStr = "admin@example.com"
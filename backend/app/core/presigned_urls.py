@@ -0,0 +1,87 @@
+"""
+Кэш presigned URL изображений
+
+Списки вопросов и тестов подписывали URL каждого изображения на каждый запрос
+(HMAC-подпись и замена адреса на MINIO_PUBLIC_URL) — 500 вопросов = 500 подписей.
+
+Время делится на окна шириной expires - PRESIGNED_URL_MIN_VALIDITY. Внутри окна
+URL подписывается с датой начала окна (request_date), поэтому он одинаков для
+всех запросов окна: подпись выполняется один раз, браузер получает стабильный
+URL и может его кэшировать. Выданный URL действует ещё не меньше
+PRESIGNED_URL_MIN_VALIDITY секунд (но не меньше половины expires).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+# sign(object_name, request_date) -> URL
+Signer = Callable[[str, datetime], str]
+
+
+def signing_window(expires_seconds: int, now: Optional[float] = None) -> Tuple[int, datetime]:
+    """(номер окна, дата подписи) для текущего момента"""
+    min_validity = min(settings.PRESIGNED_URL_MIN_VALIDITY, expires_seconds // 2)
+    width = max(1, expires_seconds - min_validity)
+    window = int((time.time() if now is None else now) // width)
+    return window, datetime.fromtimestamp(window * width, tz=timezone.utc)
+
+
+class PresignedUrlCache:
+    """LRU (имя объекта, expires) -> (окно, URL); потокобезопасен"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def peek_many(self, object_names: Iterable[str], expires_seconds: int) -> Dict[str, str]:
+        """URL, уже подписанные в текущем окне; отсутствующие не подписываются"""
+        window, _ = signing_window(expires_seconds)
+        return self._lookup(object_names, expires_seconds, window)
+
+    def get_many(
+        self, object_names: Iterable[str], expires_seconds: int, sign: Signer
+    ) -> Dict[str, str]:
+        """URL для набора объектов: подписываются только отсутствующие в текущем окне"""
+        window, request_date = signing_window(expires_seconds)
+        object_names = list(dict.fromkeys(object_names))
+        urls = self._lookup(object_names, expires_seconds, window)
+        missing = [object_name for object_name in object_names if object_name not in urls]
+
+        # Подпись вне блокировки: другие запросы не ждут чужую пачку
+        signed = {object_name: sign(object_name, request_date) for object_name in missing}
+        urls.update(signed)
+
+        with self._lock:
+            for object_name, url in signed.items():
+                self._entries[(object_name, expires_seconds)] = (window, url)
+                self._entries.move_to_end((object_name, expires_seconds))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return urls
+
+    def _lookup(
+        self, object_names: Iterable[str], expires_seconds: int, window: int
+    ) -> Dict[str, str]:
+        urls: Dict[str, str] = {}
+        with self._lock:
+            for object_name in object_names:
+                entry = self._entries.get((object_name, expires_seconds))
+                if entry is not None and entry[0] == window:
+                    self._entries.move_to_end((object_name, expires_seconds))
+                    urls[object_name] = entry[1]
+        return urls
+
+    def drop(self, object_name: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == object_name]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,4 +1,6 @@
+import asyncio
 import json
+import uuid
 from typing import Any, Optional
 
 import redis.asyncio as redis
@@ -8,6 +10,15 @@ from app.core.config import settings
 # Global redis client
 _redis_client: Optional[redis.Redis] = None
 
+# Снятие блокировки, только если она ещё наша: владелец, работавший дольше TTL,
+# не должен снимать блокировку следующего владельца
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 async def get_redis_client() -> redis.Redis:
     """
@@ -48,3 +59,25 @@ async def delete_key(key: str):
     """
     client = await get_redis_client()
     await client.delete(key)
+
+
+async def acquire_lock(key: str, ttl: int, wait: float = 0.0) -> Optional[str]:
+    """
+    Блокировка SET NX со случайным токеном. Ждёт до wait секунд, если она занята.
+    Возвращает токен для release_lock или None.
+    """
+    client = await get_redis_client()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    token = uuid.uuid4().hex
+    while not await client.set(key, token, nx=True, ex=ttl):
+        if loop.time() >= deadline:
+            return None
+        await asyncio.sleep(0.1)
+    return token
+
+
+async def release_lock(key: str, token: str) -> None:
+    """Снятие блокировки acquire_lock (сравнение токена и удаление атомарно)"""
+    client = await get_redis_client()
+    await client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
@@ -2,13 +2,17 @@
 Security utilities: password hashing, JWT tokens, RBAC
 """
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Callable, Optional, TypeVar, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
@@ -35,6 +39,88 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+T = TypeVar("T")
+
+CRYPTO_QUEUE_DEPTH = Gauge(
+    "crypto_executor_queue_depth", "Операций хеширования паролей, ожидающих свободный поток"
+)
+CRYPTO_IN_FLIGHT = Gauge(
+    "crypto_executor_in_flight", "Операций хеширования паролей в очереди и в работе"
+)
+CRYPTO_WAIT_SECONDS = Histogram(
+    "crypto_executor_wait_seconds", "Ожидание свободного потока хеширования",
+    buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+CRYPTO_REJECTED = Counter(
+    "crypto_executor_rejected_total", "Операций хеширования, отклонённых из-за переполнения очереди"
+)
+
+
+class CryptoExecutor:
+    """
+    Ограниченный пул потоков для bcrypt.
+
+    Проверка пароля занимает 200-300 мс CPU; в обработчике она блокирует event loop,
+    и утренний поток входов останавливает все остальные запросы воркера. Пул
+    ограничен workers потоками и max_queue ожидающими операциями; сверх этого
+    запрос сразу получает 503, а не ждёт секунды в очереди.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crypto")
+        self._in_flight = 0  # меняется только в потоке event loop
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self.workers)
+
+    def _update_gauges(self) -> None:
+        CRYPTO_IN_FLIGHT.set(self._in_flight)
+        CRYPTO_QUEUE_DEPTH.set(self.queue_depth)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._in_flight >= self.workers + self.max_queue:
+            CRYPTO_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку через несколько секунд.",
+                headers={"Retry-After": "2"},
+            )
+
+        submitted = time.perf_counter()
+
+        def _timed() -> T:
+            CRYPTO_WAIT_SECONDS.observe(time.perf_counter() - submitted)
+            return func(*args)
+
+        self._in_flight += 1
+        self._update_gauges()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _timed)
+        finally:
+            self._in_flight -= 1
+            self._update_gauges()
+
+
+crypto_executor = CryptoExecutor(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Проверка пароля в пуле crypto_executor (для async-обработчиков)
+    """
+    return await crypto_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Хеширование пароля в пуле crypto_executor (для async-обработчиков)
+    """
+    return await crypto_executor.run(get_password_hash, password)
+
+
 def create_access_token(
     subject: Union[str, Any],
     expires_delta: Optional[timedelta] = None,
@@ -136,15 +222,19 @@ async def get_current_user(
     user_id: str = Depends(get_current_user_id)
 ):
     """
-    Получение текущего пользователя из БД
+    Получение текущего пользователя
     
-    Будет реализовано после создания User model
+    Снимок пользователя берётся из кэша (app/core/user_cache.py), при промахе — из БД
     """
     from app.models.user import User
     from sqlalchemy import select
     
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    if settings.USER_CACHE_ENABLED:
+        from app.core.user_cache import get_cached_user
+        user = await get_cached_user(db, user_id)
+    else:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
     
     if user is None:
         raise HTTPException(
@@ -1,14 +1,42 @@
 """
 Object Storage (MinIO/S3) utilities
+
+storage_service — синхронный интерфейс (Celery, скрипты), async_storage —
+асинхронный для обработчиков FastAPI (блокирующие вызовы в пуле потоков).
+
+Импорт модуля не обращается к сети: клиент MinIO с пулом HTTP-соединений
+создаётся при первом использовании, проверка/создание bucket выполняется
+один раз перед первой операцией с объектами. Время этой инициализации
+пишется в лог и метрику storage_init_seconds. API прогревает хранилище
+в фоне при старте (async_storage.warmup).
 """
 
+import asyncio
+import functools
 import io
-from typing import BinaryIO, Optional
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
 
+import certifi
+import urllib3
 from minio import Minio
 from minio.error import S3Error
+from prometheus_client import Gauge
 
 from app.core.config import settings
+from app.core.presigned_urls import PresignedUrlCache
+
+logger = logging.getLogger(__name__)
+
+STORAGE_INIT_SECONDS = Gauge(
+    "storage_init_seconds",
+    "Время инициализации хранилища (проверка bucket и политики) в процессе",
+)
 
 
 class StorageService:
@@ -17,14 +45,65 @@ class StorageService:
     """
     
     def __init__(self):
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
-        )
         self.bucket = settings.MINIO_BUCKET
-        self._ensure_bucket()
+        self.url_cache = PresignedUrlCache(settings.PRESIGNED_URL_CACHE_SIZE)
+        self._client: Optional[Minio] = None
+        self._bucket_ready = False
+        self._init_lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_IO_WORKERS,
+            thread_name_prefix="storage"
+        )
+        self._sign_executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_SIGN_WORKERS,
+            thread_name_prefix="storage-sign"
+        )
+
+    @property
+    def client(self) -> Minio:
+        """
+        Клиент MinIO (создаётся при первом обращении, без сетевых вызовов).
+        Соединения переиспользуются из пула на STORAGE_HTTP_POOL_SIZE.
+        """
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    http_client = urllib3.PoolManager(
+                        maxsize=settings.STORAGE_HTTP_POOL_SIZE,
+                        timeout=urllib3.Timeout(
+                            connect=settings.STORAGE_CONNECT_TIMEOUT,
+                            read=settings.STORAGE_READ_TIMEOUT
+                        ),
+                        cert_reqs="CERT_REQUIRED",
+                        ca_certs=certifi.where(),
+                        retries=urllib3.Retry(
+                            total=3,
+                            backoff_factor=0.2,
+                            status_forcelist=[500, 502, 503, 504]
+                        )
+                    )
+                    self._client = Minio(
+                        settings.MINIO_ENDPOINT,
+                        access_key=settings.MINIO_ACCESS_KEY,
+                        secret_key=settings.MINIO_SECRET_KEY,
+                        secure=settings.MINIO_SECURE,
+                        region=settings.MINIO_REGION,
+                        http_client=http_client
+                    )
+        return self._client
+
+    def _ready_client(self) -> Minio:
+        """Клиент для операций с объектами: при первом вызове проверяет bucket"""
+        if not self._bucket_ready:
+            with self._init_lock:
+                if not self._bucket_ready:
+                    started = time.perf_counter()
+                    self._ensure_bucket()
+                    elapsed = time.perf_counter() - started
+                    STORAGE_INIT_SECONDS.set(elapsed)
+                    logger.info(f"Storage initialized in {elapsed:.3f}s (bucket {self.bucket})")
+                    self._bucket_ready = True
+        return self.client
     
     def _ensure_bucket(self):
         """
@@ -88,13 +167,17 @@ class StorageService:
             file_size = file_data.tell()
             file_data.seek(0)
             
-            self.client.put_object(
+            # Большие файлы загружаются multipart последовательно частями по
+            # STORAGE_UPLOAD_PART_SIZE: в памяти одна часть, а не весь файл
+            self._ready_client().put_object(
                 self.bucket,
                 object_name,
                 file_data,
                 file_size,
                 content_type=content_type,
-                metadata=metadata
+                metadata=metadata,
+                part_size=settings.STORAGE_UPLOAD_PART_SIZE,
+                num_parallel_uploads=1
             )
             
             return f"{self.bucket}/{object_name}"
@@ -113,7 +196,7 @@ class StorageService:
             Содержимое файла в bytes
         """
         try:
-            response = self.client.get_object(self.bucket, object_name)
+            response = self._ready_client().get_object(self.bucket, object_name)
             data = response.read()
             response.close()
             response.release_conn()
@@ -133,7 +216,8 @@ class StorageService:
             True если удалено успешно
         """
         try:
-            self.client.remove_object(self.bucket, object_name)
+            self._ready_client().remove_object(self.bucket, object_name)
+            self.url_cache.drop(object_name)
             return True
         except S3Error as e:
             print(f"Error deleting file: {e}")
@@ -148,34 +232,66 @@ class StorageService:
         Получение временной signed URL для доступа к файлу.
         В режиме разработки, если bucket публичный, возвращает прямую ссылку.
         """
-        try:
-            # В разработке используем прямые ссылки без подписи, 
-            # так как мы сделали bucket публичным. Это надежнее через прокси.
-            if settings.ENVIRONMENT == "development":
-                base = settings.MINIO_PUBLIC_URL or f"http://{settings.MINIO_ENDPOINT}"
-                base = base.rstrip('/')
-                # Если мы используем прокси /storage, то bucket уже не нужен в пути 
-                # (зависит от настроек прокси, но обычно MinIO хочет bucket в пути)
-                return f"{base}/{self.bucket}/{object_name}"
-
-            from datetime import timedelta
-            url = self.client.presigned_get_object(
-                self.bucket,
-                object_name,
-                expires=timedelta(seconds=expires_seconds)
-            )
-            
+        return self.get_presigned_urls([object_name], expires_seconds)[object_name]
+
+    def get_presigned_urls(
+        self,
+        object_names: Iterable[str],
+        expires_seconds: int = 3600
+    ) -> Dict[str, str]:
+        """
+        Signed URL для набора файлов: {имя объекта: URL}.
+        URL кэшируются (см. app.core.presigned_urls) и действуют ещё не меньше
+        PRESIGNED_URL_MIN_VALIDITY секунд.
+        """
+        # В разработке используем прямые ссылки без подписи,
+        # так как мы сделали bucket публичным. Это надежнее через прокси.
+        if settings.ENVIRONMENT == "development":
+            return {name: self.public_url(name) for name in object_names}
+
+        def sign(object_name: str, request_date: datetime) -> str:
+            try:
+                url = self.client.presigned_get_object(
+                    self.bucket,
+                    object_name,
+                    expires=timedelta(seconds=expires_seconds),
+                    request_date=request_date
+                )
+            except S3Error as e:
+                raise Exception(f"Failed to generate URL: {e}")
+
             # Если задан публичный URL, заменяем внутренний адрес на публичный
             if settings.MINIO_PUBLIC_URL:
-                from urllib.parse import urlparse
                 parsed_url = urlparse(url)
                 internal_base = f"{parsed_url.scheme}://{parsed_url.netloc}"
                 public_base = settings.MINIO_PUBLIC_URL.rstrip('/')
                 url = url.replace(internal_base, public_base)
-                
             return url
-        except S3Error as e:
-            raise Exception(f"Failed to generate URL: {e}")
+
+        return self.url_cache.get_many(object_names, expires_seconds, sign)
+
+    def public_url(self, object_name: str) -> str:
+        """
+        Прямая ссылка без подписи (bucket публичный на чтение). Для неизменяемых
+        объектов, на которые ссылаются шаблоном URL (тайлы).
+        """
+        base = settings.MINIO_PUBLIC_URL or f"http://{settings.MINIO_ENDPOINT}"
+        base = base.rstrip('/')
+        # Если мы используем прокси /storage, то bucket уже не нужен в пути
+        # (зависит от настроек прокси, но обычно MinIO хочет bucket в пути)
+        return f"{base}/{self.bucket}/{object_name}"
+
+    def attach_presigned_urls(self, images: Iterable, expires_seconds: int = 3600) -> None:
+        """Заполнение presigned_url у набора ImageAsset одной пачкой"""
+        images = [image for image in images if image is not None and image.storage_path]
+        if not images:
+            return
+        urls = self.get_presigned_urls(
+            [object_name_from_path(image.storage_path) for image in images],
+            expires_seconds
+        )
+        for image in images:
+            image.presigned_url = urls[object_name_from_path(image.storage_path)]
     
     def file_exists(self, object_name: str) -> bool:
         """
@@ -188,12 +304,102 @@ class StorageService:
             True если файл существует
         """
         try:
-            self.client.stat_object(self.bucket, object_name)
+            self._ready_client().stat_object(self.bucket, object_name)
             return True
         except S3Error:
             return False
 
 
-# Singleton instance
+def object_name_from_path(storage_path: str) -> str:
+    """storage_path ImageAsset ("bucket/object") -> имя объекта"""
+    return storage_path.split("/", 1)[1]
+
+
+class AsyncStorageService:
+    """
+    Асинхронный интерфейс хранилища для обработчиков FastAPI. Блокирующие
+    вызовы выполняются в пуле потоков хранилища: event loop не ждёт,
+    одновременно выполняется не больше STORAGE_IO_WORKERS вызовов. Подпись URL
+    в этот пул не попадает (см. get_presigned_urls).
+    """
+
+    def __init__(self, sync: StorageService):
+        self.sync = sync
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Произвольный блокирующий вызов (MinIO, чтение загруженного файла) в пуле хранилища"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.sync._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def warmup(self) -> None:
+        """Инициализация в фоне при старте API; ошибка не мешает запуску"""
+        try:
+            await self.run(self.sync._ready_client)
+        except Exception as e:
+            logger.warning(f"Storage warmup failed, will retry on first use: {e}")
+
+    async def upload_file(
+        self,
+        file_data: BinaryIO,
+        object_name: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None
+    ) -> str:
+        return await self.run(self.sync.upload_file, file_data, object_name, content_type, metadata)
+
+    async def download_file(self, object_name: str) -> bytes:
+        return await self.run(self.sync.download_file, object_name)
+
+    async def delete_file(self, object_name: str) -> bool:
+        return await self.run(self.sync.delete_file, object_name)
+
+    async def file_exists(self, object_name: str) -> bool:
+        return await self.run(self.sync.file_exists, object_name)
+
+    async def get_presigned_urls(
+        self, object_names: Iterable[str], expires_seconds: int = 3600
+    ) -> Dict[str, str]:
+        """
+        URL из кэша отдаются сразу, без пула. Остальные подписываются в отдельном
+        небольшом пуле (STORAGE_SIGN_WORKERS): подпись — локальный HMAC (и определение
+        региона при первом вызове, если MINIO_REGION не задан), она не должна стоять
+        в очереди за загрузками и разбором файлов.
+        """
+        object_names = list(object_names)
+        if settings.ENVIRONMENT == "development":
+            # Прямые ссылки без подписи и сети
+            return self.sync.get_presigned_urls(object_names, expires_seconds)
+
+        urls = self.sync.url_cache.peek_many(object_names, expires_seconds)
+        missing = [object_name for object_name in object_names if object_name not in urls]
+        if missing:
+            loop = asyncio.get_running_loop()
+            urls.update(await loop.run_in_executor(
+                self.sync._sign_executor,
+                functools.partial(self.sync.get_presigned_urls, missing, expires_seconds)
+            ))
+        return urls
+
+    async def get_presigned_url(self, object_name: str, expires_seconds: int = 3600) -> str:
+        urls = await self.get_presigned_urls([object_name], expires_seconds)
+        return urls[object_name]
+
+    async def attach_presigned_urls(self, images: Iterable, expires_seconds: int = 3600) -> None:
+        """Заполнение presigned_url у набора ImageAsset одной пачкой"""
+        images = [image for image in images if image is not None and image.storage_path]
+        if not images:
+            return
+        urls = await self.get_presigned_urls(
+            [object_name_from_path(image.storage_path) for image in images],
+            expires_seconds
+        )
+        for image in images:
+            image.presigned_url = urls[object_name_from_path(image.storage_path)]
+
+
+# Singleton instances
 storage_service = StorageService()
+async_storage = AsyncStorageService(storage_service)
 
@@ -0,0 +1,196 @@
+"""
+Кэш снимков пользователей для get_current_user
+
+Каждый авторизованный запрос (в том числе автосохранение и события теста)
+выполнял SELECT users. Снимок пользователя — id, email, ФИО, роль и флаги —
+хранится в двух уровнях:
+    - в процессе: LRU на USER_CACHE_MAX_ENTRIES записей с TTL USER_CACHE_LOCAL_TTL;
+    - в Redis:    user:snapshot:{id} с TTL USER_CACHE_REDIS_TTL.
+
+Изменение пользователя (профиль, админка, удаление) вызывает invalidate_user:
+ключ в Redis удаляется, id публикуется в канал user:invalidate, и остальные
+процессы сбрасывают локальную копию (run_invalidation_listener). Без
+сообщения локальная копия устаревает не дольше USER_CACHE_LOCAL_TTL, копия в
+Redis (если удалить ключ не удалось) — не дольше USER_CACHE_REDIS_TTL.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import settings
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+USER_SNAPSHOT_PREFIX = "user:snapshot:"
+USER_INVALIDATE_CHANNEL = "user:invalidate"
+# Сообщение канала: сбросить все локальные копии
+INVALIDATE_ALL = "*"
+LISTENER_RETRY_SECONDS = 5.0
+
+# Поля снимка; password_hash и служебные поля не кэшируются
+SNAPSHOT_FIELDS = ("email", "last_name", "first_name", "middle_name", "is_active", "is_verified")
+
+_local: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def user_snapshot(user) -> Dict[str, Any]:
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    snapshot["id"] = str(user.id)
+    snapshot["role"] = user.role.value if hasattr(user.role, "value") else user.role
+    snapshot["created_at"] = user.created_at.isoformat() if user.created_at else None
+    snapshot["last_login"] = user.last_login.isoformat() if user.last_login else None
+    return snapshot
+
+
+def user_from_snapshot(snapshot: Dict[str, Any]):
+    """
+    User из снимка в состоянии detached: незакэшированные поля (password_hash)
+    помечены как невыгруженные, изменения после merge сохраняются обычным UPDATE.
+    """
+    from app.models.user import Role, User
+
+    user = User(
+        id=UUID(snapshot["id"]),
+        role=Role(snapshot["role"]),
+        created_at=(
+            datetime.fromisoformat(snapshot["created_at"]) if snapshot.get("created_at") else None
+        ),
+        last_login=(
+            datetime.fromisoformat(snapshot["last_login"]) if snapshot.get("last_login") else None
+        ),
+        **{field: snapshot.get(field) for field in SNAPSHOT_FIELDS},
+    )
+    make_transient_to_detached(user)
+    return user
+
+
+def _local_get(user_id: str) -> Optional[Dict[str, Any]]:
+    entry = _local.get(user_id)
+    if entry is None:
+        return None
+    expires_at, snapshot = entry
+    if expires_at < time.monotonic():
+        _local.pop(user_id, None)
+        return None
+    _local.move_to_end(user_id)
+    return snapshot
+
+
+def _local_put(user_id: str, snapshot: Dict[str, Any]) -> None:
+    _local[user_id] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL, snapshot)
+    _local.move_to_end(user_id)
+    while len(_local) > settings.USER_CACHE_MAX_ENTRIES:
+        _local.popitem(last=False)
+
+
+def drop_local(user_id: str) -> None:
+    if user_id == INVALIDATE_ALL:
+        _local.clear()
+    else:
+        _local.pop(user_id, None)
+
+
+async def _load_snapshot(db: AsyncSession, user_id: str):
+    """(снимок, загруженный User или None) — из Redis, при промахе из БД"""
+    from app.models.user import User
+
+    key = f"{USER_SNAPSHOT_PREFIX}{user_id}"
+    client = None
+    try:
+        client = await get_redis_client()
+        cached = await client.get(key)
+        if cached:
+            return json.loads(cached), None
+    except Exception as e:
+        logger.warning(f"User snapshot cache unavailable: {e}")
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
+    if user is None:
+        return None, None
+
+    snapshot = user_snapshot(user)
+    if client is not None:
+        try:
+            await client.set(key, json.dumps(snapshot), ex=settings.USER_CACHE_REDIS_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to cache user {user_id}: {e}")
+    return snapshot, user
+
+
+async def get_cached_user(db: AsyncSession, user_id: str):
+    """
+    Пользователь по id: локальный LRU -> Redis -> БД. None — пользователь не найден.
+
+    Снимок из кэша присоединяется к сессии без запроса (merge load=False),
+    поэтому эндпоинты могут менять и сохранять current_user как раньше.
+    """
+    user_id = str(user_id)
+    snapshot = _local_get(user_id)
+    if snapshot is None:
+        snapshot, user = await _load_snapshot(db, user_id)
+        if snapshot is None:
+            return None
+        _local_put(user_id, snapshot)
+        if user is not None:
+            return user
+    return await db.merge(user_from_snapshot(snapshot), load=False)
+
+
+async def invalidate_user(*user_ids: Any) -> None:
+    """Сброс снимков после изменения или удаления пользователей (после commit)"""
+    if not user_ids:
+        return
+    ids = [str(user_id) for user_id in user_ids]
+    for user_id in ids:
+        drop_local(user_id)
+    try:
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(*[f"{USER_SNAPSHOT_PREFIX}{user_id}" for user_id in ids])
+        for user_id in ids:
+            pipe.publish(USER_INVALIDATE_CHANNEL, user_id)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to invalidate user snapshots {ids}: {e}")
+
+
+async def run_invalidation_listener() -> None:
+    """
+    Фоновая задача процесса API: сброс локальных копий по сообщениям
+    user:invalidate. После (пере)подключения локальный кэш очищается —
+    сообщения за время разрыва могли быть пропущены.
+    """
+    while True:
+        pubsub = None
+        try:
+            client = await get_redis_client()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(USER_INVALIDATE_CHANNEL)
+            _local.clear()
+            async for message in pubsub.listen():
+                if message and message.get("type") == "message":
+                    drop_local(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"User invalidation listener disconnected: {e}")
+            _local.clear()
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
@@ -2,6 +2,7 @@
 FastAPI Application Entry Point
 """
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -16,6 +17,8 @@ from app.api.v1 import router as api_v1_router
 from app.core.config import settings
 from app.core.database import engine
 from app.core.rate_limit import limiter, rate_limit_exceeded_handler
+from app.core.storage import async_storage
+from app.core.user_cache import run_invalidation_listener
 from app.models import Base
 
 # Конфигурация логгера приложения: по умолчанию uvicorn настраивает только
@@ -47,6 +50,12 @@ async def lifespan(app: FastAPI):
     # Startup
     print(f"[*] Starting {settings.PROJECT_NAME}...")
     
+    # Сброс локального кэша пользователей по сообщениям из Redis
+    invalidation_listener = asyncio.create_task(run_invalidation_listener())
+    
+    # Проверка bucket в фоне: старт не ждёт MinIO, первая загрузка — тоже
+    storage_warmup = asyncio.create_task(async_storage.warmup())
+    
     # Создание таблиц (в production использовать Alembic)
     # async with engine.begin() as conn:
     #     await conn.run_sync(Base.metadata.create_all)
@@ -57,6 +66,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("[*] Shutting down...")
+    invalidation_listener.cancel()
+    storage_warmup.cancel()
     await engine.dispose()
     print("[+] Shutdown complete")
 
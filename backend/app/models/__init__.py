@@ -8,8 +8,10 @@ from app.models.topic import Topic
 from app.models.question import Question, QuestionType, ImageAsset
 from app.models.test import Test, TestStatus, TestQuestion, TestVariant
 from app.models.submission import Submission, SubmissionStatus, Answer
+from app.models.submission_event import SubmissionEvent
 from app.models.audit import AuditLog
 from app.models.system_config import SystemConfig
+from app.models.llm_call import LLMCall
 from app.models.teacher_application import TeacherApplication, ApplicationStatus
 
 __all__ = [
@@ -27,8 +29,10 @@ __all__ = [
     "Submission",
     "SubmissionStatus",
     "Answer",
+    "SubmissionEvent",
     "AuditLog",
     "SystemConfig",
+    "LLMCall",
     "TeacherApplication",
     "ApplicationStatus",
 ]
@@ -0,0 +1,45 @@
+"""
+Учёт вызовов LLM-провайдеров
+"""
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Index, Integer, SmallInteger, String
+
+from app.core.database import Base
+
+
+class LLMCall(Base):
+    """
+    Один запрос к LLM-провайдеру: токены, задержка, статус.
+    Записи накапливаются в Redis stream и переносятся сюда пачками (maintenance.flush_llm_calls).
+    """
+    __tablename__ = "llm_calls"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # id записи Redis stream: повторный перенос пачки не создаёт дублей
+    stream_id = Column(String(32), nullable=True, unique=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    provider = Column(String(32), nullable=False)  # yandex, deepseek, qwen, gigachat, local
+    model = Column(String(100), nullable=True)
+    operation = Column(String(32), nullable=False)  # evaluate, evaluate_batch, generate
+
+    success = Column(Boolean, nullable=False)
+    http_status = Column(SmallInteger, nullable=True)  # None — ответа не было (таймаут, сеть)
+    latency_ms = Column(Integer, nullable=False)
+
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+
+    # Предыдущих попыток для того же ответа
+    retries = Column(SmallInteger, nullable=False, default=0)
+    fallback = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_llm_calls_provider_created_at", "provider", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<LLMCall {self.provider}/{self.model} {self.latency_ms}ms>"
@@ -77,6 +77,7 @@ class ImageAsset(Base):
     
     filename = Column(String(255), nullable=False)
     storage_path = Column(String(500), nullable=False)  # Путь в MinIO/S3
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 содержимого
     
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
@@ -85,6 +86,11 @@ class ImageAsset(Base):
     # COCO аннотации (эталонные)
     coco_annotations = Column(JSONB, nullable=True)
     
+    # Манифест пирамиды тайлов (app.services.tile_pyramid); None — не построена
+    tile_pyramid = Column(JSONB, nullable=True)
+    # Уменьшенные копии {"thumb": storage_path, "preview": storage_path} (app.services.renditions)
+    renditions = Column(JSONB, nullable=True)
+    
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
@@ -6,7 +6,17 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, Enum, Float, ForeignKey, Text, Integer
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Text,
+    Integer,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
@@ -56,6 +66,10 @@ class Submission(Base):
     # - percentage: float
     # - grade: str (например, "5", "4", "3", etc.)
     # - feedback: str (опциональная общая обратная связь от LLM)
+
+    # Сводка поведения по вопросам (focus_timeline), сохраняется при отправке:
+    # {question_id | "-": {away_seconds, away_count, paste_count, first_ts, last_ts, log}}
+    focus_summary = Column(JSONB, nullable=True)
     
     # Relationships
     student = relationship("User", back_populates="submissions")
@@ -118,6 +132,11 @@ class Answer(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Один ответ на вопрос в попытке: автосохранение — INSERT ... ON CONFLICT
+    __table_args__ = (
+        UniqueConstraint("submission_id", "question_id", name="uq_answers_submission_question"),
+    )
     
     # Relationships
     submission = relationship("Submission", back_populates="answers")
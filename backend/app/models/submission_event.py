@@ -0,0 +1,55 @@
+"""
+События прохождения теста (смена вкладки, потеря фокуса, вставка)
+"""
+
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DDL, Column, DateTime, ForeignKey, Index, String, event
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+from app.core.database import Base
+
+
+class SubmissionEvent(Base):
+    """
+    Событие попытки для анти-чит анализа.
+
+    Таблица секционирована по месяцам (RANGE по ts), секции создаёт миграция
+    и задача maintenance.manage_submission_event_partitions; она же удаляет
+    секции старше AUDIT_LOG_RETENTION_DAYS. Первичный ключ включает ts —
+    требование PostgreSQL для секционированных таблиц.
+    """
+    __tablename__ = "submission_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+    submission_id = Column(
+        UUID(as_uuid=True), ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False
+    )
+    question_id = Column(UUID(as_uuid=True), nullable=True)  # None — событие не привязано к вопросу
+    # tab_hidden, tab_visible, window_blur, window_focus, paste_attempted
+    event_type = Column(String(50), nullable=False)
+
+    details = Column(JSONB, nullable=True)
+
+    __table_args__ = (
+        Index("ix_submission_events_submission_question_ts", "submission_id", "question_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    def __repr__(self):
+        return f"<SubmissionEvent {self.event_type} submission={self.submission_id}>"
+
+
+# create_all (тесты, init_db) создаёт таблицу без месячных секций —
+# строки попадают в секцию по умолчанию
+event.listen(
+    SubmissionEvent.__table__,
+    "after_create",
+    DDL(
+        "CREATE TABLE IF NOT EXISTS submission_events_default "
+        "PARTITION OF submission_events DEFAULT"
+    ),
+)
@@ -6,7 +6,18 @@ import enum
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
@@ -108,7 +119,19 @@ class TestVariant(Base):
     # Порядок вопросов для этого варианта
     question_order = Column(JSONB, nullable=False)  # List[UUID] - порядок question_id
     
+    # Пул заранее сгенерированных вариантов (app/services/variant_pool.py)
+    pooled = Column(Boolean, default=False, server_default="false", nullable=False)
+    claimed_at = Column(DateTime, nullable=True)  # Когда вариант последний раз выдан из пула
+    
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ix_test_variants_pool",
+            "test_id", "claimed_at",
+            postgresql_where=text("pooled"),
+        ),
+    )
     
     # Relationships
     test = relationship("Test", back_populates="variants")
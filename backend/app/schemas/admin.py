@@ -3,7 +3,7 @@ Admin Pydantic схемы
 """
 
 import enum
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, Dict, Generic, List, Optional, TypeVar
 from uuid import UUID
 
@@ -341,7 +341,59 @@ class AdminLLMConfig(BaseModel):
     strategy: str = Field("yandex", description="Стратегия: yandex, local, hybrid, deepseek, qwen, gigachat")
     hybrid_cloud_provider: str = Field("deepseek", description="Основной облачный провайдер для гибридной стратегии")
     evaluation_prompt: Optional[str] = Field(None, description="Кастомный промпт для оценки")
+    stream_enabled: bool = Field(
+        False,
+        description="Потоковый режим с остановкой после получения JSON (YandexGPT, DeepSeek, Qwen)",
+    )
+    batch_size: int = Field(
+        8,
+        ge=1,
+        le=20,
+        description=(
+            "Ответов на один вопрос в одном запросе пакетной оценки (YandexGPT, DeepSeek, Qwen)"
+        ),
+    )
+    prefix_cache_providers: List[str] = Field(
+        default_factory=list,
+        description=(
+            "Провайдеры с раскладкой промпта под префиксный кэш: рубрика в системном сообщении, "
+            "данные ответа в конце (yandex, deepseek, qwen, local)"
+        ),
+    )
+    token_prices: Dict[str, Dict[str, float]] = Field(
+        default_factory=dict,
+        description=(
+            "Цены за 1M токенов по моделям для отчёта о расходах: "
+            "{модель: {input, cached_input, output}}"
+        ),
+    )
     
+    # Предварительная оценка правилами (без вызова LLM), см. app/services/pregrader.py
+    pregrade_enabled: bool = Field(
+        True, description="Оценивать пустые ответы, отказы и копии вопроса/эталона без LLM"
+    )
+    pregrade_min_chars: int = Field(
+        1, ge=0, description="Минимум букв и цифр в ответе, иначе 0 баллов"
+    )
+    pregrade_refusal_phrases: Optional[List[str]] = Field(
+        None, description="Фразы-отказы («не знаю»); пусто — список по умолчанию"
+    )
+    pregrade_question_similarity: float = Field(
+        0.9,
+        ge=0.0,
+        le=1.0,
+        description="Сходство с текстом вопроса (Жаккар), от которого — 0 баллов; 0 — выключено",
+    )
+    pregrade_reference_similarity: float = Field(
+        0.95,
+        ge=0.0,
+        le=1.0,
+        description=(
+            "Сходство последовательности слов с эталоном, от которого — полный балл "
+            "(без добавленных отрицаний); 0 — выключено"
+        ),
+    )
+
     # Поля для анти-чита
     yandex_search_api_key: Optional[str] = Field(None, description="API ключ Yandex Search")
     yandex_search_folder_id: Optional[str] = Field(None, description="Folder ID для Yandex Search")
@@ -352,6 +404,9 @@ class AdminLLMConfig(BaseModel):
     ai_threshold_warning: float = Field(0.5, description="Порог предупреждения ИИ")
     ai_threshold_error: float = Field(0.8, description="Порог ошибки ИИ")
     plagiarism_threshold: float = Field(0.5, description="Порог плагиата")
+    peer_similarity_threshold: float = Field(
+        0.8, ge=0.0, le=1.0, description="Порог сходства с ответом другого студента (MinHash)"
+    )
 
     @field_validator("yandex_api_key")
     @classmethod
@@ -371,3 +426,33 @@ class AdminLLMTestResponse(BaseModel):
     provider: Optional[str] = None
     result: Optional[Dict[str, Any]] = None
     search_result: Optional[Dict[str, Any]] = None
+
+
+class AdminLLMUsageGroup(BaseModel):
+    """Агрегат вызовов LLM по провайдеру / модели / дню"""
+    provider: str
+    model: Optional[str] = None
+    day: Optional[date] = None
+    calls: int
+    errors: int
+    fallbacks: int
+    retries: int
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    cost: Optional[float] = Field(
+        None, description="Оценка стоимости по token_prices (если цены модели заданы)"
+    )
+
+
+class AdminLLMUsageResponse(BaseModel):
+    """Отчёт о расходе токенов и задержках LLM"""
+    since: datetime
+    pending_calls: int = Field(
+        0, description="Записей в Redis stream, ещё не перенесённых в llm_calls"
+    )
+    by_provider: List[AdminLLMUsageGroup]
+    by_model: List[AdminLLMUsageGroup]
+    by_day: List[AdminLLMUsageGroup]
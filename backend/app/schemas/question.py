@@ -30,6 +30,42 @@ class ImageAssetResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class TileLevel(BaseModel):
+    """
+    Уровень пирамиды тайлов
+    """
+    level: int
+    width: int
+    height: int
+    columns: int
+    rows: int
+
+
+class TilePyramidResponse(BaseModel):
+    """
+    Манифест пирамиды тайлов изображения
+    """
+    image_id: UUID
+    width: int
+    height: int
+    tile_size: int
+    overlap: int
+    format: str
+    max_level: int
+    levels: List[TileLevel]
+    url_template: str  # {level}, {col}, {row}
+    manifest_url: str
+
+
+class BulkAnnotationsResponse(BaseModel):
+    """
+    Результат массового импорта аннотаций COCO
+    """
+    updated: List[UUID]  # аннотации сохранены
+    unmatched: List[UUID]  # file_name изображения нет в датасете
+    not_found: List[UUID]  # изображения с таким id нет
+
+
 class QuestionBase(BaseModel):
     """
     Базовая схема вопроса
@@ -6,7 +6,7 @@ from datetime import datetime
 from typing import Any, Dict, List, Optional
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.models.submission import SubmissionStatus
 from app.schemas.user import UserResponse
@@ -60,6 +60,17 @@ class SubmissionEventCreate(BaseModel):
     """
     event_type: str
     details: Optional[Dict[str, Any]] = None
+    # Время события по часам клиента (для пакетной отправки)
+    occurred_at: Optional[datetime] = None
+
+
+class SubmissionEventBatch(BaseModel):
+    """
+    Пачка событий прохождения теста
+    """
+    events: List[SubmissionEventCreate] = Field(..., min_length=1, max_length=200)
+    # Время отправки по часам клиента: поправка occurred_at на расхождение часов
+    sent_at: Optional[datetime] = None
 
 
 class SubmissionCreate(BaseModel):
@@ -0,0 +1,84 @@
+"""
+Потоковый импорт аннотаций COCO
+
+Преподаватели загружают выгрузку датасета целиком (100+ МБ), чтобы взять
+аннотации одного изображения. Файл не загружается в память: ijson читает его
+потоком по временному файлу загрузки, отдельным проходом на каждый массив:
+    1. images — запоминаются только изображения, подходящие к искомым
+       именам файлов (точное file_name или имя без пути);
+    2. categories — все категории (массив небольшой);
+    3. annotations — остаются только аннотации найденных изображений.
+Порядок ключей в файле произвольный (annotations могут идти раньше images).
+Каждый проход — ijson.items на C-бэкенде: это быстрее, чем один проход
+с разбором событий в Python.
+
+Результат для каждого файла — COCO из одного изображения:
+{"images": [...], "annotations": [...], "categories": [...все категории...]}.
+"""
+
+import os
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import ijson
+
+# Ошибки разбора JSON (некорректный или обрезанный файл)
+CocoParseError = ijson.JSONError
+
+
+def _items(stream: BinaryIO, prefix: str) -> Iterator[Any]:
+    """Элементы массива prefix — отдельный проход с начала файла"""
+    stream.seek(0)
+    return ijson.items(stream, prefix, use_float=True)
+
+
+class CocoImageIndex:
+    """Изображения COCO, подходящие к искомым именам файлов"""
+
+    def __init__(self, filenames: Iterable[str]):
+        self.filenames = set(filenames)
+        self.basenames = {os.path.basename(name) for name in self.filenames}
+        self.by_name: Dict[str, dict] = {}
+        self.by_basename: Dict[str, dict] = {}
+
+    def add(self, image: dict) -> None:
+        file_name = image.get("file_name") or ""
+        if file_name in self.filenames:
+            self.by_name.setdefault(file_name, image)
+        basename = os.path.basename(file_name)
+        if basename in self.basenames:
+            self.by_basename.setdefault(basename, image)
+
+    def match(self, filename: str) -> Optional[dict]:
+        """Сначала точное совпадение file_name, затем по имени файла без пути"""
+        return self.by_name.get(filename) or self.by_basename.get(os.path.basename(filename))
+
+
+def extract_coco_annotations(stream: BinaryIO, filenames: Iterable[str]) -> Dict[str, dict]:
+    """
+    {имя файла: COCO этого изображения} для найденных в датасете файлов.
+    Блокирующая (читает файл): вызывается через async_storage.run.
+    """
+    index = CocoImageIndex(filenames)
+    for image in _items(stream, "images.item"):
+        index.add(image)
+
+    matched = {filename: index.match(filename) for filename in index.filenames}
+    matched = {filename: image for filename, image in matched.items() if image is not None}
+    if not matched:
+        return {}
+
+    categories = list(_items(stream, "categories.item"))
+    annotations: Dict[Any, List[dict]] = {image.get("id"): [] for image in matched.values()}
+    for item in _items(stream, "annotations.item"):
+        image_annotations = annotations.get(item.get("image_id"))
+        if image_annotations is not None:
+            image_annotations.append(item)
+
+    return {
+        filename: {
+            "images": [image],
+            "annotations": annotations[image.get("id")],
+            "categories": categories,
+        }
+        for filename, image in matched.items()
+    }
@@ -0,0 +1,289 @@
+"""
+Пакетный приём событий прохождения теста (смена вкладки, потеря фокуса, вставка)
+
+Эндпоинт не обращается к БД на каждое событие: владелец попытки берётся из кэша
+в Redis, события дописываются в Redis stream. Задача maintenance.flush_submission_events
+(и оценка перед чтением сводок) переносит их в submission_events многострочными INSERT
+и обновляет сводки по вопросам (focus_timeline).
+
+Время события — время получения сервером. Если клиент передал occurred_at и sent_at,
+время события сдвигается на разницу часов клиента и сервера и ограничивается
+окном [получение - MAX_EVENT_AGE, получение].
+
+Ключи Redis:
+    submission:events              stream событий
+    submission:owner:{id}          student_id попытки
+"""
+
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import acquire_lock, get_redis_client, release_lock
+from app.models.submission import Submission
+from app.models.submission_event import SubmissionEvent
+from app.services.focus_timeline import mark_summaries_incomplete, update_summaries
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_EVENTS_STREAM = "submission:events"
+SUBMISSION_EVENTS_STREAM_MAXLEN = 1_000_000
+SUBMISSION_EVENTS_FLUSH_LOCK = "submission:events:flush_lock"
+SUBMISSION_EVENTS_FLUSH_LOCK_TTL = 300
+# Событий stream за одну вставку
+SUBMISSION_EVENTS_FLUSH_BATCH = 2000
+OWNER_CACHE_PREFIX = "submission:owner:"
+# Владелец попытки не меняется, TTL только ограничивает размер кэша
+OWNER_CACHE_TTL = 6 * 3600
+# Самое раннее допустимое время события относительно получения пачки
+MAX_EVENT_AGE = timedelta(minutes=15)
+
+# id события выводится из id записи stream: повторная вставка
+# пачки после сбоя между commit и XDEL не создаёт дублей
+_EVENT_ID_NAMESPACE = uuid.UUID("6f1d3c52-7a43-4b0e-9d0e-2f5f3b8f4a61")
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def event_timestamp(
+    received_at: datetime,
+    occurred_at: Optional[datetime] = None,
+    sent_at: Optional[datetime] = None,
+) -> datetime:
+    """
+    Время события по часам сервера (naive UTC, как submission_events.ts)
+    """
+    if occurred_at is None:
+        return received_at
+    timestamp = _naive_utc(occurred_at)
+    if sent_at is not None:
+        # Поправка на расхождение часов клиента и сервера
+        timestamp += received_at - _naive_utc(sent_at)
+    return min(max(timestamp, received_at - MAX_EVENT_AGE), received_at)
+
+
+def _uuid_or_none(value: Any) -> Optional[UUID]:
+    try:
+        return UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def event_fields(
+    submission_id: UUID,
+    event_type: str,
+    details: Optional[Dict[str, Any]],
+    timestamp: datetime,
+) -> Dict[str, str]:
+    """
+    Плоский словарь строк для XADD. question_id из details клиента выносится в отдельное поле.
+    """
+    details = dict(details or {})
+    question_id = _uuid_or_none(details.pop("question_id", None))
+    return {
+        "submission_id": str(submission_id),
+        "question_id": str(question_id) if question_id else "",
+        "event_type": event_type[:50],
+        "details": json.dumps(details, ensure_ascii=False) if details else "",
+        "ts": timestamp.isoformat(),
+    }
+
+
+def parse_event_fields(entry_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Запись из stream -> значения колонок submission_events
+    """
+    try:
+        timestamp = datetime.fromisoformat(fields["ts"])
+    except (KeyError, ValueError):
+        timestamp = datetime.utcnow()
+    try:
+        details = json.loads(fields["details"]) if fields.get("details") else None
+    except ValueError:
+        details = None
+    return {
+        "id": uuid.uuid5(_EVENT_ID_NAMESPACE, entry_id),
+        "ts": timestamp,
+        "submission_id": UUID(fields["submission_id"]),
+        "question_id": _uuid_or_none(fields.get("question_id")),
+        "event_type": fields.get("event_type") or "unknown",
+        "details": details,
+    }
+
+
+async def get_submission_owner(db: AsyncSession, submission_id: UUID) -> Optional[UUID]:
+    """
+    student_id попытки: из кэша Redis, при промахе — из БД.
+    None — попытка не найдена.
+    """
+    key = f"{OWNER_CACHE_PREFIX}{submission_id}"
+    try:
+        client = await get_redis_client()
+        cached = await client.get(key)
+        if cached:
+            return UUID(cached)
+    except Exception as e:
+        client = None
+        logger.warning(f"Submission owner cache unavailable: {e}")
+
+    result = await db.execute(select(Submission.student_id).where(Submission.id == submission_id))
+    student_id = result.scalar_one_or_none()
+    if student_id is not None and client is not None:
+        try:
+            await client.set(key, str(student_id), ex=OWNER_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to cache submission owner: {e}")
+    return student_id
+
+
+async def enqueue_events(events: Sequence[Dict[str, str]]) -> None:
+    """
+    Запись событий (см. event_fields) в stream одним pipeline.
+    Ошибки Redis пробрасываются: вызывающий пишет события в БД напрямую.
+    """
+    if not events:
+        return
+    client = await get_redis_client()
+    pipe = client.pipeline(transaction=False)
+    for fields in events:
+        pipe.xadd(
+            SUBMISSION_EVENTS_STREAM,
+            fields,
+            maxlen=SUBMISSION_EVENTS_STREAM_MAXLEN,
+            approximate=True,
+        )
+    await pipe.execute()
+
+
+async def write_events(db: AsyncSession, events: Sequence[Dict[str, str]]) -> None:
+    """
+    Запись событий сразу в submission_events (без очереди). Commit — на вызывающем.
+    """
+    rows = [parse_event_fields(str(uuid.uuid4()), fields) for fields in events]
+    if rows:
+        await db.execute(insert(SubmissionEvent), rows)
+
+
+async def _flush_locked(client, session_factory: Callable[[], AsyncSession]) -> int:
+    flushed = 0
+    while True:
+        entries = await client.xrange(SUBMISSION_EVENTS_STREAM, count=SUBMISSION_EVENTS_FLUSH_BATCH)
+        if not entries:
+            break
+
+        rows = []
+        for entry_id, fields in entries:
+            try:
+                rows.append((entry_id, parse_event_fields(entry_id, fields)))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Dropping malformed submission event {entry_id}: {e}")
+
+        if rows:
+            async with session_factory() as db:
+                try:
+                    # События удалённых попыток нарушили бы внешний ключ всей пачки
+                    existing = set(
+                        (
+                            await db.execute(
+                                select(Submission.id).where(
+                                    Submission.id.in_({row["submission_id"] for _, row in rows})
+                                )
+                            )
+                        )
+                        .scalars()
+                        .all()
+                    )
+                    rows = [
+                        (entry_id, row)
+                        for entry_id, row in rows
+                        if row["submission_id"] in existing
+                    ]
+                    if rows:
+                        await db.execute(
+                            insert(SubmissionEvent).on_conflict_do_nothing(
+                                index_elements=["id", "ts"]
+                            ),
+                            [row for _, row in rows],
+                        )
+                        await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Failed to flush submission events: {e}")
+                    raise e
+            # Повтор пачки после сбоя до XDEL сводки не искажает: учтённые записи пропускаются
+            await update_summaries(client, rows)
+
+        await client.xdel(SUBMISSION_EVENTS_STREAM, *[entry_id for entry_id, _ in entries])
+        flushed += len(rows)
+        if len(entries) < SUBMISSION_EVENTS_FLUSH_BATCH:
+            break
+    return flushed
+
+
+async def flush_events(session_factory: Callable[[], AsyncSession], wait: float = 0.0) -> int:
+    """
+    Перенос накопленных событий из stream в submission_events.
+
+    Args:
+        wait: сколько секунд ждать, если перенос уже выполняет другой процесс
+            (оценке нужен полный журнал, периодической задаче — нет).
+
+    Returns:
+        Число перенесённых событий.
+    """
+    token = await acquire_lock(SUBMISSION_EVENTS_FLUSH_LOCK, SUBMISSION_EVENTS_FLUSH_LOCK_TTL, wait)
+    if token is None:
+        return 0
+
+    try:
+        flushed = await _flush_locked(await get_redis_client(), session_factory)
+    finally:
+        await release_lock(SUBMISSION_EVENTS_FLUSH_LOCK, token)
+
+    if flushed:
+        logger.info(f"Flushed {flushed} submission events")
+    return flushed
+
+
+async def ingest_events(
+    db: AsyncSession,
+    submission_id: UUID,
+    events: Sequence[Any],
+    sent_at: Optional[datetime] = None,
+) -> None:
+    """
+    Приём пачки событий (SubmissionEventCreate) уже проверенной попытки.
+    """
+    received_at = datetime.utcnow()
+    fields = [
+        event_fields(
+            submission_id,
+            event.event_type,
+            event.details,
+            event_timestamp(received_at, event.occurred_at, sent_at),
+        )
+        for event in events
+    ]
+    try:
+        await enqueue_events(fields)
+    except Exception as e:
+        logger.warning(f"Submission events stream unavailable, writing to DB: {e}")
+        await write_events(db, fields)
+        await db.commit()
+        # Этих событий не будет в сводках Redis: при переносе сводки соберутся из БД
+        try:
+            await mark_summaries_incomplete(await get_redis_client(), [submission_id])
+        except Exception as e:
+            logger.warning(
+                f"Failed to mark focus summaries of submission {submission_id} incomplete: {e}"
+            )
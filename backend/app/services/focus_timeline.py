@@ -0,0 +1,245 @@
+"""
+Сводка поведения студента по вопросам: уходы со вкладки, вставки, первая и последняя активность
+
+Сводки обновляются инкрементально при переносе событий из stream
+(event_ingest.flush_events, под блокировкой — один писатель) и лежат в Redis:
+    focus:{submission_id}   hash question_id ("-" — событие без вопроса) -> JSON сводки
+
+После отправки теста сводки переносятся в submissions.focus_summary
+(persist_focus_summary), оценка ответа читает готовую сводку вопроса.
+Если часть событий попытки записана в БД мимо stream (Redis не принял XADD),
+в hash ставится метка REBUILD_FIELD и сводки при переносе собираются заново из БД.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import get_redis_client
+from app.models.submission import Submission
+from app.models.submission_event import SubmissionEvent
+
+logger = logging.getLogger(__name__)
+
+FOCUS_KEY_PREFIX = "focus:"
+NO_QUESTION = "-"
+# Метка неполных сводок: часть событий попытки есть только в БД
+REBUILD_FIELD = "rebuild"
+# Сводки неотправленных попыток (брошенный тест) удаляются сами
+FOCUS_TTL_SECONDS = 7 * 24 * 3600
+# Журнал для промпта: уходы и вставки сверх лимита только суммируются
+MAX_LOG_ENTRIES = 50
+
+AWAY_EVENTS = ("tab_hidden", "window_blur")
+RETURN_EVENTS = ("tab_visible", "window_focus")
+
+
+def focus_key(submission_id: Any) -> str:
+    return f"{FOCUS_KEY_PREFIX}{submission_id}"
+
+
+def new_summary() -> Dict[str, Any]:
+    return {
+        "away_seconds": 0.0,
+        "away_count": 0,
+        "paste_count": 0,
+        "away_since": None,
+        "first_ts": None,
+        "last_ts": None,
+        "log": [],
+        "last_entry": None,
+    }
+
+
+def _stream_id(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _append_log(summary: Dict[str, Any], entry: Dict[str, str]) -> None:
+    if len(summary["log"]) < MAX_LOG_ENTRIES:
+        summary["log"].append(entry)
+
+
+def apply_event(
+    summary: Dict[str, Any], event_type: str, ts: datetime, entry_id: Optional[str] = None
+) -> bool:
+    """
+    Учёт одного события в сводке (события подаются в порядке поступления).
+
+    Args:
+        entry_id: id записи stream; уже учтённые записи (повтор пачки после сбоя) пропускаются.
+
+    Returns:
+        False, если событие уже было учтено.
+    """
+    if entry_id is not None:
+        if summary["last_entry"] and _stream_id(entry_id) <= _stream_id(summary["last_entry"]):
+            return False
+        summary["last_entry"] = entry_id
+
+    iso = ts.isoformat()
+    if summary["first_ts"] is None or iso < summary["first_ts"]:
+        summary["first_ts"] = iso
+    if summary["last_ts"] is None or iso > summary["last_ts"]:
+        summary["last_ts"] = iso
+
+    at = ts.strftime("%H:%M:%S")
+    if event_type in AWAY_EVENTS:
+        summary["away_since"] = iso
+    elif event_type in RETURN_EVENTS and summary["away_since"]:
+        duration = max(0.0, (ts - datetime.fromisoformat(summary["away_since"])).total_seconds())
+        summary["away_seconds"] += duration
+        summary["away_count"] += 1
+        summary["away_since"] = None
+        _append_log(
+            summary, {"event": "away_from_tab", "duration": f"{round(duration, 1)}s", "at": at}
+        )
+    elif event_type == "paste_attempted":
+        summary["paste_count"] += 1
+        _append_log(summary, {"event": "paste_attempted", "at": at})
+    return True
+
+
+def merge_summaries(*summaries: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Сводка вопроса вместе с событиями без привязки к вопросу"""
+    merged = new_summary()
+    for summary in summaries:
+        if not summary:
+            continue
+        merged["away_seconds"] += summary.get("away_seconds", 0.0)
+        merged["away_count"] += summary.get("away_count", 0)
+        merged["paste_count"] += summary.get("paste_count", 0)
+        for bound, pick in (("first_ts", min), ("last_ts", max)):
+            values = [v for v in (merged[bound], summary.get(bound)) if v]
+            merged[bound] = pick(values) if values else None
+        merged["log"].extend(summary.get("log", []))
+    merged["log"] = sorted(merged["log"], key=lambda entry: entry["at"])[:MAX_LOG_ENTRIES]
+    return merged
+
+
+def anticheat_fields(
+    summary: Dict[str, Any],
+    started_at: Optional[datetime],
+    submitted_at: Optional[datetime],
+) -> Dict[str, Any]:
+    """
+    Поля anticheat-конфигурации оценки: журнал, время вне вкладки, общее время и время в фокусе.
+    Время работы — от начала попытки (или первого события) до отправки (или последнего события).
+    """
+    start = started_at or datetime.utcnow()
+    end = submitted_at or datetime.utcnow()
+    if summary.get("first_ts"):
+        start = min(start, datetime.fromisoformat(summary["first_ts"]))
+    if summary.get("last_ts"):
+        end = max(end, datetime.fromisoformat(summary["last_ts"]))
+    total = (end - start).total_seconds()
+    away = summary.get("away_seconds", 0.0)
+    return {
+        "event_log": list(summary.get("log", [])),
+        "away_time_seconds": round(away, 1),
+        "total_time_seconds": round(max(1, total), 1),
+        "focus_time_seconds": round(max(0, total - away), 1),
+    }
+
+
+def question_summary(focus_summary: Optional[Dict[str, Any]], question_id: Any) -> Dict[str, Any]:
+    focus_summary = focus_summary or {}
+    return merge_summaries(focus_summary.get(str(question_id)), focus_summary.get(NO_QUESTION))
+
+
+async def update_summaries(client, rows: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+    """
+    Учёт перенесённых событий (entry_id, строка submission_events) в сводках Redis.
+    Вызывается только под блокировкой переноса stream.
+    """
+    grouped: Dict[str, Dict[str, List[Tuple[str, Dict[str, Any]]]]] = {}
+    for entry_id, row in rows:
+        field = str(row["question_id"]) if row.get("question_id") else NO_QUESTION
+        grouped.setdefault(focus_key(row["submission_id"]), {}).setdefault(field, []).append(
+            (entry_id, row)
+        )
+    if not grouped:
+        return
+
+    pipe = client.pipeline(transaction=False)
+    for key, fields in grouped.items():
+        pipe.hmget(key, list(fields))
+    current = await pipe.execute()
+
+    pipe = client.pipeline(transaction=False)
+    for (key, fields), values in zip(grouped.items(), current):
+        mapping = {}
+        for (field, events), value in zip(fields.items(), values):
+            summary = json.loads(value) if value else new_summary()
+            for entry_id, row in events:
+                apply_event(summary, row["event_type"], row["ts"], entry_id)
+            mapping[field] = json.dumps(summary, ensure_ascii=False)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, FOCUS_TTL_SECONDS)
+    await pipe.execute()
+
+
+async def mark_summaries_incomplete(client, submission_ids: Iterable[Any]) -> None:
+    """
+    Сводки попыток будут собраны из БД при переносе: события записаны мимо stream.
+    Метка переживает последующие update_summaries (они меняют только поля вопросов).
+    """
+    pipe = client.pipeline(transaction=False)
+    for submission_id in set(submission_ids):
+        pipe.hset(focus_key(submission_id), REBUILD_FIELD, "1")
+        pipe.expire(focus_key(submission_id), FOCUS_TTL_SECONDS)
+    await pipe.execute()
+
+
+async def _summaries_from_db(
+    session: AsyncSession, submission_id: UUID
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Сводки по сохранённым событиям: Redis был недоступен, часть событий записана
+    мимо stream или попытка старше сводок
+    """
+    result = await session.execute(
+        select(SubmissionEvent.question_id, SubmissionEvent.event_type, SubmissionEvent.ts)
+        .where(SubmissionEvent.submission_id == submission_id)
+        .order_by(SubmissionEvent.ts)
+    )
+    summaries: Dict[str, Dict[str, Any]] = {}
+    for question_id, event_type, ts in result.all():
+        field = str(question_id) if question_id else NO_QUESTION
+        apply_event(summaries.setdefault(field, new_summary()), event_type, ts)
+    return summaries
+
+
+async def persist_focus_summary(
+    session: AsyncSession, submission: Submission
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Перенос сводок попытки из Redis в submissions.focus_summary (commit — на вызывающем).
+    Перед вызовом события из stream должны быть перенесены (flush_events).
+    """
+    summaries: Optional[Dict[str, Dict[str, Any]]] = None
+    client = None
+    try:
+        client = await get_redis_client()
+        stored = await client.hgetall(focus_key(submission.id))
+        if stored and REBUILD_FIELD not in stored:
+            summaries = {field: json.loads(value) for field, value in stored.items()}
+    except Exception as e:
+        logger.warning(f"Focus summaries unavailable for submission {submission.id}: {e}")
+
+    if summaries is None:
+        summaries = await _summaries_from_db(session, submission.id)
+
+    submission.focus_summary = summaries
+    if client is not None:
+        try:
+            await client.delete(focus_key(submission.id))
+        except Exception as e:
+            logger.warning(f"Failed to drop focus summaries of submission {submission.id}: {e}")
+    return summaries
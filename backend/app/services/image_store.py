@@ -0,0 +1,222 @@
+"""
+Контентно-адресуемое хранение изображений
+
+Изображение хранится под ключом images/sha256/{sha256}.{ext}. Одинаковый файл,
+загруженный разными преподавателями, хранится одним объектом: новая запись
+ImageAsset ссылается на существующий (аннотации у каждой записи свои).
+Содержимое объекта по ключу не меняется, поэтому он сохраняется с
+Cache-Control: immutable и браузер не скачивает его заново в каждой сессии.
+
+Загрузка потоковая (inspect_image_stream, store_image_stream): файл читается
+частями для sha256 и размера, PIL читает только заголовок, объект загружается
+multipart в пуле потоков хранилища (async_storage) — файл целиком в памяти
+не держится.
+
+Объекты, загруженные раньше под случайными именами (images/{uuid}.{ext}),
+переносятся задачей maintenance.rekey_image_objects (rekey_image_assets).
+Один объект может принадлежать нескольким ImageAsset — удалять его можно,
+только если на storage_path больше нет ссылок.
+"""
+
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from PIL import Image
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.storage import async_storage, object_name_from_path, storage_service
+from app.models.question import ImageAsset
+
+logger = logging.getLogger(__name__)
+
+CONTENT_PREFIX = "images/sha256/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Размер чтения при подсчёте sha256
+HASH_CHUNK_SIZE = 1024 * 1024
+
+IMAGE_EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "GIF": "gif",
+    "WEBP": "webp",
+    "BMP": "bmp",
+    "TIFF": "tiff",
+}
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def content_object_name(
+    digest: str, image_format: Optional[str], filename: Optional[str] = None
+) -> str:
+    """Ключ объекта по sha256; расширение — по формату изображения (PIL), иначе из имени файла"""
+    ext = IMAGE_EXTENSIONS.get((image_format or "").upper())
+    if ext is None and filename and "." in filename:
+        ext = filename.rsplit(".", 1)[-1].lower()
+    return f"{CONTENT_PREFIX}{digest}.{ext}" if ext else f"{CONTENT_PREFIX}{digest}"
+
+
+@dataclass
+class ImageStreamInfo:
+    """Результат прохода по загруженному файлу"""
+    size: int
+    digest: str
+    image_format: Optional[str]
+    width: int
+    height: int
+
+
+def inspect_image_stream(stream: BinaryIO, max_size: int) -> ImageStreamInfo:
+    """
+    sha256 и размер файла чтением частями, размеры изображения — по заголовку.
+    Блокирующая: вызывается через async_storage.run. Поток возвращается в начало.
+    """
+    stream.seek(0)
+    sha256 = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File exceeds maximum size of {max_size} bytes"
+            )
+        sha256.update(chunk)
+
+    stream.seek(0)
+    # Image.open читает только заголовок; пиксели не декодируются
+    with Image.open(stream) as img:
+        width, height = img.size
+        image_format = img.format
+    stream.seek(0)
+    return ImageStreamInfo(size, sha256.hexdigest(), image_format, width, height)
+
+
+async def find_stored_path(db: AsyncSession, digest: str) -> Optional[str]:
+    """storage_path существующего объекта с таким содержимым"""
+    return await db.scalar(
+        select(ImageAsset.storage_path)
+        .where(ImageAsset.content_hash == digest)
+        .limit(1)
+    )
+
+
+def put_content_object(
+    stream: BinaryIO,
+    digest: str,
+    image_format: Optional[str],
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+) -> str:
+    """Загрузка объекта под контентным ключом с Cache-Control: immutable (блокирующая)"""
+    return storage_service.upload_file(
+        stream,
+        content_object_name(digest, image_format, filename),
+        content_type=content_type or Image.MIME.get((image_format or "").upper()),
+        metadata={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+    )
+
+
+async def store_image_content(
+    db: AsyncSession,
+    content: bytes,
+    image_format: Optional[str],
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+) -> Tuple[str, str]:
+    """
+    (storage_path, sha256) для содержимого изображения. Если такое содержимое
+    уже хранится, объект не загружается повторно.
+    """
+    digest = content_hash(content)
+    storage_path = await store_image_stream(
+        db, io.BytesIO(content), digest, image_format, content_type, filename
+    )
+    return storage_path, digest
+
+
+async def store_image_stream(
+    db: AsyncSession,
+    stream: BinaryIO,
+    digest: str,
+    image_format: Optional[str],
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+) -> str:
+    """
+    storage_path для файла с известным sha256 (см. inspect_image_stream).
+    Обращения к MinIO выполняются в пуле потоков хранилища.
+    """
+    existing = await find_stored_path(db, digest)
+    if existing and await async_storage.file_exists(object_name_from_path(existing)):
+        return existing
+    return await async_storage.run(
+        put_content_object, stream, digest, image_format, content_type, filename
+    )
+
+
+async def rekey_image_assets(
+    db: AsyncSession,
+    after_id: Optional[UUID] = None,
+    batch_size: int = 100,
+) -> Tuple[int, Optional[UUID]]:
+    """
+    Перенос пачки изображений без content_hash на контентные ключи.
+    Возвращает (перенесено, последний просмотренный id); id None — переносить нечего.
+    Старые объекты удаляются после commit, если на них больше нет ссылок.
+    """
+    query = select(ImageAsset).where(ImageAsset.content_hash == None)  # noqa: E711
+    if after_id is not None:
+        query = query.where(ImageAsset.id > after_id)
+    images = (await db.execute(query.order_by(ImageAsset.id).limit(batch_size))).scalars().all()
+    if not images:
+        return 0, None
+
+    # Одинаковые изображения внутри пачки получают один объект
+    stored: Dict[str, str] = {}
+    old_paths = []
+    moved = 0
+    for image in images:
+        old_path = image.storage_path
+        try:
+            content = storage_service.download_file(object_name_from_path(old_path))
+            image_format = Image.open(io.BytesIO(content)).format
+        except Exception as e:
+            logger.warning(f"Skipping image {image.id} ({old_path}): {e}")
+            continue
+
+        digest = content_hash(content)
+        new_path = stored.get(digest) or await find_stored_path(db, digest)
+        if new_path is None:
+            new_path = put_content_object(
+                io.BytesIO(content), digest, image_format, filename=image.filename
+            )
+        stored[digest] = new_path
+
+        image.storage_path = new_path
+        image.content_hash = digest
+        moved += 1
+        if old_path != new_path:
+            old_paths.append(old_path)
+
+    await db.commit()
+
+    for old_path in old_paths:
+        references = await db.scalar(
+            select(func.count(ImageAsset.id)).where(ImageAsset.storage_path == old_path)
+        )
+        if not references:
+            storage_service.delete_file(object_name_from_path(old_path))
+
+    return moved, images[-1].id
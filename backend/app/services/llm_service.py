@@ -5,21 +5,245 @@ LLM Service - абстрактный слой для работы с языко
 import json
 import logging
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.models.system_config import SystemConfig
+from app.services.llm_usage import model_from_payload, note_response, note_usage, track_llm_call
+from app.services.pregrader import pregrade
+from app.services.prompt_templates import (
+    CRITERIA_ALIASES,
+    format_batch_answers,
+    prompt_template_cache,
+)
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CRITERIA = {
+    "factual_correctness": 40,
+    "completeness": 30,
+    "terminology": 20,
+    "structure": 10,
+}
+
+# Ответов на один вопрос в одном запросе пакетной оценки (если не задано в настройках)
+DEFAULT_BATCH_SIZE = 8
+
+# Символов на токен для оценки usage прерванного потока (русский текст)
+ESTIMATED_CHARS_PER_TOKEN = 3
+
+YANDEX_SYSTEM_PROMPT = (
+    "Ты эксперт-преподаватель медицины. Отвечай СТРОГО в формате JSON. "
+    "НЕ используй разметку markdown (```json). "
+    "Твой ответ должен начинаться с '{' и заканчиваться на '}'."
+)
+CHAT_SYSTEM_PROMPT = "Ты эксперт-преподаватель медицины. Отвечай СТРОГО в формате JSON."
+LOCAL_SYSTEM_PROMPT = "Ты эксперт-преподаватель медицины. Отвечай ТОЛЬКО в формате JSON."
+
+# Настройки сборки промпта OpenAI-совместимых провайдеров: встроенный промпт по умолчанию
+# (default_evaluation_prompt) без evaluation_prompt и доп. промптов анти-чита из настроек
+BUILTIN_PROMPT_CONFIG: Dict[str, Any] = {}
+
+
+def _with_prefix(system_prompt: str, system_prefix: Optional[str]) -> str:
+    """Системное сообщение со статической частью промпта (раскладка для префиксного кэша)"""
+    return f"{system_prompt}\n\n{system_prefix}" if system_prefix else system_prompt
+
+
+class StreamingJSONCollector:
+    """
+    Инкрементальный сборщик JSON-оценки из потока токенов.
+
+    Отслеживает баланс фигурных скобок (с учётом строк и экранирования) и, как
+    только закрывается объект верхнего уровня, пробует его распарсить. Если
+    объект валиден и содержит поля оценки — чтение потока можно прекращать:
+    всё, что модель допишет после JSON, нам не нужно.
+    """
+
+    def __init__(self, required_keys: Tuple[str, ...] = ("criteria_scores", "total_score")):
+        self.required_keys = required_keys
+        self.text = ""
+        self.result: Optional[Dict[str, Any]] = None
+        self._pos = 0
+        self._depth = 0
+        self._start: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Добавление очередного фрагмента (дельты) текста.
+
+        Returns:
+            True, если полный объект оценки уже получен
+        """
+        if self.complete or not chunk:
+            return self.complete
+
+        self.text += chunk
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                # Кавычки в прозе вне объекта не считаем началом строки
+                if self._start is not None:
+                    self._in_string = True
+            elif ch == "{":
+                if self._start is None:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._start is not None:
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:i + 1]
+                    self._start = None
+                    parsed = self._try_parse(candidate)
+                    if parsed is not None:
+                        self.result = parsed
+                        self._pos = i + 1
+                        return True
+            i += 1
+
+        self._pos = i
+        return False
+
+    def feed_cumulative(self, full_text: str) -> bool:
+        """
+        Для API, которые в каждом чанке присылают весь накопленный текст (YandexGPT)
+        """
+        if full_text.startswith(self.text):
+            return self.feed(full_text[len(self.text):])
+        # Текст переписан целиком — начинаем разбор заново
+        self.__init__(self.required_keys)
+        return self.feed(full_text)
+
+    def _try_parse(self, candidate: str) -> Optional[Dict[str, Any]]:
+        try:
+            parsed = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(parsed, dict) and all(k in parsed for k in self.required_keys):
+            return parsed
+        return None
+
+
+def split_batch_evaluations(parsed: Any, count: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Разбор ответа пакетной оценки на оценки отдельных ответов.
+
+    Принимает {"evaluations": [...]} или сам массив. Оценка без criteria_scores/total_score,
+    с номером вне диапазона или с повторным номером отбрасывается (None) — такой ответ
+    переоценивается отдельным запросом.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * count
+    if isinstance(parsed, dict):
+        items = parsed.get("evaluations")
+        if items is None and count == 1 and "criteria_scores" in parsed:
+            items = [parsed]
+    else:
+        items = parsed
+    if not isinstance(items, list):
+        return results
+
+    # Без номеров принимаем оценки по порядку, только если их ровно столько, сколько ответов
+    positional = len(items) == count and not any(
+        isinstance(item, dict) and "answer_index" in item for item in items
+    )
+
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        if positional:
+            index = position
+        else:
+            try:
+                index = int(item.get("answer_index")) - 1
+            except (TypeError, ValueError):
+                continue
+        if not 0 <= index < count or results[index] is not None:
+            continue
+
+        total_score = item.get("total_score")
+        if not isinstance(item.get("criteria_scores"), dict) or isinstance(total_score, bool) \
+                or not isinstance(total_score, (int, float)):
+            continue
+
+        evaluation = dict(item)
+        evaluation.pop("answer_index", None)
+        results[index] = evaluation
+    return results
+
+
+def normalize_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """
+    Приведение usage разных API к виду {prompt_tokens, completion_tokens[, cached_tokens]}.
+
+    Попадания в префиксный кэш: DeepSeek — prompt_cache_hit_tokens,
+    OpenAI/Qwen/vLLM — prompt_tokens_details.cached_tokens, GigaChat — precached_prompt_tokens.
+    YandexGPT отдаёт счётчики строками (inputTextTokens, completionTokens).
+    """
+    if not isinstance(usage, dict):
+        return None
+
+    def _to_int(value: Any) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    result = {
+        "prompt_tokens": _to_int(usage.get("prompt_tokens", usage.get("inputTextTokens"))),
+        "completion_tokens": _to_int(usage.get("completion_tokens", usage.get("completionTokens"))),
+    }
+    cached = usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached is None:
+        cached = usage.get("precached_prompt_tokens")
+    if cached is not None:
+        result["cached_tokens"] = _to_int(cached)
+    return result
+
+
+def estimate_usage(payload: Dict[str, Any], completion_text: str) -> Dict[str, int]:
+    """
+    Оценка usage по длине текста, когда API его не прислал: поток прерван ранней
+    остановкой до финального чанка с usage. Кэшированные токены не оцениваются.
+    """
+    prompt_chars = sum(
+        len(message.get("content") or message.get("text") or "")
+        for message in payload.get("messages") or []
+    )
+    return {
+        "prompt_tokens": prompt_chars // ESTIMATED_CHARS_PER_TOKEN,
+        "completion_tokens": len(completion_text) // ESTIMATED_CHARS_PER_TOKEN,
+    }
+
 
 class BaseLLMProvider(ABC):
     """
     Базовый интерфейс для LLM провайдеров
     """
+
+    # Ключ провайдера в настройках (strategy, prefix_cache_providers)
+    name = ""
+    # Поддерживает ли провайдер пакетную оценку (evaluate_answers_batch)
+    supports_batch = False
     
     @abstractmethod
     async def evaluate_answer(
@@ -42,15 +266,24 @@ class BaseLLMProvider(ABC):
         """
         pass
 
+    async def evaluate_answers_batch(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answers: List[str],
+        criteria: Dict[str, int],
+        config: Optional[Dict[str, Any]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Пакетная оценка нескольких ответов на один вопрос одним запросом
+
+        Вызывается только у провайдеров с supports_batch = True.
+
+        Returns:
+            Оценки в порядке ответов; None — оценки ответа нет в ответе модели
+        """
+        return [None] * len(student_answers)
 
-class YandexGPTProvider(BaseLLMProvider):
-    """
-    YandexGPT provider
-    """
-    
-    def __init__(self):
-        self.default_model = "yandexgpt-lite/latest"
-    
     def _get_prompt_variables(self, question: str, reference_answer: str, student_answer: str, criteria: Dict[str, int]) -> Dict[str, Any]:
         """Подготовка переменных для форматирования промпта"""
         vars = {
@@ -63,13 +296,7 @@ class YandexGPTProvider(BaseLLMProvider):
             vars[f"max_{k}"] = v
         
         # Добавляем сокращенные алиасы для удобства в промптах
-        alias_map = {
-            "factual_correctness": "factual",
-            "completeness": "completeness",
-            "terminology": "terminology",
-            "structure": "structure"
-        }
-        for full, short in alias_map.items():
+        for full, short in CRITERIA_ALIASES.items():
             if full in criteria:
                 vars[f"max_{short}"] = criteria[full]
         
@@ -82,57 +309,22 @@ class YandexGPTProvider(BaseLLMProvider):
         return "\n".join([f"- {k.replace('_', ' ').title()}: 0-{v} баллов" 
                          for i, (k, v) in enumerate(criteria.items())])
 
-    def _prepare_full_prompt(self, question: str, reference_answer: str, student_answer: str, criteria: Dict[str, int], config: Dict[str, Any]) -> str:
-        """Сборка полного промпта с учетом анти-чита"""
-        
-        # 1. Базовый системный промпт (из БД или дефолтный)
-        custom_prompt = config.get("evaluation_prompt")
-        
-        # Динамический шаблон JSON для критериев
-        criteria_template = ",\n    ".join([f'"{k}": <баллы>' for k in criteria.keys()])
-        
-        if not custom_prompt:
-            custom_prompt = f"""Ты — эксперт-преподаватель медицины. Оцени ответ студента по критериям.
-            
-ВОПРОС: {{question}}
-ЭТАЛОН: {{reference_answer}}
-ОТВЕТ СТУДЕНТА: {{student_answer}}
-
-КРИТЕРИИ:
-{{criteria_text}}
-
-Верни ответ ТОЛЬКО в формате JSON:
-{{
-  "criteria_scores": {{
-    {criteria_template}
-  }},
-  "total_score": <сумма>,
-  "feedback": "<текст>"
-}}"""
-
-        # 2. Доп. промпты анти-чита
-        extra_prompts = ""
-        json_extras = ""
-        
-        # Детекция ИИ
-        if config.get("ai_check_enabled") and config.get("ai_check_prompt"):
-            extra_prompts += config.get("ai_check_prompt")
-            json_extras += ',\n  "ai_probability": <вероятность ИИ от 0.0 до 1.0>'
-            
-        # Анализ поведения
-        if config.get("event_log") and config.get("integrity_check_prompt"):
-            extra_prompts += config.get("integrity_check_prompt")
-            json_extras += ',\n  "integrity_score": <коэффициент честности от 0.0 до 1.0>,\n  "integrity_feedback": "<краткий комментарий по поведению>"'
-
-        # 3. Форматирование базового промпта
+    def _build_prompt_variables(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answer: str,
+        criteria: Dict[str, int],
+        config: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Переменные промпта с учетом анти-чита"""
         prompt_vars = self._get_prompt_variables(question, reference_answer, student_answer, criteria)
         
         # Вставляем event_log если он есть
         if config.get("event_log"):
             # Форматируем лог событий для читаемости человеком/моделью
             events = config.get("event_log")
-            event_log_str = json.dumps(events, indent=2, ensure_ascii=False)
-            prompt_vars["event_log"] = event_log_str
+            prompt_vars["event_log"] = json.dumps(events, indent=2, ensure_ascii=False)
             prompt_vars["away_time_seconds"] = config.get("away_time_seconds", 0)
             prompt_vars["total_time_seconds"] = config.get("total_time_seconds", 0)
             prompt_vars["focus_time_seconds"] = config.get("focus_time_seconds", 0)
@@ -142,51 +334,70 @@ class YandexGPTProvider(BaseLLMProvider):
             prompt_vars["total_time_seconds"] = 0
             prompt_vars["focus_time_seconds"] = 0
 
-        try:
-            full_prompt = custom_prompt.format(**prompt_vars)
-            # Также форматируем дополнительные промпты, так как они могут содержать {event_log} и др.
-            if extra_prompts:
-                try:
-                    extra_prompts = extra_prompts.format(**prompt_vars)
-                except Exception:  # nosec B110
-                    # Если не удалось отформатировать доп. промпт, оставляем как есть
-                    # Мы не логируем это как ошибку, так как это допустимое поведение для некоторых шаблонов
-                    pass
-        except KeyError as e:
-            # Если в промпте есть лишние скобки или переменные, которых нет в vars, 
-            # пробуем хотя бы базовые заменить
-            full_prompt = custom_prompt.replace("{question}", question).replace("{reference_answer}", reference_answer).replace("{student_answer}", student_answer)
-
-        # 4. Внедрение доп. промптов и обновление JSON-формата
-        # Ищем блок JSON в промпте, чтобы вставить поля туда
-        if json_extras:
-            # Пытаемся вставить инструкции анти-чита перед блоком JSON или в конец
-            # Проверяем несколько вариантов маркеров начала формата ответа
-            markers = ["Верни ответ ТОЛЬКО в формате JSON", "ФОРМАТ ОТВЕТА", "JSON:", "```json"]
-            marker_found = False
-            for marker in markers:
-                if marker in full_prompt:
-                    # Вставляем доп. инструкции ПЕРЕД маркером формата
-                    idx = full_prompt.find(marker)
-                    full_prompt = full_prompt[:idx] + "\n## АНТИ-ЧИТ ПРОВЕРКА\n" + extra_prompts + "\n\n" + full_prompt[idx:]
-                    marker_found = True
-                    break
-            
-            if not marker_found:
-                full_prompt += "\n## АНТИ-ЧИТ ПРОВЕРКА\n" + extra_prompts
-            
-            # Обновляем сам JSON шаблон (вставляем поля перед последней закрывающей скобкой)
-            # Мы ищем последнюю скобку ПРЕЖДЕ чем мы могли добавить что-то еще в конец (хотя мы теперь вставляем перед маркером)
-            if '"feedback":' in full_prompt:
-                # Ищем последнюю закрывающую скобку
-                last_brace_idx = full_prompt.rfind('}')
-                if last_brace_idx != -1:
-                    full_prompt = full_prompt[:last_brace_idx].strip()
-                    if full_prompt.endswith(','): full_prompt = full_prompt[:-1]
-                    full_prompt += json_extras + "\n}"
-        
-        return full_prompt
+        return prompt_vars
 
+    def _prepare_full_prompt(self, question: str, reference_answer: str, student_answer: str, criteria: Dict[str, int], config: Dict[str, Any]) -> str:
+        """
+        Сборка полного промпта с учетом анти-чита.
+
+        Структура промпта (шаблон, блок анти-чита, JSON-скелет) компилируется один раз
+        на версию настроек и набор критериев, здесь остаётся только подстановка переменных.
+        """
+        plan = prompt_template_cache.get_plan(config, tuple(criteria.keys()))
+        return plan.render(
+            self._build_prompt_variables(
+                question, reference_answer, student_answer, criteria, config
+            )
+        )
+
+    def _prepare_prompt_parts(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answer: str,
+        criteria: Dict[str, int],
+        config: Dict[str, Any],
+    ) -> Tuple[str, str]:
+        """
+        Промпт в раскладке для префиксного кэша провайдера:
+        (статический префикс для системного сообщения, блок данных ответа)
+        """
+        plan = prompt_template_cache.get_plan(config, tuple(criteria.keys()))
+        return plan.render_split(
+            self._build_prompt_variables(
+                question, reference_answer, student_answer, criteria, config
+            )
+        )
+
+    def _uses_prefix_layout(self, config: Dict[str, Any]) -> bool:
+        """Включена ли для провайдера раскладка под префиксный кэш (prefix_cache_providers)"""
+        return self.name in (config.get("prefix_cache_providers") or [])
+
+    def _with_usage(self, result: Dict[str, Any], usage: Any) -> Dict[str, Any]:
+        """Добавление нормализованного usage провайдера к результату оценки"""
+        normalized = normalize_usage(usage)
+        note_usage(normalized)
+        if normalized and isinstance(result, dict):
+            result["usage"] = normalized
+            if normalized.get("cached_tokens"):
+                logger.debug(
+                    f"{self.__class__.__name__}: {normalized['cached_tokens']} "
+                    f"of {normalized['prompt_tokens']} prompt tokens from cache"
+                )
+        return result
+
+
+class YandexGPTProvider(BaseLLMProvider):
+    """
+    YandexGPT provider
+    """
+
+    name = "yandex"
+    supports_batch = True
+    
+    def __init__(self):
+        self.default_model = "yandexgpt-lite/latest"
+    
     def _parse_json_response(self, text: str) -> Dict[str, Any]:
         """Устойчивый парсинг JSON из ответа модели"""
         import re
@@ -227,6 +438,223 @@ class YandexGPTProvider(BaseLLMProvider):
                     # Если ничего не помогло, выбрасываем ошибку с информативным текстом
                     raise Exception(f"Не удалось распарсить ответ модели как JSON. Ошибка: {str(e)}. Ответ: {text[:150]}...")
 
+    def _raise_yandex_error(self, response) -> None:
+        """Формирование понятной ошибки YandexGPT с подсказкой по коду ответа"""
+        hint = ""
+        try:
+            error_data = response.json()
+            error_msg = error_data.get("message", "")
+            if any(
+                word in error_msg.lower()
+                for word in ["billing", "payment", "suspended", "account", "balance"]
+            ):
+                hint = (
+                    " (Вероятно, облако заблокировано из-за задолженности или проблем с биллингом)"
+                )
+            elif "permission" in error_msg.lower() or "denied" in error_msg.lower():
+                hint = (
+                    " (Проверьте права доступа сервисного аккаунта. "
+                    "Требуется роль 'ai.languageModels.user')"
+                )
+        except Exception:  # nosec B110
+            pass
+
+        if not hint:
+            if response.status_code == 401:
+                hint = " (Ошибка авторизации: проверьте API Key)"
+            elif response.status_code == 403:
+                hint = " (Доступ запрещен: проверьте права или Folder ID)"
+
+        raise Exception(f"YandexGPT error: {response.status_code} {response.text}{hint}")
+
+    async def _stream_yandex_completion(
+        self, client, url: str, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Потоковое чтение ответа YandexGPT с ранней остановкой.
+
+        Каждая строка потока — JSON с накопленным на данный момент текстом альтернативы
+        и накопленным usage. Как только в тексте появился полный объект оценки, выходим
+        из контекста запроса: соединение закрывается и генерация прекращается.
+        """
+        collector = StreamingJSONCollector()
+        usage = None
+        async with client.stream(
+            "POST", url, headers=headers, json=payload, timeout=60.0
+        ) as response:
+            note_response(response.status_code, model_from_payload(payload))
+            if response.status_code != 200:
+                await response.aread()
+                self._raise_yandex_error(response)
+
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    result = json.loads(line)["result"]
+                    usage = result.get("usage") or usage
+                    text = result["alternatives"][0]["message"]["text"]
+                except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+                    continue
+                if collector.feed_cumulative(text):
+                    break
+
+        usage = usage or estimate_usage(payload, collector.text)
+        if collector.complete:
+            return self._with_usage(collector.result, usage)
+        # Полного объекта в потоке не нашлось — используем обычные эвристики парсинга
+        try:
+            return self._with_usage(self._parse_json_response(collector.text), usage)
+        except Exception:
+            logger.error(f"Failed to parse streamed YandexGPT JSON. Raw text: {collector.text}")
+            raise
+
+    async def _stream_chat_completion(
+        self, client, url: str, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Потоковое чтение OpenAI-совместимого ответа (SSE) с ранней остановкой.
+
+        usage приходит последним чанком (stream_options.include_usage); при ранней
+        остановке до него не дочитываем — usage оценивается по длине текста.
+        """
+        collector = StreamingJSONCollector()
+        usage = None
+        stream_payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        async with client.stream(
+            "POST", url, headers=headers, json=stream_payload, timeout=60.0
+        ) as response:
+            note_response(response.status_code, model_from_payload(payload))
+            if response.status_code != 200:
+                await response.aread()
+                raise Exception(f"API Error: {response.status_code} {response.text}")
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or {}
+                if collector.feed(delta.get("content") or ""):
+                    break
+
+        usage = usage or estimate_usage(payload, collector.text)
+        if collector.complete:
+            return self._with_usage(collector.result, usage)
+        return self._with_usage(self._parse_json_response(collector.text), usage)
+
+    def _prepare_batch_prompt(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answers: List[str],
+        criteria: Dict[str, int],
+        config: Dict[str, Any],
+    ) -> str:
+        """
+        Промпт пакетной оценки: ответы студентов нумерованным блоком вместо {student_answer},
+        блок формата ответа заменён форматом массива оценок. Журнал событий индивидуален
+        и в пакет не попадает.
+        """
+        batch_config = {k: v for k, v in config.items() if k != "event_log"}
+        plan = prompt_template_cache.get_plan(batch_config, tuple(criteria.keys()), batch=True)
+        variables = self._build_prompt_variables(
+            question,
+            reference_answer,
+            format_batch_answers(student_answers),
+            criteria,
+            batch_config,
+        )
+        variables["answer_count"] = len(student_answers)
+        return plan.render(variables)
+
+    def _yandex_request(
+        self,
+        prompt: str,
+        config: Dict[str, Any],
+        stream: bool = False,
+        max_tokens: int = 2000,
+        system_prefix: Optional[str] = None
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """
+        URL, заголовки и тело запроса к YandexGPT.
+
+        system_prefix — статическая часть промпта (раскладка для префиксного кэша),
+        добавляется к системному сообщению.
+        """
+        api_key = config.get("yandex_api_key") or settings.YANDEX_API_KEY
+        folder_id = config.get("yandex_folder_id") or settings.YANDEX_FOLDER_ID
+        model_name = config.get("yandex_model") or self.default_model
+
+        # Определение типа авторизации (API Key или IAM Token)
+        auth_header = f"Api-Key {api_key}"
+        if api_key.startswith("t1."):
+            auth_header = f"Bearer {api_key}"
+
+        headers = {
+            "Authorization": auth_header,
+            "x-folder-id": folder_id
+        }
+        payload = {
+            "modelUri": f"gpt://{folder_id}/{model_name}",
+            "completionOptions": {
+                "stream": stream,
+                "temperature": 0.1,  # Снижаем температуру для максимальной стабильности
+                "maxTokens": max_tokens
+            },
+            "messages": [
+                {"role": "system", "text": _with_prefix(YANDEX_SYSTEM_PROMPT, system_prefix)},
+                {"role": "user", "text": prompt}
+            ]
+        }
+        return settings.YANDEX_LLM_URL, headers, payload
+
+    async def evaluate_answers_batch(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answers: List[str],
+        criteria: Dict[str, int],
+        config: Optional[Dict[str, Any]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Пакетная оценка через YandexGPT (без потокового режима)
+        """
+        import httpx
+
+        config = config or {}
+        if not (config.get("yandex_api_key") or settings.YANDEX_API_KEY) or not (
+            config.get("yandex_folder_id") or settings.YANDEX_FOLDER_ID
+        ):
+            raise Exception("YandexGPT API key or Folder ID not configured")
+
+        prompt = self._prepare_batch_prompt(
+            question, reference_answer, student_answers, criteria, config
+        )
+        url, headers, payload = self._yandex_request(
+            prompt, config, max_tokens=max(2000, 500 * len(student_answers))
+        )
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, headers=headers, json=payload, timeout=120.0)
+            note_response(response.status_code, model_from_payload(payload))
+            if response.status_code != 200:
+                self._raise_yandex_error(response)
+            response_data = response.json()["result"]
+            note_usage(normalize_usage(response_data.get("usage")))
+            result_text = response_data["alternatives"][0]["message"]["text"]
+
+        return split_batch_evaluations(self._parse_json_response(result_text), len(student_answers))
+
     async def evaluate_answer(
         self,
         question: str,
@@ -243,7 +671,6 @@ class YandexGPTProvider(BaseLLMProvider):
         config = config or {}
         api_key = config.get("yandex_api_key") or settings.YANDEX_API_KEY
         folder_id = config.get("yandex_folder_id") or settings.YANDEX_FOLDER_ID
-        model_name = config.get("yandex_model") or self.default_model
         
         if not api_key or not folder_id:
             return {
@@ -252,64 +679,40 @@ class YandexGPTProvider(BaseLLMProvider):
                 "feedback": "YandexGPT API key or Folder ID not configured"
             }
 
-        model_uri = f"gpt://{folder_id}/{model_name}"
-        
-        prompt = self._prepare_full_prompt(question, reference_answer, student_answer, criteria, config)
+        system_prefix = None
+        if self._uses_prefix_layout(config):
+            system_prefix, prompt = self._prepare_prompt_parts(
+                question, reference_answer, student_answer, criteria, config
+            )
+        else:
+            prompt = self._prepare_full_prompt(
+                question, reference_answer, student_answer, criteria, config
+            )
 
         try:
-            # Определение типа авторизации (API Key или IAM Token)
-            auth_header = f"Api-Key {api_key}"
-            if api_key.startswith("t1."):
-                auth_header = f"Bearer {api_key}"
+            stream = bool(config.get("stream_enabled"))
+            url, headers, payload = self._yandex_request(
+                prompt, config, stream=stream, system_prefix=system_prefix
+            )
 
             async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                    headers={
-                        "Authorization": auth_header,
-                        "x-folder-id": folder_id
-                    },
-                    json={
-                        "modelUri": model_uri,
-                        "completionOptions": {
-                            "stream": False,
-                            "temperature": 0.1,  # Снижаем температуру для максимальной стабильности
-                            "maxTokens": 2000
-                        },
-                        "messages": [
-                            {"role": "system", "text": "Ты эксперт-преподаватель медицины. Отвечай СТРОГО в формате JSON. НЕ используй разметку markdown (```json). Твой ответ должен начинаться с '{' и заканчиваться на '}'."},
-                            {"role": "user", "text": prompt}
-                        ]
-                    },
-                    timeout=60.0
-                )
-                
+                if stream:
+                    return await self._stream_yandex_completion(client, url, headers, payload)
+
+                response = await client.post(url, headers=headers, json=payload, timeout=60.0)
+                note_response(response.status_code, model_from_payload(payload))
+
                 if response.status_code != 200:
-                    hint = ""
-                    error_data = {}
-                    try:
-                        error_data = response.json()
-                        error_msg = error_data.get("message", "")
-                        if any(word in error_msg.lower() for word in ["billing", "payment", "suspended", "account", "balance"]):
-                            hint = " (Вероятно, облако заблокировано из-за задолженности или проблем с биллингом)"
-                        elif "permission" in error_msg.lower() or "denied" in error_msg.lower():
-                            hint = " (Проверьте права доступа сервисного аккаунта. Требуется роль 'ai.languageModels.user')"
-                    except:
-                        pass
-                        
-                    if not hint:
-                        if response.status_code == 401:
-                            hint = " (Ошибка авторизации: проверьте API Key)"
-                        elif response.status_code == 403:
-                            hint = " (Доступ запрещен: проверьте права или Folder ID)"
-                            
-                    raise Exception(f"YandexGPT error: {response.status_code} {response.text}{hint}")
+                    self._raise_yandex_error(response)
                 
-                result_text = response.json()["result"]["alternatives"][0]["message"]["text"]
+                response_data = response.json()["result"]
+                result_text = response_data["alternatives"][0]["message"]["text"]
                 
                 # Очистка и парсинг JSON
                 try:
-                    return self._parse_json_response(result_text)
+                    return self._with_usage(
+                        self._parse_json_response(result_text), response_data.get("usage")
+                    )
                 except Exception as parse_error:
                     logger.error(f"Failed to parse YandexGPT JSON. Raw text: {result_text}")
                     raise parse_error
@@ -332,6 +735,54 @@ class OpenAICompatibleProvider(YandexGPTProvider):
         self.base_url = base_url
         self.default_model = default_model
         self.api_key_name = api_key_name
+        self.name = api_key_name.replace("_api_key", "")
+
+    def _chat_request(
+        self, prompt: str, api_key: str, config: Dict[str, Any], system_prefix: Optional[str] = None
+    ) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """URL, заголовки и тело запроса chat/completions"""
+        payload = {
+            "model": config.get("model") or self.default_model,
+            "messages": [
+                {"role": "system", "content": _with_prefix(CHAT_SYSTEM_PROMPT, system_prefix)},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.1,
+            "response_format": {"type": "json_object"}
+        }
+        return f"{self.base_url}/chat/completions", {"Authorization": f"Bearer {api_key}"}, payload
+
+    async def evaluate_answers_batch(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answers: List[str],
+        criteria: Dict[str, int],
+        config: Optional[Dict[str, Any]] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        import httpx
+        config = config or {}
+
+        api_key = config.get(self.api_key_name) or getattr(settings, self.api_key_name.upper(), None)
+        if not api_key:
+            raise Exception(f"API key {self.api_key_name} not configured")
+
+        # Тот же встроенный промпт, что и при оценке по одному ответу
+        prompt = self._prepare_batch_prompt(
+            question, reference_answer, student_answers, criteria, BUILTIN_PROMPT_CONFIG
+        )
+        url, headers, payload = self._chat_request(prompt, api_key, config)
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, headers=headers, json=payload, timeout=120.0)
+            note_response(response.status_code, model_from_payload(payload))
+            if response.status_code != 200:
+                raise Exception(f"API Error: {response.status_code} {response.text}")
+            response_data = response.json()
+            note_usage(normalize_usage(response_data.get("usage")))
+            result_text = response_data["choices"][0]["message"]["content"]
+
+        return split_batch_evaluations(self._parse_json_response(result_text), len(student_answers))
 
     async def evaluate_answer(
         self,
@@ -341,12 +792,10 @@ class OpenAICompatibleProvider(YandexGPTProvider):
         criteria: Dict[str, int],
         config: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        import httpx
         config = config or {}
         
         # Получаем API ключ из настроек или конфига
         api_key = config.get(self.api_key_name) or getattr(settings, self.api_key_name.upper(), None)
-        model = config.get("model") or self.default_model
         
         if not api_key:
             return {
@@ -355,48 +804,48 @@ class OpenAICompatibleProvider(YandexGPTProvider):
                 "feedback": f"API key {self.api_key_name} not configured"
             }
 
-        criteria_template = ",\n    ".join([f'"{k}": <баллы>' for k in criteria.keys()])
-        prompt = f"""Ты — эксперт-преподаватель медицины. Оцени ответ студента по критериям.
-            
-ВОПРОС: {question}
-ЭТАЛОН: {reference_answer}
-ОТВЕТ СТУДЕНТА: {student_answer}
-
-КРИТЕРИИ:
-{self._format_criteria(criteria)}
-
-Верни ответ ТОЛЬКО в формате JSON:
-{{
-  "criteria_scores": {{
-    {criteria_template}
-  }},
-  "total_score": <сумма>,
-  "feedback": "<текст>"
-}}"""
+        # Встроенный промпт (как и раньше, evaluation_prompt из настроек не используется).
+        # Раскладка для префиксного кэша меняет только порядок его частей, не содержание.
+        if self._uses_prefix_layout(config):
+            system_prefix, prompt = self._prepare_prompt_parts(
+                question, reference_answer, student_answer, criteria, BUILTIN_PROMPT_CONFIG
+            )
+            return await self._request_evaluation(prompt, api_key, criteria, config, system_prefix)
+
+        prompt = self._prepare_full_prompt(
+            question, reference_answer, student_answer, criteria, BUILTIN_PROMPT_CONFIG
+        )
+        return await self._request_evaluation(prompt, api_key, criteria, config)
+
+    async def _request_evaluation(
+        self,
+        prompt: str,
+        api_key: str,
+        criteria: Dict[str, int],
+        config: Dict[str, Any],
+        system_prefix: Optional[str] = None
+    ) -> Dict[str, Any]:
+        import httpx
+
+        url, headers, payload = self._chat_request(prompt, api_key, config, system_prefix)
 
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={
-                        "model": model,
-                        "messages": [
-                            {"role": "system", "content": "Ты эксперт-преподаватель медицины. Отвечай СТРОГО в формате JSON."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.1,
-                        "response_format": {"type": "json_object"}
-                    },
-                    timeout=60.0
-                )
-                
+                if config.get("stream_enabled"):
+                    return await self._stream_chat_completion(client, url, headers, payload)
+
+                response = await client.post(url, headers=headers, json=payload, timeout=60.0)
+                note_response(response.status_code, model_from_payload(payload))
+
                 if response.status_code != 200:
                     raise Exception(f"API Error: {response.status_code} {response.text}")
                 
-                result_text = response.json()["choices"][0]["message"]["content"]
-                return self._parse_json_response(result_text)
-                
+                response_data = response.json()
+                result_text = response_data["choices"][0]["message"]["content"]
+                return self._with_usage(
+                    self._parse_json_response(result_text), response_data.get("usage")
+                )
+
         except Exception as e:
             logger.error(f"Provider {self.default_model} error: {e}")
             return {
@@ -410,6 +859,9 @@ class GigaChatProvider(YandexGPTProvider):
     """
     GigaChat Provider
     """
+
+    name = "gigachat"
+    supports_batch = False
     
     def __init__(self):
         self.token = None
@@ -421,7 +873,7 @@ class GigaChatProvider(YandexGPTProvider):
         
         async with httpx.AsyncClient() as client:
             response = await client.post(
-                "https://ngw.devices.sberbank.ru:9443/api/v2/oauth",
+                settings.GIGACHAT_AUTH_URL,
                 headers={
                     "Authorization": f"Basic {credentials}",
                     "RqUID": str(uuid.uuid4()),
@@ -462,7 +914,7 @@ class GigaChatProvider(YandexGPTProvider):
 
             async with httpx.AsyncClient() as client:
                 response = await client.post(
-                    "https://gigachat.devices.sberbank.ru/api/v1/chat/completions",
+                    f"{settings.GIGACHAT_API_URL}/chat/completions",
                     headers={"Authorization": f"Bearer {token}"},
                     json={
                         "model": self.default_model,
@@ -470,8 +922,12 @@ class GigaChatProvider(YandexGPTProvider):
                         "temperature": 0.1
                     }
                 )
-                result_text = response.json()["choices"][0]["message"]["content"]
-                return self._parse_json_response(result_text)
+                note_response(response.status_code, self.default_model)
+                response_data = response.json()
+                result_text = response_data["choices"][0]["message"]["content"]
+                return self._with_usage(
+                    self._parse_json_response(result_text), response_data.get("usage")
+                )
         except Exception as e:
             return {"criteria_scores": {}, "total_score": 0, "feedback": f"GigaChat Error: {str(e)}"}
 
@@ -480,6 +936,8 @@ class LocalLLMProvider(BaseLLMProvider):
     """
     Локальная LLM модель (LLaMA, Mistral через vLLM/Ollama)
     """
+
+    name = "local"
     
     def __init__(self):
         pass
@@ -508,8 +966,15 @@ class LocalLLMProvider(BaseLLMProvider):
                 "feedback": "Local LLM URL not configured"
             }
 
+        system_prompt = LOCAL_SYSTEM_PROMPT
         custom_prompt = config.get("evaluation_prompt")
-        if custom_prompt:
+        if self._uses_prefix_layout(config):
+            # Общий префикс запросов переиспользуется prefix caching в vLLM
+            system_prefix, prompt = self._prepare_prompt_parts(
+                question, reference_answer, student_answer, criteria, config
+            )
+            system_prompt = _with_prefix(LOCAL_SYSTEM_PROMPT, system_prefix)
+        elif custom_prompt:
             try:
                 # Используем тот же хелпер из YandexGPTProvider (или можно вынести его выше)
                 # Для простоты пока повторим логику подготовки переменных здесь
@@ -548,7 +1013,7 @@ class LocalLLMProvider(BaseLLMProvider):
                     json={
                         "model": model,
                         "messages": [
-                            {"role": "system", "content": "Ты эксперт-преподаватель медицины. Отвечай ТОЛЬКО в формате JSON."},
+                            {"role": "system", "content": system_prompt},
                             {"role": "user", "content": prompt}
                         ],
                         "max_tokens": 1000,
@@ -557,14 +1022,16 @@ class LocalLLMProvider(BaseLLMProvider):
                     },
                     timeout=60.0
                 )
-                
-                result = response.json()["choices"][0]["message"]["content"]
+                note_response(response.status_code, model)
+
+                response_data = response.json()
+                result = response_data["choices"][0]["message"]["content"]
                 
                 # Попытка парсинга JSON из ответа
                 try:
                     if isinstance(result, str):
-                        return json.loads(result)
-                    return result
+                        result = json.loads(result)
+                    return self._with_usage(result, response_data.get("usage"))
                 except:
                     # Fallback - простая оценка
                     return {
@@ -593,12 +1060,12 @@ class LLMRouter:
             "yandex": YandexGPTProvider(),
             "gigachat": GigaChatProvider(),
             "deepseek": OpenAICompatibleProvider(
-                base_url="https://api.deepseek.com",
+                base_url=settings.DEEPSEEK_BASE_URL,
                 default_model="deepseek-chat",
                 api_key_name="deepseek_api_key"
             ),
             "qwen": OpenAICompatibleProvider(
-                base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
+                base_url=settings.QWEN_BASE_URL,
                 default_model="qwen-plus",
                 api_key_name="qwen_api_key"
             )
@@ -715,9 +1182,9 @@ class LLMService:
         if api_key and api_key.startswith("t1."):
             auth_header = f"Bearer {api_key}"
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient() as client, track_llm_call("yandex", "generate") as call:
             response = await client.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
+                settings.YANDEX_LLM_URL,
                 headers={"Authorization": auth_header, "x-folder-id": folder_id},
                 json={
                     "modelUri": f"gpt://{folder_id}/{model_name}",
@@ -729,10 +1196,115 @@ class LLMService:
                 },
                 timeout=90.0
             )
+            note_response(response.status_code, model_name)
             if response.status_code == 200:
-                return response.json()["result"]["alternatives"][0]["message"]["text"].strip()
+                response_data = response.json()["result"]
+                note_usage(normalize_usage(response_data.get("usage")))
+                call.finish(success=True)
+                return response_data["alternatives"][0]["message"]["text"].strip()
             return f"# API Error: {response.status_code}"
 
+    def _apply_integrity_penalties(
+        self, result: Dict[str, Any], db_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Штрафы за нарушения (плагиат, ИИ, поведение) по порогам из настроек
+        """
+        manual_integrity_score = 1.0
+        plagiarism_score = db_config.get("plagiarism_score", 0.0)
+        
+        # Предварительная проверка на плагиат (если найден через Search API)
+        if plagiarism_score > 0.5:
+            # Если найден плагиат, сильно снижаем целостность сразу
+            manual_integrity_score = min(manual_integrity_score, 0.2)
+
+        # Применяем integrity_score из ответа LLM или наш manual
+        # Если в конфиге были промпты анти-чита, LLM должна была вернуть integrity_score
+        llm_integrity = result.get("integrity_score")
+        final_integrity = llm_integrity if llm_integrity is not None else manual_integrity_score
+        
+        # --- Расширенная логика штрафов на основе порогов ---
+        ai_threshold_error = db_config.get("ai_threshold_error", 0.8)
+        plagiarism_threshold = db_config.get("plagiarism_threshold", 0.5)
+        integrity_threshold_error = db_config.get("integrity_threshold_error", 0.6)
+        
+        ai_prob = result.get("ai_probability") or result.get("ai_score") or 0.0
+        # Почти дословное совпадение с ответом другого студента (similarity_service)
+        peer_similarity = db_config.get("peer_similarity") or 0.0
+        is_peer_copy = peer_similarity > 0 and peer_similarity >= db_config.get(
+            "peer_similarity_threshold", 0.8
+        )
+        is_plagiarism = plagiarism_score > plagiarism_threshold or is_peer_copy
+        
+        # Проктор теперь оценивается самой LLM (final_integrity)
+        # Мы считаем критическим нарушением если:
+        # 1. Плагиат обнаружен (is_plagiarism)
+        # 2. Вероятность ИИ критическая (ai_prob >= ai_threshold_error)
+        # 3. Сама LLM поставила низкий балл честности (например, < integrity_threshold_error)
+
+        is_critical = (
+            is_plagiarism
+            or ai_prob >= ai_threshold_error
+            or final_integrity <= integrity_threshold_error
+        )
+
+        if final_integrity < 1.0 or is_critical:
+            # Определяем итоговый коэффициент штрафа
+            # Если критично — балл обнуляется (0)
+            # Если просто подозрительно — используем integrity_score
+            penalty_factor = final_integrity
+            if is_critical:
+                penalty_factor = 0.0
+            
+            reduction_percent = round((1.0 - penalty_factor) * 100)
+            
+            if reduction_percent > 0:
+                result["total_score"] = result["total_score"] * penalty_factor
+                
+                reasons = []
+                if plagiarism_score > plagiarism_threshold: reasons.append("Плагиат")
+                if is_peer_copy:
+                    reasons.append(f"Совпадение с ответом другого студента: {peer_similarity:.2f}")
+                if ai_prob >= ai_threshold_error: reasons.append(f"Использование ИИ: {ai_prob:.2f}")
+                if final_integrity <= integrity_threshold_error:
+                    reasons.append(f"Списывание: {final_integrity:.2f}")
+                elif final_integrity < 1.0:
+                    reasons.append(f"Подозрительное поведение: {final_integrity:.2f}")
+
+                percent_text = "100%" if is_critical else f"{reduction_percent}%"
+                header = f"Нарушение: Оценка снижена на {percent_text}"
+                penalty_note = f"{header}\nПричины:\n" + "\n".join(reasons)
+            else:
+                penalty_note = ""
+        else:
+            penalty_note = ""
+        
+        result["integrity_score"] = final_integrity
+        result["ai_probability"] = ai_prob
+        result["plagiarism_found"] = is_plagiarism
+        if "peer_similarity" in db_config:
+            result["peer_similarity"] = peer_similarity
+        result["penalty_note"] = penalty_note
+        return result
+
+    @staticmethod
+    def _track(provider: BaseLLMProvider, operation: str, fallback: bool = False, retries: int = 0):
+        """Учёт вызова провайдера в llm_calls (см. app.services.llm_usage)"""
+        return track_llm_call(
+            provider.name or provider.__class__.__name__,
+            operation,
+            fallback=fallback,
+            retries=retries,
+        )
+
+    @staticmethod
+    def _is_error_result(result: Dict[str, Any]) -> bool:
+        """Провайдер вернул ошибку внутри результата (нулевой балл и текст ошибки в feedback)"""
+        feedback = result.get("feedback", "")
+        return result.get("total_score") == 0 and (
+            "Error" in feedback or "ошибка" in feedback.lower()
+        )
+
     async def evaluate_text_answer(
         self,
         question: str,
@@ -741,18 +1313,18 @@ class LLMService:
         criteria: Optional[Dict[str, int]] = None,
         priority: str = "normal",
         db: Optional[AsyncSession] = None,
-        config: Optional[Dict[str, Any]] = None
+        config: Optional[Dict[str, Any]] = None,
+        retries: int = 0
     ) -> Dict[str, Any]:
         """
-        Оценка текстового ответа с поддержкой fallback и анти-чита
+        Оценка текстового ответа с поддержкой fallback и анти-чита.
+        Тривиальные ответы оцениваются правилами без вызова провайдера (см. pregrader).
+
+        Args:
+            retries: сколько попыток оценить этот ответ уже было (для учёта вызовов llm_calls)
         """
         if criteria is None:
-            criteria = {
-                "factual_correctness": 40,
-                "completeness": 30,
-                "terminology": 20,
-                "structure": 10,
-            }
+            criteria = dict(DEFAULT_CRITERIA)
         
         # Приоритет: переданный конфиг -> конфиг из БД -> settings из .env
         db_config = config
@@ -760,85 +1332,31 @@ class LLMService:
             db_config = await self._get_db_config(db)
         
         db_config = (db_config or {}).copy()
-        
-        # --- Анти-чит логика ---
-        manual_integrity_score = 1.0
-        plagiarism_score = db_config.get("plagiarism_score", 0.0)
-        
-        # Предварительная проверка на плагиат (если найден через Search API)
-        if plagiarism_score > 0.5:
-            # Если найден плагиат, сильно снижаем целостность сразу
-            manual_integrity_score = min(manual_integrity_score, 0.2)
+
+        pregraded = pregrade(question, reference_answer, student_answer, criteria, db_config)
+        if pregraded is not None:
+            return self._apply_integrity_penalties(pregraded, db_config)
 
         strategy = db_config.get("strategy") or settings.LLM_STRATEGY
         
         # 1. Первая попытка
         provider = self.router.get_provider(strategy, priority, db_config)
         try:
-            result = await provider.evaluate_answer(
-                question=question,
-                reference_answer=reference_answer,
-                student_answer=student_answer,
-                criteria=criteria,
-                config=db_config
-            )
-            
+            async with self._track(provider, "evaluate", retries=retries) as call:
+                result = await provider.evaluate_answer(
+                    question=question,
+                    reference_answer=reference_answer,
+                    student_answer=student_answer,
+                    criteria=criteria,
+                    config=db_config
+                )
+                call.finish(success=not self._is_error_result(result))
+
             # Проверяем, не вернул ли провайдер ошибку внутри результата
-            if result.get("total_score") == 0 and ("Error" in result.get("feedback", "") or "ошибка" in result.get("feedback", "").lower()):
+            if self._is_error_result(result):
                 raise Exception(result["feedback"])
                 
-            # Применяем integrity_score из ответа LLM или наш manual
-            # Если в конфиге были промпты анти-чита, LLM должна была вернуть integrity_score
-            llm_integrity = result.get("integrity_score")
-            final_integrity = llm_integrity if llm_integrity is not None else manual_integrity_score
-            
-            # --- Расширенная логика штрафов на основе порогов ---
-            ai_threshold_error = db_config.get("ai_threshold_error", 0.8)
-            plagiarism_threshold = db_config.get("plagiarism_threshold", 0.5)
-            integrity_threshold_error = db_config.get("integrity_threshold_error", 0.6)
-            
-            ai_prob = result.get("ai_probability") or result.get("ai_score") or 0.0
-            is_plagiarism = plagiarism_score > plagiarism_threshold
-            
-            # Проктор теперь оценивается самой LLM (final_integrity)
-            # Мы считаем критическим нарушением если:
-            # 1. Плагиат обнаружен (is_plagiarism)
-            # 2. Вероятность ИИ критическая (ai_prob >= ai_threshold_error)
-            # 3. Сама LLM поставила низкий балл честности (например, < integrity_threshold_error)
-            
-            is_critical = is_plagiarism or ai_prob >= ai_threshold_error or final_integrity <= integrity_threshold_error
-            
-            if final_integrity < 1.0 or is_critical:
-                # Определяем итоговый коэффициент штрафа
-                # Если критично — балл обнуляется (0)
-                # Если просто подозрительно — используем integrity_score
-                penalty_factor = final_integrity
-                if is_critical:
-                    penalty_factor = 0.0
-                
-                reduction_percent = round((1.0 - penalty_factor) * 100)
-                
-                if reduction_percent > 0:
-                    result["total_score"] = result["total_score"] * penalty_factor
-                    
-                    reasons = []
-                    if is_plagiarism: reasons.append("Плагиат")
-                    if ai_prob >= ai_threshold_error: reasons.append(f"Использование ИИ: {ai_prob:.2f}")
-                    if final_integrity <= integrity_threshold_error: reasons.append(f"Списывание: {final_integrity:.2f}")
-                    elif final_integrity < 1.0: reasons.append(f"Подозрительное поведение: {final_integrity:.2f}")
-                    
-                    percent_text = "100%" if is_critical else f"{reduction_percent}%"
-                    header = f"Нарушение: Оценка снижена на {percent_text}"
-                    penalty_note = f"{header}\nПричины:\n" + "\n".join(reasons)
-                else:
-                    penalty_note = ""
-            else:
-                penalty_note = ""
-            
-            result["integrity_score"] = final_integrity
-            result["ai_probability"] = ai_prob
-            result["plagiarism_found"] = is_plagiarism
-            result["penalty_note"] = penalty_note
+            result = self._apply_integrity_penalties(result, db_config)
             result["provider"] = provider.__class__.__name__
             return result
 
@@ -853,60 +1371,24 @@ class LLMService:
             logger.info(f"Attempting fallback to {fallback_provider.__class__.__name__}")
             
             try:
-                result = await fallback_provider.evaluate_answer(
-                    question=question,
-                    reference_answer=reference_answer,
-                    student_answer=student_answer,
-                    criteria=criteria,
-                    config=db_config
-                )
-                
+                async with self._track(
+                    fallback_provider, "evaluate", fallback=True, retries=retries + 1
+                ) as call:
+                    result = await fallback_provider.evaluate_answer(
+                        question=question,
+                        reference_answer=reference_answer,
+                        student_answer=student_answer,
+                        criteria=criteria,
+                        config=db_config
+                    )
+                    call.finish(success=not self._is_error_result(result))
+
                 # Если и fallback вернул ошибку, добавим инфо об ошибке основного провайдера
-                if result.get("total_score") == 0 and ("Error" in result.get("feedback", "") or "ошибка" in result.get("feedback", "").lower()):
+                if self._is_error_result(result):
                     result["feedback"] = f"Основной сервис ({provider.__class__.__name__}) недоступен: {str(e)}. Запасной сервис также вернул ошибку: {result['feedback']}"
                 
-                # Применяем integrity_score к итоговому баллу в fallback
-                llm_integrity = result.get("integrity_score")
-                final_integrity = llm_integrity if llm_integrity is not None else manual_integrity_score
-
-                # --- Расширенная логика штрафов на основе порогов (Fallback) ---
-                ai_threshold_error = db_config.get("ai_threshold_error", 0.8)
-                plagiarism_threshold = db_config.get("plagiarism_threshold", 0.5)
-                integrity_threshold_error = db_config.get("integrity_threshold_error", 0.6)
-                
-                ai_prob = result.get("ai_probability") or result.get("ai_score") or 0.0
-                is_plagiarism = plagiarism_score > plagiarism_threshold
-
-                is_critical = is_plagiarism or ai_prob >= ai_threshold_error or final_integrity <= integrity_threshold_error
-
-                if final_integrity < 1.0 or is_critical:
-                    penalty_factor = final_integrity
-                    if is_critical:
-                        penalty_factor = 0.0
-                    
-                    reduction_percent = round((1.0 - penalty_factor) * 100)
-                    
-                    if reduction_percent > 0:
-                        result["total_score"] = result["total_score"] * penalty_factor
-                        
-                        reasons = []
-                        if is_plagiarism: reasons.append("Плагиат")
-                        if ai_prob >= ai_threshold_error: reasons.append(f"Использование ИИ: {ai_prob:.2f}")
-                        if final_integrity <= integrity_threshold_error: reasons.append(f"Списывание: {final_integrity:.2f}")
-                        elif final_integrity < 1.0: reasons.append(f"Подозрительное поведение: {final_integrity:.2f}")
-                        
-                        percent_text = "100%" if is_critical else f"{reduction_percent}%"
-                        header = f"Нарушение: Оценка снижена на {percent_text}"
-                        penalty_note = f"{header}\nПричины:\n" + "\n".join(reasons)
-                    else:
-                        penalty_note = ""
-                else:
-                    penalty_note = ""
-                
-                result["integrity_score"] = final_integrity
-                result["ai_probability"] = ai_prob
-                result["plagiarism_found"] = is_plagiarism
-                result["penalty_note"] = penalty_note
+                # Применяем integrity_score и штрафы к итоговому баллу в fallback
+                result = self._apply_integrity_penalties(result, db_config)
                 result["provider"] = f"{fallback_provider.__class__.__name__} (Fallback)"
                 return result
             except Exception as fallback_e:
@@ -918,6 +1400,105 @@ class LLMService:
                     "provider": "None"
                 }
 
+    async def evaluate_text_answers_batch(
+        self,
+        question: str,
+        reference_answer: str,
+        student_answers: List[str],
+        criteria: Optional[Dict[str, int]] = None,
+        priority: str = "normal",
+        db: Optional[AsyncSession] = None,
+        config: Optional[Dict[str, Any]] = None,
+        answer_configs: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Пакетная оценка ответов на один вопрос (массовая переоценка, конец экзамена).
+
+        Ответы группируются по batch_size из настроек и отправляются основному провайдеру
+        одним запросом на группу. Ответы, которых нет в ответе модели (или оценка которых
+        не прошла проверку), а также все ответы при ошибке запроса или провайдере без
+        пакетного режима переоцениваются по одному через evaluate_text_answer (с fallback).
+        Тривиальные ответы оцениваются правилами (pregrader) и в пакеты не попадают.
+
+        Args:
+            answer_configs: дополнения конфига для каждого ответа (например, plagiarism_score)
+        """
+        if criteria is None:
+            criteria = dict(DEFAULT_CRITERIA)
+
+        db_config = config
+        if db_config is None and db:
+            db_config = await self._get_db_config(db)
+        db_config = (db_config or {}).copy()
+
+        answer_configs = answer_configs or [{} for _ in student_answers]
+        batch_size = max(1, int(db_config.get("batch_size") or DEFAULT_BATCH_SIZE))
+        strategy = db_config.get("strategy") or settings.LLM_STRATEGY
+        provider = self.router.get_provider(strategy, priority, db_config)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(student_answers)
+        for i, student_answer in enumerate(student_answers):
+            pregraded = pregrade(question, reference_answer, student_answer, criteria, db_config)
+            if pregraded is not None:
+                results[i] = self._apply_integrity_penalties(
+                    pregraded, {**db_config, **answer_configs[i]}
+                )
+        pending = [i for i, evaluation in enumerate(results) if evaluation is None]
+
+        # Ответы, уже отправленные провайдеру в пакете (повторная оценка учитывается как retry)
+        sent_in_batch = [False] * len(student_answers)
+        batch_starts = range(0, len(pending), batch_size) if provider.supports_batch else range(0)
+        for start in batch_starts:
+            indices = pending[start:start + batch_size]
+            chunk = [student_answers[i] for i in indices]
+            if len(chunk) < 2:
+                continue
+            try:
+                async with self._track(provider, "evaluate_batch") as call:
+                    evaluations = await provider.evaluate_answers_batch(
+                        question=question,
+                        reference_answer=reference_answer,
+                        student_answers=chunk,
+                        criteria=criteria,
+                        config=db_config
+                    )
+                    call.finish(success=any(evaluation is not None for evaluation in evaluations))
+            except Exception as e:
+                logger.warning(
+                    f"Batch evaluation ({provider.__class__.__name__}, "
+                    f"{len(chunk)} answers) failed: {e}"
+                )
+                for i in indices:
+                    sent_in_batch[i] = True
+                continue
+
+            for i, evaluation in zip(indices, evaluations):
+                sent_in_batch[i] = True
+                if evaluation is None:
+                    continue
+                answer_config = {**db_config, **answer_configs[i]}
+                evaluation = self._apply_integrity_penalties(evaluation, answer_config)
+                evaluation["provider"] = f"{provider.__class__.__name__} (Batch)"
+                results[i] = evaluation
+
+        missing = [i for i, evaluation in enumerate(results) if evaluation is None]
+        if missing and len(pending) > 1:
+            logger.info(
+                f"Batch evaluation: {len(missing)} of {len(pending)} answers "
+                f"are evaluated individually"
+            )
+        for i in missing:
+            results[i] = await self.evaluate_text_answer(
+                question=question,
+                reference_answer=reference_answer,
+                student_answer=student_answers[i],
+                criteria=criteria,
+                priority=priority,
+                config={**db_config, **answer_configs[i]},
+                retries=1 if sent_in_batch[i] else 0
+            )
+        return results
+
 
 # Singleton
 llm_service = LLMService()
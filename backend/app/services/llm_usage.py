@@ -0,0 +1,259 @@
+"""
+Учёт вызовов LLM: токены, задержка, статус ответа, повторы и fallback.
+
+Каждый вызов провайдера оборачивается в track_llm_call. Провайдер сообщает
+HTTP-статус, модель и usage через note_response / note_usage (через contextvar,
+без изменения сигнатур), по выходе из контекста запись дописывается в Redis stream.
+Задача maintenance.flush_llm_calls (flush_calls) переносит накопленные записи в таблицу
+llm_calls пачками.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import acquire_lock, get_redis_client, release_lock
+from app.models.llm_call import LLMCall
+
+logger = logging.getLogger(__name__)
+
+LLM_CALLS_STREAM = "llm:calls"
+# Верхняя граница длины stream, если сброс в БД надолго остановился
+LLM_CALLS_STREAM_MAXLEN = 200_000
+# Записей stream за одну вставку
+LLM_CALLS_FLUSH_BATCH = 5000
+LLM_CALLS_FLUSH_LOCK = "llm:calls:flush_lock"
+LLM_CALLS_FLUSH_LOCK_TTL = 300
+# Запись учёта не должна задерживать оценку
+PUBLISH_TIMEOUT_SECONDS = 1.0
+
+_current_call: ContextVar[Optional["LLMCallRecord"]] = ContextVar("llm_current_call", default=None)
+
+
+class LLMCallRecord:
+    """
+    Накопитель данных одного вызова провайдера
+    """
+
+    def __init__(self, provider: str, operation: str, fallback: bool = False, retries: int = 0):
+        self.provider = provider
+        self.operation = operation
+        self.fallback = fallback
+        self.retries = retries
+        self.model: Optional[str] = None
+        self.http_status: Optional[int] = None
+        self.success = False
+        self.latency_ms = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.created_at = datetime.utcnow()
+
+    def add_usage(self, usage: Optional[Dict[str, int]]) -> None:
+        """Суммирование нормализованного usage (см. normalize_usage)"""
+        if not usage:
+            return
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.cached_tokens += usage.get("cached_tokens", 0)
+
+    def finish(self, success: bool) -> None:
+        self.success = success
+
+    def to_fields(self) -> Dict[str, str]:
+        """Плоский словарь строк для XADD"""
+        return {
+            "created_at": self.created_at.isoformat(),
+            "provider": self.provider,
+            "model": self.model or "",
+            "operation": self.operation,
+            "success": "1" if self.success else "0",
+            "http_status": "" if self.http_status is None else str(self.http_status),
+            "latency_ms": str(self.latency_ms),
+            "prompt_tokens": str(self.prompt_tokens),
+            "completion_tokens": str(self.completion_tokens),
+            "cached_tokens": str(self.cached_tokens),
+            "retries": str(self.retries),
+            "fallback": "1" if self.fallback else "0",
+        }
+
+
+def parse_stream_fields(entry_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Запись из stream -> значения колонок llm_calls
+    """
+    def _int(name: str) -> int:
+        try:
+            return int(fields.get(name) or 0)
+        except ValueError:
+            return 0
+
+    try:
+        created_at = datetime.fromisoformat(fields["created_at"])
+    except (KeyError, ValueError):
+        created_at = datetime.utcnow()
+
+    http_status = fields.get("http_status")
+    return {
+        "stream_id": entry_id,
+        "created_at": created_at,
+        "provider": (fields.get("provider") or "unknown")[:32],
+        "model": (fields.get("model") or None) and fields["model"][:100],
+        "operation": (fields.get("operation") or "evaluate")[:32],
+        "success": fields.get("success") == "1",
+        "http_status": int(http_status) if http_status and http_status.isdigit() else None,
+        "latency_ms": _int("latency_ms"),
+        "prompt_tokens": _int("prompt_tokens"),
+        "completion_tokens": _int("completion_tokens"),
+        "cached_tokens": _int("cached_tokens"),
+        "retries": _int("retries"),
+        "fallback": fields.get("fallback") == "1",
+    }
+
+
+def model_from_payload(payload: Dict[str, Any]) -> Optional[str]:
+    """
+    Имя модели из тела запроса: "model" (OpenAI-совместимые API)
+    или "modelUri" вида gpt://<folder>/<model> (YandexGPT)
+    """
+    if payload.get("model"):
+        return str(payload["model"])
+    model_uri = payload.get("modelUri")
+    if model_uri:
+        return str(model_uri).split("://", 1)[-1].split("/", 1)[-1]
+    return None
+
+
+def note_response(status_code: Optional[int], model: Optional[str] = None) -> None:
+    """
+    Вызывается провайдером после получения HTTP-ответа. Вне track_llm_call ничего не делает.
+    """
+    call = _current_call.get()
+    if call is None:
+        return
+    call.http_status = status_code
+    if model:
+        call.model = model
+
+
+def note_usage(usage: Optional[Dict[str, int]]) -> None:
+    """
+    Учёт нормализованного usage ответа провайдера. Вне track_llm_call ничего не делает.
+    """
+    call = _current_call.get()
+    if call is not None:
+        call.add_usage(usage)
+
+
+async def publish_call(call: LLMCallRecord) -> None:
+    """
+    Запись вызова в Redis stream. Ошибки Redis только логируются.
+    """
+    try:
+        client = await get_redis_client()
+        await asyncio.wait_for(
+            client.xadd(
+                LLM_CALLS_STREAM, call.to_fields(), maxlen=LLM_CALLS_STREAM_MAXLEN, approximate=True
+            ),
+            timeout=PUBLISH_TIMEOUT_SECONDS,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to record LLM call ({call.provider}/{call.operation}): {e}")
+
+
+@asynccontextmanager
+async def track_llm_call(
+    provider: str,
+    operation: str,
+    fallback: bool = False,
+    retries: int = 0,
+) -> AsyncIterator[LLMCallRecord]:
+    """
+    Учёт одного вызова провайдера.
+
+    Пример:
+        async with track_llm_call(provider.name, "evaluate") as call:
+            result = await provider.evaluate_answer(...)
+            call.finish(success=...)
+
+    Если finish не вызван (исключение), вызов считается неуспешным.
+    """
+    call = LLMCallRecord(provider, operation, fallback=fallback, retries=retries)
+    token = _current_call.set(call)
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        call.latency_ms = int((time.perf_counter() - started) * 1000)
+        _current_call.reset(token)
+        await publish_call(call)
+
+
+async def flush_calls(session_factory: Callable[[], AsyncSession]) -> int:
+    """
+    Перенос записей из stream в llm_calls пачками; записи удаляются из stream после
+    commit. stream_id уникален: пачка, вставленная повторно после сбоя между commit
+    и XDEL, дублей не создаёт. Возвращает число перенесённых записей.
+    """
+    # Один перенос одновременно; блокировку снимает только её владелец
+    token = await acquire_lock(LLM_CALLS_FLUSH_LOCK, LLM_CALLS_FLUSH_LOCK_TTL)
+    if token is None:
+        return 0
+
+    client = await get_redis_client()
+    flushed = 0
+    try:
+        while True:
+            entries = await client.xrange(LLM_CALLS_STREAM, count=LLM_CALLS_FLUSH_BATCH)
+            if not entries:
+                break
+
+            async with session_factory() as db:
+                try:
+                    await db.execute(
+                        insert(LLMCall).on_conflict_do_nothing(index_elements=["stream_id"]),
+                        [parse_stream_fields(entry_id, fields) for entry_id, fields in entries],
+                    )
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Failed to flush LLM calls: {e}")
+                    raise e
+
+            await client.xdel(LLM_CALLS_STREAM, *[entry_id for entry_id, _ in entries])
+            flushed += len(entries)
+            if len(entries) < LLM_CALLS_FLUSH_BATCH:
+                break
+    finally:
+        await release_lock(LLM_CALLS_FLUSH_LOCK, token)
+    return flushed
+
+
+def estimate_cost(
+    prices: Optional[Dict[str, float]],
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int = 0,
+) -> Optional[float]:
+    """
+    Стоимость по ценам за 1M токенов {input, cached_input, output}.
+    Кэшированные токены входят в prompt_tokens; без cached_input считаются по цене input.
+    """
+    if not prices:
+        return None
+    input_price = float(prices.get("input", 0))
+    cached_price = float(prices.get("cached_input", input_price))
+    output_price = float(prices.get("output", 0))
+    cost = (
+        (prompt_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+    return round(cost, 6)
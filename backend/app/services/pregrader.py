@@ -0,0 +1,126 @@
+"""
+Предварительная оценка текстовых ответов по простым правилам (без вызова LLM)
+
+Пустые ответы, отказы («не знаю»), копия текста вопроса и почти дословный эталонный
+ответ оцениваются сразу. Правила и пороги настраиваются в llm_evaluation_params:
+    pregrade_enabled              включить предварительную оценку
+    pregrade_min_chars            минимум букв/цифр в ответе, иначе 0 баллов
+    pregrade_refusal_phrases      фразы-отказы, ответ из одной такой фразы — 0 баллов
+    pregrade_question_similarity  Жаккар по словам с текстом вопроса, от которого — 0 баллов
+    pregrade_reference_similarity сходство последовательности слов с эталоном, от которого —
+                                  полный балл (без добавленных отрицаний)
+"""
+
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set
+
+PREGRADER_PROVIDER = "PreGrader"
+
+# Только пустые ответы и ответы без букв и цифр: «4» или «K» — тоже ответ
+DEFAULT_MIN_CHARS = 1
+DEFAULT_REFUSAL_PHRASES = [
+    "не знаю",
+    "я не знаю",
+    "не помню",
+    "нет ответа",
+    "затрудняюсь ответить",
+]
+DEFAULT_QUESTION_SIMILARITY = 0.9
+DEFAULT_REFERENCE_SIMILARITY = 0.95
+# Короткий ответ с фразой-отказом внутри («эээ, не знаю...») тоже отказ
+REFUSAL_MAX_WORDS = 4
+
+# Отрицания: одно добавленное «не» меняет смысл почти дословного эталона на обратный
+NEGATIONS = frozenset({"не", "нет", "ни", "без", "никогда", "нельзя"})
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(text: str) -> list:
+    return _WORD.findall((text or "").lower().replace("ё", "е"))
+
+
+def jaccard(left: Set[str], right: Set[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def _contains_phrase(words: List[str], phrase: List[str]) -> bool:
+    """Фраза входит в ответ целыми словами подряд («не знаю» не находится в «не знают»)"""
+    size = len(phrase)
+    return any(words[i:i + size] == phrase for i in range(len(words) - size + 1))
+
+
+def matches_reference(words: List[str], reference_words: List[str], threshold: float) -> bool:
+    """
+    Почти дословный эталон: сходство последовательностей слов (порядок важен)
+    не ниже порога и в ответе нет отрицаний сверх тех, что есть в эталоне
+    """
+    if not words or not reference_words:
+        return False
+    if SequenceMatcher(None, words, reference_words, autojunk=False).ratio() < threshold:
+        return False
+    negations = Counter(w for w in words if w in NEGATIONS)
+    reference_negations = Counter(w for w in reference_words if w in NEGATIONS)
+    return not (negations - reference_negations)
+
+
+def _result(
+    criteria: Dict[str, int], rule: str, feedback: str, full: bool = False
+) -> Dict[str, Any]:
+    scores = {k: (v if full else 0) for k, v in criteria.items()}
+    return {
+        "criteria_scores": scores,
+        "total_score": sum(scores.values()),
+        "feedback": feedback,
+        "provider": PREGRADER_PROVIDER,
+        "pregrade_rule": rule,
+    }
+
+
+def pregrade(
+    question: str,
+    reference_answer: str,
+    student_answer: str,
+    criteria: Dict[str, int],
+    config: Dict[str, Any],
+) -> Optional[Dict[str, Any]]:
+    """
+    Итоговая оценка по правилам или None, если ответ нужно оценивать моделью
+    """
+    if not config.get("pregrade_enabled", True):
+        return None
+
+    words = _tokens(student_answer)
+    min_chars = config.get("pregrade_min_chars", DEFAULT_MIN_CHARS)
+    if sum(len(w) for w in words) < max(1, min_chars):
+        return _result(criteria, "min_length", "Ответ отсутствует или слишком короткий.")
+
+    phrases = [
+        _tokens(p) for p in (config.get("pregrade_refusal_phrases") or DEFAULT_REFUSAL_PHRASES)
+    ]
+    phrases = [p for p in phrases if p]
+    if words in phrases or (
+        len(words) <= REFUSAL_MAX_WORDS and any(_contains_phrase(words, p) for p in phrases)
+    ):
+        return _result(criteria, "refusal", "Студент не дал ответа на вопрос.")
+
+    answer_set = set(words)
+    question_threshold = config.get("pregrade_question_similarity", DEFAULT_QUESTION_SIMILARITY)
+    if question_threshold and jaccard(answer_set, set(_tokens(question))) >= question_threshold:
+        return _result(
+            criteria, "question_copy", "Ответ повторяет текст вопроса и не содержит ответа."
+        )
+
+    reference_threshold = config.get("pregrade_reference_similarity", DEFAULT_REFERENCE_SIMILARITY)
+    if (
+        reference_answer
+        and reference_threshold
+        and matches_reference(words, _tokens(reference_answer), reference_threshold)
+    ):
+        return _result(criteria, "reference_match", "Ответ совпадает с эталонным.", full=True)
+
+    return None
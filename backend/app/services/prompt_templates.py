@@ -0,0 +1,407 @@
+"""
+Компиляция промптов оценки в кэшируемые шаблоны.
+
+Промпт оценки зависит от настроек LLM и набора критериев вопроса, а от конкретного
+ответа — только через подставляемые переменные. Поэтому разбор шаблона
+(`str.format`), вставку блока анти-чита перед маркером формата ответа и правку
+JSON-скелета выполняем один раз на версию конфига, а на каждый ответ остаётся
+склейка готовых фрагментов.
+"""
+
+import hashlib
+import re
+import string
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# Маркеры начала блока формата ответа: блок анти-чита вставляется перед первым найденным
+FORMAT_MARKERS = ["Верни ответ ТОЛЬКО в формате JSON", "ФОРМАТ ОТВЕТА", "JSON:", "```json"]
+
+ANTICHEAT_HEADER = "\n## АНТИ-ЧИТ ПРОВЕРКА\n"
+
+AI_JSON_EXTRAS = ',\n  "ai_probability": <вероятность ИИ от 0.0 до 1.0>'
+INTEGRITY_JSON_EXTRAS = (
+    ',\n  "integrity_score": <коэффициент честности от 0.0 до 1.0>,'
+    '\n  "integrity_feedback": "<краткий комментарий по поведению>"'
+)
+
+# Сокращённые алиасы критериев, доступные в промптах как {max_factual} и т.д.
+CRITERIA_ALIASES = {
+    "factual_correctness": "factual",
+    "completeness": "completeness",
+    "terminology": "terminology",
+    "structure": "structure",
+}
+
+# Пакетная оценка: несколько ответов на один вопрос в одном запросе
+BATCH_ANSWER_HEADER = "### Ответ №{index}"
+# Блок формата ответа пакетного промпта: заменяет блок формата одиночной оценки
+BATCH_FORMAT_SECTION = """ФОРМАТ ОТВЕТА (строго JSON, пакетная оценка)
+В разделе ответа студента приведены ответы разных студентов на один и тот же вопрос
+(блоки «Ответ №1» … «Ответ №{{answer_count}}»).
+Оцени КАЖДЫЙ ответ независимо от остальных по тем же критериям.
+Верни ТОЛЬКО JSON с оценками всех {{answer_count}} ответов, "answer_index" — номер ответа:
+{{{{
+  "evaluations": [
+    {{{{
+      "answer_index": <номер ответа>,
+      "criteria_scores": {{{{
+        {criteria_template}
+      }}}},
+      "total_score": <сумма>,
+      "feedback": "<текст>"{json_extras}
+    }}}}
+  ]
+}}}}"""
+
+# Переменные, зависящие от вопроса или конкретного ответа. В раскладке для префиксного
+# кэша провайдера они выносятся из системного префикса в блок данных в конце запроса
+# (порядок блока: сначала общее для всех ответов на вопрос, затем индивидуальное).
+DATA_SECTIONS = (
+    ("question", "ВОПРОС"),
+    ("reference_answer", "ЭТАЛОННЫЙ ОТВЕТ"),
+    ("student_answer", "ОТВЕТ СТУДЕНТА"),
+    ("event_log", "ЖУРНАЛ СОБЫТИЙ"),
+    ("away_time_seconds", "ВРЕМЯ ВНЕ ВКЛАДКИ, СЕК."),
+    ("total_time_seconds", "ОБЩЕЕ ВРЕМЯ, СЕК."),
+    ("focus_time_seconds", "ВРЕМЯ В ФОКУСЕ, СЕК."),
+)
+DATA_REFERENCE = "[см. «{label}» в блоке данных ниже]"
+DATA_HEADER = "## ДАННЫЕ ДЛЯ ОЦЕНКИ"
+
+BASE_VARIABLES = (
+    "question",
+    "reference_answer",
+    "student_answer",
+    "criteria_text",
+    "event_log",
+    "away_time_seconds",
+    "total_time_seconds",
+    "focus_time_seconds",
+)
+
+_formatter = string.Formatter()
+_PLAIN_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_BASIC_FIELDS = re.compile(r"\{(question|reference_answer|student_answer)\}")
+
+
+@dataclass(frozen=True)
+class _Field:
+    """
+    Подстановка переменной. `template` задан, если нужен полноценный str.format
+    (спецификатор, атрибут)
+    """
+    name: str
+    template: Optional[str] = None
+
+
+Piece = Union[str, _Field]
+
+
+def default_evaluation_prompt(criteria_keys: Sequence[str]) -> str:
+    """Промпт по умолчанию (если в настройках не задан evaluation_prompt)"""
+    criteria_template = ",\n    ".join([f'"{k}": <баллы>' for k in criteria_keys])
+    return f"""Ты — эксперт-преподаватель медицины. Оцени ответ студента по критериям.
+
+ВОПРОС: {{question}}
+ЭТАЛОН: {{reference_answer}}
+ОТВЕТ СТУДЕНТА: {{student_answer}}
+
+КРИТЕРИИ:
+{{criteria_text}}
+
+Верни ответ ТОЛЬКО в формате JSON:
+{{{{
+  "criteria_scores": {{{{
+    {criteria_template}
+  }}}},
+  "total_score": <сумма>,
+  "feedback": "<текст>"
+}}}}"""
+
+
+def format_batch_answers(student_answers: Sequence[str]) -> str:
+    """Нумерованный блок ответов для подстановки вместо {student_answer}"""
+    return "\n\n".join(
+        f"{BATCH_ANSWER_HEADER.format(index=i)}\n{answer}"
+        for i, answer in enumerate(student_answers, 1)
+    )
+
+
+def batch_format_pieces(criteria_keys: Sequence[str], json_extras: str = "") -> List[Piece]:
+    """Скомпилированный блок формата пакетной оценки ({answer_count} подставляется при рендере)"""
+    criteria_template = ",\n        ".join([f'"{k}": <баллы>' for k in criteria_keys])
+    extras = json_extras.replace("\n  ", "\n      ").replace("{", "{{").replace("}", "}}")
+    source = BATCH_FORMAT_SECTION.format(criteria_template=criteria_template, json_extras=extras)
+    return compile_template(source, {"answer_count"})
+
+
+def prompt_variable_names(criteria_keys: Sequence[str]) -> set:
+    """Имена переменных, которые будут переданы в шаблон для данного набора критериев"""
+    names = set(BASE_VARIABLES)
+    names.update(f"max_{k}" for k in criteria_keys)
+    names.update(
+        f"max_{short}" for full, short in CRITERIA_ALIASES.items() if full in criteria_keys
+    )
+    return names
+
+
+def compile_template(source: str, allowed: set) -> List[Piece]:
+    """
+    Разбор шаблона в список фрагментов с семантикой `source.format(**vars)`.
+
+    Raises:
+        KeyError: шаблон ссылается на переменную, которой не будет в vars
+        IndexError: позиционное поле ({} или {0})
+        ValueError: синтаксическая ошибка шаблона (непарные скобки)
+    """
+    pieces: List[Piece] = []
+    for literal, field_name, spec, conversion in _formatter.parse(source):
+        if literal:
+            if pieces and isinstance(pieces[-1], str):
+                pieces[-1] += literal
+            else:
+                pieces.append(literal)
+        if field_name is None:
+            continue
+
+        root = re.split(r"[.\[]", field_name, maxsplit=1)[0]
+        if root == "" or root.isdigit():
+            raise IndexError(
+                f"Replacement index {root or 0} out of range for positional args tuple"
+            )
+        if root not in allowed:
+            raise KeyError(root)
+
+        if _PLAIN_NAME.match(field_name) and not spec and not conversion:
+            pieces.append(_Field(field_name))
+        else:
+            conv = f"!{conversion}" if conversion else ""
+            fmt = f":{spec}" if spec else ""
+            pieces.append(_Field(root, "{" + field_name + conv + fmt + "}"))
+    return pieces
+
+
+def _compile_basic_replace(source: str) -> List[Piece]:
+    """Fallback: подставляем только вопрос/эталон/ответ, остальное оставляем как есть"""
+    pieces: List[Piece] = []
+    pos = 0
+    for match in _BASIC_FIELDS.finditer(source):
+        if match.start() > pos:
+            pieces.append(source[pos:match.start()])
+        pieces.append(_Field(match.group(1)))
+        pos = match.end()
+    if pos < len(source):
+        pieces.append(source[pos:])
+    return pieces
+
+
+def _render_pieces(
+    pieces: Sequence[Piece], variables: Dict[str, Any], references: Optional[Dict[str, str]] = None
+) -> str:
+    parts = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            parts.append(piece)
+        elif references and piece.name in references:
+            parts.append(references[piece.name])
+        elif piece.template is None:
+            parts.append(str(variables[piece.name]))
+        else:
+            parts.append(piece.template.format(**variables))
+    return "".join(parts)
+
+
+class PromptPlan:
+    """
+    Скомпилированный промпт для конкретной версии настроек и набора критериев
+    """
+
+    def __init__(self, head: List[Piece], close_json: bool = False, json_extras: str = ""):
+        self.head = head
+        self.close_json = close_json
+        self.json_extras = json_extras
+        used = {piece.name for piece in head if isinstance(piece, _Field)}
+        self.data_sections = [(name, label) for name, label in DATA_SECTIONS if name in used]
+        self._references = {
+            name: DATA_REFERENCE.format(label=label) for name, label in self.data_sections
+        }
+
+    def _finish(self, text: str) -> str:
+        if self.close_json:
+            text = text.strip()
+            if text.endswith(","):
+                text = text[:-1]
+            text += self.json_extras + "\n}"
+        return text
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        return self._finish(_render_pieces(self.head, variables))
+
+    def render_split(self, variables: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Раскладка для префиксного кэша: (статический префикс, блок данных).
+
+        Префикс — тот же промпт, где вопрос, эталон, ответ и журнал событий заменены
+        ссылками на блок данных; он одинаков для всех ответов при тех же настройках и
+        критериях. Блок данных идёт последним и содержит всё, что меняется от ответа к ответу.
+        """
+        prefix = self._finish(_render_pieces(self.head, variables, self._references))
+        data = [DATA_HEADER]
+        for name, label in self.data_sections:
+            data.append(f"### {label}\n{variables[name]}")
+        return prefix, "\n\n".join(data)
+
+
+def _insert_before_marker(pieces: List[Piece], insertion: List[Piece]) -> bool:
+    for marker in FORMAT_MARKERS:
+        for i, piece in enumerate(pieces):
+            if isinstance(piece, str) and marker in piece:
+                idx = piece.find(marker)
+                before, after = piece[:idx], piece[idx:]
+                pieces[i:i + 1] = [p for p in (before, *insertion, after) if p != ""]
+                return True
+    return False
+
+
+def _cut_at_last_brace(pieces: List[Piece]) -> Optional[List[Piece]]:
+    for i in range(len(pieces) - 1, -1, -1):
+        piece = pieces[i]
+        if isinstance(piece, str) and "}" in piece:
+            head = pieces[:i]
+            remainder = piece[:piece.rfind("}")]
+            if remainder:
+                head.append(remainder)
+            return head
+    return None
+
+
+def _replace_format_section(pieces: List[Piece], replacement: List[Piece]) -> List[Piece]:
+    """
+    Замена блока формата ответа — от маркера до конца JSON-скелета (последней "}") —
+    на replacement. Текст после скелета сохраняется; без маркера блок добавляется в конец.
+    """
+    for marker in FORMAT_MARKERS:
+        for i, piece in enumerate(pieces):
+            if isinstance(piece, str) and marker in piece:
+                idx = piece.find(marker)
+                section = [piece[idx:], *pieces[i + 1:]]
+                tail: List[Piece] = []
+                for j in range(len(section) - 1, -1, -1):
+                    part = section[j]
+                    if isinstance(part, str) and "}" in part:
+                        tail = [part[part.rfind("}") + 1:], *section[j + 1:]]
+                        break
+                head = [*pieces[:i], piece[:idx]]
+                return [p for p in (*head, *replacement, *tail) if p != ""]
+    return [*pieces, "\n\n", *replacement]
+
+
+def build_prompt_plan(
+    config: Dict[str, Any], criteria_keys: Tuple[str, ...], batch: bool = False
+) -> PromptPlan:
+    """
+    Компиляция промпта оценки с учётом анти-чита (без подстановки данных ответа).
+
+    batch — вариант для пакетной оценки: блок формата ответа заменяется форматом
+    {"evaluations": [...]} (переменная {answer_count} — число ответов в пакете).
+    """
+    allowed = prompt_variable_names(criteria_keys)
+
+    # 1. Базовый промпт (из БД или дефолтный)
+    source = config.get("evaluation_prompt") or default_evaluation_prompt(criteria_keys)
+    try:
+        pieces = compile_template(source, allowed)
+    except KeyError:
+        # Если в промпте есть лишние скобки или переменные, которых нет в vars,
+        # подставляем хотя бы базовые
+        pieces = _compile_basic_replace(source)
+
+    # 2. Доп. промпты анти-чита
+    extra_source = ""
+    json_extras = ""
+    if config.get("ai_check_enabled") and config.get("ai_check_prompt"):
+        extra_source += config.get("ai_check_prompt")
+        json_extras += AI_JSON_EXTRAS
+    if config.get("event_log") and config.get("integrity_check_prompt"):
+        extra_source += config.get("integrity_check_prompt")
+        json_extras += INTEGRITY_JSON_EXTRAS
+
+    if json_extras:
+        try:
+            extra_pieces = compile_template(extra_source, allowed)
+        except Exception:  # nosec B110
+            # Доп. промпт, который не форматируется, вставляем как есть
+            extra_pieces = [extra_source]
+
+        # 3. Вставка инструкций анти-чита перед блоком формата ответа (или в конец)
+        insertion: List[Piece] = [ANTICHEAT_HEADER, *extra_pieces, "\n\n"]
+        if not _insert_before_marker(pieces, insertion):
+            pieces = pieces + [ANTICHEAT_HEADER, *extra_pieces]
+
+    if batch:
+        return PromptPlan(
+            _replace_format_section(pieces, batch_format_pieces(criteria_keys, json_extras))
+        )
+    if not json_extras:
+        return PromptPlan(pieces)
+
+    # 4. Дополнение JSON-скелета полями анти-чита перед последней закрывающей скобкой
+    if any(isinstance(p, str) and '"feedback":' in p for p in pieces):
+        head = _cut_at_last_brace(pieces)
+        if head is not None:
+            return PromptPlan(head, close_json=True, json_extras=json_extras)
+
+    return PromptPlan(pieces)
+
+
+def prompt_config_fingerprint(config: Dict[str, Any]) -> str:
+    """Хэш частей конфига, от которых зависит структура промпта"""
+    ai_prompt = (config.get("ai_check_prompt") or "") if config.get("ai_check_enabled") else ""
+    integrity_prompt = (
+        (config.get("integrity_check_prompt") or "") if config.get("event_log") else ""
+    )
+
+    digest = hashlib.sha256()
+    for part in (config.get("evaluation_prompt") or "", ai_prompt, integrity_prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class PromptTemplateCache:
+    """
+    LRU-кэш скомпилированных промптов: ключ — (хэш конфига, ключи критериев, пакетный вариант)
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._plans: "OrderedDict[Tuple[str, Tuple[str, ...], bool], PromptPlan]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_plan(
+        self, config: Dict[str, Any], criteria_keys: Tuple[str, ...], batch: bool = False
+    ) -> PromptPlan:
+        key = (prompt_config_fingerprint(config), criteria_keys, batch)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+        self.misses += 1
+        plan = build_prompt_plan(config, criteria_keys, batch)
+        self._plans[key] = plan
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def clear(self) -> None:
+        self._plans.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+prompt_template_cache = PromptTemplateCache()
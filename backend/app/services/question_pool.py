@@ -0,0 +1,144 @@
+"""
+Индекс банка вопросов для генерации вариантов теста
+
+Генерация варианта (start_test, публикация теста) выполняла по SELECT на каждое
+правило структуры и выбирала все подходящие id, чтобы взять из них случайные.
+Индекс (topic_id, type, difficulty) -> [question_id] строится одним запросом и
+хранится в процессе; выборка по правилам идёт без обращения к БД.
+
+Актуальность:
+    - question_bank:version в Redis — счётчик изменений банка; эндпоинты, меняющие
+      вопросы, увеличивают его после commit (bump_question_bank_version);
+    - изменения Question через ORM в этом процессе сбрасывают индекс сразу;
+    - без Redis или при изменениях в обход API индекс перестраивается не реже
+      чем раз в QUESTION_POOL_MAX_AGE секунд.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import get_redis_client
+from app.models.question import Question
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_VERSION_KEY = "question_bank:version"
+QUESTION_POOL_MAX_AGE = 300.0
+
+PoolKey = Tuple[Optional[str], str, Optional[int]]
+
+
+def pool_key(topic_id: Any, question_type: Any, difficulty: Any) -> PoolKey:
+    """Ключ пула; topic_id из структуры теста приходит строкой, тип — строкой или enum"""
+    return (
+        str(topic_id) if topic_id is not None else None,
+        getattr(question_type, "value", question_type),
+        int(difficulty) if difficulty is not None else None,
+    )
+
+
+class QuestionPoolIndex:
+    """Снимок банка вопросов: id по (тема, тип, сложность)"""
+
+    def __init__(self, version: Optional[str], pools: Dict[PoolKey, List[UUID]]):
+        self.version = version
+        self.pools = pools
+        self.built_at = time.monotonic()
+
+    def sample(
+        self, structure: List[dict], exclude_ids: Optional[Iterable[UUID]] = None
+    ) -> List[UUID]:
+        """
+        Выбор вопросов по правилам структуры (точное совпадение темы, типа и сложности).
+        Вопросы из exclude_ids и уже выбранные по предыдущим правилам не повторяются;
+        если подходящих меньше, чем нужно, берутся все оставшиеся.
+        """
+        selected_ids: List[UUID] = []
+        excluded = set(exclude_ids or ())
+
+        for rule in structure:
+            key = pool_key(
+                rule.get("topic_id"), rule.get("question_type"), rule.get("difficulty", 1)
+            )
+            count_needed = rule.get("count", 0)
+            available_ids = [qid for qid in self.pools.get(key, ()) if qid not in excluded]
+
+            if len(available_ids) < count_needed:
+                picked = available_ids
+            else:
+                picked = random.sample(available_ids, count_needed)  # nosec B311
+            selected_ids.extend(picked)
+            excluded.update(picked)
+
+        return selected_ids
+
+
+_index: Optional[QuestionPoolIndex] = None
+_build_lock = asyncio.Lock()
+
+
+def _drop_local_index(*_args) -> None:
+    global _index
+    _index = None
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Question, _event_name, _drop_local_index)
+
+
+def _is_fresh(index: Optional[QuestionPoolIndex], version: Optional[str]) -> bool:
+    if index is None or time.monotonic() - index.built_at > QUESTION_POOL_MAX_AGE:
+        return False
+    # Redis недоступен — полагаемся только на возраст индекса
+    return version is None or index.version == version
+
+
+async def _bank_version() -> Optional[str]:
+    try:
+        client = await get_redis_client()
+        return await client.get(QUESTION_BANK_VERSION_KEY) or "0"
+    except Exception as e:
+        logger.warning(f"Question bank version unavailable: {e}")
+        return None
+
+
+async def bump_question_bank_version() -> None:
+    """Отметка изменения банка вопросов для всех процессов (после commit)"""
+    _drop_local_index()
+    try:
+        client = await get_redis_client()
+        await client.incr(QUESTION_BANK_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"Failed to bump question bank version: {e}")
+
+
+async def get_question_pool(db: AsyncSession) -> QuestionPoolIndex:
+    """
+    Актуальный индекс банка вопросов. Одновременные запросы при устаревшем
+    индексе ждут одну перестройку.
+    """
+    global _index
+    # Версия читается до построения: изменение во время запроса вызовет повторную перестройку
+    version = await _bank_version()
+    if _is_fresh(_index, version):
+        return _index
+
+    async with _build_lock:
+        if _is_fresh(_index, version):
+            return _index
+        result = await db.execute(
+            select(Question.id, Question.topic_id, Question.type, Question.difficulty)
+        )
+        pools: Dict[PoolKey, List[UUID]] = {}
+        for question_id, topic_id, question_type, difficulty in result.all():
+            pools.setdefault(pool_key(topic_id, question_type, difficulty), []).append(question_id)
+        index = QuestionPoolIndex(version, pools)
+        _index = index
+        return index
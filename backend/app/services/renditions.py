@@ -0,0 +1,162 @@
+"""
+Уменьшенные копии изображений для списков
+
+Списки вопросов и изображений отдавали ссылки на оригиналы — страница списка
+скачивала сотни мегабайт. После загрузки фоновая задача строит WebP-копии:
+    thumb    — до IMAGE_THUMB_SIZE px по большей стороне;
+    preview  — до IMAGE_PREVIEW_SIZE px.
+Копии хранятся под renditions/{sha256}/{size}.webp (общие для одинаковых
+изображений, immutable), пути — в ImageAsset.renditions. Списки принимают
+size=thumb|preview|original; пока копии нет, отдаётся оригинал.
+"""
+
+import enum
+import io
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.storage import async_storage, object_name_from_path, storage_service
+from app.models.question import ImageAsset
+from app.services.image_store import IMMUTABLE_CACHE_CONTROL, content_hash
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_PREFIX = "renditions/"
+
+
+class ImageSize(str, enum.Enum):
+    """Размер изображения в ответах списков"""
+    THUMB = "thumb"
+    PREVIEW = "preview"
+    ORIGINAL = "original"
+
+
+def rendition_sizes() -> Dict[str, int]:
+    return {
+        ImageSize.THUMB.value: settings.IMAGE_THUMB_SIZE,
+        ImageSize.PREVIEW.value: settings.IMAGE_PREVIEW_SIZE,
+    }
+
+
+def render_rendition(img: Image.Image, max_side: int) -> bytes:
+    """WebP с сохранением пропорций; изображение меньше max_side не увеличивается"""
+    copy = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    copy.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, format="WEBP", quality=settings.IMAGE_RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def store_renditions(content: bytes, digest: str) -> Dict[str, str]:
+    """Построение и загрузка копий (блокирующая, для Celery). {размер: storage_path}"""
+    renditions = {}
+    with Image.open(io.BytesIO(content)) as img:
+        # draft: JPEG декодируется сразу в уменьшенном масштабе
+        img.draft(None, (settings.IMAGE_PREVIEW_SIZE, settings.IMAGE_PREVIEW_SIZE))
+        img.load()
+        for size, max_side in sorted(rendition_sizes().items(), key=lambda item: -item[1]):
+            renditions[size] = storage_service.upload_file(
+                io.BytesIO(render_rendition(img, max_side)),
+                f"{RENDITIONS_PREFIX}{digest}/{size}.webp",
+                content_type="image/webp",
+                metadata={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+            )
+    return renditions
+
+
+async def build_renditions(db: AsyncSession, image: ImageAsset) -> Optional[Dict[str, str]]:
+    """
+    Копии для ImageAsset (если их ещё нет); commit — на вызывающем. Для уже
+    обработанного содержимого пути копируются с другой записи.
+    """
+    if image.renditions:
+        return None
+
+    renditions = None
+    if image.content_hash:
+        renditions = await db.scalar(
+            select(ImageAsset.renditions)
+            .where(
+                ImageAsset.content_hash == image.content_hash,
+                ImageAsset.renditions != None,  # noqa: E711
+            )
+            .limit(1)
+        )
+    if renditions is None:
+        content = storage_service.download_file(object_name_from_path(image.storage_path))
+        renditions = store_renditions(content, image.content_hash or content_hash(content))
+
+    image.renditions = renditions
+    return renditions
+
+
+async def build_image_renditions(db: AsyncSession, image_id: UUID) -> Optional[Dict[str, str]]:
+    image = await db.get(ImageAsset, image_id)
+    if image is None:
+        return None
+    renditions = await build_renditions(db, image)
+    await db.commit()
+    return renditions
+
+
+async def backfill_renditions(
+    db: AsyncSession,
+    after_id: Optional[UUID] = None,
+    batch_size: int = 50,
+) -> Tuple[int, Optional[UUID]]:
+    """
+    Копии для пачки изображений без renditions.
+    Возвращает (обработано, последний просмотренный id); id None — обрабатывать нечего.
+    """
+    query = select(ImageAsset).where(ImageAsset.renditions == None)  # noqa: E711
+    if after_id is not None:
+        query = query.where(ImageAsset.id > after_id)
+    images = (await db.execute(query.order_by(ImageAsset.id).limit(batch_size))).scalars().all()
+    if not images:
+        return 0, None
+
+    built = 0
+    for image in images:
+        try:
+            await build_renditions(db, image)
+            # Следующие записи с тем же содержимым найдут копии этой
+            await db.flush()
+            built += 1
+        except Exception as e:
+            logger.warning(f"Skipping renditions for image {image.id}: {e}")
+    await db.commit()
+    return built, images[-1].id
+
+
+def schedule_renditions(image_id: Any) -> None:
+    try:
+        from app.tasks.image_tasks import build_renditions_task
+        build_renditions_task.delay(str(image_id))
+    except Exception as e:
+        logger.error(f"Failed to schedule renditions for image {image_id}: {e}")
+
+
+def image_storage_path(image: ImageAsset, size: ImageSize = ImageSize.ORIGINAL) -> str:
+    """Путь копии нужного размера; оригинал, если копии нет"""
+    if size != ImageSize.ORIGINAL and image.renditions:
+        return image.renditions.get(size.value) or image.storage_path
+    return image.storage_path
+
+
+async def attach_image_urls(
+    images: Iterable, size: ImageSize = ImageSize.ORIGINAL, expires_seconds: int = 3600
+) -> None:
+    """presigned_url нужного размера для набора ImageAsset одной пачкой"""
+    images = [image for image in images if image is not None and image.storage_path]
+    if not images:
+        return
+    paths = {image.id: object_name_from_path(image_storage_path(image, size)) for image in images}
+    urls = await async_storage.get_presigned_urls(paths.values(), expires_seconds)
+    for image in images:
+        image.presigned_url = urls[paths[image.id]]
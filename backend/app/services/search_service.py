@@ -2,57 +2,131 @@
 Сервис для проверки на плагиат через Yandex Search API
 """
 
-import httpx
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+import re
+from typing import Any, Dict, List, Optional
+
+import httpx
+
 from app.core.config import settings
+from app.core.redis import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+PLAGIARISM_CACHE_PREFIX = "plagiarism:fragment:"
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_fragment(fragment: str) -> str:
+    """
+    Нормализация фрагмента для ключа кэша: регистр, пунктуация и пробелы не влияют на поиск
+    """
+    return " ".join(_PUNCTUATION.sub(" ", fragment.lower()).split())
+
+
+def select_fragments(text: str, count: int) -> List[str]:
+    """
+    Фрагменты ответа для поиска точных совпадений: самые длинные (информативные)
+    предложения, не более 200 символов (лимит Яндекса). Совпадающие после
+    нормализации предложения ищутся один раз.
+    """
+    clean_text = " ".join(text.split())
+    sentences = [s.strip() for s in clean_text.split('.') if len(s.strip()) > 30]
+    if not sentences:
+        return [clean_text[:150]]
+
+    fragments: List[str] = []
+    seen = set()
+    for sentence in sorted(sentences, key=len, reverse=True):
+        fragment = sentence[:200]
+        key = normalize_fragment(fragment)
+        if key in seen:
+            continue
+        seen.add(key)
+        fragments.append(fragment)
+        if len(fragments) >= count:
+            break
+    return fragments
+
+
 class SearchService:
     """
     Сервис для работы с Yandex Search API (Cloud version)
+
+    Результаты поиска фрагментов кэшируются в Redis (одинаковые ответы в потоке
+    студентов не повторяют запросы), запросы идут через общий пул соединений
+    с ограничением параллельности на процесс.
     """
-    
+
     def __init__(self):
-        self.url = "https://searchapi.cloud.yandex.net/v1/search"
-    
-    async def check_plagiarism(self, text: str, config: Optional[Dict[str, Any]] = None) -> float:
+        self.url = settings.YANDEX_SEARCH_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Запросы фрагментов в полёте: одинаковые ответы, проверяемые одновременно, ждут один запрос
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
         """
-        Проверка текста на наличие в поисковой выдаче Яндекса.
-        Ищет точные совпадения длинных фрагментов текста.
-        
-        Returns:
-            float: 1.0 если плагиат найден, 0.0 если нет.
+        Общий клиент и семафор привязаны к event loop: воркер Celery и API
+        работают в разных циклах, поэтому при смене цикла создаются заново.
         """
-        if not text or len(text.strip()) < 50:
-            return 0.0
-            
-        config = config or {}
-        api_key = config.get("yandex_search_api_key") or settings.YANDEX_SEARCH_API_KEY
-        folder_id = config.get("yandex_search_folder_id") or settings.YANDEX_SEARCH_FOLDER_ID
-        
-        if not api_key or not folder_id:
-            # Не логируем ошибку каждый раз, чтобы не спамить, если не настроено
-            return 0.0
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            concurrency = max(1, settings.PLAGIARISM_SEARCH_CONCURRENCY)
+            self._client = httpx.AsyncClient(
+                timeout=10.0,
+                limits=httpx.Limits(
+                    max_connections=concurrency, max_keepalive_connections=concurrency
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(concurrency)
+            self._inflight = {}
+            self._loop = loop
+        return self._client
 
-        # Очистка текста и выбор фрагмента для поиска
-        clean_text = " ".join(text.split())
-        # Разбиваем на предложения и выбираем самое длинное (информативное)
-        sentences = [s.strip() for s in clean_text.split('.') if len(s.strip()) > 30]
-        
-        if not sentences:
-            query = clean_text[:150]
-        else:
-            # Берем самое длинное предложение, но не более 200 символов (лимит Яндекса)
-            query = max(sentences, key=len)[:200]
+    async def _cached_results(self, keys: List[str]) -> List[Optional[bool]]:
+        try:
+            client = await get_redis_client()
+            values = await client.mget([PLAGIARISM_CACHE_PREFIX + key for key in keys])
+        except Exception as e:
+            logger.warning(f"Plagiarism cache unavailable: {e}")
+            return [None] * len(keys)
+        return [None if value is None else value == "1" for value in values]
 
+    async def _store_results(self, results: Dict[str, bool]) -> None:
+        if not results:
+            return
         try:
-            auth_header = f"Api-Key {api_key}"
-            if api_key.startswith("t1."):
-                auth_header = f"Bearer {api_key}"
+            client = await get_redis_client()
+            pipe = client.pipeline(transaction=False)
+            for key, found in results.items():
+                pipe.set(
+                    PLAGIARISM_CACHE_PREFIX + key,
+                    "1" if found else "0",
+                    ex=settings.PLAGIARISM_CACHE_TTL,
+                )
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to store plagiarism cache: {e}")
+
+    async def _search_fragment(self, query: str, api_key: str, folder_id: str) -> Optional[bool]:
+        """
+        Поиск точного совпадения фрагмента.
 
-            async with httpx.AsyncClient() as client:
+        Returns:
+            True/False — найдено ли совпадение, None — ошибка запроса (в кэш не попадает).
+        """
+        auth_header = f"Api-Key {api_key}"
+        if api_key.startswith("t1."):
+            auth_header = f"Bearer {api_key}"
+
+        client = self._get_client()
+        try:
+            async with self._semaphore:
                 # В Cloud API используется POST запрос с JSON
                 response = await client.post(
                     self.url,
@@ -65,33 +139,89 @@ class SearchService:
                         "lr": [225], # Россия
                         "l10n": "ru",
                     },
-                    timeout=10.0
                 )
-                
-                if response.status_code != 200:
-                    logger.error(f"Yandex Search API error: {response.status_code} {response.text}")
-                    return 0.0
-                
-                data = response.json()
-                
-                # Проверка наличия результатов. В JSON ответе Yandex Search API 
-                # результаты обычно лежат в results или organic
-                found = False
-                
-                # Проверяем типичные поля ответа
-                if "results" in data and len(data["results"]) > 0:
-                    found = True
-                elif "organic" in data and len(data["organic"]) > 0:
-                    found = True
-                # Если ответ содержит xml_response (некоторые прокси так делают)
-                elif "xml_response" in data:
-                    if "<group>" in data["xml_response"]:
-                        found = True
-                
-                return 1.0 if found else 0.0
 
+            if response.status_code != 200:
+                logger.error(f"Yandex Search API error: {response.status_code} {response.text}")
+                return None
+
+            data = response.json()
         except Exception as e:
             logger.error(f"Plagiarism check failed: {str(e)}")
+            return None
+
+        # Проверка наличия результатов. В JSON ответе Yandex Search API
+        # результаты обычно лежат в results или organic
+        if "results" in data and len(data["results"]) > 0:
+            return True
+        if "organic" in data and len(data["organic"]) > 0:
+            return True
+        # Если ответ содержит xml_response (некоторые прокси так делают)
+        if "xml_response" in data and "<group>" in data["xml_response"]:
+            return True
+        return False
+
+    async def _search_once(
+        self, key: str, query: str, api_key: str, folder_id: str
+    ) -> Optional[bool]:
+        """Поиск фрагмента с объединением одновременных запросов одного и того же фрагмента"""
+        self._get_client()
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._search_fragment(query, api_key, folder_id))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def check_plagiarism(
+        self, text: str, config: Optional[Dict[str, Any]] = None, use_cache: bool = True
+    ) -> float:
+        """
+        Проверка текста на наличие в поисковой выдаче Яндекса.
+        Ищет точные совпадения нескольких длинных фрагментов текста (параллельно).
+
+        Args:
+            use_cache: False — всегда обращаться к API (проверка ключей в настройках)
+
+        Returns:
+            float: 1.0 если плагиат найден хотя бы по одному фрагменту, 0.0 если нет.
+        """
+        if not text or len(text.strip()) < 50:
+            return 0.0
+
+        config = config or {}
+        api_key = config.get("yandex_search_api_key") or settings.YANDEX_SEARCH_API_KEY
+        folder_id = config.get("yandex_search_folder_id") or settings.YANDEX_SEARCH_FOLDER_ID
+
+        if not api_key or not folder_id:
+            # Не логируем ошибку каждый раз, чтобы не спамить, если не настроено
             return 0.0
 
+        fragments = select_fragments(text, max(1, settings.PLAGIARISM_FRAGMENTS))
+        keys = [
+            hashlib.sha256(normalize_fragment(f).encode("utf-8")).hexdigest() for f in fragments
+        ]
+
+        cached = await self._cached_results(keys) if use_cache else [None] * len(keys)
+        if any(cached):
+            return 1.0
+
+        pending = [
+            (key, fragment) for key, fragment, hit in zip(keys, fragments, cached) if hit is None
+        ]
+        if use_cache:
+            searches = [
+                self._search_once(key, fragment, api_key, folder_id) for key, fragment in pending
+            ]
+        else:
+            searches = [
+                self._search_fragment(fragment, api_key, folder_id) for _, fragment in pending
+            ]
+        found = await asyncio.gather(*searches)
+
+        await self._store_results(
+            {key: result for (key, _), result in zip(pending, found) if result is not None}
+        )
+        return 1.0 if any(found) else 0.0
+
 search_service = SearchService()
@@ -0,0 +1,217 @@
+"""
+Поиск похожих ответов студентов на один вопрос (MinHash + LSH в Redis)
+
+Ответ разбивается на шинглы из SHINGLE_SIZE слов, по ним считается MinHash-подпись
+из NUM_PERM значений. Подпись делится на LSH_BANDS полос; ответы с совпадающей
+полосой попадают в одну корзину и считаются кандидатами, сходство кандидатов
+оценивается по доле совпадающих значений подписи (оценка коэффициента Жаккара).
+
+Ключи Redis (на вопрос):
+    similarity:{question_id}:sig              hash answer_id -> "student_id:подпись"
+    similarity:{question_id}:b{band}:{hash}   set answer_id в корзине полосы
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import struct
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+LSH_BANDS = 16  # 16 полос по 4 значения: кандидаты начиная с Жаккара ~0.5
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+# Короткие ответы («инсулин», «не знаю») совпадают естественно — не сравниваем
+MIN_WORDS = 8
+INDEX_TTL_SECONDS = 90 * 24 * 3600
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Фиксированные коэффициенты перестановок: подписи сравнимы между процессами и перезапусками
+_rng = random.Random(20261019)
+_PERMUTATIONS = [
+    (_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+    for _ in range(NUM_PERM)
+]
+_SIGNATURE_FORMAT = f">{NUM_PERM}I"
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower().replace("ё", "е"))
+
+
+def shingles(text: str) -> set:
+    """Шинглы из SHINGLE_SIZE подряд идущих слов нормализованного текста"""
+    words = _words(text)
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> Optional[List[int]]:
+    """
+    MinHash-подпись ответа. None — ответ слишком короткий для сравнения.
+    """
+    if len(_words(text)) < MIN_WORDS:
+        return None
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in shingles(text)
+    ]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def signature_similarity(left: List[int], right: List[int]) -> float:
+    """Оценка коэффициента Жаккара по доле совпадающих значений подписей"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def band_keys(question_id: str, signature: List[int]) -> List[str]:
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f">{LSH_ROWS}I", *rows), digest_size=8).hexdigest()
+        keys.append(f"similarity:{question_id}:b{band}:{digest}")
+    return keys
+
+
+def _pack(student_id: str, signature: List[int]) -> str:
+    return f"{student_id}:{struct.pack(_SIGNATURE_FORMAT, *signature).hex()}"
+
+
+def _unpack(value: str) -> Tuple[str, List[int]]:
+    student_id, packed = value.split(":", 1)
+    return student_id, list(struct.unpack(_SIGNATURE_FORMAT, bytes.fromhex(packed)))
+
+
+class SimilarityService:
+    """
+    Индекс похожих ответов по вопросам
+    """
+
+    @staticmethod
+    def _sig_key(question_id: str) -> str:
+        return f"similarity:{question_id}:sig"
+
+    async def index_answer(
+        self, question_id: UUID, answer_id: UUID, student_id: UUID, text: Optional[str]
+    ) -> None:
+        """
+        Добавление (или обновление при переоценке) ответа в индекс вопроса
+        """
+        signature = await asyncio.to_thread(minhash, text or "")
+        await self._store_signature(str(question_id), str(answer_id), str(student_id), signature)
+
+    async def _store_signature(
+        self, question_id: str, answer_id: str, student_id: str, signature: Optional[List[int]]
+    ) -> None:
+        client = await get_redis_client()
+        sig_key = self._sig_key(question_id)
+
+        # Старые корзины ответа убираем, иначе после правки он останется
+        # кандидатом по прежнему тексту
+        previous = await client.hget(sig_key, answer_id)
+        pipe = client.pipeline(transaction=False)
+        if previous:
+            for key in band_keys(question_id, _unpack(previous)[1]):
+                pipe.srem(key, answer_id)
+
+        if signature is None:
+            pipe.hdel(sig_key, answer_id)
+        else:
+            pipe.hset(sig_key, answer_id, _pack(student_id, signature))
+            pipe.expire(sig_key, INDEX_TTL_SECONDS)
+            for key in band_keys(question_id, signature):
+                pipe.sadd(key, answer_id)
+                pipe.expire(key, INDEX_TTL_SECONDS)
+        await pipe.execute()
+
+    async def find_peers(
+        self,
+        question_id: UUID,
+        answer_id: UUID,
+        student_id: UUID,
+        text: Optional[str],
+        limit: int = 5,
+    ) -> List[Tuple[str, float]]:
+        """
+        Похожие ответы других студентов на тот же вопрос: [(answer_id, сходство)] по убыванию
+        """
+        signature = await asyncio.to_thread(minhash, text or "")
+        return await self._find_by_signature(
+            str(question_id), str(answer_id), str(student_id), signature, limit
+        )
+
+    async def _find_by_signature(
+        self,
+        question_id: str,
+        answer_id: str,
+        student_id: str,
+        signature: Optional[List[int]],
+        limit: int,
+    ) -> List[Tuple[str, float]]:
+        if signature is None:
+            return []
+
+        client = await get_redis_client()
+        pipe = client.pipeline(transaction=False)
+        for key in band_keys(question_id, signature):
+            pipe.smembers(key)
+        candidates = set().union(*await pipe.execute())
+        candidates.discard(answer_id)
+        if not candidates:
+            return []
+
+        candidate_ids = list(candidates)
+        values = await client.hmget(self._sig_key(question_id), candidate_ids)
+        peers = []
+        for candidate_id, value in zip(candidate_ids, values):
+            if not value:
+                continue
+            peer_student, peer_signature = _unpack(value)
+            # Свои ответы из прошлых попыток списыванием не считаются
+            if peer_student == student_id:
+                continue
+            peers.append((candidate_id, signature_similarity(signature, peer_signature)))
+        peers.sort(key=lambda item: item[1], reverse=True)
+        return peers[:limit]
+
+    async def peer_matches(
+        self,
+        question_id: UUID,
+        answer_id: UUID,
+        student_id: UUID,
+        text: Optional[str],
+        limit: int = 5,
+    ) -> List[Tuple[str, float]]:
+        """
+        Индексация ответа и поиск похожих ответов других студентов ([] — нет похожих
+        или индекс недоступен). Ответы индексируются при отправке теста, здесь подпись
+        обновляется на случай переоценки изменённого ответа.
+        """
+        question_id, answer_id, student_id = str(question_id), str(answer_id), str(student_id)
+        try:
+            # Подпись считается один раз и вне event loop
+            signature = await asyncio.to_thread(minhash, text or "")
+            await self._store_signature(question_id, answer_id, student_id, signature)
+            return await self._find_by_signature(
+                question_id, answer_id, student_id, signature, limit
+            )
+        except Exception as e:
+            logger.warning(f"Peer similarity check failed for answer {answer_id}: {e}")
+            return []
+
+
+similarity_service = SimilarityService()
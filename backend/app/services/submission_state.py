@@ -0,0 +1,153 @@
+"""
+Кэш состояния идущих попыток для автосохранения ответов
+
+Автосохранение проверяет владельца, статус и срок сдачи попытки. Чтобы не читать
+submission + variant + test на каждое сохранение, состояние идущей попытки
+хранится в Redis:
+    submission:state:{id}   JSON {student_id, status, started_at, time_limit}
+
+Заполняется при начале теста (и при сдвиге started_at на первом открытии),
+сбрасывается при отправке, автозавершении по времени, скрытии и удалении.
+Завершённые попытки не кэшируются — проверяются по БД.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.redis import get_redis_client
+from app.models.submission import Submission, SubmissionStatus
+from app.models.test import TestVariant
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_STATE_PREFIX = "submission:state:"
+# Попытка без ограничения времени: запись живёт, пока тест открыт
+STATE_TTL_NO_LIMIT = 12 * 3600
+# Запас после срока сдачи: опоздавшее сохранение должно увидеть попытку и завершить её
+STATE_TTL_AFTER_DEADLINE = 15 * 60
+
+
+def parse_time_limit(raw: Any) -> Optional[float]:
+    """settings["time_limit"] теста в минутах; некорректное значение — без ограничения"""
+    try:
+        return float(raw) if raw is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+@dataclass
+class SubmissionState:
+    """Данные попытки, нужные для проверки автосохранения"""
+    student_id: UUID
+    status: SubmissionStatus
+    started_at: datetime
+    time_limit: Optional[float] = None  # минуты
+    test_id: Optional[UUID] = None
+
+    @property
+    def deadline(self) -> Optional[datetime]:
+        if self.time_limit is None:
+            return None
+        return self.started_at + timedelta(minutes=self.time_limit)
+
+    @classmethod
+    def from_submission(cls, submission: Submission) -> "SubmissionState":
+        """submission.variant.test должен быть загружен"""
+        return cls(
+            student_id=submission.student_id,
+            status=submission.status,
+            started_at=submission.started_at,
+            time_limit=parse_time_limit(submission.variant.test.settings.get("time_limit")),
+            test_id=submission.variant.test_id,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "student_id": str(self.student_id),
+            "status": self.status.value,
+            "started_at": self.started_at.isoformat(),
+            "time_limit": self.time_limit,
+            "test_id": str(self.test_id) if self.test_id else None,
+        })
+
+    @classmethod
+    def from_json(cls, value: str) -> "SubmissionState":
+        data = json.loads(value)
+        return cls(
+            student_id=UUID(data["student_id"]),
+            status=SubmissionStatus(data["status"]),
+            started_at=datetime.fromisoformat(data["started_at"]),
+            time_limit=data.get("time_limit"),
+            test_id=UUID(data["test_id"]) if data.get("test_id") else None,
+        )
+
+    def ttl(self) -> int:
+        deadline = self.deadline
+        if deadline is None:
+            return STATE_TTL_NO_LIMIT
+        remaining = (deadline - datetime.utcnow()).total_seconds()
+        return max(1, int(remaining) + STATE_TTL_AFTER_DEADLINE)
+
+
+def _key(submission_id: Any) -> str:
+    return f"{SUBMISSION_STATE_PREFIX}{submission_id}"
+
+
+async def cache_submission_state(submission: Submission) -> None:
+    """
+    Запись состояния попытки в кэш (только идущей; иначе запись сбрасывается).
+    submission.variant.test должен быть загружен.
+    """
+    state = SubmissionState.from_submission(submission)
+    if state.status != SubmissionStatus.IN_PROGRESS:
+        await invalidate_submission_state(submission.id)
+        return
+    try:
+        client = await get_redis_client()
+        await client.set(_key(submission.id), state.to_json(), ex=state.ttl())
+    except Exception as e:
+        logger.warning(f"Failed to cache state of submission {submission.id}: {e}")
+
+
+async def invalidate_submission_state(*submission_ids: Any) -> None:
+    if not submission_ids:
+        return
+    try:
+        client = await get_redis_client()
+        await client.delete(*[_key(submission_id) for submission_id in submission_ids])
+    except Exception as e:
+        logger.warning(f"Failed to invalidate submission state cache: {e}")
+
+
+async def get_submission_state(db: AsyncSession, submission_id: UUID) -> Optional[SubmissionState]:
+    """
+    Состояние попытки: из кэша, при промахе — из БД (идущая попытка кладётся в кэш).
+    None — попытка не найдена.
+    """
+    try:
+        client = await get_redis_client()
+        cached = await client.get(_key(submission_id))
+        if cached:
+            return SubmissionState.from_json(cached)
+    except Exception as e:
+        logger.warning(f"Submission state cache unavailable: {e}")
+
+    result = await db.execute(
+        select(Submission)
+        .options(selectinload(Submission.variant).selectinload(TestVariant.test))
+        .where(Submission.id == submission_id)
+    )
+    submission = result.scalar_one_or_none()
+    if submission is None:
+        return None
+    if submission.status == SubmissionStatus.IN_PROGRESS:
+        await cache_submission_state(submission)
+    return SubmissionState.from_submission(submission)
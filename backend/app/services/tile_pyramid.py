@@ -0,0 +1,188 @@
+"""
+Пирамида тайлов для больших изображений (в стиле DeepZoom)
+
+Изображение вопроса с аннотацией отдавалось студенту целиком (до
+MAX_IMAGE_DIMENSION px). Для изображений крупнее TILE_PYRAMID_MIN_DIMENSION
+после загрузки строится пирамида: уровень max_level — исходный размер, каждый
+следующий вниз вдвое меньше, уровень 0 — 1x1. Уровень режется на тайлы
+TILE_SIZE x TILE_SIZE без перекрытия:
+    tiles/{sha256}/{level}/{col}_{row}.{ext}
+    tiles/{sha256}/manifest.json
+
+Ключи строятся по sha256 содержимого: пирамида общая для одинаковых
+изображений и не меняется (Cache-Control: immutable, прямые ссылки на
+публичный bucket). Описание пирамиды хранится и в ImageAsset.tile_pyramid,
+чтобы эндпоинт не обращался к MinIO.
+"""
+
+import io
+import json
+import logging
+import math
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.storage import object_name_from_path, storage_service
+from app.models.question import ImageAsset
+from app.services.image_store import IMMUTABLE_CACHE_CONTROL, content_hash
+
+logger = logging.getLogger(__name__)
+
+TILES_PREFIX = "tiles/"
+UPLOAD_WINDOW_PER_WORKER = 2
+TILE_FORMATS = {"jpeg": ("JPEG", "jpg", "image/jpeg"), "webp": ("WEBP", "webp", "image/webp")}
+
+
+def needs_tile_pyramid(width: int, height: int) -> bool:
+    return (
+        settings.TILE_PYRAMID_ENABLED and max(width, height) > settings.TILE_PYRAMID_MIN_DIMENSION
+    )
+
+
+def pyramid_levels(width: int, height: int, tile_size: int) -> List[Dict[str, int]]:
+    """Размеры и сетка тайлов по уровням, от 0 (1x1) до max_level (исходный размер)"""
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    levels = []
+    for level in range(max_level + 1):
+        scale = 2 ** (max_level - level)
+        level_width = max(1, math.ceil(width / scale))
+        level_height = max(1, math.ceil(height / scale))
+        levels.append({
+            "level": level,
+            "width": level_width,
+            "height": level_height,
+            "columns": math.ceil(level_width / tile_size),
+            "rows": math.ceil(level_height / tile_size),
+        })
+    return levels
+
+
+def tile_prefix(digest: str) -> str:
+    return f"{TILES_PREFIX}{digest}/"
+
+
+def build_manifest(digest: str, width: int, height: int) -> Dict[str, Any]:
+    tile_size = settings.TILE_SIZE
+    _, ext, _ = TILE_FORMATS[settings.TILE_FORMAT]
+    levels = pyramid_levels(width, height, tile_size)
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "overlap": 0,
+        "format": ext,
+        "max_level": levels[-1]["level"],
+        "levels": levels,
+        "prefix": tile_prefix(digest),
+    }
+
+
+def render_tiles(img: Image.Image, manifest: Dict[str, Any]) -> Iterator[Tuple[str, bytes]]:
+    """
+    (имя объекта, тайл) от верхнего уровня к нижнему. Каждый уровень получается
+    уменьшением предыдущего вдвое — исходник масштабируется один раз на уровень.
+    """
+    pil_format, ext, _ = TILE_FORMATS[settings.TILE_FORMAT]
+    tile_size = manifest["tile_size"]
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    for level in reversed(manifest["levels"]):
+        if img.size != (level["width"], level["height"]):
+            img = img.resize((level["width"], level["height"]), Image.LANCZOS)
+        for row in range(level["rows"]):
+            for col in range(level["columns"]):
+                box = (
+                    col * tile_size,
+                    row * tile_size,
+                    min((col + 1) * tile_size, level["width"]),
+                    min((row + 1) * tile_size, level["height"]),
+                )
+                buffer = io.BytesIO()
+                img.crop(box).save(buffer, format=pil_format, quality=settings.TILE_QUALITY)
+                yield f"{manifest['prefix']}{level['level']}/{col}_{row}.{ext}", buffer.getvalue()
+
+
+def _put_immutable(object_name: str, data: bytes, content_type: str) -> None:
+    storage_service.upload_file(
+        io.BytesIO(data),
+        object_name,
+        content_type=content_type,
+        metadata={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+    )
+
+
+def store_tile_pyramid(content: bytes, digest: str) -> Dict[str, Any]:
+    """Построение и загрузка пирамиды (блокирующая, для Celery). Возвращает манифест."""
+    _, _, content_type = TILE_FORMATS[settings.TILE_FORMAT]
+    with Image.open(io.BytesIO(content)) as img:
+        manifest = build_manifest(digest, img.width, img.height)
+        # Тайлы рендерятся в этом потоке, загрузка — параллельно в пуле. В полёте
+        # не больше UPLOAD_WINDOW_PER_WORKER тайлов на поток: рендер ждёт загрузку,
+        # и в памяти не копится вся пирамида
+        window = settings.STORAGE_IO_WORKERS * UPLOAD_WINDOW_PER_WORKER
+        with ThreadPoolExecutor(max_workers=settings.STORAGE_IO_WORKERS) as executor:
+            uploads: Deque[Future] = deque()
+            for object_name, data in render_tiles(img, manifest):
+                if len(uploads) >= window:
+                    uploads.popleft().result()
+                uploads.append(executor.submit(_put_immutable, object_name, data, content_type))
+            for upload in uploads:
+                upload.result()
+
+    # Манифест — последним: его наличие означает, что пирамида загружена полностью
+    _put_immutable(
+        f"{manifest['prefix']}manifest.json",
+        json.dumps(manifest).encode(),
+        "application/json",
+    )
+    return manifest
+
+
+async def build_tile_pyramid(db: AsyncSession, image_id: UUID) -> Optional[Dict[str, Any]]:
+    """
+    Пирамида для ImageAsset (если её ещё нет). Для уже обработанного содержимого
+    манифест копируется с другой записи без повторного построения.
+    """
+    image = await db.get(ImageAsset, image_id)
+    if image is None or image.tile_pyramid or not needs_tile_pyramid(image.width, image.height):
+        return None
+
+    manifest = None
+    if image.content_hash:
+        manifest = await db.scalar(
+            select(ImageAsset.tile_pyramid)
+            .where(
+                ImageAsset.content_hash == image.content_hash,
+                ImageAsset.tile_pyramid != None,  # noqa: E711
+            )
+            .limit(1)
+        )
+    if manifest is None:
+        content = storage_service.download_file(object_name_from_path(image.storage_path))
+        manifest = store_tile_pyramid(content, image.content_hash or content_hash(content))
+
+    image.tile_pyramid = manifest
+    await db.commit()
+    return manifest
+
+
+def schedule_tile_pyramid(image_id: Any) -> None:
+    try:
+        from app.tasks.image_tasks import build_tile_pyramid_task
+        build_tile_pyramid_task.delay(str(image_id))
+    except Exception as e:
+        logger.error(f"Failed to schedule tile pyramid for image {image_id}: {e}")
+
+
+def tile_url_template(manifest: Dict[str, Any]) -> str:
+    """URL тайла с подстановками {level}, {col}, {row}"""
+    base = storage_service.public_url(manifest["prefix"])
+    return f"{base}{{level}}/{{col}}_{{row}}.{manifest['format']}"
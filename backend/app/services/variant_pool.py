@@ -0,0 +1,174 @@
+"""
+Пул заранее сгенерированных вариантов теста
+
+По умолчанию start_test генерирует вариант (случайный набор вопросов) в запросе
+студента. Для массового старта экзамена в settings теста задаётся
+    variant_pool_size   — сколько вариантов сгенерировать заранее (0 — пула нет);
+    variant_pool_reuse  — после расхода пула выдавать варианты по кругу.
+
+Пул создаётся фоновой задачей при публикации или по запросу преподавателя
+(fill_variant_pool). start_test забирает вариант одним
+UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING:
+сначала невыданные, в режиме reuse — затем давно выданные. Пока пул пуст,
+вариант генерируется как раньше, а пополнение ставится в очередь.
+"""
+
+import logging
+import secrets
+from datetime import datetime
+from typing import Any, List, Optional
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.redis import get_redis_client
+from app.models.test import Test, TestQuestion, TestVariant
+from app.services.question_pool import get_question_pool
+
+logger = logging.getLogger(__name__)
+
+VARIANT_POOL_SIZE_SETTING = "variant_pool_size"
+VARIANT_POOL_REUSE_SETTING = "variant_pool_reuse"
+MAX_VARIANT_POOL_SIZE = 2000
+# Пополнение пула одного теста ставится в очередь не чаще раза в минуту
+REFILL_LOCK_PREFIX = "variant_pool:refill:"
+REFILL_LOCK_TTL = 60
+
+
+def variant_pool_size(test_settings: Optional[dict]) -> int:
+    try:
+        size = int((test_settings or {}).get(VARIANT_POOL_SIZE_SETTING) or 0)
+    except (ValueError, TypeError):
+        return 0
+    return max(0, min(size, MAX_VARIANT_POOL_SIZE))
+
+
+def variant_pool_reuse(test_settings: Optional[dict]) -> bool:
+    return bool((test_settings or {}).get(VARIANT_POOL_REUSE_SETTING))
+
+
+async def _fixed_question_ids(db: AsyncSession, test_id: UUID) -> List[UUID]:
+    result = await db.execute(
+        select(TestQuestion.question_id)
+        .where(TestQuestion.test_id == test_id)
+        .order_by(TestQuestion.order)
+    )
+    return [r[0] for r in result.all()]
+
+
+async def variant_question_ids(db: AsyncSession, test: Test) -> List[UUID]:
+    """Фиксированные вопросы теста и вопросы, выбранные по структуре"""
+    fixed_question_ids = await _fixed_question_ids(db, test.id)
+    if not test.structure:
+        return fixed_question_ids
+    pool = await get_question_pool(db)
+    return fixed_question_ids + pool.sample(test.structure, exclude_ids=fixed_question_ids)
+
+
+async def claim_pooled_variant(
+    db: AsyncSession, test_id: UUID, reuse: bool = False
+) -> Optional[UUID]:
+    """
+    Выдача варианта из пула одним UPDATE (commit — на вызывающем).
+    None — свободных вариантов нет.
+    """
+    candidate = (
+        select(TestVariant.id)
+        .where(TestVariant.test_id == test_id, TestVariant.pooled == True)  # noqa: E712
+        .order_by(TestVariant.claimed_at.asc().nulls_first(), TestVariant.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if not reuse:
+        candidate = candidate.where(TestVariant.claimed_at == None)  # noqa: E711
+    result = await db.execute(
+        update(TestVariant)
+        .where(TestVariant.id == candidate.scalar_subquery())
+        .values(claimed_at=datetime.utcnow())
+        .returning(TestVariant.id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def fill_variant_pool(db: AsyncSession, test_id: UUID, size: Optional[int] = None) -> int:
+    """
+    Догенерация невыданных вариантов до size (по умолчанию — settings теста).
+    Варианты вставляются одной пачкой. Возвращает число созданных.
+    """
+    test = await db.get(Test, test_id)
+    if test is None:
+        return 0
+    target = variant_pool_size(
+        {VARIANT_POOL_SIZE_SETTING: size} if size is not None else test.settings
+    )
+
+    unused = await db.scalar(
+        select(func.count(TestVariant.id)).where(
+            TestVariant.test_id == test_id,
+            TestVariant.pooled == True,  # noqa: E712
+            TestVariant.claimed_at == None,  # noqa: E711
+        )
+    )
+    missing = target - (unused or 0)
+    if missing <= 0:
+        return 0
+
+    fixed_question_ids = await _fixed_question_ids(db, test_id)
+    pool = await get_question_pool(db) if test.structure else None
+    rows = []
+    for _ in range(missing):
+        question_ids = list(fixed_question_ids)
+        if pool is not None:
+            question_ids += pool.sample(test.structure, exclude_ids=fixed_question_ids)
+        if not question_ids:
+            return 0
+        rows.append({
+            "test_id": test_id,
+            "variant_code": secrets.token_urlsafe(8),
+            "question_order": [str(qid) for qid in question_ids],
+            "pooled": True,
+        })
+    await db.execute(insert(TestVariant), rows)
+    await db.commit()
+    return len(rows)
+
+
+async def retire_variant_pool(db: AsyncSession, test_id: UUID) -> None:
+    """
+    Пул устарел (изменены вопросы или структура, тест снят с публикации):
+    невыданные варианты удаляются, выданные остаются у своих попыток.
+    Commit — на вызывающем.
+    """
+    await db.execute(
+        delete(TestVariant).where(
+            TestVariant.test_id == test_id,
+            TestVariant.pooled == True,  # noqa: E712
+            TestVariant.claimed_at == None,  # noqa: E711
+        )
+    )
+    await db.execute(
+        update(TestVariant)
+        .where(TestVariant.test_id == test_id, TestVariant.pooled == True)  # noqa: E712
+        .values(pooled=False)
+    )
+
+
+def schedule_variant_pool_fill(test_id: Any, size: Optional[int] = None) -> None:
+    try:
+        from app.tasks.maintenance_tasks import fill_variant_pool_task
+        fill_variant_pool_task.delay(str(test_id), size)
+    except Exception as e:
+        logger.error(f"Failed to schedule variant pool fill for test {test_id}: {e}")
+
+
+async def request_pool_refill(test_id: Any) -> None:
+    """Пополнение опустевшего пула (одна задача на тест за REFILL_LOCK_TTL)"""
+    try:
+        client = await get_redis_client()
+        if not await client.set(f"{REFILL_LOCK_PREFIX}{test_id}", "1", nx=True, ex=REFILL_LOCK_TTL):
+            return
+    except Exception as e:
+        logger.warning(f"Variant pool refill lock unavailable: {e}")
+        return
+    schedule_variant_pool_fill(test_id)
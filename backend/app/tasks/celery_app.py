@@ -16,6 +16,7 @@ celery_app = Celery(
         "app.tasks.evaluation_tasks",
         "app.tasks.email_tasks",
         "app.tasks.maintenance_tasks",
+        "app.tasks.image_tasks",
     ]
 )
 
@@ -42,6 +43,18 @@ celery_app.conf.beat_schedule = {
         "task": "maintenance.rotate_audit_logs",
         "schedule": crontab(hour=3, minute=0),  # 3:00 AM daily
     },
+    "flush-llm-calls": {
+        "task": "maintenance.flush_llm_calls",
+        "schedule": 60.0,  # каждую минуту
+    },
+    "manage-submission-event-partitions-daily": {
+        "task": "maintenance.manage_submission_event_partitions",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "flush-submission-events": {
+        "task": "maintenance.flush_submission_events",
+        "schedule": 10.0,
+    },
 }
 
 # Routes для разных типов задач
@@ -50,7 +63,10 @@ celery_app.conf.task_routes = {
     "app.tasks.evaluation_tasks.evaluate_annotation_answer": {"queue": "celery"},
     "app.tasks.evaluation_tasks.evaluate_choice_answer": {"queue": "celery"},
     "app.tasks.evaluation_tasks.evaluate_submission": {"queue": "celery"},
+    "app.tasks.evaluation_tasks.evaluate_question_batch": {"queue": "celery"},
+    "app.tasks.evaluation_tasks.evaluate_pending_text_answers": {"queue": "celery"},
     "maintenance.*": {"queue": "celery"},
+    "images.*": {"queue": "celery"},
     # Email tasks use names declared via @task(name=...) — see app/tasks/email_tasks.py
     "email.*": {"queue": "email"},
 }
@@ -8,7 +8,7 @@ import json
 import os
 from uuid import UUID
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 
 import celery
 from sqlalchemy import select
@@ -17,14 +17,33 @@ from sqlalchemy.orm import selectinload
 
 from app.tasks.celery_app import celery_app
 from app.core.database import AsyncSessionLocal
+from app.core.redis import get_redis_client
 from app.models.submission import Submission, SubmissionStatus, Answer
 from app.models.question import Question, QuestionType
 from app.models.system_config import SystemConfig
-from app.models.audit import AuditLog
+from app.services.event_ingest import flush_events
+from app.services.focus_timeline import anticheat_fields, persist_focus_summary, question_summary
 from app.services.search_service import search_service
+from app.services.similarity_service import similarity_service
 
 logger = logging.getLogger(__name__)
 
+# session.info: {question_id: {answer_id}} ответов-пар для переоценки после commit
+PEER_RESCORE_KEY = "peer_rescore"
+
+# Текстовые ответы отправленных работ копятся по вопросу TEXT_BATCH_WINDOW_SECONDS
+# и оцениваются пакетами (evaluate_pending_text_answers): в конце экзамена один
+# запрос к LLM оценивает ответы нескольких студентов.
+#   grading:pending:{question_id}     set answer_id, ждущих оценки
+#   grading:scheduled:{question_id}   проход по вопросу уже запланирован
+TEXT_BATCH_PENDING_PREFIX = "grading:pending:"
+TEXT_BATCH_SCHEDULED_PREFIX = "grading:scheduled:"
+TEXT_BATCH_WINDOW_SECONDS = 5
+# Флаг истекает, если задача потерялась: следующая работа запланирует проход заново
+TEXT_BATCH_SCHEDULED_TTL = 300
+# Ответов за одну пакетную оценку (несколько запросов по batch_size)
+TEXT_BATCH_TASK_SIZE = 40
+
 
 class DatabaseTask(celery.Task):
     """
@@ -33,6 +52,139 @@ class DatabaseTask(celery.Task):
     def get_session(self) -> AsyncSession:
         return AsyncSessionLocal()
 
+def _store_text_evaluation(answer: Answer, evaluation_result: Dict[str, Any]) -> None:
+    """Сохранение результата LLM-оценки в ответе"""
+    answer.evaluation = {
+        "criteria_scores": evaluation_result.get("criteria_scores"),
+        "feedback": evaluation_result.get("feedback"),
+        "llm_provider": evaluation_result.get("provider"),
+        "pregrade_rule": evaluation_result.get("pregrade_rule"),
+        "integrity_score": evaluation_result.get("integrity_score"),
+        "integrity_feedback": evaluation_result.get("integrity_feedback"),
+        "ai_probability": evaluation_result.get("ai_probability"),
+        "plagiarism_found": evaluation_result.get("plagiarism_found"),
+        "peer_similarity": evaluation_result.get("peer_similarity"),
+        "penalty_note": evaluation_result.get("penalty_note"),
+        "llm_usage": evaluation_result.get("usage"),
+        "evaluated_at": datetime.utcnow().isoformat(),
+    }
+    answer.score = round(evaluation_result.get("total_score", 0))
+
+
+async def _index_submitted_answers(
+    session: AsyncSession, answers: List[Answer], student_id: UUID
+) -> None:
+    """
+    Подписи текстовых ответов с проверкой на плагиат — при отправке, до оценки:
+    работы, оцениваемые позже или параллельно, находят этот ответ независимо
+    от порядка оценки.
+    """
+    question_ids = {answer.question_id for answer in answers}
+    if not question_ids:
+        return
+    result = await session.execute(
+        select(Question.id).where(
+            Question.id.in_(question_ids),
+            Question.type == QuestionType.TEXT,
+            Question.plagiarism_check_enabled.is_(True)
+        )
+    )
+    checked = set(result.scalars().all())
+    try:
+        await asyncio.gather(*(
+            similarity_service.index_answer(
+                answer.question_id, answer.id, student_id, answer.student_answer
+            )
+            for answer in answers if answer.question_id in checked
+        ))
+    except Exception as e:
+        logger.warning(f"Failed to index answers for peer similarity: {e}")
+
+
+async def _peer_similarities(
+    session: AsyncSession, answers: List[Answer], threshold: float
+) -> List[float]:
+    """
+    Сходство ответов с ответами других студентов на тот же вопрос (MinHash/LSH).
+    Авторы ответов загружаются одним запросом, запросы к индексу идут параллельно.
+    Совпадения не ниже threshold записываются и в уже оценённые ответы-пары.
+    """
+    result = await session.execute(
+        select(Submission.id, Submission.student_id)
+        .where(Submission.id.in_({answer.submission_id for answer in answers}))
+    )
+    student_ids = dict(result.all())
+    matches = await asyncio.gather(*(
+        similarity_service.peer_matches(
+            answer.question_id, answer.id, student_ids.get(answer.submission_id),
+            answer.student_answer,
+        )
+        for answer in answers
+    ))
+    await _record_peer_hits(session, answers, matches, threshold)
+    return [peers[0][1] if peers else 0.0 for peers in matches]
+
+
+async def _record_peer_hits(
+    session: AsyncSession,
+    answers: List[Answer],
+    matches: List[List[Tuple[str, float]]],
+    threshold: float,
+) -> None:
+    """
+    Ответ, оценённый раньше своей копии, при оценке её не видел. Совпадение
+    записывается в его оценку, а сам он ставится в очередь на переоценку
+    (dispatch_peer_rescoring после commit) — штраф получают обе стороны.
+    """
+    evaluated_now = {answer.id for answer in answers}
+    hits: Dict[UUID, float] = {}
+    for peers in matches:
+        for peer_id, similarity in peers:
+            if similarity < threshold or UUID(peer_id) in evaluated_now:
+                continue
+            hits[UUID(peer_id)] = max(similarity, hits.get(UUID(peer_id), 0.0))
+    if not hits:
+        return
+
+    result = await session.execute(select(Answer).where(Answer.id.in_(hits)))
+    rescore = session.info.setdefault(PEER_RESCORE_KEY, {})
+    for peer in result.scalars().all():
+        evaluation = peer.evaluation or {}
+        # Ещё не оценённый ответ найдёт копию сам; уже отмеченный повторно не переоцениваем
+        if (
+            "evaluated_at" not in evaluation
+            or (evaluation.get("peer_similarity") or 0.0) >= threshold
+        ):
+            continue
+        peer.evaluation = {**evaluation, "peer_similarity": hits[peer.id]}
+        rescore.setdefault(str(peer.question_id), set()).add(str(peer.id))
+
+
+def dispatch_peer_rescoring(session: AsyncSession) -> None:
+    """Переоценка ответов-пар, найденных при оценке (вызывать после commit)"""
+    for question_id, answer_ids in session.info.pop(PEER_RESCORE_KEY, {}).items():
+        try:
+            evaluate_question_batch.delay(question_id, sorted(answer_ids))
+        except Exception as e:
+            logger.error(f"Failed to schedule peer rescoring for question {question_id}: {e}")
+
+
+async def _drain_submission_events() -> None:
+    """Перенос событий из очереди перед сохранением сводок (без гарантии)"""
+    try:
+        await flush_events(AsyncSessionLocal, wait=5.0)
+    except Exception as e:
+        logger.warning(f"Failed to drain submission events: {e}")
+
+
+async def _focus_summary(session: AsyncSession, submission: Submission) -> Dict[str, Any]:
+    """Сводка поведения попытки: сохранённая при отправке или собранная сейчас"""
+    if submission.focus_summary is None:
+        await _drain_submission_events()
+        await persist_focus_summary(session, submission)
+    return submission.focus_summary
+
+
 async def run_evaluate_text_answer(session: AsyncSession, answer_id: str) -> Dict[str, Any]:
     """Внутренняя логика оценки текста"""
     try:
@@ -52,53 +204,15 @@ async def run_evaluate_text_answer(session: AsyncSession, answer_id: str) -> Dic
         
         # 1. Сбор логов событий (если включено в вопросе)
         if question.event_log_check_enabled:
-            events_res = await session.execute(
-                select(AuditLog).where(
-                    AuditLog.resource_id == answer.submission_id,
-                    AuditLog.action.like("submission.%")
+            submission = await session.get(Submission, answer.submission_id)
+            focus_summary = await _focus_summary(session, submission)
+            anticheat_config.update(
+                anticheat_fields(
+                    question_summary(focus_summary, question.id),
+                    submission.started_at,
+                    submission.submitted_at,
                 )
             )
-            events = events_res.scalars().all()
-            # Фильтруем события, относящиеся к этому вопросу, если в деталях есть question_id
-            enhanced_log = []
-            away_time_total = 0
-            last_away_start = None
-            
-            # Сортируем события по времени для корректного расчета
-            sorted_events = sorted(events, key=lambda x: x.timestamp)
-            
-            # Определяем начало и конец работы над вопросом
-            q_start_time = sorted_events[0].timestamp if sorted_events else datetime.utcnow()
-            q_end_time = sorted_events[-1].timestamp if sorted_events else datetime.utcnow()
-            total_q_time = (q_end_time - q_start_time).total_seconds()
-            
-            for ev in sorted_events:
-                ev_q_id = (ev.details or {}).get("question_id")
-                if not ev_q_id or ev_q_id == str(question.id):
-                    action_type = ev.action.split('.')[-1]
-                    ev_time_str = ev.timestamp.strftime("%H:%M:%S")
-                    
-                    if action_type in ['tab_hidden', 'window_blur']:
-                        last_away_start = ev.timestamp
-                    elif action_type in ['tab_visible', 'window_focus'] and last_away_start:
-                        duration = (ev.timestamp - last_away_start).total_seconds()
-                        away_time_total += duration
-                        enhanced_log.append({
-                            "event": "away_from_tab",
-                            "duration": f"{round(duration, 1)}s",
-                            "at": ev_time_str
-                        })
-                        last_away_start = None
-                    elif action_type == 'paste_attempted':
-                        enhanced_log.append({
-                            "event": "paste_attempted",
-                            "at": ev_time_str
-                        })
-
-            anticheat_config["event_log"] = enhanced_log
-            anticheat_config["away_time_seconds"] = round(away_time_total, 1)
-            anticheat_config["total_time_seconds"] = round(max(1, total_q_time), 1)
-            anticheat_config["focus_time_seconds"] = round(max(0, total_q_time - away_time_total), 1)
 
         # 2. Проверка на плагиат (если включено в вопросе)
         if question.plagiarism_check_enabled:
@@ -111,6 +225,10 @@ async def run_evaluate_text_answer(session: AsyncSession, answer_id: str) -> Dic
             
             plagiarism_score = await search_service.check_plagiarism(answer.student_answer, config=search_config)
             anticheat_config["plagiarism_score"] = plagiarism_score
+            peer_scores = await _peer_similarities(
+                session, [answer], search_config.get("peer_similarity_threshold", 0.8)
+            )
+            anticheat_config["peer_similarity"] = peer_scores[0]
             
         # 3. Флаг проверки на ИИ (для передачи в LLM)
         if question.ai_check_enabled:
@@ -137,18 +255,7 @@ async def run_evaluate_text_answer(session: AsyncSession, answer_id: str) -> Dic
             config=llm_config
         )
         
-        answer.evaluation = {
-            "criteria_scores": evaluation_result.get("criteria_scores"),
-            "feedback": evaluation_result.get("feedback"),
-            "llm_provider": evaluation_result.get("provider"),
-            "integrity_score": evaluation_result.get("integrity_score"),
-            "integrity_feedback": evaluation_result.get("integrity_feedback"),
-            "ai_probability": evaluation_result.get("ai_probability"),
-            "plagiarism_found": evaluation_result.get("plagiarism_found"),
-            "penalty_note": evaluation_result.get("penalty_note"),
-            "evaluated_at": datetime.utcnow().isoformat(),
-        }
-        answer.score = round(evaluation_result.get("total_score", 0))
+        _store_text_evaluation(answer, evaluation_result)
         return {"answer_id": answer_id, "score": answer.score}
     except Exception as e:
         logger.exception(f"Error in run_evaluate_text_answer for {answer_id}")
@@ -164,6 +271,263 @@ async def run_evaluate_text_answer(session: AsyncSession, answer_id: str) -> Dic
             logger.error(f"Critical error updating failed answer state for {answer_id}: {e_inner}")
         raise e
 
+
+async def run_evaluate_text_answers_batch(
+    session: AsyncSession, question_id: str, answer_ids: List[str]
+) -> Dict[str, Any]:
+    """
+    Пакетная оценка текстовых ответов на один вопрос.
+
+    Журнал событий у каждого ответа свой, поэтому вопросы с проверкой поведения
+    оцениваются по одному. Плагиат проверяется для каждого ответа отдельно и
+    учитывается при расчёте штрафов.
+    """
+    result = await session.execute(select(Question).where(Question.id == UUID(question_id)))
+    question = result.scalar_one_or_none()
+    if not question or question.type != QuestionType.TEXT:
+        return {"error": "Text question not found"}
+
+    result = await session.execute(
+        select(Answer).where(
+            Answer.id.in_([UUID(a) for a in answer_ids]),
+            Answer.question_id == question.id
+        )
+    )
+    answers = result.scalars().all()
+
+    batched = not question.event_log_check_enabled
+    if batched:
+        await _evaluate_text_answers_together(session, question, answers)
+    else:
+        for answer in answers:
+            await run_evaluate_text_answer(session, str(answer.id))
+
+    await session.flush()
+    submission_ids = {answer.submission_id for answer in answers}
+    await _recalculate_completed_submissions(session, submission_ids)
+    await _complete_evaluated_submissions(session, submission_ids)
+    return {"question_id": question_id, "evaluated": len(answers), "batched": batched}
+
+
+async def _evaluate_text_answers_together(
+    session: AsyncSession, question: Question, answers: List[Answer]
+) -> None:
+    """Оценка ответов на вопрос без проверки поведения пакетными запросами к LLM"""
+    from app.services.llm_service import llm_service
+
+    result_cfg = await session.execute(
+        select(SystemConfig).where(SystemConfig.key == "llm_evaluation_params")
+    )
+    config_obj = result_cfg.scalar_one_or_none()
+    llm_config = (config_obj.value if config_obj else {}).copy()
+    if question.ai_check_enabled:
+        llm_config["ai_check_enabled"] = True
+
+    answer_configs = [{} for _ in answers]
+    if question.plagiarism_check_enabled:
+        # Параллельно: общий лимит запросов к Search API держит search_service
+        plagiarism_scores, peer_scores = await asyncio.gather(
+            asyncio.gather(*(
+                search_service.check_plagiarism(answer.student_answer, config=llm_config)
+                for answer in answers
+            )),
+            _peer_similarities(session, answers, llm_config.get("peer_similarity_threshold", 0.8)),
+        )
+        for answer_config, score, peer_score in zip(answer_configs, plagiarism_scores, peer_scores):
+            answer_config["plagiarism_score"] = score
+            answer_config["peer_similarity"] = peer_score
+
+    evaluation_results = await llm_service.evaluate_text_answers_batch(
+        question=question.content,
+        reference_answer=(
+            question.reference_data.get("reference_answer", "") if question.reference_data else ""
+        ),
+        student_answers=[answer.student_answer or "" for answer in answers],
+        criteria=question.scoring_criteria if question.scoring_criteria else None,
+        config=llm_config,
+        answer_configs=answer_configs
+    )
+    for answer, evaluation_result in zip(answers, evaluation_results):
+        _store_text_evaluation(answer, evaluation_result)
+
+
+def weighted_submission_result(
+    scored_answers: Iterable[Tuple[Optional[float], Optional[int]]],
+) -> Dict[str, Any]:
+    """
+    Итог работы по парам (балл ответа, сложность вопроса).
+
+    Коэффициенты сложности (Weight = 1.0 + (difficulty - 1) * 0.5)
+    1 -> 1.0, 2 -> 1.5, 3 -> 2.0, 4 -> 2.5, 5 -> 3.0
+    """
+    total_weighted_score = 0.0
+    max_weighted_possible = 0.0
+    for score, difficulty in scored_answers:
+        weight = 1.0 + ((difficulty or 1) - 1) * 0.5
+        total_weighted_score += (score or 0) * weight
+        max_weighted_possible += 100.0 * weight
+
+    percentage = (
+        (total_weighted_score / max_weighted_possible * 100) if max_weighted_possible > 0 else 0
+    )
+
+    if percentage >= 90: grade = "5"
+    elif percentage >= 75: grade = "4"
+    elif percentage >= 60: grade = "3"
+    else: grade = "2"
+
+    return {
+        "total_score": round(percentage),
+        "max_score": 100,
+        "percentage": round(percentage),
+        "grade": grade,
+        "weighted_details": {
+            "total_weighted": round(total_weighted_score),
+            "max_weighted": round(max_weighted_possible)
+        }
+    }
+
+
+async def _recalculate_completed_submissions(
+    session: AsyncSession, submission_ids: Set[UUID]
+) -> None:
+    """Пересчёт итогов уже завершённых работ после переоценки части ответов"""
+    if not submission_ids:
+        return
+    result = await session.execute(
+        select(Submission)
+        .options(selectinload(Submission.answers).selectinload(Answer.question))
+        .where(
+            Submission.id.in_(submission_ids),
+            Submission.status == SubmissionStatus.COMPLETED
+        )
+    )
+    for submission in result.scalars().all():
+        submission.result = {
+            **(submission.result or {}),
+            **weighted_submission_result(
+                (answer.score, answer.question.difficulty if answer.question else 1)
+                for answer in submission.answers
+            ),
+        }
+
+
+async def _complete_evaluated_submissions(session: AsyncSession, submission_ids: Set[UUID]) -> None:
+    """
+    Завершение работ, ждавших пакетной оценки текстовых ответов: итог считается,
+    когда оценены все текстовые ответы работы.
+    """
+    if not submission_ids:
+        return
+    # Блокировка строк работ: параллельные оценки разных вопросов одной работы
+    # проверяют готовность по очереди, и последняя видит оценки остальных
+    result = await session.execute(
+        select(Submission)
+        .options(selectinload(Submission.answers).selectinload(Answer.question))
+        .where(
+            Submission.id.in_(submission_ids),
+            Submission.status == SubmissionStatus.EVALUATING
+        )
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    for submission in result.scalars().all():
+        if any(
+            answer.evaluation is None
+            and answer.question is not None
+            and answer.question.type == QuestionType.TEXT
+            for answer in submission.answers
+        ):
+            continue
+        submission.result = weighted_submission_result(
+            (answer.score, answer.question.difficulty if answer.question else 1)
+            for answer in submission.answers
+        )
+        submission.status = SubmissionStatus.COMPLETED
+        submission.completed_at = datetime.utcnow()
+
+
+async def _queue_text_answers(deferred: Dict[str, List[str]]) -> Set[str]:
+    """
+    Постановка текстовых ответов в очередь пакетной оценки по вопросам.
+    Возвращает вопросы, поставленные успешно; ответы остальных оцениваются сразу.
+    """
+    queued: Set[str] = set()
+    try:
+        client = await get_redis_client()
+    except Exception as e:
+        logger.warning(f"Batch grading queue unavailable: {e}")
+        return queued
+
+    for question_id, answer_ids in deferred.items():
+        pending_key = f"{TEXT_BATCH_PENDING_PREFIX}{question_id}"
+        scheduled_key = f"{TEXT_BATCH_SCHEDULED_PREFIX}{question_id}"
+        try:
+            await client.sadd(pending_key, *answer_ids)
+            if await client.set(scheduled_key, "1", nx=True, ex=TEXT_BATCH_SCHEDULED_TTL):
+                evaluate_pending_text_answers.apply_async(
+                    (question_id,), countdown=TEXT_BATCH_WINDOW_SECONDS
+                )
+            queued.add(question_id)
+        except Exception as e:
+            logger.warning(
+                f"Failed to queue answers of question {question_id} for batch grading: {e}"
+            )
+            try:
+                await client.srem(pending_key, *answer_ids)
+                await client.delete(scheduled_key)
+            except Exception:  # nosec B110
+                pass
+    return queued
+
+
+async def run_evaluate_pending_text_answers(session_factory, question_id: str) -> int:
+    """
+    Пакетная оценка накопленных ответов на вопрос. Возвращает число оценённых ответов.
+    """
+    client = await get_redis_client()
+    # Ответы, поставленные после этого момента, запланируют следующий проход
+    await client.delete(f"{TEXT_BATCH_SCHEDULED_PREFIX}{question_id}")
+
+    evaluated = 0
+    while True:
+        answer_ids = await client.spop(
+            f"{TEXT_BATCH_PENDING_PREFIX}{question_id}", TEXT_BATCH_TASK_SIZE
+        )
+        if not answer_ids:
+            break
+        async with session_factory() as session:
+            try:
+                await run_evaluate_text_answers_batch(session, question_id, answer_ids)
+                await session.commit()
+            except Exception:
+                logger.exception(
+                    f"Batch grading of question {question_id} failed, grading answers one by one"
+                )
+                await session.rollback()
+                await _evaluate_text_answers_one_by_one(session, answer_ids)
+            dispatch_peer_rescoring(session)
+        evaluated += len(answer_ids)
+    return evaluated
+
+
+async def _evaluate_text_answers_one_by_one(session: AsyncSession, answer_ids: List[str]) -> None:
+    """Запасной путь: по одному (ошибка ответа сохраняется в его evaluation), затем итоги работ"""
+    for answer_id in answer_ids:
+        try:
+            await run_evaluate_text_answer(session, answer_id)
+            await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to evaluate answer {answer_id}: {e}")
+    result = await session.execute(
+        select(Answer.submission_id).where(
+            Answer.id.in_([UUID(answer_id) for answer_id in answer_ids])
+        )
+    )
+    await _complete_evaluated_submissions(session, set(result.scalars().all()))
+    await session.commit()
+
+
 async def run_evaluate_annotation_answer(session: AsyncSession, answer_id: str) -> Dict[str, Any]:
     """Внутренняя логика оценки аннотации"""
     result = await session.execute(
@@ -286,12 +650,50 @@ def evaluate_text_answer(self, answer_id: str):
             try:
                 res = await run_evaluate_text_answer(session, answer_id)
                 await session.commit()
+                dispatch_peer_rescoring(session)
                 return res
             except Exception as e:
                 logger.exception(f"Error evaluating text answer {answer_id}")
                 return {"error": str(e)}
     return run_async(_run())
 
+
+@celery_app.task(
+    bind=True, base=DatabaseTask, name="app.tasks.evaluation_tasks.evaluate_question_batch"
+)
+def evaluate_question_batch(self, question_id: str, answer_ids: List[str]):
+    """
+    Пакетная (пере)оценка ответов на один текстовый вопрос
+    """
+    async def _run():
+        async with self.get_session() as session:
+            try:
+                res = await run_evaluate_text_answers_batch(session, question_id, answer_ids)
+                await session.commit()
+                dispatch_peer_rescoring(session)
+                return res
+            except Exception as e:
+                logger.exception(f"Error in batch evaluation of question {question_id}")
+                return {"error": str(e)}
+    return run_async(_run())
+
+
+@celery_app.task(
+    bind=True, base=DatabaseTask, name="app.tasks.evaluation_tasks.evaluate_pending_text_answers"
+)
+def evaluate_pending_text_answers(self, question_id: str):
+    """
+    Пакетная оценка текстовых ответов отправленных работ, накопленных по вопросу
+    """
+    async def _run():
+        try:
+            evaluated = await run_evaluate_pending_text_answers(self.get_session, question_id)
+            return {"question_id": question_id, "evaluated": evaluated}
+        except Exception as e:
+            logger.exception(f"Error in pending batch grading of question {question_id}")
+            return {"error": str(e)}
+    return run_async(_run())
+
 @celery_app.task(bind=True, base=DatabaseTask, name="app.tasks.evaluation_tasks.evaluate_annotation_answer")
 def evaluate_annotation_answer(self, answer_id: str):
     async def _run():
@@ -343,14 +745,26 @@ def evaluate_submission(self, submission_id: str):
                 submission = result.scalar_one_or_none()
                 if not submission:
                     return {"error": "Submission not found"}
-                
+
+                # Сводки поведения фиксируются при отправке, до оценки ответов
+                try:
+                    await _focus_summary(session, submission)
+                except Exception as e:
+                    logger.warning(
+                        f"Failed to persist focus summary of submission {submission_id}: {e}"
+                    )
+
                 result = await session.execute(
                     select(Answer).where(Answer.submission_id == submission.id)
                 )
                 answers = result.scalars().all()
+                await _index_submitted_answers(session, answers, submission.student_id)
                 
                 # Сбор сложностей для итогового расчета
                 answer_difficulties = {}
+                # Текстовые ответы без проверки поведения оцениваются пакетами с ответами
+                # других работ на тот же вопрос: {question_id: [answer_id]}
+                deferred: Dict[str, List[str]] = {}
                 
                 for i, answer in enumerate(answers):
                     result_q = await session.execute(
@@ -366,7 +780,12 @@ def evaluate_submission(self, submission_id: str):
                         
                         answer_difficulties[answer.id] = question.difficulty or 1
 
-                        if question.type == QuestionType.TEXT:
+                        if (
+                            question.type == QuestionType.TEXT
+                            and not question.event_log_check_enabled
+                        ):
+                            deferred.setdefault(str(question.id), []).append(str(answer.id))
+                        elif question.type == QuestionType.TEXT:
                             await run_evaluate_text_answer(session, str(answer.id))
                         elif question.type == QuestionType.IMAGE_ANNOTATION:
                             await run_evaluate_annotation_answer(session, str(answer.id))
@@ -381,46 +800,45 @@ def evaluate_submission(self, submission_id: str):
                 # ВАЖНО: Делаем flush, чтобы все изменения в ответах были отправлены в БД
                 # и перечитываем ответы, чтобы получить обновленные баллы
                 await session.flush()
-                
+
+                if deferred:
+                    # Оценки остальных ответов фиксируются до постановки в очередь
+                    await session.commit()
+                    dispatch_peer_rescoring(session)
+                    queued = await _queue_text_answers(deferred)
+                    for question_id, answer_ids in deferred.items():
+                        if question_id in queued:
+                            continue
+                        for answer_id in answer_ids:
+                            try:
+                                await run_evaluate_text_answer(session, answer_id)
+                            except Exception as e:
+                                logger.error(f"Failed to evaluate answer {answer_id}: {e}")
+                    await session.flush()
+                    # Работу завершает тот, кто оценит её последние ответы:
+                    # здесь или пакетная оценка
+                    await _complete_evaluated_submissions(session, {submission.id})
+                    await session.commit()
+                    dispatch_peer_rescoring(session)
+                    return {
+                        "submission_id": submission_id,
+                        "result": submission.result,
+                        "queued": sorted(queued),
+                    }
+
                 result = await session.execute(
                     select(Answer).where(Answer.submission_id == submission.id)
                 )
                 answers = result.scalars().all()
                 
-                total_weighted_score = 0.0
-                max_weighted_possible = 0.0
-                
-                # Коэффициенты сложности (Weight = 1.0 + (difficulty - 1) * 0.5)
-                # 1 -> 1.0, 2 -> 1.5, 3 -> 2.0, 4 -> 2.5, 5 -> 3.0
-                
-                for answer in answers:
-                    difficulty = answer_difficulties.get(answer.id, 1)
-                    weight = 1.0 + (difficulty - 1) * 0.5
-                    
-                    total_weighted_score += (answer.score or 0) * weight
-                    max_weighted_possible += 100.0 * weight
-                
-                percentage = (total_weighted_score / max_weighted_possible * 100) if max_weighted_possible > 0 else 0
-                
-                if percentage >= 90: grade = "5"
-                elif percentage >= 75: grade = "4"
-                elif percentage >= 60: grade = "3"
-                else: grade = "2"
-                
-                submission.result = {
-                    "total_score": round(percentage),
-                    "max_score": 100,
-                    "percentage": round(percentage),
-                    "grade": grade,
-                    "weighted_details": {
-                        "total_weighted": round(total_weighted_score),
-                        "max_weighted": round(max_weighted_possible)
-                    }
-                }
+                submission.result = weighted_submission_result(
+                    (answer.score, answer_difficulties.get(answer.id, 1)) for answer in answers
+                )
                 submission.status = SubmissionStatus.COMPLETED
                 submission.completed_at = datetime.utcnow()
                 
                 await session.commit()
+                dispatch_peer_rescoring(session)
                 
                 return {"submission_id": submission_id, "result": submission.result}
             
@@ -0,0 +1,44 @@
+"""
+Tasks для обработки загруженных изображений
+"""
+
+import logging
+from uuid import UUID
+
+from app.core.database import AsyncSessionLocal
+from app.services.renditions import build_image_renditions
+from app.services.tile_pyramid import build_tile_pyramid
+from app.tasks.celery_app import celery_app
+from app.tasks.maintenance_tasks import run_async
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="images.build_tile_pyramid")
+def build_tile_pyramid_task(image_id: str):
+    """
+    Строит пирамиду тайлов изображения и сохраняет манифест в ImageAsset.
+    """
+    async def _build():
+        async with AsyncSessionLocal() as db:
+            manifest = await build_tile_pyramid(db, UUID(image_id))
+        if manifest:
+            logger.info(
+                f"Built tile pyramid for image {image_id} ({manifest['max_level'] + 1} levels)"
+            )
+
+    run_async(_build())
+
+
+@celery_app.task(name="images.build_renditions")
+def build_renditions_task(image_id: str):
+    """
+    Строит уменьшенные копии изображения (thumb, preview) для списков.
+    """
+    async def _build():
+        async with AsyncSessionLocal() as db:
+            renditions = await build_image_renditions(db, UUID(image_id))
+        if renditions:
+            logger.info(f"Built renditions for image {image_id}: {', '.join(renditions)}")
+
+    run_async(_build())
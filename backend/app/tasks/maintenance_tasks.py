@@ -4,17 +4,27 @@ Maintenance tasks for system cleanup and rotation.
 
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
+from uuid import UUID
 
-from sqlalchemy import delete
+from sqlalchemy import delete, text
 
 from app.core.config import settings
 from app.core.database import AsyncSessionLocal
 from app.models.audit import AuditLog
+from app.services.event_ingest import flush_events
+from app.services.image_store import rekey_image_assets
+from app.services.renditions import backfill_renditions
+from app.services.llm_usage import flush_calls
+from app.services.variant_pool import fill_variant_pool
 from app.tasks.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
+# Месячных секций submission_events, создаваемых заранее
+SUBMISSION_EVENT_PARTITIONS_AHEAD = 2
+
 def run_async(coro):
     """Helper to run async code in sync context (Celery worker)."""
     try:
@@ -57,3 +67,147 @@ def rotate_audit_logs_task():
                 raise e
 
     run_async(_rotate())
+
+
+@celery_app.task(name="maintenance.flush_llm_calls")
+def flush_llm_calls_task():
+    """
+    Переносит учёт вызовов LLM из Redis stream в таблицу llm_calls пачками
+    (см. app.services.llm_usage.flush_calls).
+    """
+    async def _flush():
+        flushed = await flush_calls(AsyncSessionLocal)
+        if flushed:
+            logger.info(f"Flushed {flushed} LLM call records to llm_calls")
+
+    run_async(_flush())
+
+
+@celery_app.task(name="maintenance.fill_variant_pool")
+def fill_variant_pool_task(test_id: str, size: Optional[int] = None):
+    """
+    Генерирует пул вариантов теста (невыданных — до size или settings.variant_pool_size).
+    """
+    async def _fill():
+        async with AsyncSessionLocal() as db:
+            created = await fill_variant_pool(db, UUID(test_id), size)
+        if created:
+            logger.info(f"Generated {created} pooled variants for test {test_id}")
+
+    run_async(_fill())
+
+
+@celery_app.task(name="maintenance.rekey_image_objects")
+def rekey_image_objects_task(batch_size: int = 100):
+    """
+    Переносит изображения, загруженные под случайными именами, на ключи sha256
+    (запускается вручную после обновления; повторный запуск безопасен).
+    """
+    async def _rekey():
+        total = 0
+        after_id = None
+        while True:
+            async with AsyncSessionLocal() as db:
+                moved, after_id = await rekey_image_assets(db, after_id, batch_size)
+            if after_id is None:
+                break
+            total += moved
+        logger.info(f"Re-keyed {total} image objects to content addresses")
+
+    run_async(_rekey())
+
+
+@celery_app.task(name="maintenance.backfill_image_renditions")
+def backfill_image_renditions_task(batch_size: int = 50):
+    """
+    Строит уменьшенные копии для изображений, загруженных до их появления
+    (запускается вручную; повторный запуск безопасен).
+    """
+    async def _backfill():
+        total = 0
+        after_id = None
+        while True:
+            async with AsyncSessionLocal() as db:
+                built, after_id = await backfill_renditions(db, after_id, batch_size)
+            if after_id is None:
+                break
+            total += built
+        logger.info(f"Built renditions for {total} images")
+
+    run_async(_backfill())
+
+
+@celery_app.task(name="maintenance.flush_submission_events")
+def flush_submission_events_task():
+    """
+    Переносит события прохождения тестов из Redis stream в submission_events пачками.
+    """
+    run_async(flush_events(AsyncSessionLocal))
+
+
+def _add_months(month_start: date, months: int) -> date:
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def submission_event_partition_name(month_start: date) -> str:
+    return f"submission_events_{month_start:%Y_%m}"
+
+
+def expired_submission_event_partitions(names, cutoff: date):
+    """Месячные секции, целиком лежащие раньше cutoff (секция по умолчанию не трогается)"""
+    expired = []
+    for name in names:
+        try:
+            month_start = datetime.strptime(name, "submission_events_%Y_%m").date()
+        except ValueError:
+            continue
+        if _add_months(month_start, 1) <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+@celery_app.task(name="maintenance.manage_submission_event_partitions")
+def manage_submission_event_partitions_task():
+    """
+    Создаёт месячные секции submission_events на SUBMISSION_EVENT_PARTITIONS_AHEAD месяцев
+    вперёд и удаляет секции старше settings.AUDIT_LOG_RETENTION_DAYS (DROP вместо DELETE).
+    """
+    async def _manage():
+        today = datetime.utcnow().date()
+        current = today.replace(day=1)
+        cutoff = today - timedelta(days=settings.AUDIT_LOG_RETENTION_DAYS)
+
+        async with AsyncSessionLocal() as db:
+            try:
+                for offset in range(SUBMISSION_EVENT_PARTITIONS_AHEAD + 1):
+                    month_start = _add_months(current, offset)
+                    month_end = _add_months(month_start, 1)
+                    await db.execute(
+                        text(
+                            f"CREATE TABLE IF NOT EXISTS "
+                            f"{submission_event_partition_name(month_start)} "
+                            f"PARTITION OF submission_events "
+                            f"FOR VALUES FROM ('{month_start.isoformat()}') "
+                            f"TO ('{month_end.isoformat()}')"
+                        )
+                    )
+
+                result = await db.execute(text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = 'submission_events'::regclass"
+                ))
+                expired = expired_submission_event_partitions(result.scalars().all(), cutoff)
+                for name in expired:
+                    await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Failed to manage submission_events partitions: {e}")
+                raise e
+
+        if expired:
+            logger.info(f"Dropped expired submission_events partitions: {', '.join(expired)}")
+
+    run_async(_manage())
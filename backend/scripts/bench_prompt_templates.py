@@ -0,0 +1,85 @@
+"""
+Micro-benchmark сборки промпта оценки: компиляция на каждый ответ vs кэшированный план.
+
+Usage:
+    python scripts/bench_prompt_templates.py
+    python scripts/bench_prompt_templates.py --config ../llm_config.json --number 20000
+
+Промпты берутся из выгрузки llm_evaluation_params (llm_config.json в корне проекта),
+если файл найден; иначе используется промпт по умолчанию.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.prompt_templates import PromptTemplateCache, build_prompt_plan  # noqa: E402
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+
+def _load_config(path: Path) -> dict:
+    config = {}
+    if path.exists():
+        config = json.loads(path.read_text(encoding="utf-8"))
+    config.update({
+        "ai_check_enabled": True,
+        "event_log": [{"event": "away_from_tab", "duration": "4.2s", "at": "10:15:03"}],
+    })
+    return config
+
+
+def _variables() -> dict:
+    variables = {
+        "question": "Опишите патогенез сахарного диабета 1 типа.",
+        "reference_answer": "Аутоиммунное разрушение бета-клеток поджелудочной железы ... " * 5,
+        "student_answer": "Происходит разрушение бета-клеток, что приводит к дефициту инсулина ... " * 5,
+        "criteria_text": "\n".join(f"- {k}: 0-{v} баллов" for k, v in CRITERIA.items()),
+        "event_log": '[{"event": "away_from_tab", "duration": "4.2s"}]',
+        "away_time_seconds": 4.2,
+        "total_time_seconds": 180.0,
+        "focus_time_seconds": 175.8,
+    }
+    variables.update({f"max_{k}": v for k, v in CRITERIA.items()})
+    variables.update({"max_factual": 40})
+    return variables
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=str(Path(__file__).resolve().parents[2] / "llm_config.json"))
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    config = _load_config(Path(args.config))
+    variables = _variables()
+    keys = tuple(CRITERIA.keys())
+    cache = PromptTemplateCache()
+
+    def uncached():
+        return build_prompt_plan(config, keys).render(variables)
+
+    def cached():
+        return cache.get_plan(config, keys).render(variables)
+
+    assert uncached() == cached()
+
+    prompt_len = len(config.get("evaluation_prompt") or "")
+    print(f"evaluation_prompt: {prompt_len} chars, iterations: {args.number}")
+    results = {}
+    for name, fn in (("compile per answer", uncached), ("cached plan", cached)):
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        results[name] = best / args.number * 1e6
+        print(f"  {name:<20} {results[name]:8.2f} us/answer")
+    print(f"  speedup: x{results['compile per answer'] / results['cached plan']:.1f} "
+          f"(cache hits={cache.hits}, misses={cache.misses})")
+
+
+if __name__ == "__main__":
+    main()
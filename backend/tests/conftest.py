@@ -6,11 +6,13 @@ import asyncio
 import uuid
 from typing import AsyncGenerator
 
+import fakeredis.aioredis
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
 
+from app.core import redis as redis_module
 from app.core.config import settings
 from app.core.database import Base, get_db
 from app.main import app
@@ -157,3 +159,14 @@ async def admin_token(test_admin: User) -> str:
 async def teacher_token(test_teacher: User) -> str:
     from app.core.security import create_access_token
     return create_access_token(str(test_teacher.id), additional_claims={"role": test_teacher.role})
+
+
+@pytest.fixture(scope="function")
+def fake_redis(monkeypatch):
+    """
+    fakeredis вместо Redis. Клиент подставляется в app.core.redis, поэтому его
+    получает любой модуль, вызывающий get_redis_client; у каждого теста свой сервер.
+    """
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setattr(redis_module, "_redis_client", client)
+    return client
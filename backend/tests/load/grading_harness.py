@@ -0,0 +1,319 @@
+"""
+Сквозной прогон оценки (evaluate_submission) против offline-заглушки LLM.
+
+Создаёт в БД синтетические сдачи с текстовыми ответами, временно направляет
+llm_evaluation_params на заглушку, оценивает сдачи в N процессах (как prefork-воркеры
+Celery) и печатает пропускную способность в ответах в минуту. После прогона
+созданные записи удаляются, а исходный llm_evaluation_params восстанавливается.
+
+Запускать на dev-БД (docker compose up db redis), сеть не нужна:
+    python tests/load/llm_stub_server.py --port 8090 --latency lognormal:-0.5,0.5 &
+    python tests/load/grading_harness.py --stub-url http://127.0.0.1:8090 \
+        --provider deepseek --submissions 40 --answers 5 --workers 4
+
+    # Потоковый режим и проверка анти-чита
+    python tests/load/grading_harness.py --provider yandex --stream --ai-check
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+PROVIDERS = ("yandex", "deepseek", "qwen", "gigachat", "local", "hybrid")
+
+ANSWERS = [
+    "Инсулинзависимый диабет развивается вследствие аутоиммунного разрушения бета-клеток.",
+    "Происходит дефицит инсулина, гипергликемия, глюкозурия и полиурия, затем кетоацидоз. " * 3,
+    "Не знаю.",
+    "Основное звено — Т-клеточная деструкция островков Лангерганса; антитела к GAD и ICA "
+    "служат маркерами. Абсолютная инсулиновая недостаточность ведёт к нарушению всех видов обмена. " * 5,
+]
+
+
+def _stub_environment(stub_url: str) -> Dict[str, str]:
+    base = stub_url.rstrip("/")
+    return {
+        "YANDEX_LLM_URL": f"{base}/foundationModels/v1/completion",
+        "DEEPSEEK_BASE_URL": f"{base}/v1",
+        "QWEN_BASE_URL": f"{base}/v1",
+        "GIGACHAT_AUTH_URL": f"{base}/api/v2/oauth",
+        "GIGACHAT_API_URL": f"{base}/api/v1",
+    }
+
+
+def _stub_llm_config(base: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    config = dict(base)
+    config.update({
+        "strategy": args.provider,
+        "stream_enabled": args.stream,
+        "yandex_api_key": "stub-key",
+        "yandex_folder_id": "stub-folder",
+        "deepseek_api_key": "stub-key",
+        "qwen_api_key": "stub-key",
+        "gigachat_credentials": "c3R1YjpzdHVi",
+        "local_llm_url": f"{args.stub_url.rstrip('/')}/v1",
+    })
+    return config
+
+
+async def _seed(args: argparse.Namespace, run_tag: str) -> Dict[str, List[Any]]:
+    from app.core.database import AsyncSessionLocal
+    from app.models.question import Question, QuestionType
+    from app.models.submission import Answer, Submission, SubmissionStatus
+    from app.models.test import Test, TestStatus, TestVariant
+    from app.models.user import Role, User
+
+    created: Dict[str, List[Any]] = {"users": [], "questions": [], "tests": [], "submissions": []}
+    async with AsyncSessionLocal() as session:
+        teacher = User(
+            email=f"harness_{run_tag}_teacher@example.com", password_hash="!",
+            last_name="Harness", first_name="Teacher", role=Role.TEACHER,
+        )
+        session.add(teacher)
+        await session.flush()
+        created["users"].append(teacher.id)
+
+        questions = []
+        for i in range(args.answers):
+            question = Question(
+                author_id=teacher.id,
+                type=QuestionType.TEXT,
+                content=f"Вопрос {i + 1}: опишите патогенез сахарного диабета 1 типа.",
+                reference_data={"reference_answer": ANSWERS[-1]},
+                difficulty=1 + i % 3,
+                ai_check_enabled=args.ai_check,
+            )
+            session.add(question)
+            questions.append(question)
+        await session.flush()
+        created["questions"] = [q.id for q in questions]
+
+        test = Test(author_id=teacher.id, title=f"Harness {run_tag}", status=TestStatus.PUBLISHED, settings={})
+        session.add(test)
+        await session.flush()
+        created["tests"].append(test.id)
+
+        variant = TestVariant(
+            test_id=test.id,
+            variant_code=f"H{run_tag}"[:50],
+            question_order=[str(q.id) for q in questions],
+        )
+        session.add(variant)
+        await session.flush()
+
+        for n in range(args.submissions):
+            student = User(
+                email=f"harness_{run_tag}_{n}@example.com", password_hash="!",
+                last_name="Harness", first_name=f"Student{n}", role=Role.STUDENT,
+            )
+            session.add(student)
+            await session.flush()
+            created["users"].append(student.id)
+
+            submission = Submission(
+                student_id=student.id, variant_id=variant.id,
+                status=SubmissionStatus.EVALUATING, submitted_at=datetime.utcnow(),
+            )
+            session.add(submission)
+            await session.flush()
+            created["submissions"].append(submission.id)
+
+            for i, question in enumerate(questions):
+                session.add(Answer(
+                    submission_id=submission.id, question_id=question.id,
+                    student_answer=ANSWERS[(n + i) % len(ANSWERS)],
+                ))
+        await session.commit()
+    return created
+
+
+async def _swap_llm_config(args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    """Подмена llm_evaluation_params; возвращает прежнее значение (None — записи не было)"""
+    from sqlalchemy import select
+
+    from app.core.database import AsyncSessionLocal
+    from app.models.system_config import SystemConfig
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(SystemConfig).where(SystemConfig.key == "llm_evaluation_params"))
+        config_obj = result.scalar_one_or_none()
+        previous = dict(config_obj.value) if config_obj else None
+
+        base = previous or {}
+        if args.config:
+            base = json.loads(Path(args.config).read_text(encoding="utf-8"))
+        value = _stub_llm_config(base, args)
+
+        if config_obj:
+            config_obj.value = value
+        else:
+            session.add(SystemConfig(key="llm_evaluation_params", value=value, description="grading harness"))
+        await session.commit()
+    return previous
+
+
+async def _restore_llm_config(previous: Optional[Dict[str, Any]]) -> None:
+    from sqlalchemy import delete, select
+
+    from app.core.database import AsyncSessionLocal
+    from app.models.system_config import SystemConfig
+
+    async with AsyncSessionLocal() as session:
+        if previous is None:
+            await session.execute(delete(SystemConfig).where(SystemConfig.key == "llm_evaluation_params"))
+        else:
+            result = await session.execute(select(SystemConfig).where(SystemConfig.key == "llm_evaluation_params"))
+            result.scalar_one().value = previous
+        await session.commit()
+
+
+async def _collect(created: Dict[str, List[Any]]) -> Dict[str, int]:
+    from sqlalchemy import select
+
+    from app.core.database import AsyncSessionLocal
+    from app.models.submission import Answer
+
+    counts = {"answers": 0, "errors": 0, "fallbacks": 0}
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Answer).where(Answer.submission_id.in_(created["submissions"])))
+        for answer in result.scalars():
+            counts["answers"] += 1
+            evaluation = answer.evaluation or {}
+            feedback = evaluation.get("feedback") or ""
+            if evaluation.get("error") or "недоступен" in feedback or "Error" in feedback:
+                counts["errors"] += 1
+            elif "(Fallback)" in (evaluation.get("llm_provider") or ""):
+                counts["fallbacks"] += 1
+    return counts
+
+
+async def _cleanup(created: Dict[str, List[Any]]) -> None:
+    from sqlalchemy import delete
+
+    from app.core.database import AsyncSessionLocal
+    from app.models.question import Question
+    from app.models.submission import Answer, Submission
+    from app.models.test import Test, TestVariant
+    from app.models.user import User
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Answer).where(Answer.submission_id.in_(created["submissions"])))
+        await session.execute(delete(Submission).where(Submission.id.in_(created["submissions"])))
+        await session.execute(delete(TestVariant).where(TestVariant.test_id.in_(created["tests"])))
+        await session.execute(delete(Test).where(Test.id.in_(created["tests"])))
+        await session.execute(delete(Question).where(Question.id.in_(created["questions"])))
+        await session.execute(delete(User).where(User.id.in_(created["users"])))
+        await session.commit()
+
+
+def _init_worker() -> None:
+    # SQL echo в development зашумляет вывод и искажает замер
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    logging.getLogger("sqlalchemy.engine.Engine").setLevel(logging.WARNING)
+
+
+def _evaluate_one(submission_id: str) -> Tuple[str, float, Optional[str]]:
+    from app.tasks.evaluation_tasks import evaluate_submission
+
+    started = time.perf_counter()
+    result = evaluate_submission.apply(args=[submission_id]).get()
+    error = result.get("error") if isinstance(result, dict) else None
+    return submission_id, time.perf_counter() - started, error
+
+
+def _fetch_stub_stats(stub_url: str) -> Dict[str, int]:
+    import httpx
+
+    try:
+        return httpx.get(f"{stub_url.rstrip('/')}/stats", timeout=5.0).json()
+    except Exception:
+        return {}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8090")
+    parser.add_argument("--provider", choices=PROVIDERS, default="deepseek")
+    parser.add_argument("--submissions", type=int, default=20)
+    parser.add_argument("--answers", type=int, default=5, help="текстовых ответов в сдаче")
+    parser.add_argument("--workers", type=int, default=4, help="параллельных процессов оценки")
+    parser.add_argument("--stream", action="store_true", help="stream_enabled в настройках LLM")
+    parser.add_argument("--ai-check", action="store_true", help="включить проверку на ИИ в вопросах")
+    parser.add_argument("--config", help="JSON с llm_evaluation_params (например, ../llm_config.json)")
+    parser.add_argument("--keep", action="store_true", help="не удалять созданные записи")
+    args = parser.parse_args()
+
+    # До импорта app: воркеры (spawn) унаследуют адреса заглушки
+    os.environ.update(_stub_environment(args.stub_url))
+    _init_worker()
+
+    durations: List[float] = []
+    failed: List[str] = []
+
+    def evaluate_all(submission_ids: List[str]) -> None:
+        with ProcessPoolExecutor(args.workers, mp_context=get_context("spawn"), initializer=_init_worker) as pool:
+            for submission_id, duration, error in pool.map(_evaluate_one, submission_ids):
+                durations.append(duration)
+                if error:
+                    failed.append(f"{submission_id}: {error}")
+
+    async def run() -> Tuple[float, Dict[str, int], Dict[str, int]]:
+        # Все обращения к БД из родительского процесса — в одном event loop (пул asyncpg привязан к loop)
+        created = await _seed(args, secrets.token_hex(4))
+        previous = await _swap_llm_config(args)
+        stats_before = _fetch_stub_stats(args.stub_url)
+        try:
+            started = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(
+                None, evaluate_all, [str(s) for s in created["submissions"]]
+            )
+            wall = time.perf_counter() - started
+            counts = await _collect(created)
+        finally:
+            await _restore_llm_config(previous)
+            if not args.keep:
+                await _cleanup(created)
+        return wall, counts, stats_before
+
+    wall, counts, stats_before = asyncio.run(run())
+
+    stats_after = _fetch_stub_stats(args.stub_url)
+    stub_delta = {k: v - stats_before.get(k, 0) for k, v in stats_after.items() if v - stats_before.get(k, 0)}
+
+    print(f"provider={args.provider} stream={args.stream} workers={args.workers} "
+          f"submissions={args.submissions} answers/submission={args.answers}")
+    print(f"  wall time:          {wall:8.2f} s")
+    print(f"  answers evaluated:  {counts['answers']:8d}")
+    print(f"  throughput:         {counts['answers'] / wall * 60:8.1f} answers/min")
+    print(f"  submission p50/p95: {statistics.median(durations):8.2f} / {_percentile(durations, 95):.2f} s")
+    print(f"  answer errors:      {counts['errors']:8d}  fallbacks: {counts['fallbacks']}")
+    if failed:
+        print(f"  failed submissions: {len(failed)}")
+        for line in failed[:5]:
+            print(f"    {line}")
+    if stub_delta:
+        print(f"  stub: {json.dumps(stub_delta, ensure_ascii=False, sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Offline-заглушка LLM API для нагрузочного тестирования оценки ответов.
+
+Отвечает по тем же протоколам, что использует app/services/llm_service.py:
+    POST /v1/chat/completions               OpenAI-совместимый (DeepSeek, Qwen, локальная модель)
+    POST /foundationModels/v1/completion    YandexGPT (в т.ч. потоковый NDJSON)
+    POST /api/v2/oauth                      GigaChat: выдача токена
+    POST /api/v1/chat/completions           GigaChat: чат
+    POST /v1/search                         Yandex Search API (проверка на плагиат)
+    GET  /stats                             счётчики запросов заглушки
+
+Usage:
+    python tests/load/llm_stub_server.py --port 8090
+    python tests/load/llm_stub_server.py --latency lognormal:0.3,0.6 --error-rate 0.02 --rate-limit-rate 0.05
+
+    # Запись реальных ответов (нужна сеть и ключи в запросах), затем воспроизведение offline
+    python tests/load/llm_stub_server.py --record llm_responses.jsonl \
+        --upstream-openai https://api.deepseek.com
+    python tests/load/llm_stub_server.py --replay llm_responses.jsonl --latency recorded
+
+Переменные окружения backend/worker для работы через заглушку:
+    YANDEX_LLM_URL=http://127.0.0.1:8090/foundationModels/v1/completion
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8090/v1
+    QWEN_BASE_URL=http://127.0.0.1:8090/v1
+    GIGACHAT_AUTH_URL=http://127.0.0.1:8090/api/v2/oauth
+    GIGACHAT_API_URL=http://127.0.0.1:8090/api/v1
+    YANDEX_SEARCH_URL=http://127.0.0.1:8090/v1/search
+    local_llm_url в llm_evaluation_params: http://127.0.0.1:8090/v1
+
+Распределения задержки (--latency, секунды до первого байта):
+    constant:0.8 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:MU,SIGMA | recorded
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+UPSTREAM_YANDEX = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+UPSTREAM_GIGACHAT_AUTH = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+UPSTREAM_GIGACHAT_API = "https://gigachat.devices.sberbank.ru/api/v1"
+
+DEFAULT_CRITERIA = ["factual_correctness", "completeness", "terminology", "structure"]
+
+_CRITERIA_KEYS = re.compile(r'"(\w+)"\s*:\s*<баллы>')
+_CRITERIA_LIMITS = re.compile(r"^-\s*([^:\n]+):\s*0-(\d+)", re.MULTILINE)
+
+
+def parse_latency(spec: str) -> Optional[Callable[[random.Random], float]]:
+    """Разбор спецификации распределения задержки; None — брать задержку из записи"""
+    kind, _, raw = spec.partition(":")
+    params = [float(p) for p in raw.split(",") if p]
+    if kind == "recorded":
+        return None
+    if kind == "constant":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(params[0], params[1])
+    raise argparse.ArgumentTypeError(f"Unknown latency distribution: {spec}")
+
+
+def request_key(protocol: str, messages: List[Dict[str, Any]]) -> str:
+    """Ключ записи: протокол + содержимое сообщений (модель и температура не учитываются)"""
+    digest = hashlib.sha256(protocol.encode("utf-8"))
+    for message in messages:
+        digest.update(b"\0")
+        digest.update(str(message.get("content") or message.get("text") or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def synthetic_evaluation(prompt: str, rng: random.Random) -> Dict[str, Any]:
+    """Правдоподобный JSON оценки для критериев, перечисленных в промпте"""
+    keys = list(dict.fromkeys(_CRITERIA_KEYS.findall(prompt))) or DEFAULT_CRITERIA
+    limits = [int(limit) for _, limit in _CRITERIA_LIMITS.findall(prompt)]
+
+    scores = {}
+    for i, key in enumerate(keys):
+        limit = limits[i] if i < len(limits) else 25
+        scores[key] = rng.randint(limit // 3, limit)
+
+    result: Dict[str, Any] = {
+        "criteria_scores": scores,
+        "total_score": sum(scores.values()),
+        "feedback": rng.choice([
+            "Ответ в целом верный, но не раскрыт патогенез.",
+            "Хорошее понимание темы, терминология использована корректно.",
+            "Ответ неполный: отсутствуют ключевые звенья механизма.",
+        ]),
+    }
+    if '"ai_probability"' in prompt:
+        result["ai_probability"] = round(rng.betavariate(1.2, 8), 2)
+    if '"integrity_score"' in prompt:
+        result["integrity_score"] = round(rng.uniform(0.7, 1.0), 2)
+        result["integrity_feedback"] = "Поведение без явных нарушений."
+    return result
+
+
+class StubState:
+    """Параметры заглушки, записанные ответы и счётчики"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.rng = random.Random(args.seed)
+        self.latency = parse_latency(args.latency)
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.retry_after = args.retry_after
+        self.chunk_size = args.chunk_size
+        self.chunk_delay = args.chunk_delay
+        self.trailing_text = args.trailing_text
+        self.search_hit_rate = args.search_hit_rate
+        self.upstream_openai = args.upstream_openai
+        self.record_path = Path(args.record) if args.record else None
+        self.stats: Counter = Counter()
+
+        self.recorded: Dict[str, Dict[str, Any]] = {}
+        self.recorded_by_protocol: Dict[str, List[Dict[str, Any]]] = {}
+        if args.replay:
+            with open(args.replay, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recorded[entry["key"]] = entry
+                        self.recorded_by_protocol.setdefault(entry["protocol"], []).append(entry)
+
+    async def delay(self, recorded_latency: Optional[float] = None) -> None:
+        if self.latency is not None:
+            seconds = self.latency(self.rng)
+        else:
+            seconds = recorded_latency or 0.0
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def injected_failure(self, protocol: str) -> Optional[Response]:
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self.stats[f"{protocol}.429"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit exceeded (stub)", "type": "rate_limit"}},
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats[f"{protocol}.500"] += 1
+            return JSONResponse({"error": {"message": "Internal error (stub)"}}, status_code=500)
+        return None
+
+    def replay(self, protocol: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.recorded.get(key)
+        if entry is None and self.recorded_by_protocol.get(protocol):
+            # Точного совпадения нет — отдаём случайный реальный ответ того же протокола
+            entry = self.rng.choice(self.recorded_by_protocol[protocol])
+            self.stats[f"{protocol}.replay_miss"] += 1
+        return entry
+
+    def record(self, protocol: str, key: str, status: int, body: Any, latency: float) -> None:
+        if not self.record_path:
+            return
+        entry = {"protocol": protocol, "key": key, "status": status, "body": body, "latency": round(latency, 3)}
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.recorded[key] = entry
+        self.recorded_by_protocol.setdefault(protocol, []).append(entry)
+
+    def completion_text(self, prompt: str) -> str:
+        text = json.dumps(synthetic_evaluation(prompt, self.rng), ensure_ascii=False)
+        if self.trailing_text:
+            text += "\n\nПояснение к оценке: " + "ответ рассмотрен по каждому критерию. " * 20
+        return text
+
+    def chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    # Грубая оценка: ~4 символа на токен
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(completion) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(state: StubState) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+
+    async def _chat(request: Request, protocol: str, upstream_base: Optional[str]) -> Response:
+        payload = await request.json()
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        key = request_key(protocol, messages)
+        stream = bool(payload.get("stream"))
+        state.stats[f"{protocol}.requests"] += 1
+
+        failure = state.injected_failure(protocol)
+        if failure is not None:
+            await state.delay()
+            return failure
+
+        text: Optional[str] = None
+        if state.record_path and upstream_base:
+            started = time.perf_counter()
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                upstream = await client.post(
+                    f"{upstream_base}/chat/completions",
+                    headers={"Authorization": request.headers.get("authorization", "")},
+                    json=dict(payload, stream=False),
+                )
+            body = upstream.json()
+            state.record(protocol, key, upstream.status_code, body, time.perf_counter() - started)
+            if upstream.status_code != 200 or not stream:
+                return JSONResponse(body, status_code=upstream.status_code)
+            text = body["choices"][0]["message"]["content"]
+        else:
+            entry = state.replay(protocol, key)
+            await state.delay(entry.get("latency") if entry else None)
+            if entry is not None:
+                if entry["status"] != 200 or not stream:
+                    return JSONResponse(entry["body"], status_code=entry["status"])
+                text = entry["body"]["choices"][0]["message"]["content"]
+
+        if text is None:
+            text = state.completion_text(prompt)
+
+        if not stream:
+            return JSONResponse({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": _usage(prompt, text),
+            })
+
+        async def sse():
+            for chunk in state.chunks(text):
+                delta = {"choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+                if state.chunk_delay:
+                    await asyncio.sleep(state.chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def openai_chat(request: Request):
+        return await _chat(request, "openai", state.upstream_openai)
+
+    @app.post("/api/v1/chat/completions")
+    async def gigachat_chat(request: Request):
+        return await _chat(request, "gigachat", UPSTREAM_GIGACHAT_API)
+
+    @app.post("/api/v2/oauth")
+    async def gigachat_oauth(request: Request):
+        state.stats["gigachat.oauth"] += 1
+        if state.record_path:
+            async with httpx.AsyncClient(timeout=30.0, verify=False) as client:  # nosec B501
+                upstream = await client.post(
+                    UPSTREAM_GIGACHAT_AUTH,
+                    headers={
+                        "Authorization": request.headers.get("authorization", ""),
+                        "RqUID": request.headers.get("rquid", str(uuid.uuid4())),
+                    },
+                    content=await request.body(),
+                )
+            return Response(upstream.content, status_code=upstream.status_code, media_type="application/json")
+        return {"access_token": f"stub-{uuid.uuid4().hex}", "expires_at": int((time.time() + 1800) * 1000)}
+
+    @app.post("/foundationModels/v1/completion")
+    async def yandex_completion(request: Request):
+        payload = await request.json()
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("text") or "") for m in messages)
+        key = request_key("yandex", messages)
+        options = payload.get("completionOptions") or {}
+        stream = bool(options.get("stream"))
+        state.stats["yandex.requests"] += 1
+
+        failure = state.injected_failure("yandex")
+        if failure is not None:
+            await state.delay()
+            return failure
+
+        text: Optional[str] = None
+        if state.record_path:
+            started = time.perf_counter()
+            async with httpx.AsyncClient(timeout=120.0) as client:
+                upstream = await client.post(
+                    UPSTREAM_YANDEX,
+                    headers={
+                        "Authorization": request.headers.get("authorization", ""),
+                        "x-folder-id": request.headers.get("x-folder-id", ""),
+                    },
+                    json=dict(payload, completionOptions=dict(options, stream=False)),
+                )
+            body = upstream.json()
+            state.record("yandex", key, upstream.status_code, body, time.perf_counter() - started)
+            if upstream.status_code != 200 or not stream:
+                return JSONResponse(body, status_code=upstream.status_code)
+            text = body["result"]["alternatives"][0]["message"]["text"]
+        else:
+            entry = state.replay("yandex", key)
+            await state.delay(entry.get("latency") if entry else None)
+            if entry is not None:
+                if entry["status"] != 200 or not stream:
+                    return JSONResponse(entry["body"], status_code=entry["status"])
+                text = entry["body"]["result"]["alternatives"][0]["message"]["text"]
+
+        if text is None:
+            text = state.completion_text(prompt)
+        usage = _usage(prompt, text)
+
+        def result(partial: str, status: str) -> Dict[str, Any]:
+            return {
+                "result": {
+                    "alternatives": [{"message": {"role": "assistant", "text": partial}, "status": status}],
+                    "usage": {
+                        "inputTextTokens": str(usage["prompt_tokens"]),
+                        "completionTokens": str(max(1, len(partial) // 4)),
+                        "totalTokens": str(usage["prompt_tokens"] + max(1, len(partial) // 4)),
+                    },
+                    "modelVersion": "stub",
+                }
+            }
+
+        if not stream:
+            return JSONResponse(result(text, "ALTERNATIVE_STATUS_FINAL"))
+
+        async def ndjson():
+            # YandexGPT в потоке присылает накопленный текст целиком в каждом чанке
+            sent = ""
+            chunks = state.chunks(text)
+            for i, chunk in enumerate(chunks):
+                sent += chunk
+                status = "ALTERNATIVE_STATUS_FINAL" if i == len(chunks) - 1 else "ALTERNATIVE_STATUS_PARTIAL"
+                yield json.dumps(result(sent, status), ensure_ascii=False) + "\n"
+                if state.chunk_delay:
+                    await asyncio.sleep(state.chunk_delay)
+
+        return StreamingResponse(ndjson(), media_type="application/json")
+
+    @app.post("/v1/search")
+    async def yandex_search(request: Request):
+        payload = await request.json()
+        query = " ".join(str(payload.get("query") or "").strip('"').lower().split())
+        state.stats["search.requests"] += 1
+
+        failure = state.injected_failure("search")
+        await state.delay()
+        if failure is not None:
+            return failure
+
+        # Результат зависит только от запроса: повторный поиск того же фрагмента даёт тот же ответ
+        digest = int(hashlib.sha256(query.encode("utf-8")).hexdigest()[:8], 16)
+        if digest / 0xFFFFFFFF < state.search_hit_rate:
+            state.stats["search.hits"] += 1
+            return {"results": [{"url": "https://example.org/source", "title": query[:60]}]}
+        return {"results": []}
+
+    @app.get("/stats")
+    async def stats():
+        return dict(state.stats)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="lognormal:-0.5,0.5", help="распределение задержки ответа")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="значение Retry-After для 429, сек.")
+    parser.add_argument("--chunk-size", type=int, default=16, help="символов в чанке потокового ответа")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="пауза между чанками, сек.")
+    parser.add_argument("--trailing-text", action="store_true", help="добавлять прозу после JSON (проверка ранней остановки)")
+    parser.add_argument("--search-hit-rate", type=float, default=0.1, help="доля поисковых запросов с найденным совпадением")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--replay", help="JSONL с записанными ответами")
+    parser.add_argument("--record", help="проксировать запросы в реальные API и дописывать ответы в JSONL")
+    parser.add_argument("--upstream-openai", default="https://api.deepseek.com",
+                        help="реальный OpenAI-совместимый API для режима --record")
+    args = parser.parse_args()
+    parse_latency(args.latency)
+
+    uvicorn.run(create_app(StubState(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Locust profile for the user snapshot cache in get_current_user.
+
+Students hammer the small authenticated endpoints of a running test
+(autosave, event batches, /users/me). Every request used to run
+SELECT users; with the cache the DB is hit once per user per
+USER_CACHE_REDIS_TTL.
+
+Usage:
+    pip install locust
+    export LOAD_STUDENT_EMAIL=student@example.com LOAD_STUDENT_PASSWORD=...
+    export LOAD_SUBMISSION_ID=<in-progress submission of that student>
+    export LOAD_QUESTION_ID=<question of that submission's variant>
+
+    # Before: restart the API with USER_CACHE_ENABLED=false
+    # After:  restart the API with USER_CACHE_ENABLED=true (default)
+    psql -c "SELECT pg_stat_statements_reset();"
+    locust -f backend/tests/load/locustfile_auth_cache.py \
+        --host http://localhost:8000 --users 1000 --spawn-rate 50 --run-time 5m --headless
+
+    # DB load from authentication:
+    psql -c "SELECT calls, total_exec_time FROM pg_stat_statements
+             WHERE query LIKE 'SELECT users.%' AND query LIKE '%WHERE users.id = %'"
+
+SLO targets:
+    - users-by-id SELECTs per request: ~1.0 before, < 0.05 after
+    - p95 of POST /answers and POST /events/batch does not regress
+    - error rate (5xx) == 0
+"""
+
+from __future__ import annotations
+
+import os
+import random
+from datetime import datetime, timezone
+
+from locust import HttpUser, between, task
+
+
+class StudentDuringTest(HttpUser):
+    wait_time = between(1, 3)
+
+    def on_start(self):
+        response = self.client.post(
+            "/api/v1/auth/login",
+            data={
+                "username": os.environ["LOAD_STUDENT_EMAIL"],
+                "password": os.environ["LOAD_STUDENT_PASSWORD"],
+            },
+            name="POST /login",
+        )
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        self.submission_id = os.environ["LOAD_SUBMISSION_ID"]
+        self.question_id = os.environ["LOAD_QUESTION_ID"]
+
+    @task(5)
+    def autosave(self):
+        self.client.post(
+            f"/api/v1/submissions/{self.submission_id}/answers",
+            json={"question_id": self.question_id, "student_answer": f"draft {random.random()}"},
+            name="POST /answers",
+        )
+
+    @task(3)
+    def events(self):
+        now = datetime.now(timezone.utc).isoformat()
+        self.client.post(
+            f"/api/v1/submissions/{self.submission_id}/events/batch",
+            json={
+                "events": [{"event_type": "window_blur", "details": {}, "occurred_at": now}],
+                "sent_at": now,
+            },
+            name="POST /events/batch",
+        )
+
+    @task(1)
+    def me(self):
+        self.client.get("/api/v1/users/me", name="GET /users/me")
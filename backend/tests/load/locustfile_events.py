@@ -0,0 +1,96 @@
+"""
+Locust profile for submission event logging: one request per event vs batches.
+
+Both user classes emit the same event stream (tab switches, blur/focus, paste)
+at the same rate; compare requests/s, p95 and DB load (pg_stat_statements on
+submission_events / submissions) between runs.
+
+Usage:
+    pip install locust
+    export LOAD_STUDENT_EMAIL=student@example.com LOAD_STUDENT_PASSWORD=...
+    export LOAD_SUBMISSION_ID=<in-progress submission of that student>
+
+    # Before: SELECT + INSERT + COMMIT per event
+    locust -f backend/tests/load/locustfile_events.py SingleEventUser \
+        --host http://localhost:8000 --users 2000 --spawn-rate 50 --run-time 5m
+
+    # After: events buffered on the client, Redis stream + background flush
+    locust -f backend/tests/load/locustfile_events.py BatchEventUser \
+        --host http://localhost:8000 --users 2000 --spawn-rate 50 --run-time 5m
+
+SLO targets:
+    - p95 POST /events/batch   < 100 ms
+    - error rate (5xx)         == 0
+    - Redis XLEN submission:events stays bounded (flush keeps up)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import uuid
+from datetime import datetime, timezone
+
+from locust import HttpUser, between, task
+
+EVENT_TYPES = ["tab_hidden", "tab_visible", "window_blur", "window_focus", "paste_attempted"]
+# Как useSubmissionEventBuffer: пачка раз в 5 секунд
+BATCH_INTERVAL = 5.0
+EVENT_WAIT = (0.5, 2.0)
+
+
+def _event() -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "event_type": random.choice(EVENT_TYPES),
+        "details": {"question_id": str(uuid.uuid4()), "timestamp": now},
+        "occurred_at": now,
+    }
+
+
+class _StudentUser(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        response = self.client.post(
+            "/api/v1/auth/login",
+            data={
+                "username": os.environ["LOAD_STUDENT_EMAIL"],
+                "password": os.environ["LOAD_STUDENT_PASSWORD"],
+            },
+            name="POST /login",
+        )
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        self.submission_id = os.environ["LOAD_SUBMISSION_ID"]
+
+
+class SingleEventUser(_StudentUser):
+    """One POST /events per event (previous behaviour of the test page)."""
+    wait_time = between(*EVENT_WAIT)
+
+    @task
+    def log_event(self):
+        event = _event()
+        self.client.post(
+            f"/api/v1/submissions/{self.submission_id}/events",
+            json={"event_type": event["event_type"], "details": event["details"]},
+            name="POST /events",
+        )
+
+
+class BatchEventUser(_StudentUser):
+    """Same event rate, sent as one POST /events/batch per BATCH_INTERVAL."""
+    wait_time = between(BATCH_INTERVAL, BATCH_INTERVAL)
+
+    @task
+    def log_batch(self):
+        average_wait = sum(EVENT_WAIT) / 2
+        count = max(1, round(random.expovariate(average_wait / BATCH_INTERVAL)))
+        self.client.post(
+            f"/api/v1/submissions/{self.submission_id}/events/batch",
+            json={
+                "events": [_event() for _ in range(count)],
+                "sent_at": datetime.now(timezone.utc).isoformat(),
+            },
+            name="POST /events/batch",
+        )
@@ -0,0 +1,56 @@
+"""
+Locust profile for POST /tests/{id}/start: a whole group presses "Start" at once.
+
+Each virtual user logs in as its own student and starts the test once, so every
+request generates a new variant from the test structure. Before the question
+pool index, every start ran one SELECT per structure rule (with a growing
+NOT IN list); now the variant is sampled from the per-process index.
+
+Usage:
+    pip install locust
+    # Students load_student_0@example.com ... load_student_{N-1}@example.com with
+    # one password and no attempts on the test (the test must have a structure)
+    export LOAD_STUDENT_PATTERN=load_student_{n}@example.com LOAD_STUDENT_PASSWORD=...
+    export LOAD_TEST_ID=<published test with structure rules>
+
+    locust -f backend/tests/load/locustfile_start_test.py \
+        --host http://localhost:8000 --users 300 --spawn-rate 300 --run-time 2m --headless
+
+    # Compare with the previous commit (per-rule SELECT) and check DB load:
+    psql -c "SELECT calls, mean_exec_time FROM pg_stat_statements
+             WHERE query LIKE 'SELECT questions.id%'"
+
+SLO targets:
+    - p95 POST /tests/{id}/start < 500 ms at 300 simultaneous starts
+    - questions SELECTs per start: rules count before, ~0 after (one per index rebuild)
+    - error rate (5xx) == 0
+"""
+
+from __future__ import annotations
+
+import itertools
+import os
+
+from locust import HttpUser, constant, task
+
+_student_numbers = itertools.count()
+
+
+class StartingStudent(HttpUser):
+    wait_time = constant(3600)
+
+    def on_start(self):
+        email = os.environ["LOAD_STUDENT_PATTERN"].format(n=next(_student_numbers))
+        response = self.client.post(
+            "/api/v1/auth/login",
+            data={"username": email, "password": os.environ["LOAD_STUDENT_PASSWORD"]},
+            name="POST /login",
+        )
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    @task
+    def start(self):
+        self.client.post(
+            f"/api/v1/tests/{os.environ['LOAD_TEST_ID']}/start",
+            name="POST /tests/{id}/start",
+        )
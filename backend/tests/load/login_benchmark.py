@@ -0,0 +1,122 @@
+"""
+Замер влияния проверки паролей на остальные запросы воркера.
+
+Поднимает в процессе FastAPI-приложение с двумя маршрутами, как у API:
+    POST /login  — verify_password (bcrypt) по заранее посчитанному хешу;
+    GET  /ping   — лёгкий async-обработчик (как автосохранение или /users/me).
+Через httpx.ASGITransport одновременно запускает поток входов и поток /ping,
+печатает задержки /ping (p50/p95/max), максимальное запаздывание event loop
+и число входов, отклонённых с 503.
+
+БД и Redis не нужны:
+    # Как раньше: bcrypt прямо в обработчике
+    python tests/load/login_benchmark.py --mode inline --logins 40
+
+    # Через crypto_executor (PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_QUEUE из окружения)
+    python tests/load/login_benchmark.py --mode executor --logins 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+PASSWORD = "benchmark-password"
+
+
+def _build_app(mode: str):
+    from fastapi import FastAPI, Form
+
+    from app.core.security import get_password_hash, verify_password, verify_password_async
+
+    app = FastAPI()
+    password_hash = get_password_hash(PASSWORD)
+
+    @app.post("/login")
+    async def login(password: str = Form(...)):
+        if mode == "inline":
+            ok = verify_password(password, password_hash)
+        else:
+            ok = await verify_password_async(password, password_hash)
+        return {"ok": ok}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def main(args: argparse.Namespace) -> None:
+    import httpx
+
+    app = _build_app(args.mode)
+    transport = httpx.ASGITransport(app=app)
+    ping_latencies: List[float] = []
+    statuses: List[int] = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/ping")
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(_loop_lag(stop))
+
+        async def login() -> None:
+            response = await client.post("/login", data={"password": PASSWORD})
+            statuses.append(response.status_code)
+
+        async def pinger() -> None:
+            # Хотя бы один запрос: при inline-режиме loop может не дойти до pinger до конца входов
+            while True:
+                started = time.perf_counter()
+                await client.get("/ping")
+                ping_latencies.append(time.perf_counter() - started)
+                if stop.is_set():
+                    break
+                await asyncio.sleep(args.ping_interval)
+
+        pingers = [asyncio.create_task(pinger()) for _ in range(args.pingers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*pingers)
+        worst_lag = await lag_task
+
+    ms = lambda seconds: f"{seconds * 1000:.1f} ms"
+    print(f"mode={args.mode} logins={args.logins} elapsed={elapsed:.2f}s")
+    print(f"  logins ok={statuses.count(200)} rejected(503)={statuses.count(503)}")
+    print(
+        f"  /ping n={len(ping_latencies)} p50={ms(statistics.median(ping_latencies))} "
+        f"p95={ms(_percentile(ping_latencies, 0.95))} max={ms(max(ping_latencies))}"
+    )
+    print(f"  event loop max lag={ms(worst_lag)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inline", "executor"], default="executor")
+    parser.add_argument("--logins", type=int, default=40, help="одновременных входов")
+    parser.add_argument("--pingers", type=int, default=10, help="параллельных клиентов /ping")
+    parser.add_argument("--ping-interval", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
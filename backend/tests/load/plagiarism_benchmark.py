@@ -0,0 +1,155 @@
+"""
+Замер проверки на плагиат (search_service.check_plagiarism) против offline-заглушки Search API.
+
+Генерирует ответы потока студентов из общего набора предложений (часть ответов —
+копии чужих с другим регистром и пунктуацией), проверяет их параллельно, как пакетная
+оценка вопроса, и печатает число запросов к Search API на ответ, долю найденных
+совпадений и время. Второй проход по тем же ответам показывает работу кэша.
+Ключи кэша, созданные прогоном, удаляются.
+
+Запускать с Redis (docker compose up redis), сеть не нужна:
+    python tests/load/llm_stub_server.py --port 8090 --latency lognormal:-1.5,0.4 --search-hit-rate 0.05 &
+    python tests/load/plagiarism_benchmark.py --stub-url http://127.0.0.1:8090 --answers 200
+
+    # Как до кэша: один фрагмент на ответ, без Redis
+    python tests/load/plagiarism_benchmark.py --fragments 1 --no-cache
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import secrets
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+SENTENCES = [
+    "Сахарный диабет первого типа развивается вследствие аутоиммунного разрушения бета-клеток",
+    "Абсолютная инсулиновая недостаточность приводит к нарушению углеводного, жирового и белкового обмена",
+    "Гипергликемия сопровождается глюкозурией, осмотическим диурезом и полиурией",
+    "При дефиците инсулина усиливается липолиз и образование кетоновых тел в печени",
+    "Маркерами аутоиммунного процесса служат антитела к глутаматдекарбоксилазе и островковым клеткам",
+    "Кетоацидоз проявляется дегидратацией, дыханием Куссмауля и запахом ацетона",
+    "Лечение заключается в пожизненной заместительной инсулинотерапии в базис-болюсном режиме",
+    "Самоконтроль гликемии и обучение пациента снижают риск острых осложнений",
+    "Поздние осложнения включают нефропатию, ретинопатию и нейропатию",
+    "Гликированный гемоглобин отражает средний уровень глюкозы за последние три месяца",
+    "Генетическая предрасположенность связана с определёнными аллелями системы HLA",
+    "Манифестация заболевания часто приходится на детский и юношеский возраст",
+]
+
+
+def _stub_environment(args: argparse.Namespace) -> Dict[str, str]:
+    return {
+        "YANDEX_SEARCH_URL": f"{args.stub_url.rstrip('/')}/v1/search",
+        "PLAGIARISM_FRAGMENTS": str(args.fragments),
+        "PLAGIARISM_SEARCH_CONCURRENCY": str(args.concurrency),
+    }
+
+
+def _cohort(count: int, copy_rate: float, run_tag: str, rng: random.Random) -> List[str]:
+    """
+    Ответы из 3-6 предложений общего набора. С вероятностью copy_rate ответ —
+    копия одного из предыдущих в другом регистре и с другой пунктуацией.
+    """
+    answers: List[str] = []
+    for _ in range(count):
+        if answers and rng.random() < copy_rate:
+            source = rng.choice(answers)
+            answers.append(source.upper().replace(",", "").replace(" ", "  "))
+            continue
+        sentences = rng.sample(SENTENCES, rng.randint(3, 6))
+        # Метка прогона: первый проход не попадает в кэш прошлых запусков
+        answers.append(". ".join(f"{s} {run_tag}" for s in sentences) + ".")
+    return answers
+
+
+async def _check_all(answers: List[str], use_cache: bool) -> Tuple[float, List[float]]:
+    from app.services.search_service import search_service
+
+    config = {"yandex_search_api_key": "stub-key", "yandex_search_folder_id": "stub-folder"}
+    started = time.perf_counter()
+    scores = await asyncio.gather(*(
+        search_service.check_plagiarism(answer, config=config, use_cache=use_cache) for answer in answers
+    ))
+    return time.perf_counter() - started, list(scores)
+
+
+async def _cleanup_cache(answers: List[str], fragments: int) -> None:
+    from app.core.redis import get_redis_client
+    from app.services.search_service import PLAGIARISM_CACHE_PREFIX, normalize_fragment, select_fragments
+
+    keys = {
+        PLAGIARISM_CACHE_PREFIX + hashlib.sha256(normalize_fragment(f).encode("utf-8")).hexdigest()
+        for answer in answers
+        for f in select_fragments(answer, fragments)
+    }
+    if keys:
+        client = await get_redis_client()
+        await client.delete(*keys)
+
+
+def _fetch_stub_stats(stub_url: str) -> Dict[str, int]:
+    import httpx
+
+    try:
+        return httpx.get(f"{stub_url.rstrip('/')}/stats", timeout=5.0).json()
+    except Exception:
+        return {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8090")
+    parser.add_argument("--answers", type=int, default=200, help="ответов в потоке")
+    parser.add_argument("--copy-rate", type=float, default=0.3, help="доля ответов-копий")
+    parser.add_argument("--fragments", type=int, default=3, help="PLAGIARISM_FRAGMENTS")
+    parser.add_argument("--concurrency", type=int, default=4, help="PLAGIARISM_SEARCH_CONCURRENCY")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать Redis-кэш")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    # До импорта app: settings читаются при импорте
+    os.environ.update(_stub_environment(args))
+
+    answers = _cohort(args.answers, args.copy_rate, secrets.token_hex(3), random.Random(args.seed))
+    use_cache = not args.no_cache
+
+    async def run() -> List[Tuple[str, float, List[float], Dict[str, int]]]:
+        passes = []
+        try:
+            for name in ("cold", "warm"):
+                before = _fetch_stub_stats(args.stub_url)
+                wall, scores = await _check_all(answers, use_cache)
+                after = _fetch_stub_stats(args.stub_url)
+                delta = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+                passes.append((name, wall, scores, delta))
+        finally:
+            if use_cache:
+                await _cleanup_cache(answers, args.fragments)
+        return passes
+
+    passes = asyncio.run(run())
+
+    print(f"answers={args.answers} copy_rate={args.copy_rate} fragments={args.fragments} "
+          f"concurrency={args.concurrency} cache={use_cache}")
+    for name, wall, scores, delta in passes:
+        requests = delta.get("search.requests", 0)
+        print(f"  {name}:")
+        print(f"    wall time:           {wall:8.2f} s  ({len(answers) / wall:.1f} answers/s)")
+        print(f"    search requests:     {requests:8d}  ({requests / len(answers):.2f} per answer)")
+        print(f"    plagiarism detected: {sum(1 for s in scores if s > 0):8d}")
+        if delta:
+            print(f"    stub: {json.dumps(delta, ensure_ascii=False, sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    main()
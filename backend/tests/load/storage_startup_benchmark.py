@@ -0,0 +1,80 @@
+"""
+Замер времени старта процесса, зависящего от хранилища.
+
+В отдельном процессе (чистый импорт) измеряет:
+    import   — import app.core.storage (создание storage_service);
+    init     — первая операция с объектами (проверка bucket, политика);
+    warm     — следующая операция (соединение уже в пуле).
+MinIO может быть недоступен: для "медленного" MinIO укажите немаршрутизируемый
+адрес — импорт не должен от него зависеть, init упрётся в STORAGE_CONNECT_TIMEOUT.
+
+    python tests/load/storage_startup_benchmark.py
+    python tests/load/storage_startup_benchmark.py --endpoint 10.255.255.1:9000 --runs 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app.core.storage import storage_service
+imported = time.perf_counter() - started
+
+def timed(call):
+    started = time.perf_counter()
+    try:
+        call()
+        error = None
+    except Exception as e:
+        error = type(e).__name__
+    return time.perf_counter() - started, error
+
+init, init_error = timed(lambda: storage_service.file_exists("startup-benchmark"))
+warm, warm_error = timed(lambda: storage_service.file_exists("startup-benchmark"))
+print(json.dumps({"import": imported, "init": init, "warm": warm, "error": init_error or warm_error}))
+"""
+
+
+def run_probe(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", help="MINIO_ENDPOINT для замера (по умолчанию из окружения)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.endpoint:
+        env["MINIO_ENDPOINT"] = args.endpoint
+
+    samples = [run_probe(env) for _ in range(args.runs)]
+    for phase in ("import", "init", "warm"):
+        values = [sample[phase] * 1000 for sample in samples]
+        print(f"{phase:>6}: median {statistics.median(values):8.1f} ms   max {max(values):8.1f} ms")
+    errors = {sample["error"] for sample in samples if sample["error"]}
+    if errors:
+        print(f"errors: {', '.join(sorted(errors))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Тесты очереди допуска к началу и отправке теста
+"""
+
+import unittest.mock as mock
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import admission
+from app.core.admission import ADMISSION_TICKET_HEADER, admission_slot, try_admit
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def admission_limits():
+    with mock.patch.object(settings, "ADMISSION_ENABLED", True), \
+            mock.patch.object(settings, "ADMISSION_TEST_CONCURRENCY", 2), \
+            mock.patch.object(settings, "ADMISSION_GLOBAL_CONCURRENCY", 3):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_admits_up_to_budget_then_queues_fifo(fake_redis):
+    assert await try_admit("test:a", "ticket-0001") == (True, 0)
+    assert await try_admit("test:a", "ticket-0002") == (True, 0)
+    assert await try_admit("test:a", "ticket-0003") == (False, 1)
+    assert await try_admit("test:a", "ticket-0004") == (False, 2)
+    # Повторный опрос не меняет место в очереди
+    assert await try_admit("test:a", "ticket-0003") == (False, 1)
+
+
+@pytest.mark.asyncio
+async def test_release_admits_head_of_queue(fake_redis):
+    await try_admit("test:a", "ticket-0001")
+    await try_admit("test:a", "ticket-0002")
+    await try_admit("test:a", "ticket-0003")
+    await try_admit("test:a", "ticket-0004")
+
+    await admission.release("test:a", "ticket-0001")
+
+    # Следующий по очереди проходит, стоящий за ним — нет
+    assert await try_admit("test:a", "ticket-0004") == (False, 1)
+    assert await try_admit("test:a", "ticket-0003") == (True, 0)
+
+
+@pytest.mark.asyncio
+async def test_global_budget_shared_between_tests(fake_redis):
+    await try_admit("test:a", "ticket-0001")
+    await try_admit("test:a", "ticket-0002")
+    assert await try_admit("test:b", "ticket-0003") == (True, 0)
+    assert await try_admit("test:b", "ticket-0004") == (False, 1)
+
+
+@pytest.mark.asyncio
+async def test_abandoned_ticket_leaves_queue(fake_redis):
+    await try_admit("test:a", "ticket-0001")
+    await try_admit("test:a", "ticket-0002")
+    await try_admit("test:a", "ticket-0003")
+    await try_admit("test:a", "ticket-0004")
+
+    now = admission.time.time()
+    with mock.patch("app.core.admission.time.time", return_value=now + settings.ADMISSION_TICKET_TTL + 1):
+        assert await try_admit("test:a", "ticket-0004") == (False, 1)
+    assert await fake_redis.zrange("admission:queue:test:a", 0, -1) == ["ticket-0004"]
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_frees_slot(fake_redis):
+    await try_admit("test:a", "ticket-0001")
+    await try_admit("test:a", "ticket-0002")
+
+    now = admission.time.time()
+    with mock.patch("app.core.admission.time.time", return_value=now + settings.ADMISSION_LEASE_SECONDS + 1):
+        assert await try_admit("test:a", "ticket-0003") == (True, 0)
+
+
+@pytest.mark.asyncio
+async def test_slot_raises_429_with_position_and_releases(fake_redis):
+    async with admission_slot("test:a", "ticket-0001"):
+        async with admission_slot("test:a", "ticket-0002"):
+            with pytest.raises(HTTPException) as exc_info:
+                async with admission_slot("test:a", None):
+                    pass
+    exc = exc_info.value
+    assert exc.status_code == 429
+    assert exc.detail["queued"] is True
+    assert exc.detail["position"] == 1
+    assert exc.headers["Retry-After"] == str(exc.detail["retry_after"])
+    assert exc.headers[ADMISSION_TICKET_HEADER] == exc.detail["ticket"]
+
+    # Слоты освобождены, билет из очереди проходит
+    async with admission_slot("test:a", exc.detail["ticket"]):
+        pass
+    assert await fake_redis.zcard("admission:inflight:global") == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_unavailable_admits_request():
+    async def _broken():
+        raise ConnectionError("redis down")
+
+    with mock.patch("app.core.admission.get_redis_client", side_effect=_broken), \
+            mock.patch.object(settings, "ADMISSION_ENABLED", True):
+        async with admission_slot("test:a", None):
+            pass
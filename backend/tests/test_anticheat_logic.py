@@ -4,14 +4,14 @@ from datetime import datetime
 from sqlalchemy import select
 from app.models.submission import Submission, Answer
 from app.models.question import Question, QuestionType
-from app.models.audit import AuditLog
+from app.models.submission_event import SubmissionEvent
 from app.tasks.evaluation_tasks import run_evaluate_text_answer
 import unittest.mock as mock
 
 @pytest.mark.asyncio
 async def test_anticheat_event_log_processing(db_session, test_teacher, test_user):
     """
-    Проверка сбора данных анти-чита из логов аудита.
+    Проверка сбора данных анти-чита из журнала событий попытки.
     """
     # 0. Создаем тест и вариант (нужны для submission)
     from app.models.test import Test, TestVariant
@@ -47,24 +47,28 @@ async def test_anticheat_event_log_processing(db_session, test_teacher, test_use
         event_log_check_enabled=True,
         reference_data={}
     )
-    submission = Submission(id=submission_id, student_id=test_user.id, variant_id=variant.id)
+    start_time = datetime.utcnow()
+    submission = Submission(
+        id=submission_id,
+        student_id=test_user.id,
+        variant_id=variant.id,
+        started_at=start_time,
+        submitted_at=start_time + timedelta(seconds=30),
+    )
     answer = Answer(id=answer_id, submission_id=submission_id, question_id=question_id, student_answer="Student Text")
     
     db_session.add_all([question, submission, answer])
     await db_session.flush()
 
-    # 2. Создаем события аудита
-    start_time = datetime.utcnow()
+    # 2. Создаем события попытки (время работы — от started_at до submitted_at)
     events = [
-        # Начало (просто событие для фиксации времени)
-        AuditLog(user_id=submission.student_id, action="submission.start", resource_type="submission", resource_id=submission_id, timestamp=start_time),
         # Ушел из вкладки на 10 секунд
-        AuditLog(user_id=submission.student_id, action="submission.tab_hidden", resource_type="submission", resource_id=submission_id, timestamp=start_time + timedelta(seconds=5)),
-        AuditLog(user_id=submission.student_id, action="submission.tab_visible", resource_type="submission", resource_id=submission_id, timestamp=start_time + timedelta(seconds=15)),
-        # Попытка вставки
-        AuditLog(user_id=submission.student_id, action="submission.paste_attempted", resource_type="submission", resource_id=submission_id, timestamp=start_time + timedelta(seconds=20)),
-        # Конец
-        AuditLog(user_id=submission.student_id, action="submission.submit", resource_type="submission", resource_id=submission_id, timestamp=start_time + timedelta(seconds=30)),
+        SubmissionEvent(submission_id=submission_id, question_id=question_id, event_type="tab_hidden", ts=start_time + timedelta(seconds=5)),
+        SubmissionEvent(submission_id=submission_id, question_id=question_id, event_type="tab_visible", ts=start_time + timedelta(seconds=15)),
+        # Попытка вставки (без привязки к вопросу)
+        SubmissionEvent(submission_id=submission_id, event_type="paste_attempted", ts=start_time + timedelta(seconds=20)),
+        # Событие другого вопроса не учитывается
+        SubmissionEvent(submission_id=submission_id, question_id=uuid4(), event_type="paste_attempted", ts=start_time + timedelta(seconds=25)),
     ]
     db_session.add_all(events)
     await db_session.commit()
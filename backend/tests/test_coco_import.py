@@ -0,0 +1,64 @@
+"""
+Тесты потокового импорта аннотаций COCO
+"""
+
+import io
+import json
+
+import pytest
+
+from app.services.coco_import import CocoParseError, extract_coco_annotations
+
+
+def _dataset(annotations_first=False) -> bytes:
+    images = [
+        {"id": 1, "file_name": "train/slide-1.png", "width": 100, "height": 80},
+        {"id": 2, "file_name": "slide-2.png", "width": 100, "height": 80},
+        {"id": 3, "file_name": "other/slide-2.png", "width": 100, "height": 80},
+        {"id": 4, "file_name": "unused.png", "width": 100, "height": 80},
+    ]
+    annotations = [
+        {"id": 10, "image_id": 1, "category_id": 1, "bbox": [1.5, 2, 3, 4], "segmentation": [[1, 2, 3, 4, 5, 6]]},
+        {"id": 11, "image_id": 2, "category_id": 2, "bbox": [0, 0, 1, 1]},
+        {"id": 12, "image_id": 4, "category_id": 1, "bbox": [0, 0, 1, 1]},
+        {"id": 13, "image_id": 1, "category_id": 2, "bbox": [5, 5, 1, 1]},
+    ]
+    categories = [{"id": 1, "name": "nucleus"}, {"id": 2, "name": "cell"}]
+    if annotations_first:
+        data = {"annotations": annotations, "categories": categories, "images": images}
+    else:
+        data = {"info": {"year": 2026}, "images": images, "annotations": annotations, "categories": categories}
+    return json.dumps(data).encode()
+
+
+@pytest.mark.parametrize("annotations_first", [False, True])
+def test_extracts_only_matching_images(annotations_first):
+    result = extract_coco_annotations(io.BytesIO(_dataset(annotations_first)), ["slide-1.png"])
+
+    coco = result["slide-1.png"]
+    assert [image["id"] for image in coco["images"]] == [1]
+    assert [annotation["id"] for annotation in coco["annotations"]] == [10, 13]
+    assert coco["annotations"][0]["bbox"] == [1.5, 2.0, 3.0, 4.0]
+    assert isinstance(coco["annotations"][0]["bbox"][0], float)
+    assert [category["name"] for category in coco["categories"]] == ["nucleus", "cell"]
+
+
+def test_exact_file_name_wins_over_basename():
+    result = extract_coco_annotations(io.BytesIO(_dataset()), ["other/slide-2.png", "uploads/slide-2.png"])
+
+    assert result["other/slide-2.png"]["images"][0]["id"] == 3
+    assert result["other/slide-2.png"]["annotations"] == []
+    # Без точного совпадения — первое изображение с тем же именем файла
+    assert result["uploads/slide-2.png"]["images"][0]["id"] == 2
+
+
+def test_bulk_matches_many_files_in_one_call():
+    result = extract_coco_annotations(io.BytesIO(_dataset()), ["slide-1.png", "unused.png", "missing.png"])
+
+    assert set(result) == {"slide-1.png", "unused.png"}
+    assert [annotation["id"] for annotation in result["unused.png"]["annotations"]] == [12]
+
+
+def test_invalid_json_raises_parse_error():
+    with pytest.raises(CocoParseError):
+        extract_coco_annotations(io.BytesIO(b'{"images": [{"id": 1, "file_name": '), ["a.png"])
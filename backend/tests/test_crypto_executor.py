@@ -0,0 +1,60 @@
+"""
+Тесты пула хеширования паролей (bcrypt вне event loop)
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.security import CryptoExecutor
+
+
+def _blocking(delay: float, started: threading.Event = None) -> str:
+    if started is not None:
+        started.set()
+    time.sleep(delay)
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_blocking_work_does_not_stall_event_loop():
+    executor = CryptoExecutor(workers=2, max_queue=4)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    names = await asyncio.gather(*(executor.run(_blocking, 0.1) for _ in range(4)))
+    ticking.cancel()
+
+    assert all(name.startswith("crypto") for name in names)
+    # ~0.2 с работы: loop успевает обработать остальные задачи
+    assert ticks >= 10
+    assert executor.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_overloaded_executor_rejects_immediately():
+    executor = CryptoExecutor(workers=1, max_queue=1)
+    started = threading.Event()
+    running = asyncio.gather(
+        executor.run(_blocking, 0.2, started),
+        executor.run(_blocking, 0.01),
+    )
+    await asyncio.sleep(0)
+    assert executor.queue_depth == 1
+
+    with pytest.raises(HTTPException) as exc:
+        await executor.run(_blocking, 0.01)
+
+    assert exc.value.status_code == 503 and exc.value.headers["Retry-After"]
+    await running
+    # После разгрузки операции снова принимаются
+    assert (await executor.run(_blocking, 0.0)).startswith("crypto")
@@ -0,0 +1,172 @@
+"""
+Тесты пакетного приёма событий прохождения теста
+"""
+
+import unittest.mock as mock
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.services.event_ingest import (
+    MAX_EVENT_AGE,
+    SUBMISSION_EVENTS_FLUSH_BATCH,
+    SUBMISSION_EVENTS_FLUSH_LOCK,
+    SUBMISSION_EVENTS_STREAM,
+    event_fields,
+    event_timestamp,
+    flush_events,
+    ingest_events,
+    parse_event_fields,
+)
+from app.services.focus_timeline import REBUILD_FIELD, focus_key
+
+
+class FakeSession:
+    """Сессия, запоминающая вставленные пачки; existing — id существующих попыток"""
+
+    def __init__(self, batches, existing=()):
+        self.batches = batches
+        self.existing = list(existing)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows=None):
+        if rows is None:
+            return mock.Mock(scalars=lambda: mock.Mock(all=lambda: self.existing))
+        self.batches.append(rows)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def test_event_timestamp_corrects_client_clock():
+    received = datetime(2026, 10, 19, 12, 0, 0)
+    # Часы клиента спешат на 3 минуты, событие за 20 секунд до отправки
+    sent = datetime(2026, 10, 19, 12, 3, 0, tzinfo=timezone.utc)
+    occurred = sent - timedelta(seconds=20)
+
+    assert event_timestamp(received, occurred, sent) == received - timedelta(seconds=20)
+    assert event_timestamp(received) == received
+    # Без sent_at время клиента не может оказаться в будущем или слишком в прошлом
+    assert event_timestamp(received, occurred) == received
+    assert event_timestamp(received, received - timedelta(days=1)) == received - MAX_EVENT_AGE
+
+
+def test_stream_fields_roundtrip_with_stable_id():
+    submission_id, question_id = uuid4(), uuid4()
+    timestamp = datetime(2026, 10, 19, 12, 0, 5)
+    details = {"question_id": str(question_id), "content_length": 120}
+    fields = event_fields(submission_id, "paste_attempted", details, timestamp)
+
+    row = parse_event_fields("1760875205000-0", fields)
+
+    assert row["event_type"] == "paste_attempted" and row["submission_id"] == submission_id
+    assert row["question_id"] == question_id and row["ts"] == timestamp
+    # question_id хранится в отдельной колонке
+    assert row["details"] == {"content_length": 120}
+    # Некорректный question_id от клиента не ломает запись
+    assert parse_event_fields("1-0", event_fields(submission_id, "tab_hidden", {"question_id": "undefined"}, timestamp))["question_id"] is None
+    # Повторный перенос той же записи stream даёт тот же id (дубль отбрасывается ON CONFLICT)
+    assert parse_event_fields("1760875205000-0", fields)["id"] == row["id"]
+    assert parse_event_fields("1760875205000-1", fields)["id"] != row["id"]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_queued_and_flushed_in_chunks(fake_redis):
+    submission_id = uuid4()
+    events = [
+        SimpleNamespace(event_type="window_blur", details={"i": i}, occurred_at=None)
+        for i in range(SUBMISSION_EVENTS_FLUSH_BATCH + 5)
+    ]
+
+    await ingest_events(mock.AsyncMock(), submission_id, events)
+    assert await fake_redis.xlen(SUBMISSION_EVENTS_STREAM) == len(events)
+
+    batches = []
+    flushed = await flush_events(lambda: FakeSession(batches, existing=[submission_id]))
+
+    assert flushed == len(events)
+    assert [len(b) for b in batches] == [SUBMISSION_EVENTS_FLUSH_BATCH, 5]
+    assert batches[0][0]["details"] == {"i": 0}
+    assert await fake_redis.xlen(SUBMISSION_EVENTS_STREAM) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_skips_when_another_flush_is_running(fake_redis):
+    await ingest_events(
+        mock.AsyncMock(), uuid4(),
+        [SimpleNamespace(event_type="tab_hidden", details=None, occurred_at=None)],
+    )
+    await fake_redis.set(SUBMISSION_EVENTS_FLUSH_LOCK, "1")
+
+    batches = []
+    assert await flush_events(lambda: FakeSession(batches), wait=0.2) == 0
+    assert batches == [] and await fake_redis.xlen(SUBMISSION_EVENTS_STREAM) == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_does_not_release_lock_of_next_holder(fake_redis):
+    async def slow_flush(client, session_factory):
+        # Блокировка истекла во время переноса и досталась другому процессу
+        await client.set(SUBMISSION_EVENTS_FLUSH_LOCK, "next-holder")
+        return 0
+
+    with mock.patch("app.services.event_ingest._flush_locked", side_effect=slow_flush):
+        await flush_events(lambda: FakeSession([]))
+
+    assert await fake_redis.get(SUBMISSION_EVENTS_FLUSH_LOCK) == "next-holder"
+
+    # Своя блокировка снимается
+    await fake_redis.delete(SUBMISSION_EVENTS_FLUSH_LOCK)
+    await flush_events(lambda: FakeSession([]))
+    assert not await fake_redis.exists(SUBMISSION_EVENTS_FLUSH_LOCK)
+
+
+@pytest.mark.asyncio
+async def test_events_go_to_db_when_redis_is_down():
+    db = mock.AsyncMock()
+    with mock.patch("app.services.event_ingest.get_redis_client", side_effect=ConnectionError("down")):
+        await ingest_events(
+            db, uuid4(),
+            [SimpleNamespace(event_type="paste_attempted", details={"content_length": 10}, occurred_at=None)],
+        )
+
+    rows = db.execute.await_args.args[1]
+    assert rows[0]["event_type"] == "paste_attempted"
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_db_fallback_marks_focus_summaries_for_rebuild(fake_redis):
+    submission_id = uuid4()
+    with mock.patch("app.services.event_ingest.enqueue_events", side_effect=TimeoutError("xadd")):
+        await ingest_events(
+            mock.AsyncMock(), submission_id,
+            [SimpleNamespace(event_type="tab_hidden", details=None, occurred_at=None)],
+        )
+
+    assert await fake_redis.hget(focus_key(submission_id), REBUILD_FIELD) == "1"
+
+
+@pytest.mark.asyncio
+async def test_events_of_deleted_submission_are_dropped(fake_redis):
+    kept, deleted = uuid4(), uuid4()
+    for submission_id in (kept, deleted):
+        await ingest_events(
+            mock.AsyncMock(), submission_id,
+            [SimpleNamespace(event_type="window_blur", details=None, occurred_at=None)],
+        )
+
+    batches = []
+    assert await flush_events(lambda: FakeSession(batches, existing=[kept])) == 1
+    assert [row["submission_id"] for row in batches[0]] == [kept]
+    assert await fake_redis.xlen(SUBMISSION_EVENTS_STREAM) == 0
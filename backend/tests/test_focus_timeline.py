@@ -0,0 +1,120 @@
+"""
+Тесты инкрементальной сводки поведения по вопросам
+"""
+
+import json
+import unittest.mock as mock
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.services.focus_timeline import (
+    NO_QUESTION,
+    REBUILD_FIELD,
+    anticheat_fields,
+    apply_event,
+    focus_key,
+    mark_summaries_incomplete,
+    new_summary,
+    persist_focus_summary,
+    question_summary,
+    update_summaries,
+)
+
+START = datetime(2026, 10, 19, 10, 0, 0)
+
+
+def _at(seconds: float) -> datetime:
+    return START + timedelta(seconds=seconds)
+
+
+def test_summary_matches_event_log_semantics():
+    summary = new_summary()
+    for event_type, second in [
+        ("window_blur", 5), ("tab_hidden", 6), ("tab_visible", 16), ("window_focus", 17),
+        ("paste_attempted", 20), ("tab_hidden", 40),  # не вернулся до отправки — не учитывается
+    ]:
+        apply_event(summary, event_type, _at(second))
+
+    assert summary["away_seconds"] == 10.0 and summary["away_count"] == 1
+    assert summary["paste_count"] == 1
+    assert [entry["event"] for entry in summary["log"]] == ["away_from_tab", "paste_attempted"]
+    assert summary["log"][0] == {"event": "away_from_tab", "duration": "10.0s", "at": "10:00:16"}
+
+    fields = anticheat_fields(summary, START, _at(60))
+    assert fields["total_time_seconds"] == 60.0
+    assert fields["away_time_seconds"] == 10.0 and fields["focus_time_seconds"] == 50.0
+
+
+def test_replayed_stream_entries_are_not_counted_twice():
+    summary = new_summary()
+    assert apply_event(summary, "tab_hidden", _at(1), "1000-0")
+    assert apply_event(summary, "tab_visible", _at(4), "1000-1")
+    assert not apply_event(summary, "tab_visible", _at(4), "1000-1")
+    assert not apply_event(summary, "tab_hidden", _at(1), "999-5")
+    assert summary["away_seconds"] == 3.0 and summary["away_count"] == 1
+
+
+def test_question_summary_includes_events_without_question():
+    question_id = uuid4()
+    own, unbound, other = new_summary(), new_summary(), new_summary()
+    apply_event(own, "paste_attempted", _at(30))
+    apply_event(unbound, "tab_hidden", _at(10))
+    apply_event(unbound, "tab_visible", _at(12))
+    apply_event(other, "paste_attempted", _at(50))
+
+    merged = question_summary({str(question_id): own, NO_QUESTION: unbound, str(uuid4()): other}, question_id)
+
+    assert merged["paste_count"] == 1 and merged["away_seconds"] == 2.0
+    assert [entry["event"] for entry in merged["log"]] == ["away_from_tab", "paste_attempted"]
+    assert merged["first_ts"] == _at(10).isoformat() and merged["last_ts"] == _at(30).isoformat()
+    # Вопрос без событий: пустая сводка, время работы по попытке
+    assert anticheat_fields(question_summary({}, question_id), START, _at(90))["total_time_seconds"] == 90.0
+
+
+@pytest.mark.asyncio
+async def test_summaries_accumulate_across_chunks_and_persist(fake_redis):
+    client = fake_redis
+    submission_id, question_id = uuid4(), uuid4()
+
+    def row(event_type, second, question=question_id):
+        return {"submission_id": submission_id, "question_id": question, "event_type": event_type, "ts": _at(second)}
+
+    await update_summaries(client, [("1-0", row("tab_hidden", 5)), ("1-1", row("paste_attempted", 6, None))])
+    await update_summaries(client, [("2-0", row("tab_visible", 15))])
+
+    stored = await client.hgetall(focus_key(submission_id))
+    assert json.loads(stored[str(question_id)])["away_seconds"] == 10.0
+    assert json.loads(stored[NO_QUESTION])["paste_count"] == 1
+
+    submission = SimpleNamespace(id=submission_id, focus_summary=None)
+    summaries = await persist_focus_summary(mock.AsyncMock(), submission)
+
+    assert submission.focus_summary == summaries
+    assert question_summary(summaries, question_id)["away_seconds"] == 10.0
+    assert not await client.exists(focus_key(submission_id))
+
+
+@pytest.mark.asyncio
+async def test_incomplete_summaries_are_rebuilt_from_db(fake_redis):
+    client = fake_redis
+    submission_id, question_id = uuid4(), uuid4()
+    row = {"submission_id": submission_id, "question_id": question_id, "event_type": "paste_attempted", "ts": _at(5)}
+
+    await mark_summaries_incomplete(client, [submission_id])
+    # Следующие события из stream не снимают метку
+    await update_summaries(client, [("1-0", row)])
+
+    session = mock.AsyncMock()
+    session.execute.return_value = mock.Mock(all=lambda: [
+        (question_id, "paste_attempted", _at(1)),
+        (question_id, "paste_attempted", _at(5)),
+    ])
+    submission = SimpleNamespace(id=submission_id, focus_summary=None)
+    summaries = await persist_focus_summary(session, submission)
+
+    assert question_summary(summaries, question_id)["paste_count"] == 2
+    assert REBUILD_FIELD not in summaries
+    assert not await client.exists(focus_key(submission_id))
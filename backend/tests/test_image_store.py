@@ -0,0 +1,131 @@
+"""
+Тесты контентно-адресуемого хранения изображений
+"""
+
+import io
+import unittest.mock as mock
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app.core.storage import AsyncStorageService
+from app.models.question import ImageAsset
+from app.services import image_store
+from app.services.image_store import (
+    IMMUTABLE_CACHE_CONTROL,
+    content_hash,
+    content_object_name,
+    inspect_image_stream,
+    rekey_image_assets,
+    store_image_content,
+    store_image_stream,
+)
+
+
+def _png(color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def storage():
+    objects = {}
+
+    def upload_file(file_data, object_name, content_type=None, metadata=None):
+        objects[object_name] = (file_data.read(), metadata)
+        return f"bucket/{object_name}"
+
+    service = mock.Mock()
+    service.upload_file.side_effect = upload_file
+    service.file_exists.side_effect = lambda name: name in objects
+    service.download_file.side_effect = lambda name: objects[name][0]
+    service.delete_file.side_effect = lambda name: objects.pop(name, None) is not None
+    service._executor = ThreadPoolExecutor(max_workers=1)
+    service.objects = objects
+    with mock.patch.object(image_store, "storage_service", service), \
+            mock.patch.object(image_store, "async_storage", AsyncStorageService(service)):
+        yield service
+    service._executor.shutdown()
+
+
+def test_object_name_depends_only_on_content_and_format():
+    digest = content_hash(_png())
+    assert content_object_name(digest, "PNG", "slide.jpeg") == f"images/sha256/{digest}.png"
+    assert content_object_name(digest, None, "scan.DCM") == f"images/sha256/{digest}.dcm"
+
+
+@pytest.mark.asyncio
+async def test_identical_upload_reuses_object(storage):
+    content = _png()
+    db = mock.AsyncMock()
+    db.scalar.return_value = None
+
+    path, digest = await store_image_content(db, content, "PNG", "image/png", "a.png")
+    assert storage.objects[path.split("/", 1)[1]][1] == {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+
+    db.scalar.return_value = path
+    again, again_digest = await store_image_content(db, content, "PNG", "image/png", "copy-of-a.png")
+    assert (again, again_digest) == (path, digest)
+    assert storage.upload_file.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_rekey_moves_legacy_objects_and_dedups(storage):
+    content = _png()
+    storage.objects["images/old-1.png"] = (content, None)
+    storage.objects["images/old-2.png"] = (content, None)
+    images = [
+        ImageAsset(id=uuid4(), filename="a.png", storage_path="bucket/images/old-1.png", width=4, height=4, file_size=1),
+        ImageAsset(id=uuid4(), filename="b.png", storage_path="bucket/images/old-2.png", width=4, height=4, file_size=1),
+    ]
+    images.sort(key=lambda image: image.id)
+
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.Mock(scalars=lambda: mock.Mock(all=lambda: images))
+    # Объекта с таким хэшем ещё нет; на старые пути ссылок не осталось
+    db.scalar.side_effect = [None, 0, 0]
+
+    moved, last_id = await rekey_image_assets(db, batch_size=10)
+
+    assert (moved, last_id) == (2, images[-1].id)
+    new_name = content_object_name(content_hash(content), "PNG")
+    assert images[0].storage_path == images[1].storage_path == f"bucket/{new_name}"
+    assert images[0].content_hash == content_hash(content)
+    assert set(storage.objects) == {new_name}
+    db.commit.assert_awaited_once()
+
+
+def test_inspect_reads_stream_in_chunks_and_rewinds():
+    content = _png()
+    stream = io.BytesIO(content)
+
+    with mock.patch.object(image_store, "HASH_CHUNK_SIZE", 16):
+        info = inspect_image_stream(stream, max_size=len(content))
+
+    assert (info.size, info.digest) == (len(content), content_hash(content))
+    assert (info.image_format, info.width, info.height) == ("PNG", 4, 4)
+    assert stream.tell() == 0
+
+
+def test_inspect_rejects_oversized_upload():
+    with pytest.raises(HTTPException) as exc_info:
+        inspect_image_stream(io.BytesIO(_png()), max_size=10)
+    assert exc_info.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_stream_upload_runs_in_storage_executor(storage):
+    content = _png()
+    stream = io.BytesIO(content)
+    info = inspect_image_stream(stream, max_size=len(content))
+    db = mock.AsyncMock()
+    db.scalar.return_value = None
+
+    path = await store_image_stream(db, stream, info.digest, info.image_format, "image/png", "a.png")
+
+    assert storage.objects[path.split("/", 1)[1]][0] == content
+    storage.file_exists.assert_not_called()
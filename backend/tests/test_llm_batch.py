@@ -0,0 +1,263 @@
+"""
+Тесты пакетной оценки нескольких ответов на один вопрос
+"""
+
+import json
+import unittest.mock as mock
+from uuid import uuid4
+
+import httpx
+import pytest
+
+from app.models.question import Question, QuestionType
+from app.models.submission import Answer, Submission, SubmissionStatus
+from app.services.llm_service import (
+    BaseLLMProvider,
+    LLMService,
+    OpenAICompatibleProvider,
+    split_batch_evaluations,
+)
+from app.tasks import evaluation_tasks
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+
+def _evaluation(total: int, **extra):
+    return {"criteria_scores": {"factual_correctness": total}, "total_score": total, "feedback": "ok", **extra}
+
+
+class FakeBatchProvider(BaseLLMProvider):
+    """Пакетный ответ теряет оценку второго ответа"""
+
+    supports_batch = True
+
+    def __init__(self):
+        self.batch_calls = []
+        self.single_calls = []
+
+    async def evaluate_answer(self, question, reference_answer, student_answer, criteria, config=None):
+        self.single_calls.append(student_answer)
+        return _evaluation(50)
+
+    async def evaluate_answers_batch(self, question, reference_answer, student_answers, criteria, config=None):
+        self.batch_calls.append(list(student_answers))
+        return [_evaluation(80 + i) if i != 1 else None for i in range(len(student_answers))]
+
+
+def test_split_by_answer_index():
+    parsed = {"evaluations": [_evaluation(10, answer_index=2), _evaluation(20, answer_index=1)]}
+    results = split_batch_evaluations(parsed, 3)
+
+    assert results[0]["total_score"] == 20
+    assert results[1]["total_score"] == 10
+    assert "answer_index" not in results[1]
+    assert results[2] is None
+
+
+def test_split_rejects_invalid_and_duplicate_items():
+    parsed = {"evaluations": [
+        _evaluation(10, answer_index=1),
+        _evaluation(99, answer_index=1),
+        {"answer_index": 2, "total_score": 5},
+        _evaluation(30, answer_index=7),
+        {"answer_index": 3, "criteria_scores": {}, "total_score": True},
+    ]}
+    assert split_batch_evaluations(parsed, 3) == [_evaluation(10), None, None]
+
+
+def test_split_positional_only_when_counts_match():
+    assert [r["total_score"] for r in split_batch_evaluations([_evaluation(1), _evaluation(2)], 2)] == [1, 2]
+    assert split_batch_evaluations([_evaluation(1)], 2) == [None, None]
+    assert split_batch_evaluations({"unexpected": 1}, 2) == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_missing_answers_are_retried_individually():
+    service = LLMService()
+    provider = FakeBatchProvider()
+    answers = ["a1", "a2", "a3", "a4", "a5"]
+
+    with mock.patch.object(service.router, "get_provider", return_value=provider):
+        results = await service.evaluate_text_answers_batch(
+            "Вопрос", "Эталон", answers, CRITERIA,
+            config={"batch_size": 3},
+            answer_configs=[{}, {}, {}, {"plagiarism_score": 0.9}, {}],
+        )
+
+    assert provider.batch_calls == [["a1", "a2", "a3"], ["a4", "a5"]]
+    # Пропущенные в пакетах ответы (второй в каждом пакете) оценены по одному
+    assert provider.single_calls == ["a2", "a5"]
+    assert [r["provider"] for r in results] == [
+        "FakeBatchProvider (Batch)", "FakeBatchProvider", "FakeBatchProvider (Batch)",
+        "FakeBatchProvider (Batch)", "FakeBatchProvider",
+    ]
+    # Штрафы применяются с индивидуальным конфигом ответа
+    assert results[3]["plagiarism_found"] is True
+    assert results[3]["total_score"] == 0
+    assert results[0]["total_score"] == 80
+
+
+@pytest.mark.asyncio
+async def test_provider_without_batch_support_is_not_batched():
+    service = LLMService()
+    provider = FakeBatchProvider()
+    provider.supports_batch = False
+
+    with mock.patch.object(service.router, "get_provider", return_value=provider):
+        results = await service.evaluate_text_answers_batch("Вопрос", "Эталон", ["a1", "a2", "a3"], CRITERIA)
+
+    assert provider.batch_calls == []
+    assert provider.single_calls == ["a1", "a2", "a3"]
+    assert all(r["provider"] == "FakeBatchProvider" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_openai_batch_request_and_split():
+    captured = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        captured.update(json.loads(request.content))
+        content = json.dumps({"evaluations": [_evaluation(70, answer_index=2), _evaluation(60, answer_index=1)]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    real_client = httpx.AsyncClient
+    provider = OpenAICompatibleProvider("https://llm.test/v1", "test-model", "deepseek_api_key")
+    with mock.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda *a, **kw: real_client(transport=httpx.MockTransport(handler)),
+    ):
+        results = await provider.evaluate_answers_batch(
+            "Вопрос", "Эталон", ["первый ответ", "второй ответ"], CRITERIA,
+            config={"deepseek_api_key": "key"},
+        )
+
+    prompt = captured["messages"][-1]["content"]
+    assert "### Ответ №1\nпервый ответ" in prompt
+    assert "### Ответ №2\nвторой ответ" in prompt
+    assert '"answer_index"' in prompt
+    # Формат одиночной оценки заменён пакетным, а не дополнен им
+    assert prompt.count("ФОРМАТ ОТВЕТА") == 1
+    assert "всех 2 ответов" in prompt
+    assert [r["total_score"] for r in results] == [60, 70]
+
+
+@pytest.mark.asyncio
+async def test_event_log_questions_recalculate_completed_submissions():
+    question = Question(type=QuestionType.TEXT, event_log_check_enabled=True)
+    answers = [Answer(submission_id=uuid4()), Answer(submission_id=uuid4())]
+    for answer in answers:
+        answer.id = uuid4()
+    session = mock.AsyncMock()
+    session.execute.side_effect = [
+        mock.Mock(scalar_one_or_none=lambda: question),
+        mock.Mock(scalars=lambda: mock.Mock(all=lambda: answers)),
+    ]
+
+    with mock.patch.object(evaluation_tasks, "run_evaluate_text_answer") as evaluate_one, \
+            mock.patch.object(evaluation_tasks, "_recalculate_completed_submissions") as recalculate, \
+            mock.patch.object(evaluation_tasks, "_complete_evaluated_submissions") as complete:
+        result = await evaluation_tasks.run_evaluate_text_answers_batch(session, str(uuid4()), [str(a.id) for a in answers])
+
+    assert result["batched"] is False
+    assert evaluate_one.await_count == 2
+    recalculate.assert_awaited_once_with(session, {answer.submission_id for answer in answers})
+    complete.assert_awaited_once_with(session, {answer.submission_id for answer in answers})
+
+
+@pytest.mark.asyncio
+async def test_submitted_answers_are_queued_per_question(fake_redis):
+    question_id = str(uuid4())
+    with mock.patch.object(evaluation_tasks.evaluate_pending_text_answers, "apply_async") as schedule:
+        assert await evaluation_tasks._queue_text_answers({question_id: ["a1"]}) == {question_id}
+        # Вторая работа в то же окно: проход уже запланирован
+        assert await evaluation_tasks._queue_text_answers({question_id: ["a2"]}) == {question_id}
+
+    schedule.assert_called_once_with((question_id,), countdown=evaluation_tasks.TEXT_BATCH_WINDOW_SECONDS)
+    pending = await fake_redis.smembers(f"{evaluation_tasks.TEXT_BATCH_PENDING_PREFIX}{question_id}")
+    assert pending == {"a1", "a2"}
+
+
+@pytest.mark.asyncio
+async def test_answers_are_graded_inline_if_queueing_fails(fake_redis):
+    question_id = str(uuid4())
+    with mock.patch.object(
+        evaluation_tasks.evaluate_pending_text_answers, "apply_async", side_effect=ConnectionError("broker down")
+    ):
+        assert await evaluation_tasks._queue_text_answers({question_id: ["a1"]}) == set()
+
+    # Ответ не останется в очереди и не будет оценён второй раз
+    assert not await fake_redis.exists(f"{evaluation_tasks.TEXT_BATCH_PENDING_PREFIX}{question_id}")
+
+
+class FakeSession:
+    def __init__(self):
+        self.info = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_pending_answers_are_graded_in_batches(fake_redis, monkeypatch):
+    question_id = str(uuid4())
+    monkeypatch.setattr(evaluation_tasks, "TEXT_BATCH_TASK_SIZE", 2)
+    await fake_redis.sadd(f"{evaluation_tasks.TEXT_BATCH_PENDING_PREFIX}{question_id}", "a1", "a2", "a3")
+    await fake_redis.set(f"{evaluation_tasks.TEXT_BATCH_SCHEDULED_PREFIX}{question_id}", "1")
+
+    with mock.patch.object(evaluation_tasks, "run_evaluate_text_answers_batch") as batch:
+        assert await evaluation_tasks.run_evaluate_pending_text_answers(FakeSession, question_id) == 3
+
+    assert sorted(len(call.args[2]) for call in batch.await_args_list) == [1, 2]
+    assert sorted(sum((call.args[2] for call in batch.await_args_list), [])) == ["a1", "a2", "a3"]
+    # Следующая работа запланирует новый проход
+    assert not await fake_redis.exists(f"{evaluation_tasks.TEXT_BATCH_SCHEDULED_PREFIX}{question_id}")
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_answers(fake_redis):
+    question_id = str(uuid4())
+    await fake_redis.sadd(f"{evaluation_tasks.TEXT_BATCH_PENDING_PREFIX}{question_id}", "a1", "a2")
+
+    with mock.patch.object(evaluation_tasks, "run_evaluate_text_answers_batch", side_effect=RuntimeError("llm")), \
+            mock.patch.object(evaluation_tasks, "_evaluate_text_answers_one_by_one") as one_by_one:
+        assert await evaluation_tasks.run_evaluate_pending_text_answers(FakeSession, question_id) == 2
+
+    assert sorted(one_by_one.await_args.args[1]) == ["a1", "a2"]
+
+
+@pytest.mark.asyncio
+async def test_submission_completes_when_all_text_answers_are_graded():
+    text, choice = Question(type=QuestionType.TEXT, difficulty=1), Question(type=QuestionType.CHOICE, difficulty=1)
+    waiting = Submission(status=SubmissionStatus.EVALUATING, answers=[
+        Answer(question=text, score=80, evaluation={"feedback": "ok"}),
+        Answer(question=text, score=None, evaluation=None),
+    ])
+    ready = Submission(status=SubmissionStatus.EVALUATING, answers=[
+        Answer(question=text, score=80, evaluation={"feedback": "ok"}),
+        Answer(question=choice, score=40, evaluation=None),
+    ])
+    session = mock.AsyncMock()
+    session.execute.return_value = mock.Mock(scalars=lambda: mock.Mock(all=lambda: [waiting, ready]))
+
+    await evaluation_tasks._complete_evaluated_submissions(session, {uuid4()})
+
+    assert waiting.status == SubmissionStatus.EVALUATING and waiting.result is None
+    assert ready.status == SubmissionStatus.COMPLETED and ready.result["percentage"] == 60
+
+
+def test_weighted_submission_result():
+    # Сложность 3 — вес 2.0, сложность 1 (или не задана) — вес 1.0
+    result = evaluation_tasks.weighted_submission_result([(100, 3), (40, 1), (None, None)])
+
+    assert result["weighted_details"] == {"total_weighted": 240, "max_weighted": 400}
+    assert result["percentage"] == 60
+    assert result["grade"] == "3"
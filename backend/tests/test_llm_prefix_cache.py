@@ -0,0 +1,119 @@
+"""
+Тесты раскладки промпта под префиксный кэш провайдера и учёта cached-токенов
+"""
+
+import json
+import unittest.mock as mock
+
+import httpx
+import pytest
+
+from app.services.llm_service import OpenAICompatibleProvider, YandexGPTProvider, normalize_usage
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+CONFIG = {
+    "evaluation_prompt": (
+        "## ВОПРОС\n{question}\n\n## ЭТАЛОН\n{reference_answer}\n\n## ОТВЕТ СТУДЕНТА\n{student_answer}\n\n"
+        "Критерии:\n{criteria_text}\n\n## ФОРМАТ ОТВЕТА\n"
+        '{{"criteria_scores": {{}}, "total_score": 0, "feedback": ""}}'
+    ),
+    "integrity_check_prompt": "\nВне фокуса: {away_time_seconds} сек. События: {event_log}\n",
+    "prefix_cache_providers": ["deepseek"],
+}
+
+
+def test_prefix_is_identical_for_different_answers():
+    provider = YandexGPTProvider()
+    events = dict(CONFIG, event_log=[{"event": "paste_attempted", "at": "10:00:00"}], away_time_seconds=3)
+
+    prefix_a, data_a = provider._prepare_prompt_parts("Вопрос 1", "Эталон 1", "Ответ А", CRITERIA, events)
+    prefix_b, data_b = provider._prepare_prompt_parts(
+        "Вопрос 2", "Эталон 2", "Ответ Б", CRITERIA, dict(events, away_time_seconds=40)
+    )
+
+    assert prefix_a == prefix_b
+    assert "Ответ А" not in prefix_a and "Вопрос 1" not in prefix_a
+    assert "[см. «ОТВЕТ СТУДЕНТА» в блоке данных ниже]" in prefix_a
+    assert "## АНТИ-ЧИТ ПРОВЕРКА" in prefix_a and '"integrity_score"' in prefix_a
+    # Данные: вопрос и эталон раньше ответа и журнала событий
+    assert data_a.index("Вопрос 1") < data_a.index("Эталон 1") < data_a.index("Ответ А") < data_a.index("paste_attempted")
+    assert "### ВРЕМЯ ВНЕ ВКЛАДКИ, СЕК.\n40" in data_b
+
+
+def test_normalize_usage_cached_fields():
+    assert normalize_usage({"prompt_tokens": 900, "completion_tokens": 80, "prompt_cache_hit_tokens": 768}) == {
+        "prompt_tokens": 900, "completion_tokens": 80, "cached_tokens": 768,
+    }
+    assert normalize_usage({"prompt_tokens": 10, "completion_tokens": 2, "prompt_tokens_details": {"cached_tokens": 8}})["cached_tokens"] == 8
+    assert normalize_usage({"inputTextTokens": "120", "completionTokens": "30", "totalTokens": "150"}) == {
+        "prompt_tokens": 120, "completion_tokens": 30,
+    }
+    assert normalize_usage(None) is None
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_sends_static_system_prefix():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        content = json.dumps({"criteria_scores": {"factual_correctness": 30}, "total_score": 30, "feedback": "ok"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": content}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 40, "prompt_cache_hit_tokens": 448},
+        })
+
+    real_client = httpx.AsyncClient
+    provider = OpenAICompatibleProvider("https://llm.test/v1", "test-model", "deepseek_api_key")
+    with mock.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda *a, **kw: real_client(transport=httpx.MockTransport(handler)),
+    ):
+        first = await provider.evaluate_answer("Вопрос", "Эталон", "Ответ 1", CRITERIA, dict(CONFIG, deepseek_api_key="k"))
+        await provider.evaluate_answer("Вопрос", "Эталон", "Ответ 2", CRITERIA, dict(CONFIG, deepseek_api_key="k"))
+
+    system_1, user_1 = requests[0]["messages"]
+    system_2, user_2 = requests[1]["messages"]
+    assert system_1 == system_2
+    # Встроенный промпт провайдера, а не evaluation_prompt из настроек
+    assert "Верни ответ ТОЛЬКО в формате JSON" in system_1["content"]
+    assert "## ЭТАЛОН" not in system_1["content"]
+    assert user_1["content"].startswith("## ДАННЫЕ ДЛЯ ОЦЕНКИ")
+    assert user_1["content"].endswith("Ответ 1")
+    assert first["usage"]["cached_tokens"] == 448
+
+
+def test_prefix_layout_is_per_provider():
+    provider = OpenAICompatibleProvider("https://llm.test/v1", "qwen-plus", "qwen_api_key")
+    assert provider.name == "qwen"
+    assert not provider._uses_prefix_layout(CONFIG)
+    assert YandexGPTProvider()._uses_prefix_layout(dict(CONFIG, prefix_cache_providers=["yandex"]))
+
+
+@pytest.mark.asyncio
+async def test_openai_prefix_layout_keeps_prompt_content():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        content = json.dumps({"criteria_scores": {}, "total_score": 0, "feedback": "ok"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    real_client = httpx.AsyncClient
+    provider = OpenAICompatibleProvider("https://llm.test/v1", "test-model", "deepseek_api_key")
+    with mock.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda *a, **kw: real_client(transport=httpx.MockTransport(handler)),
+    ):
+        for prefix_providers in ([], ["deepseek"]):
+            config = dict(CONFIG, deepseek_api_key="k", prefix_cache_providers=prefix_providers)
+            await provider.evaluate_answer("Вопрос", "Эталон", "Ответ", CRITERIA, config)
+
+    plain = requests[0]["messages"][1]["content"]
+    system, data = (message["content"] for message in requests[1]["messages"])
+    # Текст инструкций тот же, меняется только место данных ответа
+    for line in ("Оцени ответ студента по критериям.", "- Factual Correctness: 0-40 баллов", '"total_score": <сумма>'):
+        assert line in plain and line in system
+    assert "ОТВЕТ СТУДЕНТА: Ответ" in plain
+    assert data.endswith("Ответ")
@@ -0,0 +1,155 @@
+"""
+Тесты потокового режима LLM-провайдеров с ранней остановкой на JSON
+"""
+
+import json
+import unittest.mock as mock
+
+import httpx
+import pytest
+
+from app.services.llm_service import OpenAICompatibleProvider, StreamingJSONCollector, YandexGPTProvider
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+EVALUATION = {
+    "criteria_scores": {"factual_correctness": 30, "completeness": 20, "terminology": 15, "structure": 8},
+    "total_score": 73,
+    "feedback": "Ответ неполный, {скобки} в тексте допустимы",
+}
+
+
+def _split(text: str, size: int = 7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _patched_client(handler):
+    """Подмена httpx.AsyncClient на клиент с MockTransport"""
+    real_client = httpx.AsyncClient
+    return mock.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda *a, **kw: real_client(transport=httpx.MockTransport(handler)),
+    )
+
+
+def test_collector_stops_on_first_complete_object():
+    collector = StreamingJSONCollector()
+    text = "Вот оценка: " + json.dumps(EVALUATION, ensure_ascii=False) + "\nДополнительно поясню, что {ещё} ..."
+
+    done_at = None
+    for i, chunk in enumerate(_split(text)):
+        if collector.feed(chunk):
+            done_at = i
+            break
+
+    assert collector.complete
+    assert collector.result == EVALUATION
+    # Хвост с прозой не дочитывался
+    assert done_at is not None and done_at < len(_split(text)) - 1
+
+
+def test_collector_skips_objects_without_evaluation_fields():
+    collector = StreamingJSONCollector()
+    collector.feed('Пример формата: {"a": 1}. Ответ: ')
+    assert not collector.complete
+
+    collector.feed(json.dumps(EVALUATION, ensure_ascii=False))
+    assert collector.result == EVALUATION
+
+
+def test_collector_handles_escaped_quotes_and_braces_in_strings():
+    payload = dict(EVALUATION, feedback='Студент написал "}" и \\"{\\" — это не ломает разбор')
+    collector = StreamingJSONCollector()
+    for chunk in _split(json.dumps(payload, ensure_ascii=False), 3):
+        collector.feed(chunk)
+    assert collector.result == payload
+
+
+def test_collector_cumulative_mode():
+    collector = StreamingJSONCollector()
+    full = json.dumps(EVALUATION, ensure_ascii=False)
+    for end in range(5, len(full) + 5, 5):
+        if collector.feed_cumulative(full[:end]):
+            break
+    assert collector.result == EVALUATION
+
+
+@pytest.mark.asyncio
+async def test_openai_stream_terminates_after_json():
+    body = json.dumps(EVALUATION, ensure_ascii=False) + " А теперь длинное пояснение..."
+    lines = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}, ensure_ascii=False)
+        for chunk in _split(body)
+    ]
+    sse = "\n\n".join(lines + ["data: [DONE]"]) + "\n\n"
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, content=sse.encode("utf-8"))
+
+    provider = OpenAICompatibleProvider("https://llm.test/v1", "test-model", "deepseek_api_key")
+    with _patched_client(handler):
+        result = await provider.evaluate_answer(
+            "Вопрос", "Эталон", "Ответ", CRITERIA,
+            config={"deepseek_api_key": "key", "stream_enabled": True},
+        )
+
+    assert requests[0]["stream"] is True
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    # Остановились до финального чанка с usage — usage оценён по длине текста
+    usage = result.pop("usage")
+    assert usage["prompt_tokens"] > 0 and usage["completion_tokens"] > 0
+    assert result == EVALUATION
+
+
+@pytest.mark.asyncio
+async def test_yandex_stream_falls_back_to_parser():
+    # Модель обернула JSON в markdown и добавила висячую запятую — строгий JSON не соберётся
+    text = '```json\n{"criteria_scores": {"factual_correctness": 10,}, "total_score": 10, "feedback": "ok"}\n```'
+    chunks = [
+        json.dumps({"result": {"alternatives": [{"message": {"role": "assistant", "text": text[:end]}}]}})
+        for end in range(10, len(text) + 10, 10)
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["completionOptions"]["stream"] is True
+        return httpx.Response(200, content="\n".join(chunks).encode("utf-8"))
+
+    provider = YandexGPTProvider()
+    with _patched_client(handler):
+        result = await provider.evaluate_answer(
+            "Вопрос", "Эталон", "Ответ", CRITERIA,
+            config={"yandex_api_key": "AQVN-key", "yandex_folder_id": "folder", "stream_enabled": True},
+        )
+
+    assert result["total_score"] == 10
+    assert result["criteria_scores"] == {"factual_correctness": 10}
+
+
+@pytest.mark.asyncio
+async def test_yandex_stream_reports_usage_from_chunks():
+    text = json.dumps(EVALUATION, ensure_ascii=False) + " пояснение"
+    chunks = [
+        json.dumps({"result": {
+            "alternatives": [{"message": {"role": "assistant", "text": text[:end]}}],
+            "usage": {"inputTextTokens": "120", "completionTokens": str(end // 10), "totalTokens": "0"},
+        }}, ensure_ascii=False)
+        for end in range(10, len(text) + 10, 10)
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content="\n".join(chunks).encode("utf-8"))
+
+    provider = YandexGPTProvider()
+    with _patched_client(handler):
+        result = await provider.evaluate_answer(
+            "Вопрос", "Эталон", "Ответ", CRITERIA,
+            config={"yandex_api_key": "AQVN-key", "yandex_folder_id": "folder", "stream_enabled": True},
+        )
+
+    # usage накопительный: берётся из последней прочитанной строки (первой с полным JSON)
+    json_end = len(json.dumps(EVALUATION, ensure_ascii=False))
+    last_read = next(end for end in range(10, len(text) + 10, 10) if end >= json_end)
+    assert result.pop("usage") == {"prompt_tokens": 120, "completion_tokens": last_read // 10}
+    assert result == EVALUATION
@@ -0,0 +1,164 @@
+"""
+Тесты учёта вызовов LLM (токены, задержка, повторы, fallback)
+"""
+
+import unittest.mock as mock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.llm_service import BaseLLMProvider, LLMService
+from app.services.llm_usage import (
+    LLM_CALLS_FLUSH_LOCK,
+    LLM_CALLS_STREAM,
+    LLMCallRecord,
+    estimate_cost,
+    flush_calls,
+    model_from_payload,
+    note_response,
+    note_usage,
+    parse_stream_fields,
+)
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+
+class FakeProvider(BaseLLMProvider):
+    def __init__(self, name: str, feedback: str = "ok", total: int = 70):
+        self.name = name
+        self.feedback = feedback
+        self.total = total
+
+    async def evaluate_answer(self, question, reference_answer, student_answer, criteria, config=None):
+        note_response(200 if self.feedback == "ok" else 503, f"{self.name}-model")
+        note_usage({"prompt_tokens": 100, "completion_tokens": 20, "cached_tokens": 64})
+        return {"criteria_scores": {}, "total_score": self.total, "feedback": self.feedback}
+
+
+def test_record_roundtrip_through_stream_fields():
+    call = LLMCallRecord("deepseek", "evaluate", fallback=True, retries=1)
+    call.model = "deepseek-chat"
+    call.http_status = 429
+    call.latency_ms = 812
+    call.add_usage({"prompt_tokens": 900, "completion_tokens": 80, "cached_tokens": 768})
+
+    row = parse_stream_fields("1697700000000-0", call.to_fields())
+
+    assert row["provider"] == "deepseek" and row["model"] == "deepseek-chat"
+    assert row["success"] is False and row["fallback"] is True and row["retries"] == 1
+    assert row["http_status"] == 429 and row["latency_ms"] == 812
+    assert (row["prompt_tokens"], row["completion_tokens"], row["cached_tokens"]) == (900, 80, 768)
+    assert row["created_at"] == call.created_at
+    assert row["stream_id"] == "1697700000000-0"
+
+    # Без ответа (таймаут) статус и модель пустые
+    empty = parse_stream_fields("1697700000000-1", LLMCallRecord("yandex", "evaluate").to_fields())
+    assert empty["http_status"] is None and empty["model"] is None
+
+
+def test_model_from_payload():
+    assert model_from_payload({"model": "qwen-plus"}) == "qwen-plus"
+    assert model_from_payload({"modelUri": "gpt://b1gfolder/yandexgpt-lite/latest"}) == "yandexgpt-lite/latest"
+    assert model_from_payload({}) is None
+
+
+def test_estimate_cost_uses_cached_price():
+    prices = {"input": 0.27, "cached_input": 0.07, "output": 1.1}
+    assert estimate_cost(prices, 1_000_000, 1_000_000, cached_tokens=500_000) == pytest.approx(0.135 + 0.035 + 1.1)
+    assert estimate_cost({"input": 1.0}, 1_000_000, 0, cached_tokens=1_000_000) == pytest.approx(1.0)
+    assert estimate_cost(None, 10, 10) is None
+
+
+@pytest.mark.asyncio
+async def test_primary_failure_and_fallback_are_recorded():
+    service = LLMService()
+    primary = FakeProvider("deepseek", feedback="Error: 503 Service Unavailable", total=0)
+    fallback = FakeProvider("local")
+    published = []
+
+    async def _publish(call):
+        published.append(call)
+
+    with mock.patch("app.services.llm_usage.publish_call", side_effect=_publish), \
+            mock.patch.object(service.router, "get_provider", side_effect=[primary, fallback]):
+        result = await service.evaluate_text_answer("Вопрос", "Эталон", "Ответ", CRITERIA, config={"strategy": "deepseek"})
+
+    assert result["provider"] == "FakeProvider (Fallback)"
+    first, second = published
+    assert (first.provider, first.success, first.fallback, first.retries, first.http_status) == ("deepseek", False, False, 0, 503)
+    assert (second.provider, second.success, second.fallback, second.retries, second.model) == ("local", True, True, 1, "local-model")
+    assert second.cached_tokens == 64 and second.latency_ms >= 0
+
+
+@pytest.mark.asyncio
+async def test_provider_without_batch_mode_is_not_recorded_as_batch_call():
+    service = LLMService()
+    provider = FakeProvider("gigachat")
+    published = []
+
+    async def _publish(call):
+        published.append(call)
+
+    with mock.patch("app.services.llm_usage.publish_call", side_effect=_publish), \
+            mock.patch.object(service.router, "get_provider", return_value=provider):
+        await service.evaluate_text_answers_batch("Вопрос", "Эталон", ["a1", "a2"], CRITERIA, config={})
+
+    assert [(c.operation, c.retries) for c in published] == [("evaluate", 0), ("evaluate", 0)]
+
+
+class FakeSession:
+    def __init__(self, statements):
+        self.statements = statements
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, statement, rows):
+        self.statements.append((statement, rows))
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_flush_is_idempotent_per_stream_entry(fake_redis):
+    entry_ids = [
+        await fake_redis.xadd(LLM_CALLS_STREAM, LLMCallRecord("yandex", "evaluate").to_fields())
+        for _ in range(3)
+    ]
+    statements = []
+
+    assert await flush_calls(lambda: FakeSession(statements)) == 3
+
+    (statement, rows), = statements
+    # Повторная вставка пачки (сбой между commit и XDEL) пропускается по stream_id
+    compiled = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (stream_id) DO NOTHING" in compiled
+    assert [row["stream_id"] for row in rows] == entry_ids
+    assert await fake_redis.xlen(LLM_CALLS_STREAM) == 0
+    assert not await fake_redis.exists(LLM_CALLS_FLUSH_LOCK)
+
+
+@pytest.mark.asyncio
+async def test_flush_skips_when_locked_and_keeps_next_holders_lock(fake_redis):
+    await fake_redis.xadd(LLM_CALLS_STREAM, LLMCallRecord("yandex", "evaluate").to_fields())
+    await fake_redis.set(LLM_CALLS_FLUSH_LOCK, "other")
+    statements = []
+
+    assert await flush_calls(lambda: FakeSession(statements)) == 0
+    assert statements == [] and await fake_redis.get(LLM_CALLS_FLUSH_LOCK) == "other"
+
+    class ExpiringSession(FakeSession):
+        async def commit(self):
+            # Перенос пережил TTL, блокировку взял другой процесс
+            await fake_redis.set(LLM_CALLS_FLUSH_LOCK, "next-holder")
+
+    await fake_redis.delete(LLM_CALLS_FLUSH_LOCK)
+    assert await flush_calls(lambda: ExpiringSession(statements)) == 1
+    assert await fake_redis.get(LLM_CALLS_FLUSH_LOCK) == "next-holder"
@@ -0,0 +1,102 @@
+"""
+Тесты предварительной оценки ответов правилами (без вызова LLM)
+"""
+
+import unittest.mock as mock
+
+import pytest
+
+from app.services.llm_service import BaseLLMProvider, LLMService
+from app.services.pregrader import PREGRADER_PROVIDER, pregrade
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+QUESTION = "Опишите патогенез сахарного диабета первого типа"
+REFERENCE = "Аутоиммунное разрушение бета-клеток приводит к абсолютной недостаточности инсулина"
+
+
+class CountingProvider(BaseLLMProvider):
+    supports_batch = True
+
+    def __init__(self):
+        self.calls = []
+
+    async def evaluate_answer(self, question, reference_answer, student_answer, criteria, config=None):
+        self.calls.append(student_answer)
+        return {"criteria_scores": {}, "total_score": 55, "feedback": "ok"}
+
+    async def evaluate_answers_batch(self, question, reference_answer, student_answers, criteria, config=None):
+        self.calls.extend(student_answers)
+        return [{"criteria_scores": {}, "total_score": 60, "feedback": "ok"} for _ in student_answers]
+
+
+@pytest.mark.parametrize("answer, rule", [
+    ("", "min_length"),
+    ("   \n\t ", "min_length"),
+    ("-", "min_length"),
+    ("Не знаю.", "refusal"),
+    ("эээ... я не знаю", "refusal"),
+    ("Опишите патогенез сахарного диабета первого типа?", "question_copy"),
+])
+def test_trivial_answers_get_zero(answer, rule):
+    result = pregrade(QUESTION, REFERENCE, answer, CRITERIA, {})
+    assert result["pregrade_rule"] == rule
+    assert result["total_score"] == 0
+    assert result["provider"] == PREGRADER_PROVIDER
+
+
+def test_reference_copy_gets_full_score():
+    result = pregrade(QUESTION, REFERENCE, REFERENCE.upper() + "!", CRITERIA, {})
+    assert result["pregrade_rule"] == "reference_match"
+    assert result["criteria_scores"] == CRITERIA
+    assert result["total_score"] == 100
+
+
+LONG_REFERENCE = (
+    "При сахарном диабете первого типа инсулин вырабатывается в недостаточном количестве, потому что "
+    "бета-клетки поджелудочной железы разрушаются в результате аутоиммунного процесса с участием Т-лимфоцитов"
+)
+
+
+def test_reference_match_requires_order_and_no_added_negation():
+    negated = LONG_REFERENCE.replace("инсулин вырабатывается", "инсулин не вырабатывается")
+    assert pregrade(QUESTION, LONG_REFERENCE, negated, CRITERIA, {}) is None
+
+    words = LONG_REFERENCE.split()
+    salad = " ".join(words[::2] + words[1::2])
+    assert pregrade(QUESTION, LONG_REFERENCE, salad, CRITERIA, {}) is None
+
+    reworded = LONG_REFERENCE.replace("разрушаются", "гибнут").upper()
+    assert pregrade(QUESTION, LONG_REFERENCE, reworded, CRITERIA, {})["pregrade_rule"] == "reference_match"
+
+
+@pytest.mark.parametrize("answer", ["4", "K", "клетки не знают покоя", "инсулин, не уверен"])
+def test_short_meaningful_answers_go_to_model(answer):
+    assert pregrade(QUESTION, REFERENCE, answer, CRITERIA, {}) is None
+
+
+def test_rules_are_configurable():
+    assert pregrade(QUESTION, REFERENCE, "Не знаю", CRITERIA, {"pregrade_enabled": False}) is None
+    assert pregrade(QUESTION, REFERENCE, REFERENCE, CRITERIA, {"pregrade_reference_similarity": 0}) is None
+    assert pregrade(QUESTION, REFERENCE, "Инсулин", CRITERIA, {"pregrade_min_chars": 10})["pregrade_rule"] == "min_length"
+    assert pregrade(QUESTION, REFERENCE, "пас", CRITERIA, {"pregrade_refusal_phrases": ["пас"]})["pregrade_rule"] == "refusal"
+    # Осмысленный короткий ответ оценивает модель
+    assert pregrade(QUESTION, REFERENCE, "Инсулин", CRITERIA, {}) is None
+    assert pregrade(QUESTION, REFERENCE, "Не знаю точно, но вероятно аутоиммунный процесс", CRITERIA, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_pregraded_answers_skip_provider():
+    service = LLMService()
+    provider = CountingProvider()
+    answers = ["Не знаю", "Аутоиммунный процесс", "", "Дефицит инсулина из-за гибели клеток", REFERENCE]
+
+    with mock.patch.object(service.router, "get_provider", return_value=provider):
+        single = await service.evaluate_text_answer(QUESTION, REFERENCE, "не знаю", CRITERIA, config={})
+        results = await service.evaluate_text_answers_batch(QUESTION, REFERENCE, answers, CRITERIA, config={})
+
+    assert single["provider"] == PREGRADER_PROVIDER and single["total_score"] == 0
+    assert provider.calls == ["Аутоиммунный процесс", "Дефицит инсулина из-за гибели клеток"]
+    assert [r["provider"] for r in results] == [
+        PREGRADER_PROVIDER, "CountingProvider (Batch)", PREGRADER_PROVIDER, "CountingProvider (Batch)", PREGRADER_PROVIDER,
+    ]
+    assert results[4]["total_score"] == 100
@@ -0,0 +1,71 @@
+"""
+Тесты кэша presigned URL изображений
+"""
+
+import unittest.mock as mock
+
+import pytest
+
+from app.core.config import settings
+from app.core.presigned_urls import PresignedUrlCache, signing_window
+
+
+@pytest.fixture
+def signer():
+    calls = []
+
+    def sign(object_name, request_date):
+        calls.append(object_name)
+        return f"https://storage/{object_name}?date={int(request_date.timestamp())}"
+
+    sign.calls = calls
+    return sign
+
+
+def test_bulk_signs_each_object_once(signer):
+    cache = PresignedUrlCache(max_entries=100)
+
+    urls = cache.get_many(["a.png", "b.png", "a.png"], 3600, signer)
+    again = cache.get_many(["a.png", "b.png", "c.png"], 3600, signer)
+
+    assert signer.calls == ["a.png", "b.png", "c.png"]
+    assert again["a.png"] == urls["a.png"]
+    assert again["b.png"] == urls["b.png"]
+
+
+def test_url_is_stable_within_window_and_valid_for_minimum(signer):
+    cache = PresignedUrlCache(max_entries=100)
+    expires = 3600
+    width = expires - settings.PRESIGNED_URL_MIN_VALIDITY
+    window_start = 1_000 * width
+
+    # Последний момент окна: подпись от начала окна, запас не меньше MIN_VALIDITY
+    with mock.patch("app.core.presigned_urls.time.time", return_value=window_start + width - 1):
+        _, request_date = signing_window(expires)
+        late = cache.get_many(["a.png"], expires, signer)["a.png"]
+    assert request_date.timestamp() == window_start
+    assert request_date.timestamp() + expires - (window_start + width - 1) >= settings.PRESIGNED_URL_MIN_VALIDITY
+
+    # Новый экземпляр кэша (другой процесс) в том же окне выдаёт тот же URL
+    with mock.patch("app.core.presigned_urls.time.time", return_value=window_start):
+        assert PresignedUrlCache(max_entries=100).get_many(["a.png"], expires, signer)["a.png"] == late
+
+    # В следующем окне URL переподписывается
+    with mock.patch("app.core.presigned_urls.time.time", return_value=window_start + width):
+        assert cache.get_many(["a.png"], expires, signer)["a.png"] != late
+
+
+def test_short_expiry_keeps_half_of_lifetime():
+    with mock.patch.object(settings, "PRESIGNED_URL_MIN_VALIDITY", 1800):
+        _, request_date = signing_window(600, now=10_000)
+    assert 10_000 - request_date.timestamp() <= 300
+
+
+def test_cache_is_bounded_and_drop_forgets_object(signer):
+    cache = PresignedUrlCache(max_entries=2)
+    cache.get_many(["a.png", "b.png", "c.png"], 3600, signer)
+    assert len(cache._entries) == 2
+
+    cache.drop("c.png")
+    cache.get_many(["c.png"], 3600, signer)
+    assert signer.calls.count("c.png") == 2
@@ -0,0 +1,112 @@
+"""
+Тесты компиляции и кэширования промптов оценки
+"""
+
+from app.services.llm_service import YandexGPTProvider
+from app.services.prompt_templates import PromptTemplateCache, build_prompt_plan
+
+CRITERIA = {"factual_correctness": 40, "completeness": 30, "terminology": 20, "structure": 10}
+
+EVALUATION_PROMPT = """## ВОПРОС
+{question}
+
+## ЭТАЛОННЫЙ ОТВЕТ
+{reference_answer}
+
+## ОТВЕТ СТУДЕНТА
+{student_answer}
+
+Фактическая правильность (0-{max_factual})
+
+## ФОРМАТ ОТВЕТА (строго JSON)
+{{
+  "criteria_scores": {{
+    "factual_correctness": <баллы>
+  }},
+  "total_score": <сумма>,
+  "feedback": "<текст>"
+}}"""
+
+CONFIG = {
+    "evaluation_prompt": EVALUATION_PROMPT,
+    "ai_check_enabled": True,
+    "ai_check_prompt": "\nДОПОЛНИТЕЛЬНО (ИИ): оцени вероятность.\n",
+    "integrity_check_prompt": "\nСобытия: {event_log}. Вне фокуса: {away_time_seconds} сек.\n",
+}
+
+
+def test_plain_template_matches_str_format():
+    plan = build_prompt_plan({"evaluation_prompt": EVALUATION_PROMPT}, tuple(CRITERIA))
+    variables = {
+        "question": "Q", "reference_answer": "R", "student_answer": "S {не поле}",
+        "max_factual": 40,
+    }
+    assert plan.render(variables) == EVALUATION_PROMPT.format(**variables)
+
+
+def test_anticheat_block_inserted_before_format_marker():
+    provider = YandexGPTProvider()
+    config = dict(CONFIG, event_log=[{"event": "paste_attempted", "at": "10:00:00"}], away_time_seconds=12)
+
+    prompt = provider._prepare_full_prompt("Вопрос", "Эталон", "Ответ ФОРМАТ ОТВЕТА", CRITERIA, config)
+
+    anticheat_idx = prompt.index("## АНТИ-ЧИТ ПРОВЕРКА")
+    # Как и раньше, блок вставляется прямо перед маркером (заголовок "## " остаётся выше)
+    assert anticheat_idx < prompt.index("ФОРМАТ ОТВЕТА (строго JSON)")
+    # Маркер внутри ответа студента не влияет на место вставки
+    assert anticheat_idx > prompt.index("Ответ ФОРМАТ ОТВЕТА")
+    assert "Вне фокуса: 12 сек." in prompt
+    assert '"paste_attempted"' in prompt
+    assert prompt.endswith(
+        '"feedback": "<текст>"'
+        ',\n  "ai_probability": <вероятность ИИ от 0.0 до 1.0>'
+        ',\n  "integrity_score": <коэффициент честности от 0.0 до 1.0>,'
+        '\n  "integrity_feedback": "<краткий комментарий по поведению>"\n}'
+    )
+
+
+def test_default_prompt_substitutes_criteria():
+    provider = YandexGPTProvider()
+    prompt = provider._prepare_full_prompt("Вопрос", "Эталон", "Ответ", {"accuracy": 70, "style": 30}, {})
+
+    assert "- Accuracy: 0-70 баллов" in prompt
+    assert '"accuracy": <баллы>,\n    "style": <баллы>' in prompt
+    assert "{criteria_text}" not in prompt
+
+
+def test_unknown_variable_falls_back_to_basic_substitution():
+    plan = build_prompt_plan({"evaluation_prompt": "{question} / {unknown} / {{x}}"}, tuple(CRITERIA))
+    assert plan.render({"question": "Q"}) == "Q / {unknown} / {{x}}"
+
+
+def test_cache_keyed_by_config_and_criteria():
+    cache = PromptTemplateCache()
+    first = cache.get_plan(dict(CONFIG), tuple(CRITERIA))
+    assert cache.get_plan(dict(CONFIG), tuple(CRITERIA)) is first
+    assert cache.hits == 1
+
+    # Другие критерии или изменённый промпт — другой план
+    assert cache.get_plan(dict(CONFIG), ("accuracy",)) is not first
+    assert cache.get_plan(dict(CONFIG, ai_check_prompt="другой"), tuple(CRITERIA)) is not first
+    # Выключенная проверка ИИ не зависит от текста её промпта
+    assert (
+        cache.get_plan({"evaluation_prompt": EVALUATION_PROMPT, "ai_check_prompt": "a"}, tuple(CRITERIA))
+        is cache.get_plan({"evaluation_prompt": EVALUATION_PROMPT, "ai_check_prompt": "b"}, tuple(CRITERIA))
+    )
+
+
+def test_batch_plan_replaces_format_section():
+    plan = build_prompt_plan(dict(CONFIG, evaluation_prompt=EVALUATION_PROMPT + "\nОценивай строго."), tuple(CRITERIA), batch=True)
+    prompt = plan.render({
+        "question": "Q", "reference_answer": "R", "student_answer": "### Ответ №1\nS",
+        "max_factual": 40, "answer_count": 3,
+    })
+
+    assert prompt.count("ФОРМАТ ОТВЕТА") == 1
+    assert '"evaluations": [' in prompt
+    assert "«Ответ №3»" in prompt
+    # Одиночный JSON-скелет удалён, текст после него сохранён
+    assert prompt.count('"total_score"') == 1
+    assert prompt.endswith("}\nОценивай строго.")
+    # Поля анти-чита — внутри объекта оценки
+    assert '"ai_probability"' in prompt.split('"evaluations"')[1]
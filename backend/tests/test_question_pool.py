@@ -0,0 +1,91 @@
+"""
+Тесты индекса банка вопросов для генерации вариантов
+"""
+
+import asyncio
+import unittest.mock as mock
+from uuid import uuid4
+
+import pytest
+
+from app.models.question import QuestionType
+from app.services import question_pool
+from app.services.question_pool import (
+    QuestionPoolIndex,
+    bump_question_bank_version,
+    get_question_pool,
+    pool_key,
+)
+
+TOPIC = uuid4()
+
+
+@pytest.fixture(autouse=True)
+def local_index():
+    question_pool._index = None
+    yield
+    question_pool._index = None
+
+
+def _rule(count, difficulty=1, question_type="text"):
+    return {"topic_id": str(TOPIC), "question_type": question_type, "difficulty": difficulty, "count": count}
+
+
+def _db(rows):
+    db = mock.AsyncMock()
+
+    async def _execute(statement):
+        await asyncio.sleep(0)
+        return mock.Mock(all=lambda: list(rows))
+
+    db.execute.side_effect = _execute
+    return db
+
+
+def test_pool_key_normalizes_structure_values():
+    assert pool_key(TOPIC, QuestionType.TEXT, 2) == pool_key(str(TOPIC), "text", "2")
+    assert pool_key(None, "text", 1) == (None, "text", 1)
+
+
+def test_sample_excludes_fixed_and_already_picked():
+    easy = [uuid4() for _ in range(5)]
+    index = QuestionPoolIndex("1", {pool_key(TOPIC, "text", 1): easy})
+
+    picked = index.sample([_rule(2), _rule(2)], exclude_ids=[easy[0]])
+
+    assert len(picked) == 4 and len(set(picked)) == 4
+    assert easy[0] not in picked
+    # Подходящих вопросов меньше, чем нужно — берутся все оставшиеся
+    assert sorted(index.sample([_rule(10)], exclude_ids=easy[:3])) == sorted(easy[3:])
+    assert index.sample([_rule(1, difficulty=3)]) == []
+
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_build_index_once(fake_redis):
+    rows = [(uuid4(), TOPIC, QuestionType.TEXT, 1) for _ in range(3)]
+    db = _db(rows)
+
+    pools = await asyncio.gather(*(get_question_pool(db) for _ in range(20)))
+
+    assert db.execute.await_count == 1
+    assert all(pool is pools[0] for pool in pools)
+    assert len(pools[0].sample([_rule(3)])) == 3
+
+
+@pytest.mark.asyncio
+async def test_bank_change_rebuilds_index(fake_redis):
+    question_id = uuid4()
+    await get_question_pool(_db([(question_id, TOPIC, QuestionType.TEXT, 1)]))
+
+    # Изменение в другом процессе: увеличен только счётчик в Redis
+    await fake_redis.incr(question_pool.QUESTION_BANK_VERSION_KEY)
+    added = uuid4()
+    db = _db([(question_id, TOPIC, QuestionType.TEXT, 1), (added, TOPIC, QuestionType.TEXT, 1)])
+    pool = await get_question_pool(db)
+
+    assert db.execute.await_count == 1
+    assert added in pool.sample([_rule(2)])
+
+    await bump_question_bank_version()
+    assert question_pool._index is None
+    assert await fake_redis.get(question_pool.QUESTION_BANK_VERSION_KEY) == "2"
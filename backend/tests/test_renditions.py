@@ -0,0 +1,115 @@
+"""
+Тесты уменьшенных копий изображений для списков
+"""
+
+import io
+import unittest.mock as mock
+from uuid import uuid4
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.models.question import ImageAsset
+from app.services import renditions as renditions_module
+from app.services.renditions import (
+    ImageSize,
+    attach_image_urls,
+    backfill_renditions,
+    build_image_renditions,
+    store_renditions,
+)
+
+
+@pytest.fixture
+def storage():
+    objects = {}
+
+    def upload_file(file_data, object_name, content_type=None, metadata=None):
+        objects[object_name] = file_data.read()
+        return f"bucket/{object_name}"
+
+    service = mock.Mock()
+    service.upload_file.side_effect = upload_file
+    service.download_file.side_effect = lambda name: objects[name]
+    service.objects = objects
+    async_service = mock.Mock()
+    async_service.get_presigned_urls = mock.AsyncMock(
+        side_effect=lambda names, expires: {name: f"https://s/{name}" for name in names}
+    )
+    with mock.patch.object(renditions_module, "storage_service", service), \
+            mock.patch.object(renditions_module, "async_storage", async_service):
+        yield service
+
+
+def _image(**overrides):
+    fields = dict(
+        id=uuid4(), filename="slide.jpg", storage_path="bucket/images/sha256/abc.jpg",
+        content_hash="abc", width=3000, height=2000, file_size=1,
+    )
+    fields.update(overrides)
+    return ImageAsset(**fields)
+
+
+def _jpeg(width, height) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_renditions_are_webp_within_size_limits(storage):
+    paths = store_renditions(_jpeg(3000, 2000), "abc")
+
+    assert paths == {
+        "thumb": "bucket/renditions/abc/thumb.webp",
+        "preview": "bucket/renditions/abc/preview.webp",
+    }
+    thumb = Image.open(io.BytesIO(storage.objects["renditions/abc/thumb.webp"]))
+    preview = Image.open(io.BytesIO(storage.objects["renditions/abc/preview.webp"]))
+    assert thumb.format == "WEBP"
+    assert thumb.width == settings.IMAGE_THUMB_SIZE
+    assert abs(thumb.height - settings.IMAGE_THUMB_SIZE * 2 / 3) <= 1
+    assert max(preview.size) == settings.IMAGE_PREVIEW_SIZE
+
+
+@pytest.mark.asyncio
+async def test_build_for_uploaded_image(storage):
+    storage.objects["images/sha256/abc.jpg"] = _jpeg(3000, 2000)
+    image = _image()
+    db = mock.AsyncMock()
+    db.get.return_value = image
+    db.scalar.return_value = None
+
+    await build_image_renditions(db, image.id)
+
+    assert set(image.renditions) == {"thumb", "preview"}
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_backfill_reuses_renditions_of_same_content(storage):
+    existing = {"thumb": "bucket/renditions/abc/thumb.webp", "preview": "bucket/renditions/abc/preview.webp"}
+    images = sorted([_image(), _image()], key=lambda image: image.id)
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.Mock(scalars=lambda: mock.Mock(all=lambda: images))
+    db.scalar.return_value = existing
+
+    built, last_id = await backfill_renditions(db, batch_size=10)
+
+    assert (built, last_id) == (2, images[-1].id)
+    assert images[0].renditions == images[1].renditions == existing
+    storage.download_file.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_listing_urls_fall_back_to_original(storage):
+    with_copies = _image(renditions={"thumb": "bucket/renditions/abc/thumb.webp"})
+    without_copies = _image(storage_path="bucket/images/old.png", renditions=None)
+
+    await attach_image_urls([with_copies, None, without_copies], ImageSize.THUMB)
+
+    assert with_copies.presigned_url == "https://s/renditions/abc/thumb.webp"
+    assert without_copies.presigned_url == "https://s/images/old.png"
+
+    await attach_image_urls([with_copies], ImageSize.ORIGINAL)
+    assert with_copies.presigned_url == "https://s/images/sha256/abc.jpg"
@@ -0,0 +1,87 @@
+"""
+Тесты проверки на плагиат: выбор фрагментов, кэш и объединение запросов
+"""
+
+import asyncio
+import unittest.mock as mock
+
+import pytest
+
+from app.services.search_service import SearchService, normalize_fragment, select_fragments
+
+CONFIG = {"yandex_search_api_key": "key", "yandex_search_folder_id": "folder"}
+
+ANSWER = (
+    "Сахарный диабет первого типа развивается вследствие аутоиммунного разрушения бета-клеток. "
+    "Гипергликемия сопровождается глюкозурией, осмотическим диурезом и полиурией. "
+    "Лечение заключается в пожизненной заместительной инсулинотерапии. Коротко."
+)
+
+
+def test_select_fragments_longest_first_and_deduplicated():
+    text = ANSWER + " ГИПЕРГЛИКЕМИЯ сопровождается глюкозурией осмотическим диурезом и полиурией!"
+    fragments = select_fragments(text, 3)
+
+    assert fragments[0].startswith("Сахарный диабет")
+    assert len(fragments) == 3
+    assert len({normalize_fragment(f) for f in fragments}) == 3
+    assert "Коротко" not in fragments
+    assert select_fragments("Короткий текст без длинных предложений", 3) == ["Короткий текст без длинных предложений"]
+
+
+def test_normalize_fragment_ignores_case_and_punctuation():
+    assert normalize_fragment("Бета-клетки,  РАЗРУШАЮТСЯ!") == normalize_fragment("бета клетки разрушаются")
+
+
+@pytest.mark.asyncio
+async def test_cached_hit_skips_search():
+    service = SearchService()
+    with mock.patch.object(service, "_cached_results", return_value=[None, True, None]), \
+            mock.patch.object(service, "_search_fragment") as search:
+        assert await service.check_plagiarism(ANSWER, config=CONFIG) == 1.0
+    search.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_misses_searched_concurrently_and_errors_not_cached():
+    service = SearchService()
+    results = {"Сахарный": False, "Гипергликемия": None, "Лечение": False}
+    stored = {}
+
+    async def _search(query, api_key, folder_id):
+        await asyncio.sleep(0)
+        return results[query.split()[0]]
+
+    async def _store(values):
+        stored.update(values)
+
+    with mock.patch.object(service, "_cached_results", return_value=[None, None, None]), \
+            mock.patch.object(service, "_store_results", side_effect=_store), \
+            mock.patch.object(service, "_search_fragment", side_effect=_search) as search:
+        assert await service.check_plagiarism(ANSWER, config=CONFIG) == 0.0
+
+    assert search.call_count == 3
+    # Ошибка поиска (None) не кэшируется
+    assert len(stored) == 2 and set(stored.values()) == {False}
+
+
+@pytest.mark.asyncio
+async def test_identical_answers_share_inflight_requests():
+    service = SearchService()
+    calls = []
+
+    async def _search(query, api_key, folder_id):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return query.startswith("Гипергликемия")
+
+    with mock.patch.object(service, "_cached_results", return_value=[None, None, None]), \
+            mock.patch.object(service, "_store_results"), \
+            mock.patch.object(service, "_search_fragment", side_effect=_search):
+        scores = await asyncio.gather(
+            service.check_plagiarism(ANSWER, config=CONFIG),
+            service.check_plagiarism(ANSWER.upper(), config=CONFIG),
+        )
+
+    assert scores == [1.0, 1.0]
+    assert len(calls) == 3
@@ -0,0 +1,139 @@
+"""
+Тесты индекса похожих ответов (MinHash + LSH)
+"""
+
+import unittest.mock as mock
+from uuid import uuid4
+
+import pytest
+
+from app.services.llm_service import LLMService
+from app.services.similarity_service import SimilarityService, minhash, signature_similarity
+
+SOURCE = (
+    "Сахарный диабет первого типа развивается вследствие аутоиммунного разрушения бета-клеток "
+    "поджелудочной железы, что приводит к абсолютной недостаточности инсулина, гипергликемии "
+    "и нарушению углеводного, жирового и белкового обмена."
+)
+COPY = SOURCE.upper().replace(",", "") + " Как-то так."
+OTHER = (
+    "Лечение заключается в пожизненной заместительной инсулинотерапии в базис-болюсном режиме, "
+    "а самоконтроль гликемии и обучение пациента снижают риск острых осложнений заболевания."
+)
+
+
+def test_signature_estimates_similarity():
+    assert signature_similarity(minhash(SOURCE), minhash(COPY)) > 0.7
+    assert signature_similarity(minhash(SOURCE), minhash(OTHER)) < 0.2
+    # Короткие ответы не сравниваются
+    assert minhash("Не знаю") is None
+
+
+@pytest.mark.asyncio
+async def test_find_peers_excludes_own_answers(fake_redis):
+    service = SimilarityService()
+    question_id, author, copier = uuid4(), uuid4(), uuid4()
+    source_id, copy_id, other_id, retake_id = uuid4(), uuid4(), uuid4(), uuid4()
+
+    await service.index_answer(question_id, source_id, author, SOURCE)
+    await service.index_answer(question_id, other_id, uuid4(), OTHER)
+    # Прошлая попытка того же студента не считается списыванием
+    await service.index_answer(question_id, retake_id, copier, SOURCE)
+
+    peers = await service.find_peers(question_id, copy_id, copier, COPY)
+    assert [peer_id for peer_id, _ in peers] == [str(source_id)]
+    matches = await service.peer_matches(question_id, copy_id, copier, COPY)
+    assert matches[0][0] == str(source_id) and matches[0][1] > 0.7
+    # Проверенный ответ добавлен в индекс
+    assert await fake_redis.hexists(f"similarity:{question_id}:sig", str(copy_id))
+    # Другой вопрос — другой индекс
+    assert await service.peer_matches(uuid4(), copy_id, copier, COPY) == []
+
+
+@pytest.mark.asyncio
+async def test_edited_answer_leaves_old_buckets(fake_redis):
+    service = SimilarityService()
+    question_id, answer_id = uuid4(), uuid4()
+
+    await service.index_answer(question_id, answer_id, uuid4(), SOURCE)
+    await service.index_answer(question_id, answer_id, uuid4(), OTHER)
+
+    assert await service.find_peers(question_id, uuid4(), uuid4(), SOURCE) == []
+
+
+def test_peer_copy_is_penalized_as_plagiarism():
+    result = LLMService()._apply_integrity_penalties(
+        {"criteria_scores": {}, "total_score": 80, "feedback": "ok"},
+        {"peer_similarity": 0.93, "peer_similarity_threshold": 0.8},
+    )
+    assert result["total_score"] == 0
+    assert result["plagiarism_found"] is True
+    assert "Совпадение с ответом другого студента: 0.93" in result["penalty_note"]
+
+
+@pytest.mark.asyncio
+async def test_batch_peer_lookup_loads_students_once():
+    from app.models.submission import Answer
+    from app.tasks import evaluation_tasks
+
+    submissions = {uuid4(): uuid4() for _ in range(3)}
+    answers = [Answer(id=uuid4(), question_id=uuid4(), submission_id=s, student_answer=SOURCE) for s in submissions]
+    session = mock.AsyncMock()
+    session.execute.return_value = mock.Mock(all=lambda: list(submissions.items()))
+
+    with mock.patch.object(evaluation_tasks.similarity_service, "peer_matches", return_value=[("x", 0.5)]) as peer:
+        scores = await evaluation_tasks._peer_similarities(session, answers, threshold=0.8)
+
+    assert scores == [0.5, 0.5, 0.5]
+    session.execute.assert_awaited_once()
+    assert [call.args[2] for call in peer.await_args_list] == list(submissions.values())
+
+
+@pytest.mark.asyncio
+async def test_copy_found_later_rescores_earlier_graded_peer(fake_redis):
+    from app.models.submission import Answer
+    from app.tasks import evaluation_tasks
+
+    question_id = uuid4()
+    first = Answer(id=uuid4(), question_id=question_id, submission_id=uuid4(), student_answer=SOURCE)
+    second = Answer(id=uuid4(), question_id=question_id, submission_id=uuid4(), student_answer=SOURCE)
+    # Первая работа оценена, когда второй ещё не было
+    first.evaluation = {"peer_similarity": 0.0, "evaluated_at": "2026-10-19T10:00:00"}
+    await evaluation_tasks.similarity_service.index_answer(question_id, first.id, uuid4(), SOURCE)
+
+    session = mock.AsyncMock()
+    session.info = {}
+    session.execute.side_effect = [
+        mock.Mock(all=lambda: [(second.submission_id, uuid4())]),
+        mock.Mock(scalars=lambda: mock.Mock(all=lambda: [first])),
+    ]
+    scores = await evaluation_tasks._peer_similarities(session, [second], threshold=0.8)
+
+    assert scores == [1.0]
+    assert first.evaluation["peer_similarity"] == 1.0
+    with mock.patch.object(evaluation_tasks.evaluate_question_batch, "delay") as delay:
+        evaluation_tasks.dispatch_peer_rescoring(session)
+    delay.assert_called_once_with(str(question_id), [str(first.id)])
+    assert session.info == {}
+
+
+@pytest.mark.asyncio
+async def test_peer_already_flagged_is_not_rescored_again(fake_redis):
+    from app.models.submission import Answer
+    from app.tasks import evaluation_tasks
+
+    question_id = uuid4()
+    first = Answer(id=uuid4(), question_id=question_id, submission_id=uuid4(), student_answer=SOURCE)
+    second = Answer(id=uuid4(), question_id=question_id, submission_id=uuid4(), student_answer=SOURCE)
+    second.evaluation = {"peer_similarity": 1.0, "evaluated_at": "2026-10-19T10:30:00"}
+    await evaluation_tasks.similarity_service.index_answer(question_id, second.id, uuid4(), SOURCE)
+
+    session = mock.AsyncMock()
+    session.info = {}
+    session.execute.side_effect = [
+        mock.Mock(all=lambda: [(first.submission_id, uuid4())]),
+        mock.Mock(scalars=lambda: mock.Mock(all=lambda: [second])),
+    ]
+    # Переоценка первой работы находит вторую, но та уже отмечена: цикла нет
+    assert await evaluation_tasks._peer_similarities(session, [first], threshold=0.8) == [1.0]
+    assert session.info[evaluation_tasks.PEER_RESCORE_KEY] == {}
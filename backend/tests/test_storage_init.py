@@ -0,0 +1,111 @@
+"""
+Тесты ленивой инициализации хранилища
+"""
+
+import threading
+import unittest.mock as mock
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core import storage
+from app.core.storage import AsyncStorageService, StorageService
+
+
+@pytest.fixture
+def minio_cls():
+    with mock.patch.object(storage, "Minio") as cls:
+        cls.return_value.bucket_exists.return_value = True
+        yield cls
+
+
+def test_constructor_does_not_touch_network(minio_cls):
+    service = StorageService()
+
+    minio_cls.assert_not_called()
+    service.get_presigned_urls(["a.png"])
+    # Клиент создан для подписи, bucket не проверялся
+    minio_cls.return_value.bucket_exists.assert_not_called()
+
+
+def test_bucket_is_checked_once_across_threads(minio_cls):
+    service = StorageService()
+    start = threading.Barrier(8)
+
+    def exists(name):
+        start.wait()
+        return service.file_exists(name)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(exists, [f"{i}.png" for i in range(8)]))
+
+    minio_cls.assert_called_once()
+    minio_cls.return_value.bucket_exists.assert_called_once()
+    assert minio_cls.return_value.stat_object.call_count == 8
+
+
+def test_failed_initialization_is_retried(minio_cls):
+    minio_cls.return_value.bucket_exists.side_effect = [ConnectionError("minio down"), True]
+    service = StorageService()
+
+    with pytest.raises(ConnectionError):
+        service.file_exists("a.png")
+    assert service.file_exists("a.png")
+    assert minio_cls.return_value.bucket_exists.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_warmup_swallows_errors(minio_cls):
+    minio_cls.return_value.bucket_exists.side_effect = ConnectionError("minio down")
+    async_service = AsyncStorageService(StorageService())
+
+    await async_service.warmup()
+
+    assert not async_service.sync._bucket_ready
+
+
+@pytest.mark.asyncio
+async def test_async_signing_runs_in_signing_pool(minio_cls):
+    threads = []
+
+    def presign(bucket, name, expires, request_date):
+        threads.append(threading.current_thread().name)
+        return f"https://minio/{bucket}/{name}?sig"
+
+    minio_cls.return_value.presigned_get_object.side_effect = presign
+    async_service = AsyncStorageService(StorageService())
+
+    with mock.patch.object(storage.settings, "ENVIRONMENT", "production"), \
+            mock.patch.object(storage.settings, "MINIO_PUBLIC_URL", None):
+        url = await async_service.get_presigned_url("a.png")
+
+    assert url.endswith("/a.png?sig")
+    assert threads and threads[0].startswith("storage-sign")
+
+
+@pytest.mark.asyncio
+async def test_cached_urls_do_not_wait_for_busy_io_pool(minio_cls, monkeypatch):
+    minio_cls.return_value.presigned_get_object.side_effect = (
+        lambda bucket, name, expires, request_date: f"https://minio/{bucket}/{name}?sig"
+    )
+    monkeypatch.setattr(storage.settings, "ENVIRONMENT", "production")
+    monkeypatch.setattr(storage.settings, "MINIO_PUBLIC_URL", None)
+    async_service = AsyncStorageService(StorageService())
+    first = await async_service.get_presigned_urls(["a.png", "b.png"])
+
+    # Все потоки загрузок заняты
+    release = threading.Event()
+    busy = [
+        async_service.sync._executor.submit(release.wait)
+        for _ in range(storage.settings.STORAGE_IO_WORKERS)
+    ]
+    try:
+        with mock.patch.object(async_service.sync._sign_executor, "submit") as submit:
+            assert await async_service.get_presigned_urls(["a.png", "b.png"]) == first
+        submit.assert_not_called()
+        # Промах подписывается в своём пуле, не дожидаясь загрузок
+        assert (await async_service.get_presigned_url("c.png")).endswith("/c.png?sig")
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
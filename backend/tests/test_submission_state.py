@@ -0,0 +1,93 @@
+"""
+Тесты кэша состояния идущих попыток
+"""
+
+import unittest.mock as mock
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.models.submission import SubmissionStatus
+from app.services.submission_state import (
+    STATE_TTL_AFTER_DEADLINE,
+    STATE_TTL_NO_LIMIT,
+    SUBMISSION_STATE_PREFIX,
+    SubmissionState,
+    cache_submission_state,
+    get_submission_state,
+    invalidate_submission_state,
+    parse_time_limit,
+)
+
+
+def _submission(status=SubmissionStatus.IN_PROGRESS, time_limit=30, started_at=None):
+    return SimpleNamespace(
+        id=uuid4(),
+        student_id=uuid4(),
+        status=status,
+        started_at=started_at or datetime.utcnow(),
+        variant=SimpleNamespace(test_id=uuid4(), test=SimpleNamespace(settings={"time_limit": time_limit})),
+    )
+
+
+def test_state_roundtrip_and_deadline():
+    started = datetime(2026, 10, 19, 10, 0, 0)
+    state = SubmissionState.from_submission(_submission(time_limit="45", started_at=started))
+
+    restored = SubmissionState.from_json(state.to_json())
+
+    assert restored == state
+    assert restored.deadline == started + timedelta(minutes=45)
+    assert SubmissionState(uuid4(), SubmissionStatus.IN_PROGRESS, started).deadline is None
+    assert parse_time_limit("abc") is None and parse_time_limit(None) is None
+
+
+def test_ttl_covers_deadline_with_margin():
+    state = SubmissionState(uuid4(), SubmissionStatus.IN_PROGRESS, datetime.utcnow(), time_limit=10)
+    assert 10 * 60 + STATE_TTL_AFTER_DEADLINE - 5 <= state.ttl() <= 10 * 60 + STATE_TTL_AFTER_DEADLINE
+    # Давно просроченная попытка живёт в кэше не дольше запаса
+    expired = SubmissionState(uuid4(), SubmissionStatus.IN_PROGRESS, datetime.utcnow() - timedelta(days=1), 10)
+    assert expired.ttl() == 1
+    assert SubmissionState(uuid4(), SubmissionStatus.IN_PROGRESS, datetime.utcnow()).ttl() == STATE_TTL_NO_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_cached_state_is_served_without_db(fake_redis):
+    submission = _submission()
+    await cache_submission_state(submission)
+
+    db = mock.AsyncMock()
+    state = await get_submission_state(db, submission.id)
+
+    assert state.student_id == submission.student_id and state.status == SubmissionStatus.IN_PROGRESS
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_finished_submission_is_not_cached(fake_redis):
+    submission = _submission()
+    await cache_submission_state(submission)
+
+    submission.status = SubmissionStatus.EVALUATING
+    await cache_submission_state(submission)
+
+    assert not await fake_redis.exists(f"{SUBMISSION_STATE_PREFIX}{submission.id}")
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_reads_db_and_invalidation_drops_entry(fake_redis):
+    submission = _submission()
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.Mock(scalar_one_or_none=lambda: submission)
+
+    state = await get_submission_state(db, submission.id)
+    assert state.time_limit == 30.0
+    assert await fake_redis.exists(f"{SUBMISSION_STATE_PREFIX}{submission.id}")
+
+    await invalidate_submission_state(submission.id)
+    assert not await fake_redis.exists(f"{SUBMISSION_STATE_PREFIX}{submission.id}")
+
+    db.execute.return_value = mock.Mock(scalar_one_or_none=lambda: None)
+    assert await get_submission_state(db, uuid4()) is None
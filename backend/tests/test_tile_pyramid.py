@@ -0,0 +1,136 @@
+"""
+Тесты пирамиды тайлов больших изображений
+"""
+
+import io
+import json
+import threading
+import time
+import unittest.mock as mock
+from uuid import uuid4
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.models.question import ImageAsset
+from app.services import tile_pyramid
+from app.services.tile_pyramid import (
+    build_manifest,
+    build_tile_pyramid,
+    pyramid_levels,
+    render_tiles,
+    store_tile_pyramid,
+)
+
+
+@pytest.fixture
+def storage():
+    objects = {}
+
+    def upload_file(file_data, object_name, content_type=None, metadata=None):
+        objects[object_name] = file_data.read()
+        return f"bucket/{object_name}"
+
+    service = mock.Mock()
+    service.upload_file.side_effect = upload_file
+    service.download_file.side_effect = lambda name: objects[name]
+    service.objects = objects
+    with mock.patch.object(tile_pyramid, "storage_service", service):
+        yield service
+
+
+def _jpeg(width, height) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_levels_halve_down_to_single_pixel():
+    levels = pyramid_levels(1000, 600, 256)
+
+    assert levels[-1] == {"level": 10, "width": 1000, "height": 600, "columns": 4, "rows": 3}
+    assert levels[-2] == {"level": 9, "width": 500, "height": 300, "columns": 2, "rows": 2}
+    assert levels[0] == {"level": 0, "width": 1, "height": 1, "columns": 1, "rows": 1}
+
+
+def test_tiles_cover_each_level_without_overlap():
+    manifest = build_manifest("abc", 600, 300)
+    img = Image.new("RGBA", (600, 300), "red")
+
+    tiles = dict(render_tiles(img, manifest))
+
+    assert len(tiles) == sum(level["columns"] * level["rows"] for level in manifest["levels"])
+    edge = Image.open(io.BytesIO(tiles["tiles/abc/10/2_1.jpg"]))
+    assert edge.size == (600 - 2 * settings.TILE_SIZE, 300 - settings.TILE_SIZE)
+
+
+def test_manifest_is_uploaded_last(storage):
+    manifest = store_tile_pyramid(_jpeg(600, 300), "abc")
+
+    assert list(storage.objects)[-1] == "tiles/abc/manifest.json"
+    assert json.loads(storage.objects["tiles/abc/manifest.json"]) == manifest
+
+
+def test_uploads_in_flight_are_bounded(storage, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_IO_WORKERS", 2)
+    window = 2 * tile_pyramid.UPLOAD_WINDOW_PER_WORKER
+    counts = {"rendered": 0, "uploaded": 0, "max_pending": 0}
+    lock = threading.Lock()
+    render = tile_pyramid.render_tiles
+    upload = storage.upload_file.side_effect
+
+    def counting_render(img, manifest):
+        for tile in render(img, manifest):
+            with lock:
+                counts["rendered"] += 1
+                pending = counts["rendered"] - counts["uploaded"]
+                counts["max_pending"] = max(counts["max_pending"], pending)
+            yield tile
+
+    def slow_upload(file_data, object_name, content_type=None, metadata=None):
+        time.sleep(0.005)
+        with lock:
+            counts["uploaded"] += 1
+        return upload(file_data, object_name, content_type, metadata)
+
+    storage.upload_file.side_effect = slow_upload
+    monkeypatch.setattr(tile_pyramid, "render_tiles", counting_render)
+
+    store_tile_pyramid(_jpeg(2000, 1500), "abc")
+
+    assert counts["rendered"] > 5 * window
+    # Отрендерен, но не загружен: окно плюс тайл, ждущий места в нём
+    assert counts["max_pending"] <= window + 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_content_reuses_existing_pyramid(storage):
+    image = ImageAsset(
+        id=uuid4(), filename="slide.jpg", storage_path="bucket/images/sha256/abc.jpg",
+        content_hash="abc", width=4000, height=3000, file_size=1,
+    )
+    existing = build_manifest("abc", 4000, 3000)
+    db = mock.AsyncMock()
+    db.get.return_value = image
+    db.scalar.return_value = existing
+
+    manifest = await build_tile_pyramid(db, image.id)
+
+    assert manifest == existing
+    assert image.tile_pyramid == existing
+    storage.download_file.assert_not_called()
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_small_images_are_not_tiled(storage):
+    image = ImageAsset(
+        id=uuid4(), filename="small.jpg", storage_path="bucket/images/small.jpg",
+        width=800, height=600, file_size=1,
+    )
+    db = mock.AsyncMock()
+    db.get.return_value = image
+
+    assert await build_tile_pyramid(db, image.id) is None
+    db.commit.assert_not_awaited()
@@ -0,0 +1,114 @@
+"""
+Тесты кэша снимков пользователей (get_current_user)
+"""
+
+import unittest.mock as mock
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from app.core import user_cache
+from app.core.user_cache import (
+    USER_SNAPSHOT_PREFIX,
+    get_cached_user,
+    invalidate_user,
+    user_from_snapshot,
+    user_snapshot,
+)
+from app.models.user import Role, User
+
+
+@pytest.fixture(autouse=True)
+def local_cache():
+    user_cache._local.clear()
+    yield
+    user_cache._local.clear()
+
+
+def _user(**overrides):
+    fields = dict(
+        id=uuid4(), email="student@example.com", password_hash="hash",
+        last_name="Иванов", first_name="Иван", middle_name=None,
+        role=Role.STUDENT, is_active=True, is_verified=True,
+        created_at=datetime(2026, 9, 1, 8, 0), last_login=None,
+    )
+    fields.update(overrides)
+    return User(**fields)
+
+
+def _db(user):
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.Mock(scalar_one_or_none=lambda: user)
+    db.merge.side_effect = lambda instance, load=True: instance
+    return db
+
+
+def test_snapshot_roundtrip_without_password():
+    user = _user(role=Role.TEACHER, last_login=datetime(2026, 10, 19, 9, 30))
+    snapshot = user_snapshot(user)
+
+    assert "password_hash" not in snapshot
+    restored = user_from_snapshot(snapshot)
+    assert restored.id == user.id and restored.role == Role.TEACHER
+    assert restored.email == user.email and restored.last_name == "Иванов"
+    assert restored.last_login == user.last_login and restored.created_at == user.created_at
+
+
+@pytest.mark.asyncio
+async def test_second_request_does_not_query_db(fake_redis):
+    user = _user()
+    db = _db(user)
+
+    assert await get_cached_user(db, str(user.id)) is user
+    cached = await get_cached_user(db, str(user.id))
+
+    assert db.execute.await_count == 1
+    assert cached.id == user.id and cached.role == Role.STUDENT
+    assert db.merge.await_args.kwargs == {"load": False}
+    assert await fake_redis.exists(f"{USER_SNAPSHOT_PREFIX}{user.id}")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_from_redis_is_shared_between_processes(fake_redis):
+    user = _user()
+    await get_cached_user(_db(user), str(user.id))
+    # Другой процесс: локальная копия пуста, снимок берётся из Redis
+    user_cache._local.clear()
+
+    db = _db(None)
+    cached = await get_cached_user(db, str(user.id))
+
+    assert cached.email == user.email
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_invalidation_drops_both_levels(fake_redis):
+    user = _user()
+    await get_cached_user(_db(user), str(user.id))
+
+    await invalidate_user(user.id)
+
+    assert str(user.id) not in user_cache._local
+    assert not await fake_redis.exists(f"{USER_SNAPSHOT_PREFIX}{user.id}")
+    # Следующий запрос видит изменения из БД
+    blocked = _user(id=user.id, is_active=False)
+    assert (await get_cached_user(_db(blocked), str(user.id))).is_active is False
+
+
+@pytest.mark.asyncio
+async def test_local_cache_is_bounded(fake_redis):
+    users = [_user() for _ in range(3)]
+    with mock.patch.object(user_cache.settings, "USER_CACHE_MAX_ENTRIES", 2):
+        for user in users:
+            await get_cached_user(_db(user), str(user.id))
+
+    assert list(user_cache._local) == [str(users[1].id), str(users[2].id)]
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_not_cached(fake_redis):
+    user_id = str(uuid4())
+    assert await get_cached_user(_db(None), user_id) is None
+    assert user_id not in user_cache._local
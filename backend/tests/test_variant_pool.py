@@ -0,0 +1,68 @@
+"""
+Тесты пула заранее сгенерированных вариантов
+"""
+
+import unittest.mock as mock
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.question_pool import QuestionPoolIndex, pool_key
+from app.services.variant_pool import (
+    MAX_VARIANT_POOL_SIZE,
+    claim_pooled_variant,
+    fill_variant_pool,
+    variant_pool_reuse,
+    variant_pool_size,
+)
+
+
+def test_pool_settings_parsing():
+    assert variant_pool_size({"variant_pool_size": "50"}) == 50
+    assert variant_pool_size({"variant_pool_size": "many"}) == 0
+    assert variant_pool_size({}) == 0 and variant_pool_size(None) == 0
+    assert variant_pool_size({"variant_pool_size": 10 ** 6}) == MAX_VARIANT_POOL_SIZE
+    assert variant_pool_reuse({"variant_pool_reuse": True}) and not variant_pool_reuse({})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("reuse", [False, True])
+async def test_claim_is_single_update_skipping_locked_rows(reuse):
+    claimed = uuid4()
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.Mock(scalar_one_or_none=lambda: claimed)
+
+    assert await claim_pooled_variant(db, uuid4(), reuse=reuse) == claimed
+
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE test_variants") and "RETURNING test_variants.id" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert ("test_variants.claimed_at IS NULL" in sql) is not reuse
+
+
+@pytest.mark.asyncio
+async def test_fill_tops_up_unused_variants_in_one_insert():
+    topic_id, fixed_id = uuid4(), uuid4()
+    generated = [uuid4() for _ in range(3)]
+    test = SimpleNamespace(
+        id=uuid4(),
+        settings={"variant_pool_size": 5},
+        structure=[{"topic_id": str(topic_id), "question_type": "text", "difficulty": 1, "count": 2}],
+    )
+    db = mock.AsyncMock()
+    db.get.return_value = test
+    db.scalar.return_value = 2  # уже есть невыданные
+    db.execute.return_value = mock.Mock(all=lambda: [(fixed_id,)])
+    index = QuestionPoolIndex("1", {pool_key(topic_id, "text", 1): generated})
+
+    with mock.patch("app.services.variant_pool.get_question_pool", return_value=index):
+        created = await fill_variant_pool(db, test.id)
+
+    assert created == 3
+    rows = db.execute.await_args.args[1]
+    assert len(rows) == 3 and all(row["pooled"] for row in rows)
+    assert all(row["question_order"][0] == str(fixed_id) and len(row["question_order"]) == 3 for row in rows)
+    db.commit.assert_awaited_once()
@@ -1,5 +1,6 @@
+import { useCallback, useEffect, useRef } from 'react'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
-import api from '../index'
+import api, { postWithAdmission } from '../index'
 
 const SUBMISSIONS_KEY = ['submissions']
 
@@ -63,7 +64,7 @@ export function useCompleteSubmission() {
 
   return useMutation({
     mutationFn: async (submissionId: string) => {
-      const response = await api.post(`/submissions/${submissionId}/submit`)
+      const response = await postWithAdmission(`/submissions/${submissionId}/submit`)
       return response.data
     },
     onSuccess: (_, submissionId) => {
@@ -150,6 +151,84 @@ export function useLogSubmissionEvent() {
   })
 }
 
+interface BufferedSubmissionEvent {
+  event_type: string
+  details?: any
+  occurred_at: string
+}
+
+const EVENT_FLUSH_INTERVAL_MS = 5000
+const EVENT_BATCH_SIZE = 50
+// Не копим события бесконечно, если сервер долго недоступен
+const EVENT_BUFFER_LIMIT = 500
+
+/**
+ * Буфер событий прохождения теста: события отправляются пачками
+ * (по таймеру, при заполнении и при уходе со вкладки), а не запросом на каждое.
+ * flush() нужно дождаться перед отправкой теста.
+ */
+export function useSubmissionEventBuffer(submissionId: string | undefined) {
+  const bufferRef = useRef<BufferedSubmissionEvent[]>([])
+  const inFlightRef = useRef<Promise<void> | null>(null)
+
+  const flush = useCallback(async (): Promise<void> => {
+    // Пачками, пока буфер не опустеет; при ошибке остаток уйдёт со следующей отправкой
+    for (;;) {
+      while (inFlightRef.current) {
+        await inFlightRef.current
+      }
+      if (!submissionId || bufferRef.current.length === 0) return
+
+      const events = bufferRef.current.splice(0, EVENT_BATCH_SIZE)
+      let sent = true
+      inFlightRef.current = api
+        .post(`/submissions/${submissionId}/events/batch`, {
+          events,
+          sent_at: new Date().toISOString(),
+        })
+        .then(() => undefined)
+        .catch(() => {
+          sent = false
+          // Вернём события в очередь, отправятся со следующей пачкой
+          bufferRef.current = [...events, ...bufferRef.current].slice(-EVENT_BUFFER_LIMIT)
+        })
+        .finally(() => {
+          inFlightRef.current = null
+        })
+      await inFlightRef.current
+      if (!sent) return
+    }
+  }, [submissionId])
+
+  const log = useCallback(
+    (eventType: string, details?: any, options?: { immediate?: boolean }) => {
+      bufferRef.current.push({
+        event_type: eventType,
+        details,
+        occurred_at: new Date().toISOString(),
+      })
+      if (bufferRef.current.length > EVENT_BUFFER_LIMIT) {
+        bufferRef.current.shift()
+      }
+      if (options?.immediate || bufferRef.current.length >= EVENT_BATCH_SIZE) {
+        void flush()
+      }
+    },
+    [flush]
+  )
+
+  useEffect(() => {
+    if (!submissionId) return
+    const timer = setInterval(() => void flush(), EVENT_FLUSH_INTERVAL_MS)
+    return () => {
+      clearInterval(timer)
+      void flush()
+    }
+  }, [submissionId, flush])
+
+  return { log, flush }
+}
+
 export function useGrantRetake() {
   const queryClient = useQueryClient()
 
@@ -1,5 +1,5 @@
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
-import api from '../index'
+import api, { postWithAdmission } from '../index'
 import type { Test } from '../../../types'
 
 const TESTS_KEY = ['tests']
@@ -73,7 +73,7 @@ export function useStartTest() {
 
   return useMutation({
     mutationFn: async (testId: string) => {
-      const response = await api.post(`/tests/${testId}/start`)
+      const response = await postWithAdmission(`/tests/${testId}/start`)
       return response.data
     },
     onSuccess: () => {
@@ -63,6 +63,30 @@ api.interceptors.response.use(
 
 export default api
 
+const ADMISSION_TICKET_HEADER = 'X-Admission-Ticket'
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// POST через очередь допуска (начало и отправка теста): при 429 с detail.queued
+// запрос повторяется с тем же билетом через retry_after секунд
+export async function postWithAdmission<T = any>(url: string, data?: any) {
+  let ticket: string | undefined
+  for (;;) {
+    try {
+      return await api.post<T>(url, data, {
+        headers: ticket ? { [ADMISSION_TICKET_HEADER]: ticket } : undefined,
+      })
+    } catch (error: any) {
+      const detail = error.response?.status === 429 ? error.response.data?.detail : undefined
+      if (!detail?.queued) {
+        throw error
+      }
+      ticket = detail.ticket
+      await sleep((detail.retry_after || 1) * 1000)
+    }
+  }
+}
+
 // Admin API functions
 export const adminApi = {
   // LLM Config
@@ -13,7 +13,7 @@ import { useQueryClient } from '@tanstack/react-query'
 import api from '../../lib/api'
 import { useAuth } from '../../contexts/AuthContext'
 import { useLocale } from '../../contexts/LocaleContext'
-import { useSubmitTest, useLogSubmissionEvent } from '../../lib/api/hooks/useSubmissions'
+import { useSubmitTest, useSubmissionEventBuffer } from '../../lib/api/hooks/useSubmissions'
 import { AnnotationEditor } from '../../components/annotation/AnnotationEditor'
 import { AnnotationData } from '../../types/annotation'
 import { ConfirmDialog } from '../../components/common/ConfirmDialog'
@@ -27,10 +27,10 @@ export default function TakeTestPage() {
   const { user } = useAuth()
   const { t } = useLocale()
   const submitTest = useSubmitTest()
-  const logEvent = useLogSubmissionEvent()
   const { reset: resetAnnotationStore } = useAnnotationStore()
   
   const [submission, setSubmission] = useState<any>(null)
+  const { log: logEvent, flush: flushEvents } = useSubmissionEventBuffer(submission?.id)
   const [questions, setQuestions] = useState<any[]>([])
   const [currentQuestionIndex, setCurrentQuestionIndex] = useState(0)
   const currentQuestionIndexRef = useRef(currentQuestionIndex)
@@ -210,6 +210,9 @@ export default function TakeTestPage() {
         await saveAnswer(q.id)
       }
       
+      // События должны попасть в журнал до оценки ответов
+      await flushEvents()
+
       if (id) {
         await submitTest.mutateAsync(id)
       }
@@ -308,47 +311,32 @@ export default function TakeTestPage() {
 
     const handleVisibilityChange = () => {
       const eventType = document.hidden ? 'tab_hidden' : 'tab_visible'
-      logEvent.mutate({
-        submissionId: submission.id,
-        eventType,
-        details: { 
-          question_id: questions[currentQuestionIndexRef.current]?.id,
-          timestamp: new Date().toISOString()
-        }
-      })
+      // При уходе со вкладки отправляем сразу: страницу могут закрыть
+      logEvent(eventType, {
+        question_id: questions[currentQuestionIndexRef.current]?.id,
+        timestamp: new Date().toISOString()
+      }, { immediate: document.hidden })
     }
 
     const handleBlur = () => {
-      logEvent.mutate({
-        submissionId: submission.id,
-        eventType: 'window_blur',
-        details: { 
-          question_id: questions[currentQuestionIndexRef.current]?.id,
-          timestamp: new Date().toISOString()
-        }
+      logEvent('window_blur', {
+        question_id: questions[currentQuestionIndexRef.current]?.id,
+        timestamp: new Date().toISOString()
       })
     }
 
     const handleFocus = () => {
-      logEvent.mutate({
-        submissionId: submission.id,
-        eventType: 'window_focus',
-        details: { 
-          question_id: questions[currentQuestionIndexRef.current]?.id,
-          timestamp: new Date().toISOString()
-        }
+      logEvent('window_focus', {
+        question_id: questions[currentQuestionIndexRef.current]?.id,
+        timestamp: new Date().toISOString()
       })
     }
 
     const handlePaste = (e: ClipboardEvent) => {
-      logEvent.mutate({
-        submissionId: submission.id,
-        eventType: 'paste_attempted',
-        details: { 
-          question_id: questions[currentQuestionIndexRef.current]?.id,
-          timestamp: new Date().toISOString(),
-          content_length: e.clipboardData?.getData('text').length
-        }
+      logEvent('paste_attempted', {
+        question_id: questions[currentQuestionIndexRef.current]?.id,
+        timestamp: new Date().toISOString(),
+        content_length: e.clipboardData?.getData('text').length
       })
     }
 